@@ -20,11 +20,12 @@ from gofer.messaging.auth import ValidationFailed
 
 from pulp.common.bundle import Bundle
 from pulp.common.config import parse_bool
+from pulp.common.util import calculate_profile_hash
 from pulp.agent.lib.dispatcher import Dispatcher
 from pulp.agent.lib.conduit import Conduit as HandlerConduit
 from pulp.bindings.server import PulpConnection
 from pulp.bindings.bindings import Bindings
-from pulp.bindings.exceptions import NotFoundException
+from pulp.bindings.exceptions import BadRequestException, NotFoundException
 from pulp.client.consumer.config import read_config
 
 
@@ -180,6 +181,31 @@ def get_secret():
     return bundle.uid()
 
 
+def profile_unchanged(bindings, consumer_id, type_id, profile):
+    """
+    Send the hash of a content profile to the server, which reports whether
+    the profile it stores is the same, so the profile itself is only sent
+    when it changed. Servers that do not support this are always sent the
+    profile.
+    :param bindings: The pulp bindings.
+    :type bindings: PulpBindings
+    :param consumer_id: The consumer ID.
+    :type consumer_id: str
+    :param type_id: The profile (content) type ID.
+    :type type_id: str
+    :param profile: The content profile.
+    :type profile: object
+    :return: True if the server already has the profile.
+    :rtype: bool
+    """
+    profile_hash = calculate_profile_hash(profile)
+    try:
+        http = bindings.profile.send_hash(consumer_id, type_id, profile_hash)
+    except BadRequestException:
+        return False
+    return bool(http.response_body.get('unchanged'))
+
+
 class Authenticator(object):
     """
     Provides message authentication using RSA keys.
@@ -290,8 +316,15 @@ class Conduit(HandlerConduit):
     """
     Provides integration between the gofer progress reporting
     and agent handler frameworks.
+    :ivar context: The gofer context of the request being handled.
+    :type context: gofer.agent.rmi.Context
     """
 
+    def __init__(self):
+        # The gofer context is thread-local.  It is captured here so handlers
+        # may report progress from threads started by the dispatcher.
+        self.context = Context.current()
+
     @property
     def consumer_id(self):
         """
@@ -316,9 +349,8 @@ class Conduit(HandlerConduit):
         :param report: A handler progress report.
         :type report: object
         """
-        context = Context.current()
-        context.progress.details = report
-        context.progress.report()
+        self.context.progress.details = report
+        self.context.progress.report()
 
     def cancelled(self):
         """
@@ -326,8 +358,7 @@ class Conduit(HandlerConduit):
         :return: True if cancelled, else False.
         :rtype: bool
         """
-        context = Context.current()
-        return context.cancelled()
+        return self.context.cancelled()
 
 
 # --- scheduled actions ------------------------------------------------------
@@ -495,6 +526,11 @@ class Profile(object):
                 continue
 
             details = profile_report['details']
+            if profile_unchanged(bindings, consumer_id, type_id, details):
+                msg = _('profile (%(t)s), unchanged')
+                log.info(msg, {'t': type_id})
+                continue
+
             http = bindings.profile.send(consumer_id, type_id, details)
 
             msg = _('profile (%(t)s), reported: %(r)s')
@@ -1,4 +1,5 @@
 from logging import getLogger
+from threading import RLock
 import imp
 import os
 
@@ -20,6 +21,50 @@ ROLE_PROPERTY = (
 # ALL roles
 ROLES = [r[0] for r in ROLE_PROPERTY]
 
+# Descriptors and handler modules loaded from files, keyed by path.
+# Each value is ((mtime, size), object) so the file is reloaded only
+# when it has changed.
+_DESCRIPTORS = {}
+_MODULES = {}
+_CACHE_LOCK = RLock()
+
+
+def _signature(path):
+    """
+    Get the signature used to detect when a file has changed.
+    @param path: The absolute path to a file.
+    @type path: str
+    @return: (mtime, size)
+    @rtype: tuple
+    """
+    st = os.stat(path)
+    return st.st_mtime, st.st_size
+
+
+def _cached(cache, path, load):
+    """
+    Get the object loaded from a file, loading it only when the
+    file has changed since it was last loaded.
+    @param cache: The cache of loaded objects.
+    @type cache: dict
+    @param path: The absolute path to the file.
+    @type path: str
+    @param load: Called with no arguments to load the object.
+    @type load: callable
+    @return: The loaded object.
+    """
+    signature = _signature(path)
+    _CACHE_LOCK.acquire()
+    try:
+        entry = cache.get(path)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+        loaded = load()
+        cache[path] = (signature, loaded)
+        return loaded
+    finally:
+        _CACHE_LOCK.release()
+
 
 class Descriptor:
     """
@@ -53,6 +98,8 @@ class Descriptor:
     def list(cls, root=ROOT):
         """
         Load the handler descriptors.
+        Descriptors are parsed only when the file has changed since it
+        was last loaded.
         @param root: The root directory contining descriptors.
         @type root: str
         @return: A list of descriptors.
@@ -62,7 +109,7 @@ class Descriptor:
         cls.__mkdir(root)
         for name, path in cls.__list(root):
             try:
-                descriptor = cls(name, path)
+                descriptor = _cached(_DESCRIPTORS, path, lambda: cls(name, path))
                 if not descriptor.enabled():
                     continue
                 descriptors.append((name, descriptor))
@@ -292,6 +339,7 @@ class Container:
     def __load_module(self, name):
         """
         Load (import) from source the module by name.
+        The module is loaded again only when the source has changed.
         @param name: The module name.
         @type name: str
         @return: The module (or None)
@@ -300,7 +348,7 @@ class Container:
         path = self.__find_module(name)
         if path:
             mangled = self.__mangled(name)
-            mod = imp.load_source(mangled, path)
+            mod = _cached(_MODULES, path, lambda: imp.load_source(mangled, path))
         return mod
 
     def __import_module(self, path):
@@ -1,4 +1,6 @@
+from functools import partial
 from logging import getLogger
+from threading import Thread
 import os
 
 from pulp.agent.lib.container import BIND, Container, CONTENT, SYSTEM
@@ -53,20 +55,7 @@ class Dispatcher:
         @return: A dispatch report.
         @rtype: L{DispatchReport}
         """
-        dispatch_report = report.DispatchReport()
-        collated = Units(units)
-        for type_id, units in collated.items():
-            try:
-                handler = self.__handler(type_id, CONTENT)
-                _report = handler.install(conduit, units, dict(options))
-                _report.aggregation_key = type_id
-                _report.update(dispatch_report)
-            except Exception:
-                _logger.exception('handler failed')
-                _report = report.HandlerReport()
-                _report.aggregation_key = type_id
-                _report.set_failed(report.LastExceptionDetails())
-                _report.update(dispatch_report)
+        dispatch_report = self.__content(conduit, 'install', units, options)
         mgr = RebootManager(conduit, self, options)
         reboot_report = mgr.reboot(dispatch_report.num_changes)
         reboot_report.update(dispatch_report)
@@ -85,20 +74,7 @@ class Dispatcher:
         @return: A dispatch report.
         @rtype: L{DispatchReport}
         """
-        dispatch_report = report.DispatchReport()
-        collated = Units(units)
-        for type_id, units in collated.items():
-            try:
-                handler = self.__handler(type_id, CONTENT)
-                _report = handler.update(conduit, units, dict(options))
-                _report.aggregation_key = type_id
-                _report.update(dispatch_report)
-            except Exception:
-                _logger.exception('handler failed')
-                _report = report.HandlerReport()
-                _report.aggregation_key = type_id
-                _report.set_failed(report.LastExceptionDetails())
-                _report.update(dispatch_report)
+        dispatch_report = self.__content(conduit, 'update', units, options)
         mgr = RebootManager(conduit, self, options)
         reboot_report = mgr.reboot(dispatch_report.num_changes)
         reboot_report.update(dispatch_report)
@@ -117,20 +93,7 @@ class Dispatcher:
         @return: A dispatch report.
         @rtype: L{DispatchReport}
         """
-        dispatch_report = report.DispatchReport()
-        collated = Units(units)
-        for type_id, units in collated.items():
-            try:
-                handler = self.__handler(type_id, CONTENT)
-                _report = handler.uninstall(conduit, units, dict(options))
-                _report.aggregation_key = type_id
-                _report.update(dispatch_report)
-            except Exception:
-                _logger.exception('handler failed')
-                _report = report.HandlerReport()
-                _report.aggregation_key = type_id
-                _report.set_failed(report.LastExceptionDetails())
-                _report.update(dispatch_report)
+        dispatch_report = self.__content(conduit, 'uninstall', units, options)
         mgr = RebootManager(conduit, self, options)
         reboot_report = mgr.reboot(dispatch_report.num_changes)
         reboot_report.update(dispatch_report)
@@ -196,6 +159,9 @@ class Dispatcher:
     def bind(self, conduit, bindings, options):
         """
         Bind a repository.
+        The bindings are grouped by type_id and passed to each handler
+        together.  Handlers defined in different modules are called
+        concurrently.
         @param conduit: A handler conduit.
         @type conduit: L{pulp.agent.lib.conduit.Conduit}
         @param bindings: A list of bindings to add/update.
@@ -208,24 +174,33 @@ class Dispatcher:
         @rtype: L{DispatchReport}
         """
         dispatch_report = report.DispatchReport()
-        for binding in bindings:
-            type_id = binding.pop('type_id')
+        collated = Bindings(bindings)
+        calls = []
+        for type_id, batch in collated.items():
             try:
                 handler = self.__handler(type_id, BIND)
-                _report = handler.bind(conduit, binding, options)
-                _report.aggregation_key = type_id
-                _report.update(dispatch_report)
-            except Exception:
+            except HandlerNotFound:
                 _logger.exception('handler failed')
-                _report = report.BindReport(binding['repo_id'])
-                _report.aggregation_key = type_id
-                _report.set_failed(report.LastExceptionDetails())
+                for binding in batch:
+                    _report = report.BindReport(binding['repo_id'])
+                    _report.aggregation_key = type_id
+                    _report.set_failed(report.LastExceptionDetails())
+                    _report.update(dispatch_report)
+                continue
+            call = partial(self.__bind, handler, type_id, conduit, batch, options)
+            calls.append((handler, call))
+        for reports in self.__run(calls):
+            for _report in reports:
                 _report.update(dispatch_report)
         return dispatch_report
 
     def unbind(self, conduit, bindings, options):
         """
         Unbind a repository.
+        The bindings are grouped by type_id and passed to each handler
+        together.  Handlers defined in different modules are called
+        concurrently.  Bindings without a type_id are unbound on all
+        handlers.
         @param conduit: A handler conduit.
         @type conduit: L{pulp.agent.lib.conduit.Conduit}
         @param bindings: A list of bindings to be removed.
@@ -237,24 +212,28 @@ class Dispatcher:
         @rtype: L{DispatchReport}
         """
         dispatch_report = report.DispatchReport()
-        for binding in bindings:
-            repo_id = binding['repo_id']
-            type_id = binding.pop('type_id', None)
+        collated = Bindings(bindings, required=False)
+        unbound = collated.pop(None, [])
+        calls = []
+        for type_id, batch in collated.items():
+            repo_ids = [b['repo_id'] for b in batch]
             try:
-                if type_id:
-                    handler = self.__handler(type_id, BIND)
-                    _report = handler.unbind(conduit, repo_id, options)
+                handler = self.__handler(type_id, BIND)
+            except HandlerNotFound:
+                _logger.exception('handler failed')
+                for repo_id in repo_ids:
+                    _report = report.BindReport(repo_id)
                     _report.aggregation_key = type_id
+                    _report.set_failed(report.LastExceptionDetails())
                     _report.update(dispatch_report)
-                else:
-                    reports = self.unbind_all(conduit, repo_id, options)
-                    for r in reports:
-                        r.update(dispatch_report)
-            except Exception:
-                _logger.exception('handler failed')
-                _report = report.BindReport(repo_id)
-                _report.aggregation_key = type_id
-                _report.set_failed(report.LastExceptionDetails())
+                continue
+            call = partial(self.__unbind, handler, type_id, conduit, repo_ids, options)
+            calls.append((handler, call))
+        for reports in self.__run(calls):
+            for _report in reports:
+                _report.update(dispatch_report)
+        for binding in unbound:
+            for _report in self.unbind_all(conduit, binding['repo_id'], options):
                 _report.update(dispatch_report)
         return dispatch_report
 
@@ -314,6 +293,202 @@ class Dispatcher:
                 _report.update(dispatch_report)
         return dispatch_report
 
+    def __content(self, conduit, method, units, options):
+        """
+        Dispatch a content operation to the handlers for the types of the units.
+        Each handler is called once with all of the units of its type.
+        @param conduit: A handler conduit.
+        @type conduit: L{pulp.agent.lib.conduit.Conduit}
+        @param method: The name of the handler method to call.
+        @type method: str
+        @param units: A list of content units.
+        @type units: list
+        @param options: Operation options.
+        @type options: dict
+        @return: A dispatch report.
+        @rtype: L{DispatchReport}
+        """
+        dispatch_report = report.DispatchReport()
+        collated = Units(units)
+        calls = []
+        for type_id, units in collated.items():
+            try:
+                handler = self.__handler(type_id, CONTENT)
+            except HandlerNotFound:
+                _logger.exception('handler failed')
+                _report = report.HandlerReport()
+                _report.aggregation_key = type_id
+                _report.set_failed(report.LastExceptionDetails())
+                _report.update(dispatch_report)
+                continue
+            method_call = getattr(handler, method)
+            call = partial(self.__call_content, method_call, type_id, conduit, units, options)
+            calls.append((handler, call))
+        for _report in self.__run(calls):
+            _report.update(dispatch_report)
+        return dispatch_report
+
+    def __call_content(self, method, type_id, conduit, units, options):
+        """
+        Call a content handler method.
+        @param method: The bound handler method.
+        @type method: callable
+        @param type_id: The content type ID.
+        @type type_id: str
+        @param conduit: A handler conduit.
+        @type conduit: L{pulp.agent.lib.conduit.Conduit}
+        @param units: A list of unit keys.
+        @type units: list
+        @param options: Operation options.
+        @type options: dict
+        @return: A handler report.
+        @rtype: L{HandlerReport}
+        """
+        try:
+            _report = method(conduit, units, dict(options))
+        except Exception:
+            _logger.exception('handler failed')
+            _report = report.HandlerReport()
+            _report.set_failed(report.LastExceptionDetails())
+        _report.aggregation_key = type_id
+        return _report
+
+    def __bind(self, handler, type_id, conduit, bindings, options):
+        """
+        Bind repositories using a bind handler.
+        All of the bindings are passed to the handler in one call. When the
+        handler does not support that, they are bound one at a time.
+        @param handler: A bind handler.
+        @type handler: L{pulp.agent.lib.handler.BindHandler}
+        @param type_id: The distributor type ID.
+        @type type_id: str
+        @param conduit: A handler conduit.
+        @type conduit: L{pulp.agent.lib.conduit.Conduit}
+        @param bindings: A list of bindings to add/update.
+        @type bindings: list
+        @param options: Bind options.
+        @type options: dict
+        @return: A list of bind reports.
+        @rtype: list
+        """
+        reports = None
+        method = getattr(handler, 'bind_many', 0)
+        if callable(method):
+            try:
+                reports = method(conduit, bindings, options)
+            except NotImplementedError:
+                # optional
+                pass
+            except Exception:
+                _logger.exception('handler failed')
+                details = report.LastExceptionDetails()
+                reports = []
+                for binding in bindings:
+                    _report = report.BindReport(binding['repo_id'])
+                    _report.set_failed(details)
+                    reports.append(_report)
+        if reports is None:
+            reports = []
+            for binding in bindings:
+                try:
+                    _report = handler.bind(conduit, binding, options)
+                except Exception:
+                    _logger.exception('handler failed')
+                    _report = report.BindReport(binding['repo_id'])
+                    _report.set_failed(report.LastExceptionDetails())
+                reports.append(_report)
+        for _report in reports:
+            _report.aggregation_key = type_id
+        return reports
+
+    def __unbind(self, handler, type_id, conduit, repo_ids, options):
+        """
+        Unbind repositories using a bind handler.
+        All of the repository IDs are passed to the handler in one call. When
+        the handler does not support that, they are unbound one at a time.
+        @param handler: A bind handler.
+        @type handler: L{pulp.agent.lib.handler.BindHandler}
+        @param type_id: The distributor type ID.
+        @type type_id: str
+        @param conduit: A handler conduit.
+        @type conduit: L{pulp.agent.lib.conduit.Conduit}
+        @param repo_ids: A list of repository IDs.
+        @type repo_ids: list
+        @param options: Unbind options.
+        @type options: dict
+        @return: A list of bind reports.
+        @rtype: list
+        """
+        reports = None
+        method = getattr(handler, 'unbind_many', 0)
+        if callable(method):
+            try:
+                reports = method(conduit, repo_ids, options)
+            except NotImplementedError:
+                # optional
+                pass
+            except Exception:
+                _logger.exception('handler failed')
+                details = report.LastExceptionDetails()
+                reports = []
+                for repo_id in repo_ids:
+                    _report = report.BindReport(repo_id)
+                    _report.set_failed(details)
+                    reports.append(_report)
+        if reports is None:
+            reports = []
+            for repo_id in repo_ids:
+                try:
+                    _report = handler.unbind(conduit, repo_id, options)
+                except Exception:
+                    _logger.exception('handler failed')
+                    _report = report.BindReport(repo_id)
+                    _report.set_failed(report.LastExceptionDetails())
+                reports.append(_report)
+        for _report in reports:
+            _report.aggregation_key = type_id
+        return reports
+
+    def __run(self, calls):
+        """
+        Make handler calls.
+        Handlers defined in the same module may share resources such as
+        configuration files, so calls to them are made one at a time and
+        in order.  Calls to handlers defined in different modules are
+        independent and are made concurrently.
+        @param calls: A list of (handler, call).  Each call is a callable
+            that takes no arguments and does not raise.
+        @type calls: list
+        @return: The values returned by the calls, in the same order.
+        @rtype: list
+        """
+        results = [None] * len(calls)
+        modules = []
+        lanes = {}
+        for index, (handler, call) in enumerate(calls):
+            module = handler.__class__.__module__
+            if module not in lanes:
+                modules.append(module)
+                lanes[module] = []
+            lanes[module].append(index)
+
+        def run(indexes):
+            for index in indexes:
+                results[index] = calls[index][1]()
+
+        if len(modules) < 2:
+            run(range(len(calls)))
+            return results
+        threads = []
+        for module in modules:
+            thread = Thread(target=run, args=(lanes[module],))
+            thread.setDaemon(True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        return results
+
     def __handler(self, type_id, role):
         """
         Find a handler by type ID.
@@ -391,3 +566,30 @@ class Units(dict):
                 lst = []
                 self[type_id] = lst
             lst.append(unit['unit_key'])
+
+
+class Bindings(dict):
+    """
+    Bindings collated by type_id.
+    """
+
+    def __init__(self, bindings, required=True):
+        """
+        Binding is: {type_id:<str>, repo_id:<str>, ...}
+        The type_id is removed from each binding.
+        @param bindings: A list of bindings.
+        @type bindings: list
+        @param required: Whether each binding must specify a type_id.
+            When not required, bindings without one are collated under None.
+        @type required: bool
+        """
+        for binding in bindings:
+            if required:
+                type_id = binding.pop('type_id')
+            else:
+                type_id = binding.pop('type_id', None) or None
+            lst = self.get(type_id)
+            if lst is None:
+                lst = []
+                self[type_id] = lst
+            lst.append(binding)
@@ -155,6 +155,43 @@ class BindHandler(Handler):
         """
         raise NotImplementedError()
 
+    def bind_many(self, conduit, bindings, options):
+        """
+        Bind multiple repositories.
+        Optional.  Handlers that can bind several repositories more
+        efficiently than one at a time (for example, by writing a
+        configuration file once) should implement this.  Otherwise,
+        bind() is called for each binding.
+        @param conduit: A handler conduit.
+        @type conduit: L{pulp.agent.lib.conduit.Conduit}
+        @param bindings: A list of bindings to add/update.
+          A binding is: {repo_id:<str>, details:<dict>}
+            The 'details' are at the discretion of the distributor.
+        @type bindings: list
+        @param options: Bind options.
+        @type options: dict
+        @return: A list of bind reports, one for each binding and in the same order.
+        @rtype: list
+        """
+        raise NotImplementedError()
+
+    def unbind_many(self, conduit, repo_ids, options):
+        """
+        Unbind multiple repositories.
+        Optional.  Handlers that can unbind several repositories more
+        efficiently than one at a time should implement this.  Otherwise,
+        unbind() is called for each repository.
+        @param conduit: A handler conduit.
+        @type conduit: L{pulp.agent.lib.conduit.Conduit}
+        @param repo_ids: A list of repository IDs.
+        @type repo_ids: list
+        @param options: Unbind options.
+        @type options: dict
+        @return: A list of unbind reports, one for each repository and in the same order.
+        @rtype: list
+        """
+        raise NotImplementedError()
+
     def clean(self, conduit):
         """
         Clean up all bind related artifacts.
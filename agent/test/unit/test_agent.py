@@ -1,11 +1,13 @@
 from unittest import TestCase
 import os
+from threading import Thread
 
 from gofer.messaging.auth import ValidationFailed
 from M2Crypto import RSA, BIO
 from mock import patch, Mock
 
 from pulp.common.config import Config
+from pulp.common.util import calculate_profile_hash
 from pulp.devel.unit.util import SideEffect
 
 
@@ -509,6 +511,24 @@ class TestConduit(PluginTest):
         self.assertFalse(cancelled)
         self.assertTrue(mock_context.cancelled.called)
 
+    @patch('gofer.agent.rmi.Context.current')
+    def test_update_progress_other_thread(self, mock_current):
+        mock_context = Mock()
+        mock_context.progress = Mock()
+        mock_current.return_value = mock_context
+        conduit = self.plugin.Conduit()
+        mock_current.return_value = None
+        report = {'a': 1}
+
+        # test
+        thread = Thread(target=conduit.update_progress, args=(report,))
+        thread.start()
+        thread.join()
+
+        # validation
+        mock_context.progress.report.assert_called_with()
+        self.assertEqual(mock_context.progress.details, report)
+
 
 class TestGetAgentId(PluginTest):
 
@@ -866,6 +886,7 @@ class TestProfile(PluginTest):
         _report.dict = Mock(return_value=_report.details)
 
         mock_dispatcher().profile.return_value = _report
+        mock_bindings().profile.send_hash.return_value.response_body = {'unchanged': False}
 
         # test
         profile = self.plugin.Profile()
@@ -873,4 +894,45 @@ class TestProfile(PluginTest):
 
         # validation
         mock_dispatcher().profile.assert_called_with(mock_conduit())
+        mock_bindings().profile.send_hash.assert_called_once_with(
+            TEST_CN, 'BB', calculate_profile_hash(5678))
+        mock_bindings().profile.send.assert_called_once_with(TEST_CN, 'BB', 5678)
+
+    @patch('pulp.agent.gofer.pulpplugin.ConsumerX509Bundle')
+    @patch('pulp.agent.gofer.pulpplugin.Conduit')
+    @patch('pulp.agent.gofer.pulpplugin.Dispatcher')
+    @patch('pulp.agent.gofer.pulpplugin.PulpBindings')
+    def test_send_unchanged(self, mock_bindings, mock_dispatcher, mock_conduit, mock_bundle):
+        mock_bundle().cn = Mock(return_value=TEST_CN)
+        _report = Mock()
+        _report.details = {'BB': {'succeeded': True, 'details': 5678}}
+        mock_dispatcher().profile.return_value = _report
+        mock_bindings().profile.send_hash.return_value.response_body = {'unchanged': True}
+
+        # test
+        profile = self.plugin.Profile()
+        profile.send()
+
+        # validation
+        self.assertEqual(mock_bindings().profile.send_hash.call_count, 1)
+        self.assertFalse(mock_bindings().profile.send.called)
+
+    @patch('pulp.agent.gofer.pulpplugin.ConsumerX509Bundle')
+    @patch('pulp.agent.gofer.pulpplugin.Conduit')
+    @patch('pulp.agent.gofer.pulpplugin.Dispatcher')
+    @patch('pulp.agent.gofer.pulpplugin.PulpBindings')
+    def test_send_hash_not_supported(self, mock_bindings, mock_dispatcher, mock_conduit,
+                                     mock_bundle):
+        mock_bundle().cn = Mock(return_value=TEST_CN)
+        _report = Mock()
+        _report.details = {'BB': {'succeeded': True, 'details': 5678}}
+        mock_dispatcher().profile.return_value = _report
+        mock_bindings().profile.send_hash.side_effect = \
+            self.plugin.BadRequestException({'property_names': ['profile']})
+
+        # test
+        profile = self.plugin.Profile()
+        profile.send()
+
+        # validation
         mock_bindings().profile.send.assert_called_once_with(TEST_CN, 'BB', 5678)
@@ -1,6 +1,7 @@
+import os
 import unittest
 
-from mock import Mock
+from mock import Mock, patch
 
 from pulp.agent.lib import container, dispatcher, report
 from pulp.agent.lib.conduit import Conduit
@@ -62,6 +63,30 @@ class TestHandlerContainer(unittest.TestCase):
         # Verify
         self.assertTrue(handler is None)
 
+    def test_load_cached(self):
+        path = os.path.join(MockDeployer.CONF_D, 'rpm.conf')
+        container._DESCRIPTORS.clear()
+        container._MODULES.clear()
+        c = self.container()
+        # Test
+        with patch.object(container.imp, 'load_source', wraps=container.imp.load_source) as load:
+            c.load()
+            descriptor = container._DESCRIPTORS[path][1]
+            handler = c.find('rpm')
+            loaded = load.call_count
+            c.load()
+            # Verify
+            self.assertTrue(container._DESCRIPTORS[path][1] is descriptor)
+            self.assertTrue(c.find('rpm') is not handler)
+            self.assertEqual(load.call_count, loaded)
+            # changed descriptors are loaded again
+            f = open(path, 'a')
+            f.write('\n')
+            f.close()
+            c.load()
+            self.assertTrue(container._DESCRIPTORS[path][1] is not descriptor)
+            self.assertTrue(c.find('rpm') is not None)
+
 
 class TestDispatcher(unittest.TestCase):
 
@@ -383,6 +408,83 @@ class TestDispatcher(unittest.TestCase):
         self.assertTrue(details['succeeded'])
         self.assertEqual(details['details'], {})
 
+    def test_bind_many(self):
+        type_id = 'yum'
+        # Setup
+        d = dispatcher.Dispatcher(self.container())
+        handler = d.container.find(type_id, container.BIND)
+        reports = []
+        for repo_id in ('repo-1', 'repo-2'):
+            _report = report.BindReport(repo_id)
+            _report.set_succeeded({}, 1)
+            reports.append(_report)
+        handler.bind_many = Mock(return_value=reports)
+        handler.bind = Mock()
+        # Test
+        conduit = Conduit()
+        bindings = [dict(type_id=type_id, repo_id='repo-1', details={}),
+                    dict(type_id=type_id, repo_id='repo-2', details={})]
+        options = {}
+        _report = d.bind(conduit, bindings, options)
+        # Verify
+        handler.bind_many.assert_called_once_with(
+            conduit, [dict(repo_id='repo-1', details={}), dict(repo_id='repo-2', details={})],
+            options)
+        self.assertFalse(handler.bind.called)
+        self.assertTrue(_report.succeeded)
+        self.assertEqual(_report.num_changes, 2)
+        repo_ids = [details['repo_id'] for details in _report.details[type_id]]
+        self.assertEqual(repo_ids, ['repo-1', 'repo-2'])
+
+    def test_bind_concurrent(self):
+        # Setup
+        d = dispatcher.Dispatcher(self.container())
+
+        def bind(conduit, binding, options):
+            _report = report.BindReport(binding['repo_id'])
+            _report.set_succeeded({}, 1)
+            return _report
+
+        other = Mock()
+        other.bind_many.side_effect = NotImplementedError()
+        other.bind.side_effect = bind
+        d.container.handlers[container.BIND]['other'] = other
+        # Test
+        conduit = Conduit()
+        bindings = [dict(type_id='yum', repo_id='repo-1', details={}),
+                    dict(type_id='other', repo_id='repo-2', details={}),
+                    dict(type_id='yum', repo_id='repo-3', details={}),
+                    dict(type_id='other', repo_id='repo-4', details={})]
+        with patch.object(dispatcher, 'Thread', wraps=dispatcher.Thread) as thread:
+            _report = d.bind(conduit, bindings, {})
+        # Verify
+        self.assertEqual(thread.call_count, 2)
+        self.assertEqual(other.bind.call_count, 2)
+        self.assertTrue(_report.succeeded)
+        self.assertEqual(_report.num_changes, 4)
+        yum = [details['repo_id'] for details in _report.details['yum']]
+        self.assertEqual(yum, ['repo-1', 'repo-3'])
+        other = [details['repo_id'] for details in _report.details['other']]
+        self.assertEqual(other, ['repo-2', 'repo-4'])
+
+    def test_bind_many_raised(self):
+        type_id = 'yum'
+        # Setup
+        d = dispatcher.Dispatcher(self.container())
+        handler = d.container.find(type_id, container.BIND)
+        handler.bind_many = Mock(side_effect=ValueError())
+        # Test
+        conduit = Conduit()
+        bindings = [dict(type_id=type_id, repo_id='repo-1', details={}),
+                    dict(type_id=type_id, repo_id='repo-2', details={})]
+        _report = d.bind(conduit, bindings, {})
+        # Verify
+        self.assertFalse(_report.succeeded)
+        self.assertEqual(len(_report.details[type_id]), 2)
+        for details in _report.details[type_id]:
+            self.assertFalse(details['succeeded'])
+            self.assertTrue('message' in details['details'])
+
     def test_bind_failed(self):
         type_id = 'yum'
         repo_id = 'repo-1'
@@ -439,6 +541,28 @@ class TestDispatcher(unittest.TestCase):
         self.assertEqual(details['repo_id'], repo_id)
         self.assertEqual(details['details'], {})
 
+    def test_unbind_many(self):
+        type_id = 'yum'
+        # Setup
+        d = dispatcher.Dispatcher(self.container())
+        handler = d.container.find(type_id, container.BIND)
+        reports = []
+        for repo_id in ('repo-1', 'repo-2'):
+            _report = report.BindReport(repo_id)
+            _report.set_succeeded({}, 1)
+            reports.append(_report)
+        handler.unbind_many = Mock(return_value=reports)
+        # Test
+        conduit = Conduit()
+        bindings = [dict(type_id=type_id, repo_id='repo-1'),
+                    dict(type_id=type_id, repo_id='repo-2')]
+        options = {}
+        _report = d.unbind(conduit, bindings, options)
+        # Verify
+        handler.unbind_many.assert_called_once_with(conduit, ['repo-1', 'repo-2'], options)
+        self.assertTrue(_report.succeeded)
+        self.assertEqual(_report.num_changes, 2)
+
     def test_unbind_failed(self):
         type_id = 'yum'
         repo_id = 'repo-1'
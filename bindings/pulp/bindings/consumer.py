@@ -173,6 +173,25 @@ class ProfilesAPI(PulpAPI):
         data = {'content_type': content_type, 'profile': profile}
         return self.server.POST(path, data)
 
+    def send_hash(self, id, content_type, profile_hash):
+        """
+        Ask the server whether the stored profile matches the consumer's current
+        profile, without sending the profile.
+
+        :param id:           consumer ID
+        :type  id:           str
+        :param content_type: profile (content) type ID
+        :type  content_type: str
+        :param profile_hash: hash of the profile, from pulp.common.util.calculate_profile_hash
+        :type  profile_hash: str
+        :return:             response whose body has 'unchanged' set to True if the profile
+                             does not need to be sent
+        :rtype:              pulp.bindings.responses.Response
+        """
+        path = self.BASE_PATH % id
+        data = {'content_type': content_type, 'profile_hash': profile_hash}
+        return self.server.POST(path, data)
+
 
 class ConsumerHistoryAPI(PulpAPI):
     """
@@ -74,6 +74,8 @@ class Task(object):
         :param response_body: The de-serialized response from Pulp's task API
         :type  response_body: dict
         """
+        self._response_body = response_body
+
         # Tasking identity information
         if '_href' in response_body:
             self.href = response_body['_href']
@@ -93,12 +95,29 @@ class Task(object):
         self.exception = response_body.get('exception')
         self.traceback = response_body.get('traceback')
         self.error = response_body.get('error')
+        # Changes whenever the task changes; only in responses from the task API
+        self.version = response_body.get('version')
         self.spawned_tasks = []
         spawned_tasks = response_body.get('spawned_tasks')
         if spawned_tasks:
             for task in spawned_tasks:
                 self.spawned_tasks.append(Task(task))
 
+    def updated(self, changed_fields):
+        """
+        Returns a new Task with the fields of this one replaced by the given fields,
+        as returned by Pulp's task API when only some fields of a task changed.
+
+        :param changed_fields: The de-serialized fields of the task that changed
+        :type  changed_fields: dict
+
+        :rtype: Task
+        """
+        response_body = dict(self._response_body)
+        response_body.update(changed_fields)
+        response_body.pop('partial', None)
+        return Task(response_body)
+
     def is_waiting(self):
         """
         Indicates if the task has been accepted but has not yet been able to
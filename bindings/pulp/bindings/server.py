@@ -1,8 +1,11 @@
 from types import NoneType
 import base64
+import httplib
 import locale
 import logging
 import os
+import socket
+import threading
 import urllib
 try:
     import oauth2 as oauth
@@ -19,6 +22,14 @@ from pulp.common.constants import DEFAULT_CA_PATH
 from pulp.common.util import ensure_utf_8, encode_unicode
 
 
+# default number of idle connections each PulpConnection keeps open to the server
+DEFAULT_POOL_SIZE = 4
+
+# methods that may safely be sent over a pooled connection, and sent again when that connection
+# turns out to be stale
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'OPTIONS')
+
+
 class PulpConnection(object):
     """
     Stub for invoking methods against the Pulp server. By default, the
@@ -44,12 +55,14 @@ class PulpConnection(object):
                  cert_filename=None,
                  server_wrapper=None,
                  verify_ssl=True,
-                 ca_path=DEFAULT_CA_PATH):
+                 ca_path=DEFAULT_CA_PATH,
+                 pool_size=DEFAULT_POOL_SIZE):
 
         self.host = host
         self.port = port
         self.path_prefix = path_prefix
         self.timeout = timeout
+        self.pool_size = pool_size
 
         self.log = logger or logging.getLogger(__name__)
         self.api_responses_logger = api_responses_logger
@@ -162,7 +175,10 @@ class PulpConnection(object):
             self.api_responses_logger.info(
                 "Response body :\n %s\n" % json.dumps(response_body, indent=2))
 
-        if response_code >= 300:
+        if response_code == 304:
+            # not modified, so there is nothing new to return
+            body = None
+        elif response_code >= 300:
             self._handle_exceptions(response_code, response_body)
         elif response_code == 200 or response_code == 201:
             body = response_body
@@ -254,6 +270,11 @@ class HTTPSServerWrapper(object):
     This abstraction is used to simplify mocking. In this implementation, the
     intricacies (read: ugliness) of invoking and getting the response from
     the HTTPConnection class are hidden in favor of a simpler API to mock.
+
+    Connections are kept alive and reused for later requests, up to the
+    connection's pool_size idle connections at a time. New connections resume
+    the TLS session of earlier ones, so the full handshake is only done once.
+    The wrapper may be shared by several threads.
     """
 
     def __init__(self, pulp_connection):
@@ -262,12 +283,20 @@ class HTTPSServerWrapper(object):
         :type pulp_connection: PulpConnection
         """
         self.pulp_connection = pulp_connection
+        self._lock = threading.Lock()
+        self._idle_connections = []
+        self._ssl_context = None
+        self._ssl_settings = None
+        self._ssl_session = None
 
     def request(self, method, url, body):
         """
         Make the request against the Pulp server, returning a tuple of (status_code, respose_body).
-        This method creates a new connection each time since HTTPSConnection has problems
-        reusing a connection for multiple calls (as claimed by a prior comment in this module).
+
+        Idempotent requests are sent over an idle pooled connection when there is one. If the
+        server has closed that connection in the meantime, the request is sent again over a new
+        connection. Other requests may not be sent twice, since the server may already have acted
+        on them, so they are always sent over a new connection.
 
         :param method: The HTTP method to be used for the request (GET, POST, etc.)
         :type  method: str
@@ -283,34 +312,10 @@ class HTTPSServerWrapper(object):
         """
         headers = dict(self.pulp_connection.headers)  # copy so we don't affect the calling method
 
-        # Despite the confusing name, 'sslv23' configures m2crypto to use any available protocol in
-        # the underlying openssl implementation.
-        ssl_context = SSL.Context('sslv23')
-        # This restricts the protocols we are willing to do by configuring m2 not to do SSLv2.0 or
-        # SSLv3.0. EL 5 does not have support for TLS > v1.0, so we have to leave support for
-        # TLSv1.0 enabled.
-        ssl_context.set_options(m2.SSL_OP_NO_SSLv2 | m2.SSL_OP_NO_SSLv3)
-
-        if self.pulp_connection.verify_ssl:
-            ssl_context.set_verify(SSL.verify_peer, depth=100)
-            # We need to stat the ca_path to see if it exists (error if it doesn't), and if so
-            # whether it is a file or a directory. m2crypto has different directives depending on
-            # which type it is.
-            if os.path.isfile(self.pulp_connection.ca_path):
-                ssl_context.load_verify_locations(cafile=self.pulp_connection.ca_path)
-            elif os.path.isdir(self.pulp_connection.ca_path):
-                ssl_context.load_verify_locations(capath=self.pulp_connection.ca_path)
-            else:
-                # If it's not a file and it's not a directory, it's not a valid setting
-                raise exceptions.MissingCAPathException(self.pulp_connection.ca_path)
-        ssl_context.set_session_timeout(self.pulp_connection.timeout)
-
         if self.pulp_connection.username and self.pulp_connection.password:
             raw = ':'.join((self.pulp_connection.username, self.pulp_connection.password))
             encoded = base64.encodestring(raw)[:-1]
             headers['Authorization'] = 'Basic ' + encoded
-        elif self.pulp_connection.cert_filename:
-            ssl_context.load_cert(self.pulp_connection.cert_filename)
 
         # oauth configuration. This block is only True if oauth is not None, so it won't run on RHEL
         # 5.
@@ -331,14 +336,23 @@ class HTTPSServerWrapper(object):
             headers.update(oauth_header)
             headers['pulp-user'] = self.pulp_connection.oauth_user
 
-        connection = httpslib.HTTPSConnection(
-            self.pulp_connection.host, self.pulp_connection.port, ssl_context=ssl_context)
-
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        connection, reused = self._get_connection(reuse=idempotent)
         try:
-            # Request against the server
-            connection.request(method, url, body=body, headers=headers)
-            response = connection.getresponse()
+            try:
+                response = self._send(connection, method, url, body, headers)
+            except (httplib.BadStatusLine, socket.error, SSL.SSLError):
+                if not reused:
+                    raise
+                # The server most likely closed the idle connection before it received the request.
+                connection.close()
+                connection, reused = self._new_connection(), False
+                response = self._send(connection, method, url, body, headers)
+
+            # Attempt to deserialize the body (should pass unless the server is busted)
+            response_body = response.read()
         except SSL.SSLError, err:
+            connection.close()
             # Translate stale login certificate to an auth exception
             if 'sslv3 alert certificate expired' == str(err):
                 raise exceptions.ClientCertificateExpiredException(
@@ -347,12 +361,159 @@ class HTTPSServerWrapper(object):
                 raise exceptions.CertificateVerificationException()
             else:
                 raise exceptions.ConnectionException(None, str(err), None)
+        except:
+            connection.close()
+            raise
 
-        # Attempt to deserialize the body (should pass unless the server is busted)
-        response_body = response.read()
+        if response.will_close:
+            connection.close()
+        else:
+            self._release_connection(connection)
 
         try:
             response_body = json.loads(response_body)
         except:
             pass
         return response.status, response_body
+
+    def close(self):
+        """
+        Close all idle connections to the server.
+        """
+        with self._lock:
+            connections, self._idle_connections = self._idle_connections, []
+        for connection in connections:
+            connection.close()
+
+    def _send(self, connection, method, url, body, headers):
+        """
+        Send a request over the given connection and wait for the response headers. The TLS
+        session of the connection is remembered so it can be resumed by new connections.
+
+        :param connection: connection to send the request over
+        :type  connection: M2Crypto.httpslib.HTTPSConnection
+        :param method:     The HTTP method to be used for the request (GET, POST, etc.)
+        :type  method:     str
+        :param url:        The Pulp URL to make the request against
+        :type  url:        str
+        :param body:       The body to pass with the request
+        :type  body:       str
+        :param headers:    headers to send with the request
+        :type  headers:    dict
+        :return: response, whose body has not been read yet
+        :rtype:  httplib.HTTPResponse
+        """
+        connection.request(method, url, body=body, headers=headers)
+        if connection.sock is not None:
+            session = connection.get_session()
+            with self._lock:
+                self._ssl_session = session
+        return connection.getresponse()
+
+    def _get_connection(self, reuse=True):
+        """
+        Take an idle connection from the pool, or create a new one if there is none.
+
+        :param reuse: whether an idle connection may be used
+        :type  reuse: bool
+        :return: connection, and whether it was used for an earlier request
+        :rtype:  tuple of (M2Crypto.httpslib.HTTPSConnection, bool)
+        """
+        ssl_context = self._get_ssl_context()
+        with self._lock:
+            if reuse and self._idle_connections:
+                return self._idle_connections.pop(), True
+        return self._new_connection(ssl_context), False
+
+    def _new_connection(self, ssl_context=None):
+        """
+        Create a connection to the server that resumes the last TLS session, if any. The socket
+        is not opened until the first request is sent.
+
+        :param ssl_context: context for the connection, defaults to the current one
+        :type  ssl_context: M2Crypto.SSL.Context
+        :return: unopened connection
+        :rtype:  M2Crypto.httpslib.HTTPSConnection
+        """
+        ssl_context = ssl_context or self._get_ssl_context()
+        connection = httpslib.HTTPSConnection(
+            self.pulp_connection.host, self.pulp_connection.port, ssl_context=ssl_context)
+        with self._lock:
+            if self._ssl_session is not None:
+                connection.set_session(self._ssl_session)
+        return connection
+
+    def _release_connection(self, connection):
+        """
+        Return a connection whose response has been fully read to the pool, or close it if the
+        pool is full.
+
+        :param connection: connection that can be used for another request
+        :type  connection: M2Crypto.httpslib.HTTPSConnection
+        """
+        with self._lock:
+            if connection.ssl_ctx is self._ssl_context and \
+                    len(self._idle_connections) < self.pulp_connection.pool_size:
+                self._idle_connections.append(connection)
+                return
+        connection.close()
+
+    def _get_ssl_context(self):
+        """
+        Return the SSL context for new connections. It is only built again, and the pooled
+        connections closed, when the SSL settings of the pulp connection have changed.
+
+        :return: SSL context matching the current settings of the pulp connection
+        :rtype:  M2Crypto.SSL.Context
+        """
+        if self.pulp_connection.username and self.pulp_connection.password:
+            cert_filename = None
+        else:
+            cert_filename = self.pulp_connection.cert_filename
+        settings = (self.pulp_connection.verify_ssl, self.pulp_connection.ca_path, cert_filename,
+                    self.pulp_connection.timeout)
+
+        with self._lock:
+            if self._ssl_context is not None and settings == self._ssl_settings:
+                return self._ssl_context
+
+        ssl_context = self._build_ssl_context(cert_filename)
+        with self._lock:
+            self._ssl_context = ssl_context
+            self._ssl_settings = settings
+            self._ssl_session = None
+        self.close()
+        return ssl_context
+
+    def _build_ssl_context(self, cert_filename):
+        """
+        :param cert_filename: client certificate to authenticate with, if any
+        :type  cert_filename: basestring or None
+        :return: new SSL context configured from the pulp connection
+        :rtype:  M2Crypto.SSL.Context
+        """
+        # Despite the confusing name, 'sslv23' configures m2crypto to use any available protocol in
+        # the underlying openssl implementation.
+        ssl_context = SSL.Context('sslv23')
+        # This restricts the protocols we are willing to do by configuring m2 not to do SSLv2.0 or
+        # SSLv3.0. EL 5 does not have support for TLS > v1.0, so we have to leave support for
+        # TLSv1.0 enabled.
+        ssl_context.set_options(m2.SSL_OP_NO_SSLv2 | m2.SSL_OP_NO_SSLv3)
+
+        if self.pulp_connection.verify_ssl:
+            ssl_context.set_verify(SSL.verify_peer, depth=100)
+            # We need to stat the ca_path to see if it exists (error if it doesn't), and if so
+            # whether it is a file or a directory. m2crypto has different directives depending on
+            # which type it is.
+            if os.path.isfile(self.pulp_connection.ca_path):
+                ssl_context.load_verify_locations(cafile=self.pulp_connection.ca_path)
+            elif os.path.isdir(self.pulp_connection.ca_path):
+                ssl_context.load_verify_locations(capath=self.pulp_connection.ca_path)
+            else:
+                # If it's not a file and it's not a directory, it's not a valid setting
+                raise exceptions.MissingCAPathException(self.pulp_connection.ca_path)
+        ssl_context.set_session_timeout(self.pulp_connection.timeout)
+
+        if cert_filename:
+            ssl_context.load_cert(cert_filename)
+        return ssl_context
@@ -26,21 +26,59 @@ class TasksAPI(PulpAPI):
         response = self.server.DELETE(path)
         return response
 
-    def get_task(self, task_id):
+    def get_task(self, task_id, task=None):
         """
         Retrieves the status of the given task if it exists.
 
+        If task is given, the server is asked to send only the fields that
+        changed since it was retrieved, and these are merged into a copy of it.
+        task itself is returned if nothing changed.
+
+        @param task_id: ID of the task
+        @type  task_id: str
+
+        @param task: Task with the same ID from an earlier call
+        @type  task: Task
+
         @return: response with a Task object in the response_body
         @rtype:  Response
 
         @raise NotFoundException: if there is no task with the given ID
         """
         path = '/v2/tasks/%s/' % task_id
-        response = self.server.GET(path)
+        queries = []
+        if task is not None and task.version:
+            queries.append(('version', task.version))
+        response = self.server.GET(path, queries=queries)
+        if response.response_code == 304:
+            response.response_body = task
+        elif response.response_body.get('partial'):
+            response.response_body = task.updated(response.response_body)
+        else:
+            # Since it was a 200, the connection parsed the response body into a
+            # Document. We know this will be task data, so convert the object here.
+            response.response_body = Task(response.response_body)
+        return response
+
+    def get_task_statuses(self, task_ids, progress=False):
+        """
+        Retrieves the state, start time and finish time of each of the given
+        tasks in one call. The other attributes of the returned Task objects are
+        not populated, except for the progress report if requested. Tasks that
+        do not exist are left out.
+
+        :param task_ids: IDs of the tasks
+        :type  task_ids: list of str
+        :param progress: if True, the progress report of each task is included
+        :type  progress: bool
+        :return:         response with a list of Task objects in the response_body
+        :rtype:          Response
+        """
+        path = '/v2/tasks/status/'
+        body = {'task_ids': list(task_ids), 'progress': progress}
+        response = self.server.POST(path, body)
 
-        # Since it was a 200, the connection parsed the response body into a
-        # Document. We know this will be task data, so convert the object here.
-        response.response_body = Task(response.response_body)
+        response.response_body = [Task(doc) for doc in response.response_body]
         return response
 
     def get_all_tasks(self, tags=()):
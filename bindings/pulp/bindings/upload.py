@@ -9,9 +9,28 @@ class UploadAPI(PulpAPI):
     def __init__(self, pulp_connection):
         super(UploadAPI, self).__init__(pulp_connection)
 
-    def initialize_upload(self):
+    def initialize_upload(self, size=None, checksum=None, checksum_type=None):
+        """
+        Create an upload request. If the size and checksum of the file to be uploaded are given,
+        the server fills the upload with a file it already stores if one matches, and sets
+        'reused' in the response body to True; the file then does not need to be uploaded.
+
+        :param size: size of the file to be uploaded
+        :type  size: int
+        :param checksum: checksum of the file to be uploaded
+        :type  checksum: str
+        :param checksum_type: algorithm of the checksum; the server assumes sha256 if not given
+        :type  checksum_type: str
+        :return: response whose body contains the upload_id
+        :rtype:  pulp.bindings.responses.Response
+        """
         url = '/v2/content/uploads/'
-        return self.server.POST(url)
+        if checksum is None:
+            return self.server.POST(url)
+        body = {'size': size, 'checksum': checksum}
+        if checksum_type:
+            body['checksum_type'] = checksum_type
+        return self.server.POST(url, body)
 
     def upload_segment(self, upload_id, offset, data):
         url = '/v2/content/uploads/%s/%s/' % (upload_id, offset)
@@ -125,6 +125,24 @@ class TestTask(unittest.TestCase):
         self.assertEqual(a_task.spawned_tasks[0].task_id,
                          some_typical_data['spawned_tasks'][0]['task_id'])
 
+    def test_updated(self):
+        """
+        Test that updated() returns a new Task with the given fields replaced.
+        """
+        a_task = responses.Task({u'task_id': u'123', u'state': u'running', u'tags': [u'a'],
+                                 u'progress_report': {u'step': 1}, u'version': u'v1'})
+
+        updated = a_task.updated({u'task_id': u'123', u'progress_report': {u'step': 2},
+                                  u'version': u'v2', u'partial': True})
+
+        self.assertEqual(updated.task_id, u'123')
+        self.assertEqual(updated.state, u'running')
+        self.assertEqual(updated.tags, [u'a'])
+        self.assertEqual(updated.progress_report, {u'step': 2})
+        self.assertEqual(updated.version, u'v2')
+        self.assertEqual(a_task.progress_report, {u'step': 1})
+        self.assertEqual(a_task.version, u'v1')
+
     def test___str__(self):
         """
         Test the __str__() method.
@@ -1,8 +1,10 @@
 """
 This module contains tests for the pulp.bindings.server module.
 """
+import httplib
 import locale
 import logging
+import socket
 import unittest
 
 from M2Crypto import m2, SSL
@@ -75,6 +77,7 @@ class TestHTTPSServerWrapper(unittest.TestCase):
                 return '{}'
 
             status = 200
+            will_close = True
 
         getresponse.return_value = FakeResponse()
 
@@ -127,6 +130,7 @@ class TestHTTPSServerWrapper(unittest.TestCase):
                 return '{}'
 
             status = 200
+            will_close = True
 
         getresponse.return_value = FakeResponse()
 
@@ -160,6 +164,7 @@ class TestHTTPSServerWrapper(unittest.TestCase):
                 return '{"it": "worked!"}'
 
             status = 200
+            will_close = True
 
         getresponse.return_value = FakeResponse()
 
@@ -172,6 +177,173 @@ class TestHTTPSServerWrapper(unittest.TestCase):
         load_verify_locations.assert_called_once_with(cafile=ca_path)
 
 
+class FakeResponse(object):
+    """
+    This class is used to fake a response from httpslib that keeps the connection open.
+    """
+    def __init__(self, body='{}', will_close=False):
+        self.body = body
+        self.will_close = will_close
+
+    def read(self):
+        return self.body
+
+    status = 200
+
+
+@mock.patch('pulp.bindings.server.httpslib.HTTPSConnection')
+class TestHTTPSServerWrapperPool(unittest.TestCase):
+    """
+    This class contains tests for the reuse of connections by the HTTPSServerWrapper class.
+    """
+    def setUp(self):
+        self.conn = server.PulpConnection('host', verify_ssl=False)
+        self.wrapper = server.HTTPSServerWrapper(self.conn)
+
+    def _connection(self, *responses):
+        connection = mock.Mock(sock=None)
+        connection.getresponse.side_effect = list(responses)
+        connection.ssl_ctx = self.wrapper._get_ssl_context()
+        return connection
+
+    def test_request_reuses_connection(self, HTTPSConnection):
+        """
+        Assert that a connection is kept open and used for the next request.
+        """
+        connection = self._connection(FakeResponse(), FakeResponse('{"a": 1}'))
+        HTTPSConnection.return_value = connection
+
+        self.wrapper.request('GET', '/one/', '')
+        status, body = self.wrapper.request('GET', '/two/', '')
+
+        self.assertEqual(body, {'a': 1})
+        self.assertEqual(HTTPSConnection.call_count, 1)
+        self.assertEqual(connection.request.call_count, 2)
+        self.assertEqual(connection.close.call_count, 0)
+
+    def test_request_closing_response(self, HTTPSConnection):
+        """
+        Assert that a connection is not reused when the server closes it after the response.
+        """
+        first = self._connection(FakeResponse(will_close=True))
+        second = self._connection(FakeResponse())
+        HTTPSConnection.side_effect = [first, second]
+
+        self.wrapper.request('GET', '/one/', '')
+        self.wrapper.request('GET', '/two/', '')
+
+        self.assertEqual(HTTPSConnection.call_count, 2)
+        first.close.assert_called_once_with()
+        self.assertEqual(self.wrapper._idle_connections, [second])
+
+    def test_request_stale_connection(self, HTTPSConnection):
+        """
+        Assert that a request is sent again over a new connection when the reused one is stale.
+        """
+        stale = self._connection(FakeResponse(), httplib.BadStatusLine(''))
+        fresh = self._connection(FakeResponse('{"fresh": true}'))
+        HTTPSConnection.side_effect = [stale, fresh]
+        self.wrapper.request('GET', '/one/', '')
+
+        status, body = self.wrapper.request('PUT', '/two/', '{}')
+
+        self.assertEqual(body, {'fresh': True})
+        stale.close.assert_called_once_with()
+        fresh.request.assert_called_once_with('PUT', '/two/', body='{}', headers=mock.ANY)
+        self.assertEqual(self.wrapper._idle_connections, [fresh])
+
+    def test_request_not_idempotent(self, HTTPSConnection):
+        """
+        Assert that a request that is not idempotent is sent over a new connection, which is
+        then pooled.
+        """
+        pooled = self._connection(FakeResponse())
+        fresh = self._connection(FakeResponse('{"fresh": true}'))
+        HTTPSConnection.side_effect = [pooled, fresh]
+        self.wrapper.request('GET', '/one/', '')
+
+        status, body = self.wrapper.request('POST', '/two/', '{}')
+
+        self.assertEqual(body, {'fresh': True})
+        self.assertEqual(pooled.request.call_count, 1)
+        fresh.request.assert_called_once_with('POST', '/two/', body='{}', headers=mock.ANY)
+        self.assertEqual(self.wrapper._idle_connections, [pooled, fresh])
+
+    def test_request_new_connection_not_retried(self, HTTPSConnection):
+        """
+        Assert that errors on a new connection are not retried.
+        """
+        connection = self._connection()
+        connection.request.side_effect = socket.error('refused')
+        HTTPSConnection.return_value = connection
+
+        self.assertRaises(socket.error, self.wrapper.request, 'GET', '/one/', '')
+
+        self.assertEqual(HTTPSConnection.call_count, 1)
+        connection.close.assert_called_once_with()
+        self.assertEqual(self.wrapper._idle_connections, [])
+
+    def test_request_pool_size(self, HTTPSConnection):
+        """
+        Assert that no more than pool_size idle connections are kept.
+        """
+        self.conn.pool_size = 1
+        first = self._connection()
+        second = self._connection()
+
+        self.wrapper._release_connection(first)
+        self.wrapper._release_connection(second)
+
+        self.assertEqual(self.wrapper._idle_connections, [first])
+        second.close.assert_called_once_with()
+
+    def test_request_resumes_session(self, HTTPSConnection):
+        """
+        Assert that new connections resume the TLS session of earlier connections.
+        """
+        first = self._connection(FakeResponse(will_close=True))
+        first.sock = mock.Mock()
+        second = self._connection(FakeResponse())
+        HTTPSConnection.side_effect = [first, second]
+
+        self.wrapper.request('GET', '/one/', '')
+        self.wrapper.request('GET', '/two/', '')
+
+        self.assertEqual(first.set_session.call_count, 0)
+        second.set_session.assert_called_once_with(first.get_session.return_value)
+
+    @mock.patch('pulp.bindings.server.SSL.Context.load_cert')
+    def test_ssl_settings_changed(self, load_cert, HTTPSConnection):
+        """
+        Assert that the SSL context is rebuilt and idle connections are closed when the SSL
+        settings of the connection change.
+        """
+        context = self.wrapper._get_ssl_context()
+        idle = self._connection()
+        self.wrapper._release_connection(idle)
+        self.assertTrue(self.wrapper._get_ssl_context() is context)
+
+        self.conn.cert_filename = '/path/to/cert'
+        new_context = self.wrapper._get_ssl_context()
+
+        self.assertTrue(new_context is not context)
+        load_cert.assert_called_once_with('/path/to/cert')
+        idle.close.assert_called_once_with()
+        self.assertEqual(self.wrapper._idle_connections, [])
+
+    def test_close(self, HTTPSConnection):
+        """
+        Assert that close() closes all idle connections.
+        """
+        idle = self._connection()
+        self.wrapper._release_connection(idle)
+
+        self.wrapper.close()
+
+        idle.close.assert_called_once_with()
+        self.assertEqual(self.wrapper._idle_connections, [])
+
+
 class TestPulpConnection(unittest.TestCase):
     """
     This class contains tests for the PulpConnection object.
@@ -197,6 +369,7 @@ class TestPulpConnection(unittest.TestCase):
         self.assertEqual(connection.oauth_key, None)
         self.assertEqual(connection.oauth_secret, None)
         self.assertEqual(connection.oauth_user, 'admin')
+        self.assertEqual(connection.pool_size, server.DEFAULT_POOL_SIZE)
 
         # Make sure the headers are right
         expected_locale = locale.getdefaultlocale()[0]
@@ -214,6 +387,19 @@ class TestPulpConnection(unittest.TestCase):
         # 1142376 - verify default path points to a known valid file
         self.assertEqual(server.DEFAULT_CA_PATH, '/etc/pki/tls/certs/ca-bundle.crt')
 
+    def test_request_not_modified(self):
+        """
+        Test that a 304 response is returned without a body rather than raised.
+        """
+        connection = server.PulpConnection('host')
+        connection.server_wrapper = mock.MagicMock()
+        connection.server_wrapper.request.return_value = (304, '')
+
+        response = connection.GET('/v2/tasks/1/', queries=[('version', 'v1')])
+
+        self.assertEqual(response.response_code, 304)
+        self.assertEqual(response.response_body, None)
+
     def test___init___ca_path_set(self):
         """
         Test __init__() with the ca_path argument explicitly set.
@@ -76,6 +76,72 @@ class TestGetAllTasks(unittest.TestCase):
             self.assertTrue(isinstance(task, responses.Task))
 
 
+class TestGetTask(unittest.TestCase):
+    def setUp(self):
+        self.server = mock.MagicMock()
+        self.api = tasks.TasksAPI(self.server)
+
+        self.server.GET.return_value.response_body = copy.deepcopy(TASKS[0])
+
+    def test_get_task(self):
+        ret = self.api.get_task(TASKS[0]['task_id']).response_body
+
+        self.server.GET.assert_called_once_with('/v2/tasks/%s/' % TASKS[0]['task_id'],
+                                                queries=[])
+        self.assertTrue(isinstance(ret, responses.Task))
+        self.assertEqual(ret.version, None)
+
+    def test_get_task_version(self):
+        self.server.GET.return_value.response_body['version'] = 'v2'
+        task = responses.Task(dict(TASKS[0], version='v1'))
+
+        ret = self.api.get_task(TASKS[0]['task_id'], task=task).response_body
+
+        self.server.GET.assert_called_once_with('/v2/tasks/%s/' % TASKS[0]['task_id'],
+                                                queries=[('version', 'v1')])
+        self.assertEqual(ret.version, 'v2')
+
+    def test_get_task_partial(self):
+        self.server.GET.return_value.response_body = {
+            'task_id': TASKS[0]['task_id'], 'state': 'finished', 'version': 'v2', 'partial': True}
+        task = responses.Task(dict(TASKS[0], state='running', version='v1'))
+
+        ret = self.api.get_task(TASKS[0]['task_id'], task=task).response_body
+
+        self.assertTrue(isinstance(ret, responses.Task))
+        self.assertEqual(ret.state, 'finished')
+        self.assertEqual(ret.version, 'v2')
+        self.assertEqual(ret.tags, TASKS[0]['tags'])
+        self.assertEqual(task.state, 'running')
+
+    def test_get_task_not_modified(self):
+        self.server.GET.return_value = responses.Response(304, None)
+        task = responses.Task(dict(TASKS[0], version='v1'))
+
+        response = self.api.get_task(TASKS[0]['task_id'], task=task)
+
+        self.assertEqual(response.response_code, 304)
+        self.assertTrue(response.response_body is task)
+
+
+class TestGetTaskStatuses(unittest.TestCase):
+    def setUp(self):
+        self.server = mock.MagicMock()
+        self.api = tasks.TasksAPI(self.server)
+
+    def test_get_task_statuses(self):
+        self.server.POST.return_value.response_body = [
+            {'task_id': '1', 'state': 'finished', 'start_time': None, 'finish_time': None}]
+
+        ret = self.api.get_task_statuses(('1', '2'), progress=True).response_body
+
+        self.server.POST.assert_called_once_with(
+            '/v2/tasks/status/', {'task_ids': ['1', '2'], 'progress': True})
+        self.assertEqual(len(ret), 1)
+        self.assertTrue(isinstance(ret[0], responses.Task))
+        self.assertTrue(ret[0].is_completed())
+
+
 class TestPurgeTasks(unittest.TestCase):
     def setUp(self):
         self.server = mock.MagicMock()
@@ -9,6 +9,19 @@ class TestUploadAPI(unittest.TestCase):
     def setUp(self):
         self.api = UploadAPI(mock.MagicMock())
 
+    def test_initialize_upload(self):
+        ret = self.api.initialize_upload()
+
+        self.api.server.POST.assert_called_once_with('/v2/content/uploads/')
+        self.assertEqual(ret, self.api.server.POST.return_value)
+
+    def test_initialize_upload_with_checksum(self):
+        ret = self.api.initialize_upload(11, 'abc', 'sha256')
+
+        self.api.server.POST.assert_called_once_with(
+            '/v2/content/uploads/', {'size': 11, 'checksum': 'abc', 'checksum_type': 'sha256'})
+        self.assertEqual(ret, self.api.server.POST.return_value)
+
     def test_import_upload_with_override_config(self):
         ret = self.api.import_upload('upload_id', 'repo_id', 'unit_type_id', unit_key={},
                                      unit_metadata={}, override_config={'mask-id': 'test-mask-id'})
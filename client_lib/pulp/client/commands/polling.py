@@ -32,6 +32,9 @@ class PollingCommand(PulpCliCommand):
     If the poll_frequency_in_seconds is not specified, it will be loaded from
     the configuration under output -> poll_frequency_in_seconds.
 
+    Each poll passes the task already known, so the server sends only the parts of the task that
+    changed since.
+
     :ivar context: the client context
     :type context: pulp.client.extensions.core.ClientContext
     """
@@ -212,7 +215,8 @@ class PollingCommand(PulpCliCommand):
 
             time.sleep(self.poll_frequency_in_seconds)
 
-            response = self.context.server.tasks.get_task(task.task_id)
+            # only the parts of the task that changed since the last poll are sent again
+            response = self.context.server.tasks.get_task(task.task_id, task=task)
             task = response.response_body
 
         # One final call to update the progress with the end state. It's possible the run state
@@ -7,13 +7,23 @@ client-side tracking of upload requests on the server.
 
 import copy
 import errno
+import hashlib
 import os
 import pickle
+import Queue
+import sys
+import threading
+import time
 
 from pulp.common.lock import LockFile
 
 
 DEFAULT_CHUNKSIZE = 1048576  # 1 MB per upload call
+MAX_CHUNKSIZE = 16777216  # 16 MB per upload call when the chunk size is adapted
+DEFAULT_CONCURRENCY = 1  # number of upload calls in flight at once
+TARGET_SEGMENT_SECONDS = 2  # adapted chunk sizes aim for upload calls taking this long
+CHECKPOINT_INTERVAL = 5  # seconds between saves of the tracker file during an upload
+DEDUPLICATION_CHECKSUM_TYPE = 'sha256'  # checksum sent to the server to find stored files
 
 
 class ManagerUninitializedException(Exception):
@@ -71,7 +81,8 @@ class UploadManager(object):
     on disk state files.
     """
 
-    def __init__(self, upload_working_dir, bindings, chunk_size=DEFAULT_CHUNKSIZE):
+    def __init__(self, upload_working_dir, bindings, chunk_size=DEFAULT_CHUNKSIZE,
+                 concurrency=DEFAULT_CONCURRENCY, max_chunk_size=None, deduplicate=False):
         """
         @param upload_working_dir: directory in which to store client-side files
                to track upload requests; if it doesn't exist it will be created
@@ -84,10 +95,30 @@ class UploadManager(object):
         @param chunk_size: size in bytes of data to upload on each call to the
                server
         @type  chunk_size: int
+
+        @param concurrency: number of upload calls to the server that may be
+               in progress at once
+        @type  concurrency: int
+
+        @param max_chunk_size: if greater than chunk_size, the size of each
+               upload call is adapted between chunk_size and this value so that
+               calls take about TARGET_SEGMENT_SECONDS
+        @type  max_chunk_size: int, None
+
+        @param deduplicate: if true, the size and checksum of each file are sent
+               when initializing its upload, so the server can reuse a file it
+               already stores instead of having the file uploaded; this costs
+               a read of the whole file here and another on the server, and
+               the server only reuses files of unit types whose model defines
+               a checksum_field
+        @type  deduplicate: bool
         """
         self.upload_working_dir = upload_working_dir
         self.bindings = bindings
         self.chunk_size = chunk_size
+        self.concurrency = max(concurrency, 1)
+        self.max_chunk_size = max_chunk_size
+        self.deduplicate = deduplicate
 
         # Internal state
         self.tracker_files = {}
@@ -111,7 +142,11 @@ class UploadManager(object):
         upload_working_dir = os.path.join(context.config['filesystem']['upload_working_dir'],
                                           'default')
         upload_working_dir = os.path.expanduser(upload_working_dir)
-        return cls(upload_working_dir, context.server)
+        server_config = context.config.get('server', {})
+        chunk_size = int(server_config.get('upload_chunk_size', DEFAULT_CHUNKSIZE))
+        concurrency = int(server_config.get('upload_concurrency', DEFAULT_CONCURRENCY))
+        max_chunk_size = int(server_config.get('upload_max_chunk_size', chunk_size))
+        return cls(upload_working_dir, context.server, chunk_size, concurrency, max_chunk_size)
 
     def initialize(self):
         """
@@ -147,13 +182,24 @@ class UploadManager(object):
                when importing the unit; what is done with these values is up to
                the importer's implementation
 
+        If the manager deduplicates uploads and the server already stores a file
+        with the same size and checksum, the upload is marked as finished and
+        the file is not uploaded.
+
         @return: upload ID used to identify this upload request in future calls
         """
         # Create the working directory if it doesn't exist
         if not os.path.exists(self.upload_working_dir):
             os.makedirs(self.upload_working_dir)
 
-        response = self.bindings.uploads.initialize_upload().response_body
+        size = None
+        if self.deduplicate and filename and os.path.isfile(filename):
+            size = os.path.getsize(filename)
+            checksum = self._checksum(filename)
+            response = self.bindings.uploads.initialize_upload(
+                size, checksum, DEDUPLICATION_CHECKSUM_TYPE).response_body
+        else:
+            response = self.bindings.uploads.initialize_upload().response_body
 
         upload_id = response['upload_id']
         location = response['_href']
@@ -164,6 +210,7 @@ class UploadManager(object):
         tracker_file.upload_id = upload_id
         tracker_file.location = location
         tracker_file.offset = 0
+        tracker_file.completed_ranges = []
         tracker_file.repo_id = repo_id
         tracker_file.unit_type_id = unit_type_id
         tracker_file.unit_key = unit_key
@@ -171,6 +218,11 @@ class UploadManager(object):
         tracker_file.override_config = override_config
         tracker_file.source_filename = filename
 
+        # Servers that don't deduplicate uploads leave out 'reused'
+        if response.get('reused'):
+            tracker_file.add_completed_range(0, size)
+            tracker_file.is_finished_uploading = True
+
         # Save the tracker file to disk
         tracker_file.save()
 
@@ -184,13 +236,19 @@ class UploadManager(object):
         Begins or resumes the upload process for the given upload request.
         This call will not return until the upload is complete. The other
         expected exit point is a KeyboardError to kill the process. The
-        client-side on disk tracker files will store the current offset and
-        resume the upload from where it left off on the next call to this method.
+        client-side on disk tracker files will store the ranges of the file
+        already uploaded and resume the upload from there on the next call to
+        this method.
+
+        Up to the manager's concurrency upload calls are made to the server at
+        once, each sending a segment of the file. The tracker file is saved
+        every CHECKPOINT_INTERVAL seconds rather than after each call; segments
+        that completed after the last save are uploaded again when resuming.
 
         The callback_func is used to get feedback on the upload process. After
         each successful upload segment call to the server, this function
-        will be invoked with the new offset in the file and the file size
-        (intended to be fed into a progress indicator). As this is called
+        will be invoked with the number of bytes uploaded so far and the file
+        size (intended to be fed into a progress indicator). As this is called
         after each upload segment call, the granularity at which it is called
         depends on the chunk_size value for this instance.
 
@@ -234,23 +292,8 @@ class UploadManager(object):
             tracker_file.save()
 
             source_file_size = os.path.getsize(tracker_file.source_filename)
-
-            f = open(tracker_file.source_filename, 'r')
-            while True:
-                # Load the chunk to upload
-                f.seek(tracker_file.offset)
-                data = f.read(self.chunk_size)
-                if not data:
-                    break
-
-                # Server request
-                self.bindings.uploads.upload_segment(upload_id, tracker_file.offset, data)
-
-                # Status update and callback notification
-                tracker_file.offset = min(tracker_file.offset + self.chunk_size, source_file_size)
-                tracker_file.save()
-
-                callback_func(tracker_file.offset, source_file_size)
+            uploader = _SegmentUploader(self, tracker_file, source_file_size, callback_func)
+            uploader.run()
 
             tracker_file.is_finished_uploading = True
         finally:
@@ -369,6 +412,26 @@ class UploadManager(object):
         self._uncache_tracker_file(tracker)
         tracker.delete()
 
+    def _checksum(self, filename):
+        """
+        @param filename: full path to a file
+        @type  filename: str
+
+        @return: hex digest of the file using DEDUPLICATION_CHECKSUM_TYPE
+        @rtype:  str
+        """
+        digest = hashlib.new(DEDUPLICATION_CHECKSUM_TYPE)
+        f = open(filename, 'r')
+        try:
+            while True:
+                data = f.read(DEFAULT_CHUNKSIZE)
+                if not data:
+                    break
+                digest.update(data)
+        finally:
+            f.close()
+        return digest.hexdigest()
+
     def _tracker_filename(self, upload_id):
         return os.path.join(self.upload_working_dir, upload_id)
 
@@ -397,7 +460,8 @@ class UploadTracker(object):
         # Upload call information
         self.upload_id = None
         self.location = None  # URL to the upload request on the server
-        self.offset = None  # start of next chunk to upload
+        self.offset = None  # end of the uploaded data at the start of the file
+        self.completed_ranges = []  # sorted [start, end) pairs of uploaded data
         self.source_filename = None  # path on disk to the file to upload
 
         # Import call information
@@ -410,6 +474,53 @@ class UploadTracker(object):
         self.is_running = False
         self.is_finished_uploading = False
 
+    def add_completed_range(self, start, end):
+        """
+        Records that the data between start and end has been uploaded.
+
+        @param start: offset of the first uploaded byte
+        @type  start: int
+
+        @param end: offset just past the last uploaded byte
+        @type  end: int
+        """
+        merged = []
+        for range_start, range_end in self.completed_ranges:
+            if range_end < start or range_start > end:
+                merged.append([range_start, range_end])
+            else:
+                start, end = min(start, range_start), max(end, range_end)
+        merged.append([start, end])
+        merged.sort()
+        self.completed_ranges = merged
+        if merged[0][0] == 0:
+            self.offset = merged[0][1]
+
+    def missing_ranges(self, size):
+        """
+        @param size: size of the file being uploaded
+        @type  size: int
+
+        @return: sorted [start, end) pairs of the data not yet uploaded
+        @rtype:  list
+        """
+        missing = []
+        position = 0
+        for range_start, range_end in self.completed_ranges:
+            if range_start > position:
+                missing.append([position, min(range_start, size)])
+            position = max(position, range_end)
+        if position < size:
+            missing.append([position, size])
+        return missing
+
+    def completed_bytes(self):
+        """
+        @return: number of bytes uploaded so far
+        @rtype:  int
+        """
+        return sum(end - start for start, end in self.completed_ranges)
+
     def save(self):
         """
         Saves the current state of the tracker file. This will lock on the file
@@ -449,4 +560,204 @@ class UploadTracker(object):
         status_file = pickle.load(f)
         f.close()
 
+        # Trackers saved before ranges were tracked only know the offset
+        if not hasattr(status_file, 'completed_ranges'):
+            status_file.completed_ranges = []
+            if status_file.offset:
+                status_file.completed_ranges.append([0, status_file.offset])
+
         return status_file
+
+
+class _SegmentUploader(object):
+    """
+    Uploads the missing ranges of a file in segments, with several upload
+    calls in flight when the manager's concurrency allows it. Worker threads
+    make the upload calls; the calling thread hands out segments and records
+    the completed ones in the tracker.
+    """
+
+    def __init__(self, manager, tracker_file, size, callback_func):
+        """
+        @param manager: manager performing the upload
+        @type  manager: UploadManager
+
+        @param tracker_file: tracker of the upload request
+        @type  tracker_file: UploadTracker
+
+        @param size: size of the file being uploaded
+        @type  size: int
+
+        @param callback_func: optional method to be called after each upload
+               call to the server
+        @type  callback_func: func
+        """
+        self.manager = manager
+        self.tracker_file = tracker_file
+        self.size = size
+        self.callback_func = callback_func
+        self.chunk_size = manager.chunk_size
+        self.last_checkpoint = time.time()
+
+    def run(self):
+        """
+        Uploads all missing segments, returning once they have all completed.
+        If an upload call fails, the segments already in flight are allowed to
+        finish and the error is raised.
+        """
+        segments = self._segments()
+        if self.manager.concurrency == 1:
+            # Without concurrency the calls are made from this thread, which
+            # keeps the upload interruptible.
+            for start, end in segments:
+                self._completed(start, end, self._upload_segment(start, end))
+            return
+
+        requests = Queue.Queue()
+        results = Queue.Queue()
+        workers = []
+        for i in range(self.manager.concurrency):
+            worker = threading.Thread(target=self._worker, args=(requests, results))
+            worker.setDaemon(True)
+            worker.start()
+            workers.append(worker)
+
+        error = None
+        in_flight = 0
+        try:
+            while True:
+                while error is None and in_flight < self.manager.concurrency:
+                    segment = next(segments, None)
+                    if segment is None:
+                        break
+                    requests.put(segment)
+                    in_flight += 1
+                if not in_flight:
+                    break
+                start, end, elapsed, exc_info = self._get_result(results)
+                in_flight -= 1
+                if exc_info is not None:
+                    error = error or exc_info
+                else:
+                    self._completed(start, end, elapsed)
+        finally:
+            for worker in workers:
+                requests.put(None)
+
+        if error is not None:
+            raise error[0], error[1], error[2]
+
+    def _segments(self):
+        """
+        @return: generator of (start, end) pairs of the segments to upload, sized
+                 by the chunk size at the time each segment is handed out
+        @rtype:  generator
+        """
+        for start, end in self.tracker_file.missing_ranges(self.size):
+            while start < end:
+                segment_end = min(start + self.chunk_size, end)
+                yield start, segment_end
+                start = segment_end
+
+    def _worker(self, requests, results):
+        """
+        Worker thread loop, uploading segments until a None request is received.
+
+        @param requests: queue of (start, end) segments to upload
+        @type  requests: Queue.Queue
+
+        @param results: queue the (start, end, elapsed, exc_info) outcome of
+               each upload is put on
+        @type  results: Queue.Queue
+        """
+        f = open(self.tracker_file.source_filename, 'r')
+        try:
+            while True:
+                segment = requests.get()
+                if segment is None:
+                    return
+                start, end = segment
+                try:
+                    elapsed = self._upload_segment(start, end, f)
+                    results.put((start, end, elapsed, None))
+                except Exception:
+                    results.put((start, end, None, sys.exc_info()))
+        finally:
+            f.close()
+
+    @staticmethod
+    def _get_result(results):
+        """
+        Waits for the next upload result. A timeout is used so the wait can be
+        interrupted from the keyboard.
+
+        @param results: queue of upload results
+        @type  results: Queue.Queue
+
+        @return: (start, end, elapsed, exc_info) outcome of an upload
+        @rtype:  tuple
+        """
+        while True:
+            try:
+                return results.get(timeout=1)
+            except Queue.Empty:
+                pass
+
+    def _upload_segment(self, start, end, f=None):
+        """
+        Reads a segment of the file and uploads it to the server.
+
+        @param start: offset of the first byte of the segment
+        @type  start: int
+
+        @param end: offset just past the last byte of the segment
+        @type  end: int
+
+        @param f: open source file; it is opened for this call if not given
+        @type  f: file
+
+        @return: seconds taken by the upload call
+        @rtype:  float
+        """
+        if f is None:
+            f = open(self.tracker_file.source_filename, 'r')
+            try:
+                return self._upload_segment(start, end, f)
+            finally:
+                f.close()
+
+        f.seek(start)
+        data = f.read(end - start)
+        began = time.time()
+        self.manager.bindings.uploads.upload_segment(self.tracker_file.upload_id, start, data)
+        return time.time() - began
+
+    def _completed(self, start, end, elapsed):
+        """
+        Records an uploaded segment, adapts the chunk size, saves the tracker if
+        a checkpoint is due and notifies the callback.
+
+        @param start: offset of the first byte of the segment
+        @type  start: int
+
+        @param end: offset just past the last byte of the segment
+        @type  end: int
+
+        @param elapsed: seconds taken by the upload call
+        @type  elapsed: float
+        """
+        self.tracker_file.add_completed_range(start, end)
+
+        if self.manager.max_chunk_size and self.manager.max_chunk_size > self.manager.chunk_size:
+            if elapsed < TARGET_SEGMENT_SECONDS / 2.0 and end - start >= self.chunk_size:
+                self.chunk_size = min(self.chunk_size * 2, self.manager.max_chunk_size)
+            elif elapsed > TARGET_SEGMENT_SECONDS * 2:
+                self.chunk_size = max(self.chunk_size / 2, self.manager.chunk_size)
+
+        now = time.time()
+        if now - self.last_checkpoint >= CHECKPOINT_INTERVAL:
+            self.tracker_file.save()
+            self.last_checkpoint = now
+
+        if self.callback_func:
+            self.callback_func(self.tracker_file.completed_bytes(), self.size)
@@ -1,7 +1,7 @@
 import mock
 
 from pulp.bindings.responses import (
-    Task, STATE_WAITING, STATE_CANCELED, STATE_ERROR, STATE_FINISHED,
+    Response, Task, STATE_WAITING, STATE_CANCELED, STATE_ERROR, STATE_FINISHED,
     STATE_RUNNING, STATE_SKIPPED, STATE_ACCEPTED)
 from pulp.client.commands.polling import (
     PollingCommand, RESULT_ABORTED, FLAG_BACKGROUND, RESULT_BACKGROUND)
@@ -75,6 +75,29 @@ class PollingCommandTests(base.PulpClientTests):
         self.assertEqual(1, len(completed_tasks))
         self.assertEqual(STATE_FINISHED, completed_tasks[0].state)
 
+    @mock.patch('time.sleep')
+    def test_poll_single_task_passes_known_task(self, mock_sleep):
+        """
+        The last task received is passed with each poll, so the bindings only need to fetch the
+        parts of it that changed.
+        """
+        waiting = Task({'task_id': '123', 'state': STATE_WAITING})
+        running = Task({'task_id': '123', 'state': STATE_RUNNING, 'version': 'v1'})
+        finished = Task({'task_id': '123', 'state': STATE_FINISHED, 'version': 'v2'})
+        mock_get_task = mock.MagicMock(side_effect=[Response(200, running),
+                                                    Response(304, running),
+                                                    Response(200, finished)])
+        self.bindings.tasks.get_task = mock_get_task
+
+        completed_tasks = self.command.poll([waiting], {})
+
+        self.assertEqual(3, mock_sleep.call_count)
+        self.assertEqual(mock_get_task.call_args_list,
+                         [mock.call('123', task=waiting),
+                          mock.call('123', task=running),
+                          mock.call('123', task=running)])
+        self.assertEqual(STATE_FINISHED, completed_tasks[0].state)
+
     def test_poll_task_list(self):
         """
         Task Count: 3
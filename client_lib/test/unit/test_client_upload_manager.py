@@ -1,4 +1,5 @@
 import errno
+import hashlib
 import math
 import os
 import shutil
@@ -54,6 +55,20 @@ class UploadManagerTests(unittest.TestCase):
 
         self.assertTrue(isinstance(manager, upload_util.UploadManager))
         self.assertEqual(manager.upload_working_dir, '/a/b/c/default')
+        self.assertEqual(manager.chunk_size, upload_util.DEFAULT_CHUNKSIZE)
+        self.assertEqual(manager.concurrency, upload_util.DEFAULT_CONCURRENCY)
+
+    def test_init_with_defaults_server_config(self):
+        context = mock.MagicMock()
+        context.config = {'filesystem': {'upload_working_dir': '/a/b/c'},
+                          'server': {'upload_chunk_size': '100', 'upload_concurrency': '3',
+                                     'upload_max_chunk_size': '400'}}
+
+        manager = upload_util.UploadManager.init_with_defaults(context)
+
+        self.assertEqual(manager.chunk_size, 100)
+        self.assertEqual(manager.concurrency, 3)
+        self.assertEqual(manager.max_chunk_size, 400)
 
     def test_initialize_no_trackers(self):
         os.makedirs(self.upload_working_dir)
@@ -194,6 +209,51 @@ class UploadManagerTests(unittest.TestCase):
         self.assertEqual(tracker.unit_metadata, {})
         self.assertEqual(tracker.override_config, test_override_config)
 
+    def test_initialize_upload_reused(self):
+        # Setup
+        self.upload_manager.deduplicate = True
+        body = {'upload_id': MOCK_UPLOAD_ID, '_href': MOCK_LOCATION, 'reused': True}
+        self.mock_upload_bindings.initialize_upload.return_value = Response(201, body)
+        rpm_size = os.path.getsize(TEST_RPM_FILENAME)
+        f = open(TEST_RPM_FILENAME, 'r')
+        checksum = hashlib.sha256(f.read()).hexdigest()
+        f.close()
+
+        # Test
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, {})
+        self.upload_manager.upload(upload_id)
+
+        # Verify
+        self.mock_upload_bindings.initialize_upload.assert_called_once_with(
+            rpm_size, checksum, 'sha256')
+        self.assertEqual(0, self.mock_upload_bindings.upload_segment.call_count)
+        tracker = upload_util.UploadTracker.load(self.upload_manager._tracker_filename(upload_id))
+        self.assertEqual(True, tracker.is_finished_uploading)
+        self.assertEqual([[0, rpm_size]], tracker.completed_ranges)
+
+    def test_initialize_upload_not_reused(self):
+        # Setup
+        self.upload_manager.deduplicate = True
+
+        # Test
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, {})
+
+        # Verify
+        self.assertEqual(1, self.mock_upload_bindings.initialize_upload.call_count)
+        tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
+        self.assertEqual(False, tracker.is_finished_uploading)
+        self.assertEqual([], tracker.completed_ranges)
+
+    def test_initialize_upload_no_deduplication(self):
+        # Test
+        self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1', {'k': 'v'},
+                                              {})
+
+        # Verify
+        self.mock_upload_bindings.initialize_upload.assert_called_once_with()
+
     def test_upload_single_pass(self):
         # Setup
         # way higher than needed
@@ -289,6 +349,121 @@ class UploadManagerTests(unittest.TestCase):
         tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
         self.assertEqual(rpm_size, tracker.offset)
 
+    def test_upload_in_parallel(self):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.concurrency = 3
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+        mock_callback = mock.Mock()
+
+        # Test
+        self.upload_manager.upload(upload_id, mock_callback.update_status)
+
+        # Verify
+        rpm_size = os.path.getsize(TEST_RPM_FILENAME)
+        num_upload_calls = int(math.ceil(float(rpm_size) / float(self.upload_manager.chunk_size)))
+        self.assertEqual(num_upload_calls, self.mock_upload_bindings.upload_segment.call_count)
+
+        f = open(TEST_RPM_FILENAME, 'r')
+        expected = f.read()
+        f.close()
+        uploaded = {}
+        for single_call_args in self.mock_upload_bindings.upload_segment.call_args_list:
+            self.assertEqual(upload_id, single_call_args[0][0])
+            uploaded[single_call_args[0][1]] = single_call_args[0][2]
+        self.assertEqual(expected, ''.join(uploaded[offset] for offset in sorted(uploaded)))
+
+        self.assertEqual(num_upload_calls, mock_callback.update_status.call_count)
+        mock_callback.update_status.assert_called_with(rpm_size, rpm_size)
+
+        tf_filename = self.upload_manager._tracker_filename(upload_id)
+        tracker = upload_util.UploadTracker.load(tf_filename)
+        self.assertEqual(rpm_size, tracker.offset)
+        self.assertEqual([[0, rpm_size]], tracker.completed_ranges)
+        self.assertEqual(True, tracker.is_finished_uploading)
+
+    def test_upload_in_parallel_error(self):
+        # Setup
+        self.upload_manager.chunk_size = 1000
+        self.upload_manager.concurrency = 2
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+
+        def upload_segment(upload_id, offset, data):
+            if offset == 1000:
+                raise NotFoundException({})
+        self.mock_upload_bindings.upload_segment.side_effect = upload_segment
+
+        # Test
+        self.assertRaises(NotFoundException, self.upload_manager.upload, upload_id)
+
+        # Verify
+        tf_filename = self.upload_manager._tracker_filename(upload_id)
+        tracker = upload_util.UploadTracker.load(tf_filename)
+        self.assertTrue([0, 1000] in tracker.completed_ranges)
+        self.assertEqual(1000, tracker.offset)
+        self.assertEqual(False, tracker.is_running)
+        self.assertEqual(False, tracker.is_finished_uploading)
+
+    def test_upload_resume_missing_ranges(self):
+        # Setup
+        self.upload_manager.chunk_size = 500
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+        tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
+        tracker.add_completed_range(0, 500)
+        tracker.add_completed_range(800, 1500)
+
+        # Test
+        self.upload_manager.upload(upload_id)
+
+        # Verify
+        rpm_size = os.path.getsize(TEST_RPM_FILENAME)
+        segments = [(c[0][1], len(c[0][2]))
+                    for c in self.mock_upload_bindings.upload_segment.call_args_list]
+        self.assertEqual(segments, [(500, 300), (1500, 500), (2000, rpm_size - 2000)])
+        self.assertEqual([[0, rpm_size]], tracker.completed_ranges)
+
+    @mock.patch('pulp.client.upload.manager.time.time', return_value=0)
+    def test_upload_adapts_chunk_size(self, mock_time):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.max_chunk_size = 400
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+
+        # Test
+        self.upload_manager.upload(upload_id)
+
+        # Verify
+        sizes = [len(c[0][2]) for c in self.mock_upload_bindings.upload_segment.call_args_list]
+        self.assertEqual(sizes[:4], [100, 200, 400, 400])
+
+    @mock.patch('pulp.client.upload.manager.time.time')
+    def test_upload_checkpoints(self, mock_time):
+        # Setup
+        mock_time.side_effect = range(0, 1000)
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1',
+                                                          {'k': 'v'}, 'm-1')
+        tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
+
+        # Test
+        with mock.patch.object(tracker, 'save') as mock_save:
+            self.upload_manager.upload(upload_id)
+
+        # Verify
+        self.assertEqual(23, self.mock_upload_bindings.upload_segment.call_count)
+        # The clock advances a second on each of the three reads per segment, so a checkpoint is
+        # saved after every second segment, besides the saves at the start and end of the upload.
+        self.assertEqual(11 + 2, mock_save.call_count)
+
     def test_upload_concurrent_upload(self):
         # Setup
         self.upload_manager.initialize()
@@ -417,6 +592,33 @@ class UploadManagerTests(unittest.TestCase):
         self.assertRaises(upload_util.MissingUploadRequestException,
                           self.upload_manager.delete_upload, 'i')
 
+    def test_tracker_load_offset_only(self):
+        os.makedirs(self.upload_working_dir)
+        tracker = upload_util.UploadTracker(os.path.join(self.upload_working_dir, 'old'))
+        tracker.offset = 300
+        del tracker.completed_ranges
+        tracker.save()
+
+        loaded = upload_util.UploadTracker.load(tracker.filename)
+
+        self.assertEqual([[0, 300]], loaded.completed_ranges)
+        self.assertEqual([[300, 1000]], loaded.missing_ranges(1000))
+
+    def test_tracker_add_completed_range(self):
+        tracker = upload_util.UploadTracker('tracker')
+
+        tracker.add_completed_range(200, 300)
+        tracker.add_completed_range(500, 600)
+        self.assertEqual(None, tracker.offset)
+        self.assertEqual([[0, 200], [300, 500], [600, 700]], tracker.missing_ranges(700))
+
+        tracker.add_completed_range(0, 200)
+        tracker.add_completed_range(300, 500)
+        self.assertEqual([[0, 600]], tracker.completed_ranges)
+        self.assertEqual(600, tracker.offset)
+        self.assertEqual(600, tracker.completed_bytes())
+        self.assertEqual([[600, 700]], tracker.missing_ranges(700))
+
     def _mock_initialize_upload(self):
         """
         Configures the mock bindings to return a valid upload ID.
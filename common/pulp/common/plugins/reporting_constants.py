@@ -13,6 +13,7 @@ PROGRESS_DETAILS_KEY = u'details'
 PROGRESS_STATE_KEY = u'state'
 PROGRESS_ERROR_DETAILS_KEY = u'error_details'
 PROGRESS_SUB_STEPS_KEY = u'sub_steps'
+PROGRESS_TIMING_KEY = u'timing'
 
 STATE_NOT_STARTED = u'NOT_STARTED'
 STATE_RUNNING = u'IN_PROGRESS'
@@ -1,3 +1,7 @@
+import hashlib
+import json
+
+
 def encode_unicode(path):
     """
     Check if given path is a unicode and if yes, return utf-8 encoded path
@@ -39,3 +43,20 @@ def partial(func, *args, **kwds):
     Python 2.4 doesn't provide functools so provide our own version of the partial method
     """
     return lambda *fargs, **fkwds: func(*(args + fargs), **dict(kwds, **fkwds))
+
+
+def calculate_profile_hash(profile):
+    """
+    Return a hash of a consumer unit profile. This hash is useful for quickly
+    comparing profiles to determine if they are the same, and is computed the
+    same way by consumers and the server.
+
+    :param profile: The profile structure you wish to hash
+    :type  profile: object
+    :return:        Hash of profile
+    :rtype:         basestring
+    """
+    # Don't use any whitespace in the json separators, and sort dictionary keys to be repeatable
+    serialized_profile = json.dumps(profile, separators=(',', ':'), sort_keys=True)
+    hasher = hashlib.sha256(serialized_profile)
+    return hasher.hexdigest()
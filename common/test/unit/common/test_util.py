@@ -52,3 +52,21 @@ class TestPartial(unittest.TestCase):
         result_kwargs.update(kwargs)
         result_kwargs.update(additional_kwargs)
         base_func.assert_called_once_with(*result_args, **result_kwargs)
+
+
+class TestCalculateProfileHash(unittest.TestCase):
+
+    def test_key_order_ignored(self):
+        first = [{'name': 'zsh', 'version': '1.0'}]
+        second = [{'version': '1.0', 'name': 'zsh'}]
+
+        self.assertEqual(util.calculate_profile_hash(first), util.calculate_profile_hash(second))
+
+    def test_unicode_matches_str(self):
+        # the server hashes the profile decoded from JSON, the consumer the profile it collected
+        self.assertEqual(util.calculate_profile_hash([{'name': 'zsh'}]),
+                         util.calculate_profile_hash([{u'name': u'zsh'}]))
+
+    def test_list_order_significant(self):
+        self.assertNotEqual(util.calculate_profile_hash(['a', 'b']),
+                            util.calculate_profile_hash(['b', 'a']))
@@ -21,6 +21,8 @@ DEFAULT_CONFIG = {
         'verify_ssl': 'true',
         'ca_path': '/etc/pki/tls/certs/ca-bundle.crt',
         'upload_chunk_size': '1048576',
+        'upload_concurrency': '4',
+        'upload_max_chunk_size': '16777216',
     },
     'client': {
         'role': 'admin'
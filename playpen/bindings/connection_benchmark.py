@@ -0,0 +1,91 @@
+#!/usr/bin/env python2
+"""
+Compare sequential GET requests made through the Python bindings:
+
+  * with a new HTTPSServerWrapper for every request, which opens a new connection and does a full
+    TLS handshake each time, as the bindings used to do
+  * with a single PulpConnection, which keeps its connections alive and resumes TLS sessions
+
+A throwaway HTTPS server with a self-signed certificate is started on localhost to answer the
+requests. The openssl command is needed to create the certificate.
+
+usage: connection_benchmark.py [request count]
+"""
+
+import BaseHTTPServer
+import os
+import shutil
+import SocketServer
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from pulp.bindings.server import HTTPSServerWrapper, PulpConnection
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = '{"id": "benchmark"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def start_server(cert_dir):
+    cert = os.path.join(cert_dir, 'server.pem')
+    subprocess.check_call(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days',
+                           '1', '-subj', '/CN=localhost', '-keyout', cert, '-out', cert],
+                          stdout=open(os.devnull, 'w'), stderr=subprocess.STDOUT)
+    server = Server(('localhost', 0), Handler)
+    server.socket = ssl.wrap_socket(server.socket, certfile=cert, server_side=True)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.setDaemon(True)
+    thread.start()
+    return server
+
+
+def new_connection_per_request(connection, count):
+    for i in xrange(count):
+        connection.server_wrapper = HTTPSServerWrapper(connection)
+        connection.GET('/v2/repositories/benchmark/')
+
+
+def pooled_connection(connection, count):
+    for i in xrange(count):
+        connection.GET('/v2/repositories/benchmark/')
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    cert_dir = tempfile.mkdtemp()
+    try:
+        server = start_server(cert_dir)
+        port = server.server_address[1]
+        for strategy in (new_connection_per_request, pooled_connection):
+            connection = PulpConnection('localhost', port, verify_ssl=False)
+            start = time.time()
+            strategy(connection, count)
+            elapsed = time.time() - start
+            print '%-26s %d GETs in %.2fs (%.1f ms each)' % (
+                strategy.__name__, count, elapsed, elapsed * 1000 / count)
+        server.shutdown()
+    finally:
+        shutil.rmtree(cert_dir)
+
+
+if __name__ == '__main__':
+    main()
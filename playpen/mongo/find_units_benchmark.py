@@ -0,0 +1,103 @@
+#!/usr/bin/env python2
+"""
+Compare the two ways of looking up existing content units by unit key:
+
+  * a $or of full unit keys in pages of 50, as units_controller.find_units used to do
+  * a single $in over unit key digests in pages of 1000, as it does now for units that
+    are already known
+
+Synthetic RPM-like units with a five field unit key are written to a scratch collection of a local
+mongod, then every unit is looked up with both strategies.
+
+usage: find_units_benchmark.py [unit count] [database name]
+"""
+
+from hashlib import sha256
+import sys
+import time
+
+import pymongo
+
+
+UNIT_KEY_FIELDS = ('name', 'epoch', 'version', 'release', 'arch')
+COLLECTION = 'find_units_benchmark'
+
+
+def digest(unit_key):
+    """
+    Same algorithm as ContentUnit.unit_key_lookup_digest() for string values
+    """
+    _hash = sha256()
+    for key, value in sorted(unit_key.items()):
+        for part in (key, value):
+            _hash.update('%d:%s' % (len(part), part))
+    return _hash.hexdigest()
+
+
+def make_units(count):
+    for i in xrange(count):
+        yield {'name': 'package-%d' % (i / 10), 'epoch': '0', 'version': '%d.0' % (i % 10),
+               'release': '1.el7', 'arch': 'x86_64'}
+
+
+def paginate(iterable, page_size):
+    page = []
+    for item in iterable:
+        page.append(item)
+        if len(page) == page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def load(collection, count):
+    collection.drop()
+    collection.create_index([(f, pymongo.ASCENDING) for f in UNIT_KEY_FIELDS], unique=True)
+    collection.create_index('_unit_key_digest')
+    for page in paginate(make_units(count), 10000):
+        for unit_key in page:
+            unit_key['_unit_key_digest'] = digest(unit_key)
+        collection.insert_many(page)
+
+
+def by_unit_key(collection, count):
+    found = 0
+    for page in paginate(make_units(count), 50):
+        found += len(list(collection.find({'$or': page}, projection=['_id'])))
+    return found
+
+
+def by_digest(collection, count):
+    found = 0
+    for page in paginate(make_units(count), 1000):
+        digests = dict((digest(unit_key), unit_key) for unit_key in page)
+        # find_units compares the unit key of each unit found with the one requested
+        for document in collection.find({'_unit_key_digest': {'$in': digests.keys()}},
+                                        projection=UNIT_KEY_FIELDS + ('_unit_key_digest',)):
+            unit_key = dict((f, document[f]) for f in UNIT_KEY_FIELDS)
+            if unit_key == digests[document['_unit_key_digest']]:
+                found += 1
+    return found
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    db_name = sys.argv[2] if len(sys.argv) > 2 else 'pulp_benchmark'
+    collection = pymongo.MongoClient()[db_name][COLLECTION]
+
+    print 'Loading %d units' % count
+    load(collection, count)
+
+    try:
+        for strategy in (by_unit_key, by_digest):
+            start = time.time()
+            found = strategy(collection, count)
+            print '%-12s found %d units in %.2fs' % (strategy.__name__, found,
+                                                     time.time() - start)
+    finally:
+        collection.drop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,30 @@
 from gettext import gettext as _
 import csv
 import errno
+import hashlib
 import logging
 import os
 import shutil
 import traceback
 
+from pulp.common.config import parse_bool
 from pulp.common.plugins.distributor_constants import MANIFEST_FILENAME
 from pulp.common.plugins.progress import ProgressReport
 from pulp.plugins.distributor import Distributor
+from pulp.plugins.model import Unit
 from pulp.server.managers.repo import _common as common_utils
 from pulp.server.util import copytree
 
 BUILD_DIRNAME = 'build'
 
+# When true, a repository that has already been published is republished by
+# changing only the links and manifest rows of units that were added or removed.
+CONFIG_INCREMENTAL_PUBLISH = 'incremental_publish'
+
+# Distributor scratchpad key recording the hosting locations and the manifest
+# checksum of the last publish.
+SCRATCHPAD_PUBLISHED_MANIFEST = 'published_manifest'
+
 _logger = logging.getLogger(__name__)
 
 
@@ -81,27 +92,26 @@ class FileDistributor(Distributor):
             build_dir = os.path.join(working_dir, BUILD_DIRNAME)
             os.makedirs(build_dir)
 
-            self.initialize_metadata(build_dir)
+            hosting_locations = self.get_hosting_locations(repo, config)
 
-            try:
-                # process each unit
-                for unit in units:
-                    links_to_create = self.get_paths_for_unit(unit)
-                    self._symlink_unit(build_dir, unit, links_to_create)
-                    self.publish_metadata_for_unit(unit)
-            finally:
-                # Finalize the processing
-                self.finalize_metadata()
+            incremental = config.get(CONFIG_INCREMENTAL_PUBLISH, False)
+            if isinstance(incremental, basestring):
+                incremental = parse_bool(incremental)
+            published_unit_keys = None
+            if incremental:
+                published_unit_keys = self._published_unit_keys(publish_conduit,
+                                                                hosting_locations)
 
-            # Let's unpublish, and then republish
-            self.unpublish_repo(repo, config)
-
-            hosting_locations = self.get_hosting_locations(repo, config)
-            for location in hosting_locations:
-                copytree(build_dir, location, symlinks=True)
+            if published_unit_keys is None:
+                self._publish_all(build_dir, units, repo, config, hosting_locations)
+            else:
+                self._publish_changes(build_dir, units, published_unit_keys, hosting_locations)
 
             self.post_repo_publish(repo, config)
 
+            if incremental:
+                self._save_published_manifest(publish_conduit, build_dir, hosting_locations)
+
             # Clean up our build_dir
             self._rmtree_if_exists(build_dir)
 
@@ -117,6 +127,167 @@ class FileDistributor(Distributor):
             report = progress_report.build_final_report()
             return report
 
+    def _publish_all(self, build_dir, units, repo, config, hosting_locations):
+        """
+        Link every unit and write the manifest in the build dir, then replace
+        each hosting location with a copy of the build dir.
+
+        :param build_dir: empty directory in which the publish is built
+        :type  build_dir: basestring
+        :param units: every unit associated with the repository
+        :type  units: iterable of pulp.plugins.model.AssociatedUnit
+        :param repo: metadata describing the repository
+        :type  repo: pulp.plugins.model.Repository
+        :param config: plugin configuration
+        :type  config: pulp.plugins.config.PluginCallConfiguration
+        :param hosting_locations: paths the repository is published to
+        :type  hosting_locations: list of basestring
+        """
+        self.initialize_metadata(build_dir)
+
+        try:
+            # process each unit
+            for unit in units:
+                links_to_create = self.get_paths_for_unit(unit)
+                self._symlink_unit(build_dir, unit, links_to_create)
+                self.publish_metadata_for_unit(unit)
+        finally:
+            # Finalize the processing
+            self.finalize_metadata()
+
+        # Let's unpublish, and then republish
+        self.unpublish_repo(repo, config)
+
+        for location in hosting_locations:
+            copytree(build_dir, location, symlinks=True)
+
+    def _publish_changes(self, build_dir, units, published_unit_keys, hosting_locations):
+        """
+        Write the manifest in the build dir, then update each hosting location
+        in place: links of units that are no longer in the repository are
+        removed, links of new units are added, and the manifest is replaced by
+        renaming the new one over it, so the repository stays available
+        throughout.
+
+        Removed units are identified by the rows of the published manifest,
+        which hold their unit keys, so get_paths_for_unit must only depend on
+        the unit key when incremental publishing is used.
+
+        :param build_dir: empty directory in which the manifest is written
+        :type  build_dir: basestring
+        :param units: every unit associated with the repository
+        :type  units: iterable of pulp.plugins.model.AssociatedUnit
+        :param published_unit_keys: manifest rows of the units that are published
+        :type  published_unit_keys: set of tuple
+        :param hosting_locations: paths the repository is published to
+        :type  hosting_locations: list of basestring
+        """
+        self.initialize_metadata(build_dir)
+
+        units_by_key = {}
+        try:
+            for unit in units:
+                self.publish_metadata_for_unit(unit)
+                units_by_key[self._manifest_row(unit)] = unit
+        finally:
+            self.finalize_metadata()
+
+        removed_units = [Unit(None, {'name': name, 'checksum': checksum, 'size': size}, {}, None)
+                         for name, checksum, size in published_unit_keys - set(units_by_key)]
+        added_units = [unit for key, unit in units_by_key.iteritems()
+                       if key not in published_unit_keys]
+        _logger.debug(_('Publishing %(a)d new and removing %(r)d old files') %
+                      {'a': len(added_units), 'r': len(removed_units)})
+
+        new_manifest = os.path.join(build_dir, MANIFEST_FILENAME)
+        for location in hosting_locations:
+            for unit in removed_units:
+                for path in self.get_paths_for_unit(unit):
+                    try:
+                        os.remove(os.path.join(location, path))
+                    except OSError, e:
+                        if e.errno != errno.ENOENT:
+                            raise
+            for unit in added_units:
+                self._symlink_unit(location, unit, self.get_paths_for_unit(unit))
+
+            temp_manifest = os.path.join(location, '.%s.new' % MANIFEST_FILENAME)
+            shutil.copyfile(new_manifest, temp_manifest)
+            os.rename(temp_manifest, os.path.join(location, MANIFEST_FILENAME))
+
+    def _published_unit_keys(self, publish_conduit, hosting_locations):
+        """
+        Read the unit keys of the published units from the manifest of the last
+        publish. They can only be trusted if the last publish was to the same
+        hosting locations and every location still holds the manifest it wrote.
+
+        :param publish_conduit: The conduit for publishing a repo
+        :type  publish_conduit: pulp.plugins.conduits.repo_publish.RepoPublishConduit
+        :param hosting_locations: paths the repository is published to
+        :type  hosting_locations: list of basestring
+        :return: manifest rows of the published units, or None if the repository
+                 must be published in full
+        :rtype:  set of tuple or None
+        """
+        published = (publish_conduit.get_scratchpad() or {}).get(SCRATCHPAD_PUBLISHED_MANIFEST)
+        if not published or not hosting_locations or \
+                published['locations'] != list(hosting_locations):
+            return None
+
+        for location in hosting_locations:
+            manifest = os.path.join(location, MANIFEST_FILENAME)
+            if not os.path.isfile(manifest) or \
+                    self._manifest_checksum(manifest) != published['checksum']:
+                _logger.info(_('Published manifest %(m)s has changed; publishing all files') %
+                             {'m': manifest})
+                return None
+
+        with open(os.path.join(hosting_locations[0], MANIFEST_FILENAME)) as manifest_file:
+            return set(tuple(row) for row in csv.reader(manifest_file))
+
+    def _save_published_manifest(self, publish_conduit, build_dir, hosting_locations):
+        """
+        Record the hosting locations and manifest checksum of this publish in the
+        distributor scratchpad, for the next incremental publish.
+
+        :param publish_conduit: The conduit for publishing a repo
+        :type  publish_conduit: pulp.plugins.conduits.repo_publish.RepoPublishConduit
+        :param build_dir: directory in which the manifest was written
+        :type  build_dir: basestring
+        :param hosting_locations: paths the repository is published to
+        :type  hosting_locations: list of basestring
+        """
+        scratchpad = publish_conduit.get_scratchpad() or {}
+        scratchpad[SCRATCHPAD_PUBLISHED_MANIFEST] = {
+            'locations': list(hosting_locations),
+            'checksum': self._manifest_checksum(os.path.join(build_dir, MANIFEST_FILENAME)),
+        }
+        publish_conduit.set_scratchpad(scratchpad)
+
+    @staticmethod
+    def _manifest_row(unit):
+        """
+        :param unit: unit to be published
+        :type  unit: pulp.plugins.model.AssociatedUnit
+        :return: the row of the manifest for the unit, as it is read back from the manifest
+        :rtype:  tuple
+        """
+        return tuple(str(unit.unit_key[k]) for k in ('name', 'checksum', 'size'))
+
+    @staticmethod
+    def _manifest_checksum(path):
+        """
+        :param path: path to a manifest
+        :type  path: basestring
+        :return: hex digest of the SHA-256 checksum of the manifest
+        :rtype:  str
+        """
+        checksum = hashlib.sha256()
+        with open(path, 'rb') as manifest_file:
+            for chunk in iter(lambda: manifest_file.read(65536), ''):
+                checksum.update(chunk)
+        return checksum.hexdigest()
+
     def unpublish_repo(self, repo, config):
         """
         Delete the published files from our filesystem
@@ -96,6 +96,13 @@ class Importer(object):
         * types - List of all content type IDs that may be imported using this
                importer.
 
+        The following key is optional:
+
+        * server_side_copy - True if import_units does nothing more than
+               associate the given units with the destination repository. Pulp
+               may then copy associations between repositories without calling
+               import_units. Defaults to False.
+
         This method call may be made multiple times during the course of a
         running Pulp server and thus should not be used for initialization
         purposes.
@@ -54,6 +54,10 @@ def initialize(validate=True):
     for entry_point in plugin_entry_points:
         loading.load_plugins_from_entry_point(*entry_point)
 
+    # Type definitions only change when they are loaded by pulp-manage-db, so read them once here
+    # and serve later lookups from memory
+    database.refresh_type_registry()
+
     # post-initialization validation
     if not validate:
         return
@@ -4,7 +4,10 @@ This module covers both the ContentType collection itself as well as any
 type-specific collections that exist to suit the type needs.
 """
 
+from collections import OrderedDict
+import copy
 import logging
+import threading
 
 from pymongo import ASCENDING
 
@@ -17,6 +20,71 @@ TYPE_COLLECTION_PREFIX = 'units_'
 _logger = logging.getLogger(__name__)
 
 
+class _TypeDefinitionRegistry(object):
+    """
+    In-process copy of the content types collection, keyed by type ID.
+
+    The collection only changes when type definitions are (re)loaded, so lookups are answered
+    from memory. Every reload bumps the registry version, which lets callers that derive their
+    own state from type definitions tell when it has gone stale.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._definitions = None
+        self.version = 0
+
+    def refresh(self):
+        """
+        Reload all type definitions from the database.
+        """
+        with self._lock:
+            collection = ContentType.get_collection()
+            definitions = OrderedDict((t['id'], t) for t in collection.find())
+            self._definitions = definitions
+            self.version += 1
+
+    def invalidate(self):
+        """
+        Discard the loaded definitions; they will be reloaded on next access.
+        """
+        with self._lock:
+            self._definitions = None
+            self.version += 1
+
+    def definitions(self):
+        """
+        :return: mapping of type ID to type definition SON, loading it if necessary
+        :rtype:  collections.OrderedDict
+        """
+        definitions = self._definitions
+        if definitions is None:
+            with self._lock:
+                if self._definitions is None:
+                    self.refresh()
+                definitions = self._definitions
+        return definitions
+
+
+_REGISTRY = _TypeDefinitionRegistry()
+
+
+def refresh_type_registry():
+    """
+    Reload the in-process registry of type definitions from the database.
+    """
+    _REGISTRY.refresh()
+
+
+def type_registry_version():
+    """
+    :return: number that changes every time the type definition registry is reloaded or
+             invalidated
+    :rtype:  int
+    """
+    return _REGISTRY.version
+
+
 class UpdateFailed(Exception):
     """
     Indicates a call to update the database has failed for one or more type
@@ -119,6 +187,9 @@ def update_database(definitions, error_on_missing_definitions=False, drop_indice
                 error_defs.append(type_def)
                 continue
 
+    # The types collection has changed, so reload the registry for all later lookups
+    _REGISTRY.refresh()
+
     if len(error_defs) > 0:
         raise UpdateFailed(error_defs)
 
@@ -144,6 +215,7 @@ def clean():
     # Purge the types collection of all entries
     type_collection = ContentType.get_collection()
     type_collection.remove()
+    _REGISTRY.invalidate()
 
 
 def type_units_collection(type_id):
@@ -168,11 +240,7 @@ def all_type_ids():
     @rtype:  list of str
     """
 
-    collection = ContentType.get_collection()
-    type_id_son = list(collection.find(projection={'id': 1}))
-    type_ids = [t['id'] for t in type_id_son]
-
-    return type_ids
+    return _REGISTRY.definitions().keys()
 
 
 def all_type_collection_names():
@@ -181,14 +249,7 @@ def all_type_collection_names():
     @rtype:  list of str
     """
 
-    collection = ContentType.get_collection()
-    type_ids = list(collection.find(projection={'id': 1}))
-
-    type_collection_names = []
-    for id in type_ids:
-        type_collection_names.append(unit_collection_name(id['id']))
-
-    return type_collection_names
+    return [unit_collection_name(type_id) for type_id in _REGISTRY.definitions()]
 
 
 def all_type_definitions():
@@ -197,9 +258,7 @@ def all_type_definitions():
     @rtype:  list of dict
     """
 
-    coll = ContentType.get_collection()
-    types = list(coll.find())
-    return types
+    return copy.deepcopy(_REGISTRY.definitions().values())
 
 
 def type_definition(type_id):
@@ -210,9 +269,8 @@ def type_definition(type_id):
     @return: corresponding type definition, None if not found
     @rtype: SON or None
     """
-    collection = ContentType.get_collection()
-    type_ = collection.find_one({'id': type_id})
-    return type_
+    type_ = _REGISTRY.definitions().get(type_id)
+    return copy.deepcopy(type_)
 
 
 def unit_collection_name(type_id):
@@ -239,11 +297,10 @@ def type_units_unit_key(type_id):
              content type collection
     @rtype: list of str or None
     """
-    collection = ContentType.get_collection()
-    type_def = collection.find_one({'id': type_id})
+    type_def = _REGISTRY.definitions().get(type_id)
     if type_def is None:
         return None
-    return type_def['unit_key']
+    return copy.deepcopy(type_def['unit_key'])
 
 
 def _create_or_update_type(type_def):
@@ -275,6 +332,7 @@ def _create_or_update_type(type_def):
         content_type._id = existing_type['_id']
     # XXX this still causes a potential race condition when 2 users are updating the same type
     content_type_collection.save(content_type)
+    _REGISTRY.invalidate()
 
 
 def _update_indexes(type_def, unique):
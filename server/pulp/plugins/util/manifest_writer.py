@@ -1,5 +1,8 @@
+from multiprocessing.pool import ThreadPool
 import csv
 import hashlib
+import json
+import logging
 import os
 
 from pulp.common.plugins.distributor_constants import MANIFEST_FILENAME
@@ -7,6 +10,12 @@ from pulp.common.plugins.distributor_constants import MANIFEST_FILENAME
 
 # not much science behind this
 CHUNK_SIZE = 2 ** 16
+# bytes read at a time by build_manifest_for_dir
+BUILD_CHUNK_SIZE = 2 ** 20
+# number of files build_manifest_for_dir calculates checksums for at the same time
+HASH_THREADS = 4
+
+_logger = logging.getLogger(__name__)
 
 
 def make_manifest_for_dir(path):
@@ -30,20 +39,123 @@ def make_manifest_for_dir(path):
             writer.writerow([filename, checksum, size])
 
 
-def get_sha256_checksum(path):
+def build_manifest_for_dir(path, known_checksums=None, threads=HASH_THREADS, cache_path=None):
     """
-    calculate and return the sha256 checksum of a file
+    creates a PULP_MANIFEST file in the specified directory, like make_manifest_for_dir, while
+    calculating as few checksums as possible
+
+    A file's checksum is taken from known_checksums, or from the checksum cache written by the
+    previous build, when both its size and modification time match. The remaining checksums are
+    calculated by a pool of threads. The cache is then rewritten.
+
+    :param path:            full path to the directory where the manifest should be created
+    :type  path:            basestring
+    :param known_checksums: sha256 checksum, size in bytes and modification time of files whose
+                            checksums are already known, such as content units, keyed by filename
+    :type  known_checksums: dict of basestring: (basestring, int, float)
+    :param threads:         maximum number of checksums calculated at the same time
+    :type  threads:         int
+    :param cache_path:      full path to the file the checksums are kept in between builds. It
+                            must be outside of the published directory tree, so that it is
+                            neither served nor copied. No cache is kept if it is None.
+    :type  cache_path:      basestring
+    """
+    known_checksums = known_checksums or {}
+    cache = _read_checksum_cache(cache_path) if cache_path else {}
+
+    # [filename, size, mtime, checksum] for each file in the manifest
+    entries = []
+    unknown = []
+    for filename in os.listdir(path):
+        fullpath = os.path.join(path, filename)
+        if filename == MANIFEST_FILENAME or fullpath == cache_path or \
+                not os.path.isfile(fullpath):
+            continue
+        stat = os.stat(fullpath)
+        entry = [filename, stat.st_size, stat.st_mtime, None]
+        known = known_checksums.get(filename)
+        cached = cache.get(filename)
+        if known and tuple(known[1:]) == (stat.st_size, stat.st_mtime):
+            entry[3] = known[0]
+        elif cached and cached[:2] == [stat.st_size, stat.st_mtime]:
+            entry[3] = cached[2]
+        else:
+            unknown.append(entry)
+        entries.append(entry)
+
+    if unknown:
+        pool = ThreadPool(min(threads, len(unknown)))
+        try:
+            checksums = pool.map(_get_build_checksum,
+                                 [os.path.join(path, unknown_file[0]) for unknown_file in unknown])
+        finally:
+            pool.close()
+            pool.join()
+        for entry, checksum in zip(unknown, checksums):
+            entry[3] = checksum
 
+    with open(os.path.join(path, MANIFEST_FILENAME), 'w') as open_file:
+        writer = csv.writer(open_file)
+        for filename, size, mtime, checksum in entries:
+            writer.writerow([filename, checksum, size])
+
+    if not cache_path:
+        return
+    cache = dict((filename, [size, mtime, checksum])
+                 for filename, size, mtime, checksum in entries)
+    try:
+        with open(cache_path, 'w') as open_file:
+            json.dump(cache, open_file)
+    except IOError, e:
+        _logger.warning('Could not write checksum cache %s: %s' % (cache_path, e))
+
+
+def _read_checksum_cache(cache_path):
+    """
+    :param cache_path:  full path to a checksum cache written by build_manifest_for_dir
+    :type  cache_path:  basestring
+
+    :return:    [size, mtime, checksum] keyed by filename; empty if the cache is missing or
+                cannot be read
+    :rtype:     dict
+    """
+    try:
+        with open(cache_path) as open_file:
+            cache = json.load(open_file)
+    except (IOError, ValueError):
+        return {}
+    if not isinstance(cache, dict):
+        return {}
+    return cache
+
+
+def _get_build_checksum(path):
+    """
     :param path:    full path to the file
     :type  path:    basestring
 
+    :return:    sha256 checksum, calculated with larger reads than the default
+    :rtype:     basestring
+    """
+    return get_sha256_checksum(path, BUILD_CHUNK_SIZE)
+
+
+def get_sha256_checksum(path, chunk_size=CHUNK_SIZE):
+    """
+    calculate and return the sha256 checksum of a file
+
+    :param path:        full path to the file
+    :type  path:        basestring
+    :param chunk_size:  number of bytes to read at a time
+    :type  chunk_size:  int
+
     :return:    sha256 checksum
     :rtype:     basestring
     """
     hasher = hashlib.sha256()
     with open(path) as open_file:
-        chunk = open_file.read(CHUNK_SIZE)
+        chunk = open_file.read(chunk_size)
         while chunk:
             hasher.update(chunk)
-            chunk = open_file.read(CHUNK_SIZE)
+            chunk = open_file.read(chunk_size)
     return hasher.hexdigest()
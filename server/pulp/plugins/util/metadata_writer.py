@@ -15,6 +15,120 @@ from pulp.server.util import CHECKSUM_FUNCTIONS
 
 _LOG = logging.getLogger(__name__)
 BUFFER_SIZE = 1024
+# size of the reads used when a checksum has to be computed from a file already on disk
+CHECKSUM_BUFFER_SIZE = 1024 * 1024
+
+
+class _HashingStream(object):
+    """
+    Passes writes through to another stream, keeping track of the size and,
+    optionally, the checksum of everything written.
+    """
+
+    def __init__(self, stream, checksum_constructor=None):
+        """
+        :param stream: stream to write to
+        :type  stream: file-like object
+        :param checksum_constructor: hashlib constructor, or None to only count the size
+        :type  checksum_constructor: callable or None
+        """
+        self.stream = stream
+        self.hash = checksum_constructor() if checksum_constructor else None
+        self.size = 0
+
+    def write(self, data):
+        if self.hash is not None:
+            self.hash.update(data)
+        self.size += len(data)
+        self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+
+class HashingFileWriter(object):
+    """
+    Write-only file object that computes the checksum and size of a file while
+    it is being written, so that the file does not have to be read back.
+
+    Files whose path ends with ".gz" are gzip compressed. For those, checksum and
+    size describe the compressed file on disk while open_checksum and open_size
+    describe the uncompressed content. For other files both pairs are the same.
+    The values are only complete once the writer has been closed.
+    """
+
+    def __init__(self, path, checksum_constructor=None):
+        """
+        :param path: full path to the file to write; it is overwritten if it exists
+        :type  path: str
+        :param checksum_constructor: hashlib constructor, or None to only compute sizes
+        :type  checksum_constructor: callable or None
+        """
+        self.name = path
+        self._file = open(path, 'wb')
+        self._on_disk = _HashingStream(self._file, checksum_constructor)
+        if path.endswith('.gz'):
+            self._gzip = gzip.GzipFile(filename=path, mode='wb', fileobj=self._on_disk)
+            self._content = _HashingStream(self._gzip, checksum_constructor)
+        else:
+            self._gzip = None
+            self._content = self._on_disk
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    @property
+    def checksum(self):
+        """
+        :return: hex digest of the file on disk, or None if no checksum type was given
+        :rtype:  str or None
+        """
+        if self._on_disk.hash is None:
+            return None
+        return self._on_disk.hash.hexdigest()
+
+    @property
+    def size(self):
+        """
+        :return: size in bytes of the file on disk
+        :rtype:  int
+        """
+        return self._on_disk.size
+
+    @property
+    def open_checksum(self):
+        """
+        :return: hex digest of the uncompressed content, or None if no checksum type was given
+        :rtype:  str or None
+        """
+        if self._content.hash is None:
+            return None
+        return self._content.hash.hexdigest()
+
+    @property
+    def open_size(self):
+        """
+        :return: size in bytes of the uncompressed content
+        :rtype:  int
+        """
+        return self._content.size
+
+    def write(self, data):
+        self._content.write(data)
+
+    def flush(self):
+        self._content.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._gzip is not None:
+                # writes the gzip trailer, but leaves the underlying file open
+                self._gzip.close()
+        finally:
+            self._file.close()
 
 
 class MetadataFileContext(object):
@@ -35,7 +149,11 @@ class MetadataFileContext(object):
         self.metadata_file_path = metadata_file_path
         self.metadata_file_handle = None
         self.checksum_type = checksum_type
+        self.checksum_constructor = None
         self.checksum = None
+        self.open_checksum = None
+        self.size = None
+        self.open_size = None
         if self.checksum_type is not None:
             checksum_function = CHECKSUM_FUNCTIONS.get(checksum_type)
             if not checksum_function:
@@ -76,6 +194,10 @@ class MetadataFileContext(object):
     def finalize(self):
         """
         Write the footer into the metadata file and close it.
+
+        If a checksum type was given, checksum and open_checksum are set to the
+        checksums of the file and of its uncompressed content, size and open_size
+        to their sizes, and the checksum is prepended to the file name.
         """
         if self._is_closed(self.metadata_file_handle):
             # finalize has already been run or initialize has not been run
@@ -96,11 +218,16 @@ class MetadataFileContext(object):
         # Add calculated checksum to the filename
         file_name = os.path.basename(self.metadata_file_path)
         if self.checksum_type is not None:
-            with open(self.metadata_file_path, 'rb') as file_handle:
-                content = file_handle.read()
-                checksum = self.checksum_constructor(content).hexdigest()
+            if isinstance(self.metadata_file_handle, HashingFileWriter):
+                self.checksum = self.metadata_file_handle.checksum
+                self.size = self.metadata_file_handle.size
+                self.open_checksum = self.metadata_file_handle.open_checksum
+                self.open_size = self.metadata_file_handle.open_size
+            else:
+                # the file was opened by a subclass, so it has to be read back
+                self.checksum, self.size = self._calculate_checksum(self.metadata_file_path)
 
-            self.checksum = checksum
+            checksum = self.checksum
             file_name_with_checksum = checksum + '-' + file_name
             new_file_path = os.path.join(os.path.dirname(self.metadata_file_path),
                                          file_name_with_checksum)
@@ -142,11 +269,27 @@ class MetadataFileContext(object):
         msg = _('Opening metadata file handle for [%(p)s]')
         _LOG.debug(msg % {'p': self.metadata_file_path})
 
-        if self.metadata_file_path.endswith('.gz'):
-            self.metadata_file_handle = gzip.open(self.metadata_file_path, 'w')
+        self.metadata_file_handle = HashingFileWriter(self.metadata_file_path,
+                                                      self.checksum_constructor)
 
-        else:
-            self.metadata_file_handle = open(self.metadata_file_path, 'w')
+    def _calculate_checksum(self, path):
+        """
+        Compute the checksum of a file on disk without reading it into memory at once.
+
+        :param path: full path to the file
+        :type  path: str
+        :return: hex digest and size in bytes of the file
+        :rtype:  tuple of (str, int)
+        """
+        checksum = self.checksum_constructor()
+        size = 0
+        with open(path, 'rb') as file_handle:
+            content = file_handle.read(CHECKSUM_BUFFER_SIZE)
+            while content:
+                checksum.update(content)
+                size += len(content)
+                content = file_handle.read(CHECKSUM_BUFFER_SIZE)
+        return checksum.hexdigest(), size
 
     def _write_file_header(self):
         """
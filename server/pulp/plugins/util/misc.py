@@ -1,4 +1,6 @@
+import ctypes
 import errno
+import fcntl
 from gettext import gettext as _
 import itertools
 import logging
@@ -8,6 +10,16 @@ import shutil
 
 DEFAULT_PAGE_SIZE = 1000
 
+# ioctl request that makes a file share the data blocks of another (Linux, e.g. btrfs and XFS)
+FICLONE = 0x40049409
+
+try:
+    # fallocate(2) without glibc's posix_fallocate emulation, which writes to every block
+    _fallocate = ctypes.CDLL(None, use_errno=True).fallocate64
+    _fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+except (AttributeError, OSError):
+    _fallocate = None
+
 _log = logging.getLogger(__name__)
 
 
@@ -142,3 +154,39 @@ def clear_directory(path, skip_list=()):
 
         elif os.path.isfile(entry_path):
             os.unlink(entry_path)
+
+
+def preallocate(file_object, size):
+    """
+    Reserve disk space for a file of the given size, so writing its data later neither extends
+    the file piece by piece nor fails for lack of space. Where the filesystem cannot reserve
+    space, the file is only extended to the size.
+
+    :param file_object: file open for writing
+    :type  file_object: file
+    :param size: size of the file in bytes
+    :type  size: int
+    """
+    if size <= 0:
+        return
+    if _fallocate is not None and _fallocate(file_object.fileno(), 0, 0, size) == 0:
+        return
+    file_object.truncate(size)
+
+
+def copy_file(source_path, destination_path):
+    """
+    Copy a file along with its permission bits and timestamps. Where the filesystem supports it,
+    the copy is a reflink that shares the data blocks of the source file until either is modified.
+
+    :param source_path: path of the file to copy
+    :type  source_path: str
+    :param destination_path: path of the new file
+    :type  destination_path: str
+    """
+    with open(source_path, 'rb') as source, open(destination_path, 'wb') as destination:
+        try:
+            fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+        except (IOError, OSError):
+            shutil.copyfileobj(source, destination)
+    shutil.copystat(source_path, destination_path)
@@ -1,12 +1,16 @@
 from gettext import gettext as _
 from itertools import chain, imap
+import cProfile
 import copy
 import itertools
 import logging
 import os
+import Queue
 import shutil
 import sys
 import tarfile
+import tempfile
+import threading
 import time
 import traceback
 import uuid
@@ -16,7 +20,9 @@ from pulp.common.plugins import reporting_constants, importer_constants
 from pulp.common.util import encode_unicode
 from pulp.plugins.util import manifest_writer, misc
 from pulp.plugins.util.nectar_config import importer_config_to_nectar_config
+from pulp.server import config as pulp_config
 from pulp.server.controllers import repository as repo_controller
+from pulp.server.db import connection
 from pulp.server.db.model.criteria import Criteria, UnitAssociationCriteria
 from pulp.server.exceptions import PulpCodedTaskFailedException
 from pulp.server.controllers import units as units_controller
@@ -30,6 +36,11 @@ from pulp.server.util import copytree
 
 _logger = logging.getLogger(__name__)
 
+# Serializes progress counter updates and progress reports of steps that run concurrently
+_PROGRESS_LOCK = threading.RLock()
+# Marks the end of the items handed to the worker threads of a step
+_NO_MORE_ITEMS = object()
+
 
 def _post_order(step):
     """
@@ -44,6 +55,16 @@ def _post_order(step):
     yield step
 
 
+def _timing_sample():
+    """
+    :return: the wall time, the CPU time used by this process and the number of database commands
+             sent by this process, or None for the latter if it is unknown
+    :rtype:  tuple
+    """
+    times = os.times()
+    return time.time(), times[0] + times[1], connection.get_command_count()
+
+
 class Step(object):
     """
     Base class for step processing. The only tie to the platform is an assumption of
@@ -72,10 +93,32 @@ class Step(object):
     |
     +-- post_process()
 
+    CONCURRENCY:
+
+    Both forms of concurrency are opt-in and use threads, so they only pay off for work that
+    waits on I/O, such as creating symlinks, writing files or talking to the database.
+
+    If max_workers is greater than 1, the items from get_iterator() are passed to process_main()
+    by that many threads at once, so process_main() must be thread safe. Items may complete out
+    of order. Those threads, and the threads of parallel steps below, do not run in the celery
+    task, so anything that needs it must be looked up beforehand in _prepare_threads().
+
+    Consecutive child steps created with parallel=True are processed (along with their own
+    children) at the same time, each in its own thread. Their parent waits for all of them to
+    finish before processing the next child.
+
+    TIMING:
+
+    Once a step starts, its progress report includes the wall time and process CPU time spent in
+    process() so far, the items processed per second and the number of database commands sent.
+    CPU time and commands are counted for the whole process, so they include the work of any
+    parallel steps. Steps whose type is listed in the step_types setting of the [profiling]
+    section of server.conf are also profiled, see _profile_dir().
+
     """
 
     def __init__(self, step_type, status_conduit=None, non_halting_exceptions=None,
-                 disable_reporting=False):
+                 disable_reporting=False, max_workers=1, parallel=False):
         """
         :param step_type: The id of the step this processes
         :type step_type: str
@@ -85,6 +128,11 @@ class Step(object):
         :type non_halting_exceptions: list of Exception
         :param disable_reporting: Disable progress reporting for this step or any child steps
         :type disable_reporting: bool
+        :param max_workers: The number of threads processing the items from get_iterator()
+        :type max_workers: int
+        :param parallel: Whether this step may be processed at the same time as adjacent sibling
+                         steps that are also parallel
+        :type parallel: bool
         """
         self.status_conduit = status_conduit
         self.uuid = str(uuid.uuid4())
@@ -105,6 +153,14 @@ class Step(object):
         self.non_halting_exceptions = non_halting_exceptions or []
         self.exceptions = []
         self.disable_reporting = disable_reporting
+        self.max_workers = max_workers
+        self.parallel = parallel
+        # thread local state of the item being processed, while items are processed concurrently
+        self._item_state = None
+        # _timing_sample() results from when process() started and finished
+        self._timing_start = None
+        self._timing_end = None
+        self._profiler = None
 
     def add_child(self, step):
         """
@@ -154,12 +210,66 @@ class Step(object):
         * post_process
         """
         try:
-            # Process the steps in post order
-            for step in _post_order(self):
-                step.process()
+            self._process_tree()
         finally:
             self.report_progress(force=True)
 
+    def _process_tree(self):
+        """
+        Process the children of this step in post order, followed by this step. Consecutive
+        parallel children are processed at the same time.
+        """
+        group = []
+        for step in self.children:
+            if step.parallel:
+                group.append(step)
+                continue
+            self._process_parallel_steps(group)
+            group = []
+            step._process_tree()
+        self._process_parallel_steps(group)
+        self.process()
+
+    @staticmethod
+    def _process_parallel_steps(steps):
+        """
+        Process the trees of the given steps, each in its own thread, and wait for all of them
+        to finish. The first exception raised by any of them is then re-raised.
+
+        :param steps: The steps to process
+        :type steps: list of Step
+        """
+        if len(steps) < 2:
+            for step in steps:
+                step._process_tree()
+            return
+
+        for step in steps:
+            step._prepare_threads()
+        errors = []
+
+        def process_tree(step):
+            try:
+                step._process_tree()
+            except Exception:
+                errors.append(sys.exc_info())
+
+        threads = [threading.Thread(target=process_tree, args=(step,)) for step in steps]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0][0], errors[0][1], errors[0][2]
+
+    def _prepare_threads(self):
+        """
+        Called on the thread running the task before this step is processed by other threads.
+        Anything that can only be looked up from the task's own thread, such as its working
+        directory, must be looked up here.
+        """
+        pass
+
     def is_skipped(self):
         """
         Test to find out if the step should be skipped.
@@ -215,7 +325,16 @@ class Step(object):
             return
 
         self.state = reporting_constants.STATE_RUNNING
+        self._start_timing()
+        try:
+            self._process()
+        finally:
+            self._stop_timing()
 
+    def _process(self):
+        """
+        The body of process(), which is timed and profiled.
+        """
         try:
             try:
                 self.total_units = self._get_total()
@@ -223,7 +342,13 @@ class Step(object):
                 self.initialize()
                 self.report_progress()
                 item_iterator = self.get_iterator()
-                if item_iterator is not None:
+                if item_iterator is not None and self.max_workers > 1:
+                    self._process_items_concurrently(item_iterator)
+                    self.progress_details = ""
+                    if self.exceptions:
+                        raise PulpCodedTaskFailedException(error_code=error_codes.PLP0032,
+                                                           task_id=self.status_conduit.task_id)
+                elif item_iterator is not None:
                     # We are using a generator and will call _process_block for each item
                     for item in item_iterator:
                         if self.canceled:
@@ -273,6 +398,72 @@ class Step(object):
 
         self.state = reporting_constants.STATE_COMPLETE
 
+    def _start_timing(self):
+        """
+        Start timing this step, and profiling it if its type is configured to be profiled.
+        """
+        self._timing_start = _timing_sample()
+        self._timing_end = None
+        step_types = pulp_config.config.get('profiling', 'step_types')
+        if self.step_id in [step_type.strip() for step_type in step_types.split(',')]:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def _stop_timing(self):
+        """
+        Stop timing this step, and write out its profile if it was profiled.
+        """
+        self._timing_end = _timing_sample()
+        if self._profiler is None:
+            return
+        self._profiler.disable()
+        profile_path = '%s-%s.prof' % (self.step_id, self.uuid)
+        try:
+            try:
+                profile_dir = self._profile_dir()
+            except RuntimeError:
+                # the working directory cannot be looked up outside of the celery task's thread
+                profile_dir = tempfile.gettempdir()
+            profile_path = os.path.join(profile_dir, profile_path)
+            self._profiler.dump_stats(profile_path)
+            _logger.info(_('Wrote profile of step {step} to {path}').format(step=self.step_id,
+                                                                            path=profile_path))
+        except (IOError, OSError), e:
+            _logger.warning(_('Could not write profile of step {step} to {path}: {error}').format(
+                step=self.step_id, path=profile_path, error=e))
+        self._profiler = None
+
+    def _profile_dir(self):
+        """
+        :return: the directory profiles of this step are written to
+        :rtype:  str
+        """
+        return common_utils.get_working_directory()
+
+    def get_timing(self):
+        """
+        Return how long processing this step has taken so far, and how much work it did
+
+        :return: wall_time and cpu_time in seconds, items_per_second, and database_commands
+                 (None if they cannot be counted); None if the step has not started
+        :rtype:  dict or None
+        """
+        if self._timing_start is None:
+            return None
+        start = self._timing_start
+        end = self._timing_end or _timing_sample()
+        wall_time = end[0] - start[0]
+        processed = self.progress_successes + self.progress_failures
+        timing = {
+            'wall_time': wall_time,
+            'cpu_time': end[1] - start[1],
+            'items_per_second': processed / wall_time if wall_time > 0 else None,
+            'database_commands': None,
+        }
+        if start[2] is not None and end[2] is not None:
+            timing['database_commands'] = end[2] - start[2]
+        return timing
+
     def on_error(self):
         """
         this block is called if a child step raised an exception
@@ -296,6 +487,83 @@ class Step(object):
             self.progress_successes += 1
         self.report_progress()
 
+    def _process_items_concurrently(self, item_iterator):
+        """
+        This is part of the workflow internals that should not be overridden unless you are sure of
+        what you are doing. Pass each item to process_main() using max_workers threads.
+
+        No more items are started once the step is canceled or an item raises an exception that
+        is not one of the non_halting_exceptions. That exception is re-raised once the items that
+        were already started have finished.
+
+        :param item_iterator: The items to process
+        :type item_iterator: iterator
+        """
+        items = Queue.Queue(maxsize=self.max_workers * 2)
+        errors = []
+
+        def work():
+            while True:
+                item = items.get()
+                if item is _NO_MORE_ITEMS:
+                    return
+                if self.canceled or errors:
+                    continue
+                try:
+                    self._process_concurrent_block(item)
+                except Exception:
+                    errors.append(sys.exc_info())
+
+        self._prepare_threads()
+        self._item_state = threading.local()
+        threads = [threading.Thread(target=work) for i in range(self.max_workers)]
+        for thread in threads:
+            thread.setDaemon(True)
+            thread.start()
+        try:
+            for item in item_iterator:
+                if self.canceled or errors:
+                    break
+                items.put(item)
+        finally:
+            for thread in threads:
+                items.put(_NO_MORE_ITEMS)
+            for thread in threads:
+                thread.join()
+            self._item_state = None
+
+        if errors:
+            raise errors[0][0], errors[0][1], errors[0][2]
+
+    def _process_concurrent_block(self, item):
+        """
+        The counterpart of _process_block() for items processed concurrently.
+
+        :param item: The item to process
+        :type item: object
+        """
+        self._item_state.failed = False
+        try:
+            # Need to keep backwards compatibility
+            if item:
+                self.process_main(item=item)
+            else:
+                self.process_main()
+        except Exception as e:
+            for exception in self.non_halting_exceptions:
+                if isinstance(e, exception):
+                    with _PROGRESS_LOCK:
+                        self._record_failure(e=e)
+                        self.exceptions.append(e)
+                    return
+            raise
+
+        with _PROGRESS_LOCK:
+            if not self._item_state.failed and \
+                    self.progress_successes + self.progress_failures < self.get_total():
+                self.progress_successes += 1
+            self.report_progress()
+
     def _get_total(self):
         """
         DEPRECATED in favor of get_total()
@@ -321,21 +589,22 @@ class Step(object):
         if self.disable_reporting:
             return
 
-        # Force an update if the step state has changed
-        if self.state != self.last_reported_state:
-            force = True
-            self.last_reported_state = self.state
-        if self.parent:
-            self.parent.report_progress(force)
-        else:
-            if force:
-                self.get_status_conduit().set_progress(self.get_progress_report())
+        with _PROGRESS_LOCK:
+            # Force an update if the step state has changed
+            if self.state != self.last_reported_state:
+                force = True
+                self.last_reported_state = self.state
+            if self.parent:
+                self.parent.report_progress(force)
             else:
-                current_time = time.time()
-                if current_time != self.last_report_time:
-                    # Update at most once a second
+                if force:
                     self.get_status_conduit().set_progress(self.get_progress_report())
-                    self.last_report_time = current_time
+                else:
+                    current_time = time.time()
+                    if current_time != self.last_report_time:
+                        # Update at most once a second
+                        self.get_status_conduit().set_progress(self.get_progress_report())
+                        self.last_report_time = current_time
 
     def get_progress_report(self):
         """
@@ -360,6 +629,9 @@ class Step(object):
             reporting_constants.PROGRESS_DESCRIPTION_KEY: self.description,
             reporting_constants.PROGRESS_DETAILS_KEY: self.progress_details
         }
+        timing = self.get_timing()
+        if timing is not None:
+            report[reporting_constants.PROGRESS_TIMING_KEY] = timing
         if self.children:
             child_reports = []
             for step in self.children:
@@ -380,22 +652,25 @@ class Step(object):
         :param tb: traceback instance (if any)
         :type  tb: Traceback or None
         """
-        self.progress_failures += 1
+        with _PROGRESS_LOCK:
+            self.progress_failures += 1
+            if self._item_state is not None:
+                self._item_state.failed = True
 
-        error_details = {'error': None,
-                         'traceback': None}
+            error_details = {'error': None,
+                             'traceback': None}
 
-        if tb is not None:
-            error_details['traceback'] = '\n'.join(traceback.format_tb(tb))
+            if tb is not None:
+                error_details['traceback'] = '\n'.join(traceback.format_tb(tb))
 
-        if e is not None:
-            error_details['error'] = str(e)
+            if e is not None:
+                error_details['error'] = str(e)
 
-        if error_details.values() != (None, None):
-            self.error_details.append(error_details)
+            if error_details.values() != (None, None):
+                self.error_details.append(error_details)
 
-        if self.parent:
-            self.parent._record_failure()
+            if self.parent:
+                self.parent._record_failure()
 
     def cancel(self):
         """
@@ -465,6 +740,21 @@ class PluginStep(Step):
             self.working_dir = common_utils.get_working_directory()
             return self.working_dir
 
+    def _profile_dir(self):
+        """
+        :return: the directory profiles of this step are written to
+        :rtype:  str
+        """
+        return self.get_working_dir()
+
+    def _prepare_threads(self):
+        """
+        Look up the working directory, which get_working_directory() can only do from the
+        task's own thread. It is stored on this step or its nearest ancestor, where
+        get_working_dir() finds it when called by other threads.
+        """
+        self.get_working_dir()
+
     def get_plugin_type(self):
         """
         Return the plugin type
@@ -861,9 +1151,15 @@ class AtomicDirectoryPublishStep(PluginStep):
             link each file in the source directory to a file with the same name in the target
             directory
     :type only_publish_directory_contents: bool
+    :param incremental: If true, build the new master directory from the source directory by
+            updating a master directory that is no longer published, hardlinking regular files
+            that are unchanged since the last publish and leaving unchanged entries alone, instead
+            of copying the whole source directory. Regular files are considered unchanged when
+            their size and modification time match.
+    :type incremental: bool
     """
     def __init__(self, source_dir, publish_locations, master_publish_dir, step_type=None,
-                 only_publish_directory_contents=False):
+                 only_publish_directory_contents=False, incremental=False):
         step_type = step_type if step_type else reporting_constants.PUBLISH_STEP_DIRECTORY
         super(AtomicDirectoryPublishStep, self).__init__(step_type)
         self.context = None
@@ -871,6 +1167,9 @@ class AtomicDirectoryPublishStep(PluginStep):
         self.publish_locations = publish_locations
         self.master_publish_dir = master_publish_dir
         self.only_publish_directory_contents = only_publish_directory_contents
+        self.incremental = incremental
+        # numbers of entries copied, hardlinked and left alone by the last incremental publish
+        self.copy_counts = None
 
     def process_main(self, item=None):
         """
@@ -886,8 +1185,15 @@ class AtomicDirectoryPublishStep(PluginStep):
         # Given that it is timestamped for this publish/repo we could skip the copytree
         # for items where http & https are published to a separate directory
 
-        _logger.debug('Copying tree from %s to %s' % (self.source_dir, timestamp_master_dir))
-        copytree(self.source_dir, timestamp_master_dir, symlinks=True)
+        skip_list = [self.parent.timestamp]
+        if self.incremental:
+            previous_master = self._build_master_incrementally(timestamp_master_dir)
+            if previous_master:
+                # Keep the previous master so the next publish can update it in place
+                skip_list.append(previous_master)
+        else:
+            _logger.debug('Copying tree from %s to %s' % (self.source_dir, timestamp_master_dir))
+            copytree(self.source_dir, timestamp_master_dir, symlinks=True)
 
         for source_relative_location, publish_location in self.publish_locations:
             if source_relative_location.startswith('/'):
@@ -926,7 +1232,182 @@ class AtomicDirectoryPublishStep(PluginStep):
                     os.rename(tmp_link_name, final_name)
 
         # Clear out any previously published masters
-        misc.clear_directory(self.master_publish_dir, skip_list=[self.parent.timestamp])
+        misc.clear_directory(self.master_publish_dir, skip_list=skip_list)
+
+    def _build_master_incrementally(self, timestamp_master_dir):
+        """
+        Build the master directory for this publish by diffing the source directory against the
+        existing masters.
+
+        The currently published master is the newest one the publish locations link into. It is
+        never modified. If another master is left over, such as the one from the publish before
+        last or one from a publish that failed before its links were switched, no link points
+        into it, so it is renamed to the new master directory and only the entries that differ
+        have to be written. Otherwise the new master starts out empty. Regular files that are
+        unchanged from those in the currently published master are hardlinked to them.
+
+        :param timestamp_master_dir: path of the master directory to build
+        :type  timestamp_master_dir: str
+        :return: name of the currently published master, or None if there is none
+        :rtype:  str or None
+        """
+        masters = []
+        if os.path.isdir(self.master_publish_dir):
+            for name in os.listdir(self.master_publish_dir):
+                path = os.path.join(self.master_publish_dir, name)
+                if name == self.parent.timestamp or os.path.islink(path) or \
+                        not os.path.isdir(path):
+                    continue
+                try:
+                    masters.append((float(name), name))
+                except ValueError:
+                    continue
+        masters.sort(reverse=True)
+
+        published = self._published_masters()
+        previous_master = None
+        spare_master = None
+        for timestamp, name in masters:
+            if name in published:
+                previous_master = previous_master or name
+            else:
+                spare_master = spare_master or name
+        previous_master_dir = None
+        if previous_master:
+            previous_master_dir = os.path.join(self.master_publish_dir, previous_master)
+
+        if spare_master:
+            spare_master_dir = os.path.join(self.master_publish_dir, spare_master)
+            _logger.debug('Updating %s from %s' % (spare_master_dir, self.source_dir))
+            os.rename(spare_master_dir, timestamp_master_dir)
+        else:
+            _logger.debug('Linking tree from %s to %s' % (self.source_dir, timestamp_master_dir))
+            os.makedirs(timestamp_master_dir)
+
+        self.copy_counts = {'copied': 0, 'linked': 0, 'skipped': 0}
+        self._sync_directory(self.source_dir, timestamp_master_dir, previous_master_dir)
+        _logger.info(_('Published {source} with {copied} entries copied, {linked} linked and '
+                       '{skipped} unchanged').format(source=self.source_dir, **self.copy_counts))
+        return previous_master
+
+    def _published_masters(self):
+        """
+        Find the masters that the publish locations currently link into.
+
+        :return: names of the published master directories
+        :rtype:  set of str
+        """
+        master_publish_dir = os.path.normpath(self.master_publish_dir)
+        links = []
+        for source_relative_location, publish_location in self.publish_locations:
+            publish_location = publish_location.rstrip('/')
+            if not self.only_publish_directory_contents:
+                links.append(publish_location)
+            elif os.path.isdir(publish_location) and not os.path.islink(publish_location):
+                links.extend(os.path.join(publish_location, name)
+                             for name in os.listdir(publish_location))
+
+        published = set()
+        for link in links:
+            if not os.path.islink(link):
+                continue
+            target = os.path.normpath(os.path.join(os.path.dirname(link), os.readlink(link)))
+            relative_target = os.path.relpath(target, master_publish_dir)
+            if relative_target == os.curdir or relative_target.startswith(os.pardir):
+                continue
+            published.add(relative_target.split(os.sep)[0])
+        return published
+
+    def _sync_directory(self, source_dir, target_dir, previous_dir):
+        """
+        Make the contents of the target directory match those of the source directory.
+
+        Entries are never modified in place, since regular files in the target directory may be
+        hardlinked to files in a published master. Changed entries are removed and recreated.
+
+        :param source_dir: directory to copy from
+        :type  source_dir: str
+        :param target_dir: existing directory to update
+        :type  target_dir: str
+        :param previous_dir: matching directory in the currently published master, if any
+        :type  previous_dir: str or None
+        """
+        source_names = set(os.listdir(source_dir))
+        for name in os.listdir(target_dir):
+            if name not in source_names:
+                self._remove_entry(os.path.join(target_dir, name))
+
+        for name in sorted(source_names):
+            source_path = os.path.join(source_dir, name)
+            target_path = os.path.join(target_dir, name)
+            previous_path = os.path.join(previous_dir, name) if previous_dir else None
+
+            if os.path.islink(source_path):
+                link_target = os.readlink(source_path)
+                if os.path.islink(target_path) and os.readlink(target_path) == link_target:
+                    self.copy_counts['skipped'] += 1
+                    continue
+                self._remove_entry(target_path)
+                os.symlink(link_target, target_path)
+                self.copy_counts['copied'] += 1
+
+            elif os.path.isdir(source_path):
+                if os.path.islink(target_path) or not os.path.isdir(target_path):
+                    self._remove_entry(target_path)
+                    os.mkdir(target_path)
+                if previous_path and (os.path.islink(previous_path) or
+                                      not os.path.isdir(previous_path)):
+                    previous_path = None
+                self._sync_directory(source_path, target_path, previous_path)
+                shutil.copystat(source_path, target_path)
+
+            else:
+                if self._same_file(source_path, target_path):
+                    self.copy_counts['skipped'] += 1
+                    continue
+                self._remove_entry(target_path)
+                if self._same_file(source_path, previous_path):
+                    try:
+                        os.link(previous_path, target_path)
+                        self.copy_counts['linked'] += 1
+                        continue
+                    except OSError:
+                        # e.g. the hardlink limit of the file was reached
+                        pass
+                misc.copy_file(source_path, target_path)
+                self.copy_counts['copied'] += 1
+
+    @staticmethod
+    def _same_file(source_path, other_path):
+        """
+        :param source_path: path of a regular file
+        :type  source_path: str
+        :param other_path: path to compare with, which may not exist
+        :type  other_path: str or None
+        :return: True if other_path is a regular file with the same size and modification time
+                 as source_path
+        :rtype:  bool
+        """
+        if not other_path or os.path.islink(other_path) or not os.path.isfile(other_path):
+            return False
+        source_stat = os.stat(source_path)
+        other_stat = os.stat(other_path)
+        # copies keep the modification time with less precision, so compare whole seconds
+        return (source_stat.st_size, int(source_stat.st_mtime)) == \
+            (other_stat.st_size, int(other_stat.st_mtime))
+
+    @staticmethod
+    def _remove_entry(path):
+        """
+        Remove a file, symlink or directory tree, if it exists.
+
+        :param path: path to remove
+        :type  path: str
+        """
+        if os.path.islink(path) or os.path.isfile(path):
+            os.unlink(path)
+        elif os.path.isdir(path):
+            shutil.rmtree(path)
 
 
 class SaveTarFilePublishStep(PublishStep):
@@ -968,20 +1449,29 @@ class SaveTarFilePublishStep(PublishStep):
 class CreatePulpManifestStep(Step):
     """
     This will create a PULP_MANIFEST file in the specified directory. This step should be used when
-    the checksums of the files are not already known, because it will read and calculate new
-    checksums for each one.
+    the checksums of the files are not all known, because it will read and calculate new
+    checksums for the others. If a cache path is given, checksums calculated by a previous run
+    are reused for files that have not changed since.
 
-    If you already know the SHA256 checksums of the files going in the manifest, see an example
-    in the FileDistributor that creates this file in a different way.
+    If you already know the SHA256 checksums of all the files going in the manifest, see an
+    example in the FileDistributor that creates this file in a different way.
     """
-    def __init__(self, target_dir):
-        """
-        :param target_dir:  full path to the directory where the PULP_MANIFEST file should
-                            be created
-        :type  target_dir:  basestring
+    def __init__(self, target_dir, known_checksums=None, cache_path=None):
+        """
+        :param target_dir:      full path to the directory where the PULP_MANIFEST file should
+                                be created
+        :type  target_dir:      basestring
+        :param known_checksums: sha256 checksum, size in bytes and modification time of files
+                                whose checksums are already known, keyed by filename
+        :type  known_checksums: dict of basestring: (basestring, int, float)
+        :param cache_path:      full path to a file outside of the published directory tree
+                                where checksums are kept between runs, or None
+        :type  cache_path:      basestring
         """
         super(CreatePulpManifestStep, self).__init__(reporting_constants.STEP_CREATE_PULP_MANIFEST)
         self.target_dir = target_dir
+        self.known_checksums = known_checksums
+        self.cache_path = cache_path
         self.description = _('Creating PULP_MANIFEST')
 
     def process_main(self, item=None):
@@ -990,7 +1480,8 @@ class CreatePulpManifestStep(Step):
 
         :param item:    not used
         """
-        manifest_writer.make_manifest_for_dir(self.target_dir)
+        manifest_writer.build_manifest_for_dir(self.target_dir, self.known_checksums,
+                                               cache_path=self.cache_path)
 
 
 class CopyDirectoryStep(PublishStep):
@@ -1182,11 +1673,11 @@ class GetLocalUnitsStep(SaveUnitsStep):
     available_units attribute, but can be overridden in the constructor.
     """
 
-    def __init__(self, importer_type, unit_pagination_size=50, available_units=None, **kwargs):
+    def __init__(self, importer_type, unit_pagination_size=1000, available_units=None, **kwargs):
         """
         :param importer_type:        unique identifier for the type of importer
         :type  importer_type:        basestring
-        :param unit_pagination_size: How many units should be queried at one time (default 50)
+        :param unit_pagination_size: How many units should be queried at one time (default 1000)
         :type  importer_type:        int
         :param available_units:      An iterable of Units available for retrieval. This defaults to
                                      this step's parent's available_units attribute if not provided.
@@ -136,6 +136,9 @@ _default_values = {
         'download_interval': '30',
         'download_concurrency': '5'
     },
+    'profiling': {
+        'step_types': '',
+    },
 }
 
 # to add a default configuration file, list the full path here
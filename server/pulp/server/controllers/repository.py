@@ -2,7 +2,9 @@ from gettext import gettext as _
 from itertools import chain
 import logging
 import os
+import Queue
 import sys
+import threading
 import time
 from urlparse import urlunsplit
 import uuid
@@ -56,6 +58,19 @@ TYPE_ID = 'type_id'
 UNIT_FILES = 'unit_files'
 REQUEST = 'request'
 
+# number of threads verifying and storing the files downloaded by a LazyUnitDownloadStep
+VERIFICATION_WORKERS = 4
+# number of downloaded files a LazyUnitDownloadStep lets wait for verification before its
+# downloader threads block
+VERIFICATION_QUEUE_SIZE = VERIFICATION_WORKERS * 4
+# number of units a LazyUnitDownloadStep marks as downloaded in one database update
+DOWNLOADED_BATCH_SIZE = 100
+# number of DeferredDownload entries a download_deferred task claims at a time
+DEFERRED_DOWNLOAD_BATCH_SIZE = 100
+# seconds a download_deferred task has to download the units it claimed before other tasks may
+# claim them again
+DEFERRED_DOWNLOAD_LEASE = 3600
+
 
 def get_associated_unit_ids(repo_id, unit_type, repo_content_unit_q=None):
     """
@@ -1219,17 +1234,38 @@ def queue_download_repo(repo_id, verify_all_units=False):
 @celery.task(base=Task)
 def download_deferred():
     """
-    Downloads all the units with entries in the DeferredDownload collection.
+    Downloads the units with entries in the DeferredDownload collection.
+
+    Entries are claimed in batches, most requested first, until none are left unclaimed, so
+    several of these tasks can share the work. An entry is removed once its unit has been
+    downloaded; entries whose download failed can be claimed again once their lease expires.
     """
     task_description = _('Download Cached On-Demand Content')
-    deferred_content_units = _get_deferred_content_units()
-    download_requests = _create_download_requests(deferred_content_units)
-    download_step = LazyUnitDownloadStep(
-        _('on_demand_download'),
-        task_description,
-        download_requests
-    )
-    download_step.start()
+    lease_owner = get_current_task_id() or str(uuid.uuid4())
+    while True:
+        deferred_downloads = model.DeferredDownload.claim(
+            lease_owner,
+            DEFERRED_DOWNLOAD_BATCH_SIZE,
+            DEFERRED_DOWNLOAD_LEASE
+        )
+        if not deferred_downloads:
+            break
+        deferred_content_units = _get_deferred_content_units(deferred_downloads)
+        download_requests = _create_download_requests(deferred_content_units)
+
+        # Nothing can be downloaded for units without catalog entries.
+        requested_units = set((request.data[TYPE_ID], request.data[UNIT_ID])
+                              for request in download_requests)
+        for deferred_download in deferred_downloads:
+            if (deferred_download.unit_type_id, deferred_download.unit_id) not in requested_units:
+                deferred_download.delete()
+
+        download_step = LazyUnitDownloadStep(
+            _('on_demand_download'),
+            task_description,
+            download_requests
+        )
+        download_step.start()
 
 
 @celery.task(base=Task)
@@ -1263,14 +1299,18 @@ def download_repo(repo_id, verify_all_units=False):
     download_step.start()
 
 
-def _get_deferred_content_units():
+def _get_deferred_content_units(deferred_downloads):
     """
-    Retrieve a list of units that have been added to the DeferredDownload collection.
+    Retrieve the units of the given DeferredDownload entries. Entries whose unit no longer
+    exists are removed.
+
+    :param deferred_downloads: The entries to retrieve the units of.
+    :type  deferred_downloads: list of pulp.server.db.model.DeferredDownload
 
     :return: A generator of content units that correspond to DeferredDownload entries.
     :rtype:  generator of pulp.server.db.model.FileContentUnit
     """
-    for deferred_download in model.DeferredDownload.objects.filter():
+    for deferred_download in deferred_downloads:
         try:
             unit_model = plugin_api.get_unit_model_by_id(deferred_download.unit_type_id)
             if unit_model is None:
@@ -1284,6 +1324,7 @@ def _get_deferred_content_units():
             # orphan cleanup.
             _logger.debug(_('Unable to find the {type}:{id} content unit.').format(
                 type=deferred_download.unit_type_id, id=deferred_download.unit_id))
+            deferred_download.delete()
 
 
 def _create_download_requests(content_units):
@@ -1377,6 +1418,11 @@ class LazyUnitDownloadStep(DownloadEventListener):
     A Step that downloads all the given requests. The downloader is configured
     to download from the Pulp Streamer components.
 
+    Downloaded files are handed to a pool of verification threads that check
+    their checksums and move them into place, so that the downloader's threads
+    are free to keep downloading. Units whose files have all been stored are
+    marked as downloaded in batches.
+
     :ivar download_requests: The download requests the step will process.
     :type download_requests: list of nectar.request.DownloadRequest
     :ivar download_config:   The keyword args used to initialize the Nectar
@@ -1419,13 +1465,35 @@ class LazyUnitDownloadStep(DownloadEventListener):
         self.timestamp = str(time.time())
         self.task_id = get_current_task_id()
 
+        # reports of downloaded files waiting to be verified
+        self.verification_queue = Queue.Queue(maxsize=VERIFICATION_QUEUE_SIZE)
+        # guards the progress counters, the download flags of unit files and downloaded_units
+        self.lock = threading.RLock()
+        # ids of units whose files have all been stored, keyed by type id
+        self.downloaded_units = {}
+
     def start(self):
         """
         Start the download process.
         """
         self.state = reporting_constants.STATE_RUNNING
         self.report()
-        self.downloader.download(self.download_requests)
+
+        workers = [threading.Thread(target=self._verify_downloads)
+                   for i in range(VERIFICATION_WORKERS)]
+        for worker in workers:
+            worker.setDaemon(True)
+            worker.start()
+        try:
+            self.downloader.download(self.download_requests)
+        finally:
+            for worker in workers:
+                self.verification_queue.put(None)
+            for worker in workers:
+                worker.join()
+            self._flush_downloaded_units()
+            with self.lock:
+                self.report()
 
     def report(self):
         """
@@ -1478,13 +1546,6 @@ class LazyUnitDownloadStep(DownloadEventListener):
         """
         _logger.debug(_('Starting download of {url}.').format(url=report.url))
 
-        # Remove the deferred entry now that the download has started.
-        query_set = model.DeferredDownload.objects.filter(
-            unit_id=report.data[UNIT_ID],
-            unit_type_id=report.data[TYPE_ID]
-        )
-        query_set.delete()
-
         try:
             # If the file exists and the checksum is valid, don't download it
             path_entry = report.data[UNIT_FILES][report.destination]
@@ -1494,25 +1555,52 @@ class LazyUnitDownloadStep(DownloadEventListener):
                 catalog_entry.checksum_algorithm,
                 catalog_entry.checksum
             )
-            path_entry[PATH_DOWNLOADED] = True
-            self.progress_successes += 1
-            self.report()
             msg = _('{path} has already been downloaded.').format(
                 path=path_entry[CATALOG_ENTRY].path)
             _logger.debug(msg)
             report.data[REQUEST].canceled = True
         except (InvalidChecksumType, VerificationException, IOError):
             # It's either missing or incorrect, so download it
-            pass
+            return
+        self._file_processed(report, True)
+        self._flush_full_batch()
 
     def download_succeeded(self, report):
+        """
+        Queues the downloaded file to be verified and stored by a verification thread.
+
+        Inherited from DownloadEventListener.
+
+        :param report: the report associated with the download request.
+        :type  report: nectar.report.DownloadReport
+        """
+        self.verification_queue.put(report)
+
+    def _verify_downloads(self):
+        """
+        Verification thread loop, processing queued downloads until a None is dequeued.
+        """
+        while True:
+            report = self.verification_queue.get()
+            if report is None:
+                return
+            try:
+                self.verify_download(report)
+            except Exception:
+                _logger.exception(_('Unable to store the download of {path}.').format(
+                    path=report.destination))
+                with self.lock:
+                    report.data[UNIT_FILES][report.destination][PATH_DOWNLOADED] = False
+                    self.progress_failures += 1
+                    self.report()
+            self._flush_full_batch()
+
+    def verify_download(self, report):
         """
         Marks the individual file for the unit as downloaded and moves it into
         its final storage location if its checksum value matches the value in
         the catalog entry (if present).
 
-        Inherited from DownloadEventListener.
-
         :param report: the report associated with the download request.
         :type  report: nectar.report.DownloadReport
         """
@@ -1543,22 +1631,79 @@ class LazyUnitDownloadStep(DownloadEventListener):
                     content_unit.storage_path,
                 )
                 content_unit.import_content(report.destination, location=relative_path)
-            self.progress_successes += 1
-            path_entry[PATH_DOWNLOADED] = True
+            downloaded = True
         except (InvalidChecksumType, VerificationException, IOError), e:
             _logger.debug(_('Download of {path} failed: {reason}.').format(
                 path=catalog_entry.path, reason=str(e)))
-            path_entry[PATH_DOWNLOADED] = False
-            self.progress_failures += 1
-        self.report()
+            downloaded = False
+        self._file_processed(report, downloaded)
+
+    def _file_processed(self, report, downloaded):
+        """
+        Records whether a file of a unit is in place, and queues the unit to be marked as
+        downloaded once all of its files are.
 
-        # Mark the entire unit as downloaded, if necessary.
-        download_flags = [entry[PATH_DOWNLOADED] for entry in
-                          report.data[UNIT_FILES].values()]
-        if all(download_flags):
+        :param report:     the report associated with the download request.
+        :type  report:     nectar.report.DownloadReport
+        :param downloaded: whether the file is in its final storage location
+        :type  downloaded: bool
+        """
+        with self.lock:
+            report.data[UNIT_FILES][report.destination][PATH_DOWNLOADED] = downloaded
+            if downloaded:
+                self.progress_successes += 1
+            else:
+                self.progress_failures += 1
+            self.report()
+
+            # Mark the entire unit as downloaded, if necessary.
+            download_flags = [entry[PATH_DOWNLOADED] for entry in
+                              report.data[UNIT_FILES].values()]
+            if not all(download_flags):
+                return
             _logger.debug(_('Marking content unit {type}:{id} as downloaded.').format(
-                type=content_unit.type_id, id=content_unit.id))
-            unit_qs.update_one(set__downloaded=True)
+                type=report.data[TYPE_ID], id=report.data[UNIT_ID]))
+            unit_ids = self.downloaded_units.setdefault(report.data[TYPE_ID], [])
+            unit_ids.append(report.data[UNIT_ID])
+
+    def _flush_full_batch(self):
+        """
+        Marks the units waiting to be marked as downloaded once there are DOWNLOADED_BATCH_SIZE
+        of them. If the database update fails, they are put back to be marked with a later batch.
+        """
+        with self.lock:
+            if sum(len(ids) for ids in self.downloaded_units.values()) < DOWNLOADED_BATCH_SIZE:
+                return
+            downloaded_units = self.downloaded_units
+            self.downloaded_units = {}
+        try:
+            self._flush_downloaded_units(downloaded_units)
+        except Exception:
+            _logger.exception(_('Unable to mark downloaded content units as downloaded.'))
+            with self.lock:
+                for type_id, unit_ids in downloaded_units.items():
+                    self.downloaded_units.setdefault(type_id, []).extend(unit_ids)
+
+    def _flush_downloaded_units(self, downloaded_units=None):
+        """
+        Marks units as downloaded and removes them from the deferred download queue, with one
+        database update for each unit type.
+
+        :param downloaded_units: ids of the units to update keyed by type id; defaults to
+                                 all units waiting to be marked as downloaded
+        :type  downloaded_units: dict
+        """
+        if downloaded_units is None:
+            with self.lock:
+                downloaded_units = self.downloaded_units
+                self.downloaded_units = {}
+        for type_id, unit_ids in downloaded_units.items():
+            unit_model = plugin_api.get_unit_model_by_id(type_id)
+            unit_model.objects.filter(id__in=unit_ids).update(set__downloaded=True)
+            model.DeferredDownload.objects.filter(
+                unit_type_id=type_id,
+                unit_id__in=unit_ids
+            ).delete()
 
     def download_failed(self, report):
         """
@@ -1574,9 +1719,10 @@ class LazyUnitDownloadStep(DownloadEventListener):
             path_entry = report.data[UNIT_FILES][report.destination]
             _logger.info('Download of {path} failed: {reason}.'.format(
                 path=path_entry[CATALOG_ENTRY].path, reason=report.error_msg))
-            path_entry[PATH_DOWNLOADED] = False
-            self.progress_failures += 1
-            self.report()
+            with self.lock:
+                path_entry[PATH_DOWNLOADED] = False
+                self.progress_failures += 1
+                self.report()
 
     @staticmethod
     def validate_file(file_path, checksum_algorithm, checksum):
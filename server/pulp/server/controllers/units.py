@@ -1,20 +1,22 @@
-import mongoengine
-
 from pulp.plugins.loader import api as plugin_api
 from pulp.plugins.types import database as types_db
 from pulp.plugins.util import misc
 
 
-def find_units(units, pagination_size=50):
+def find_units(units, pagination_size=1000):
     """
     Query for units matching the unit key fields of an iterable of ContentUnit objects.
 
     This requires that all the ContentUnit objects are of the same content type.
 
+    Units are matched on their indexed unit key digest, so each page of units costs a single $in
+    query. The unit key of each unit found is compared with the one requested. Every unit saved
+    has a digest, and migration 0025 sets it on units saved before it was introduced.
+
     :param units: Iterable of content units with the unit key fields specified.
     :type units: iterable of pulp.server.db.model.ContentUnit
     :param pagination_size: How large a page size to use when querying units.
-    :type pagination_size: int (default 50)
+    :type pagination_size: int (default 1000)
 
     :returns: unit models that pulp already knows about.
     :rtype: Generator of pulp.server.db.model.ContentUnit
@@ -23,22 +25,18 @@ def find_units(units, pagination_size=50):
     model_class = None
 
     for units_group in misc.paginate(units, pagination_size):
-        q_object = mongoengine.Q()
-        # Build a query for the units in this group
+        unit_keys = {}
         for unit in units_group:
             if model_class is None:
                 model_class = unit.__class__
-
-            # Build the query for all the units, the | operator here
-            # creates the equivalent of a mongo $or of all the unit keys
-            unit_q_obj = mongoengine.Q(**unit.unit_key)
-            q_object = q_object | unit_q_obj
+            unit_keys[unit.unit_key_lookup_digest()] = unit.unit_key
 
         # Get this group of units
-        query = model_class.objects(q_object)
+        query = model_class.objects(_unit_key_digest__in=unit_keys.keys())
 
         for found_unit in query:
-            yield found_unit
+            if found_unit.unit_key == unit_keys.get(found_unit._unit_key_digest):
+                yield found_unit
 
 
 def get_unit_key_fields_for_type(type_id):
@@ -4,6 +4,7 @@ import copy
 import itertools
 import logging
 import ssl
+import threading
 import time
 from gettext import gettext as _
 
@@ -11,6 +12,12 @@ import mongoengine
 from pymongo.collection import Collection
 from pymongo.errors import AutoReconnect, OperationFailure
 from pymongo.son_manipulator import NamespaceInjector
+try:
+    from pymongo.monitoring import CommandListener, register as register_listener
+except ImportError:
+    # command monitoring was added in pymongo 3.1
+    CommandListener = object
+    register_listener = None
 
 from pulp.common import error_codes
 
@@ -32,6 +39,44 @@ MONGO_WRITE_CONCERN_VERSION = semantic_version.Version("2.6.0")
 _logger = logging.getLogger(__name__)
 
 
+class _CommandCounter(CommandListener):
+    """
+    Counts the commands sent to MongoDB by this process.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        with self._lock:
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+# Listeners only apply to clients created after they are registered, so this happens on import.
+_COMMAND_COUNTER = _CommandCounter()
+if register_listener is not None:
+    register_listener(_COMMAND_COUNTER)
+
+
+def get_command_count():
+    """
+    Return the number of commands, such as queries and updates, this process has sent to MongoDB.
+
+    :return: number of commands sent so far, or None if the installed pymongo cannot count them
+    :rtype:  int or None
+    """
+    if register_listener is None:
+        return None
+    return _COMMAND_COUNTER.count
+
+
 def initialize(name=None, seeds=None, max_pool_size=None, replica_set=None, max_timeout=32):
     """
     Initialize the connection pool and top-level database for pulp. Calling this more than once will
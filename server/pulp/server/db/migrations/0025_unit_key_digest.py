@@ -0,0 +1,52 @@
+"""
+This migration stores the unit key digest on every content unit that is defined with a mongoengine
+model, so that existing units can be looked up by their indexed digest.
+"""
+from pymongo import UpdateOne
+
+from pulp.plugins.loader.manager import PluginManager
+
+
+# number of units updated with each bulk write
+BATCH_SIZE = 1000
+
+
+def migrate(*args, **kwargs):
+    """
+    Perform the migration as described in this module's docblock.
+
+    :param args:   unused
+    :type  args:   list
+    :param kwargs: unused
+    :type  kwargs: dict
+    """
+    plugin_manager = PluginManager()
+    for model_class in plugin_manager.unit_models.values():
+        _migrate_unit_model(model_class)
+
+
+def _migrate_unit_model(model_class):
+    """
+    Set _unit_key_digest on all units of the given model that do not have one yet.
+
+    :param model_class: content unit model whose collection should be migrated
+    :type  model_class: subclass of pulp.server.db.model.ContentUnit
+    """
+    collection = model_class._get_collection()
+    db_fields = dict((name, model_class._fields[name].db_field)
+                     for name in model_class.unit_key_fields)
+    projection = dict((db_field, 1) for db_field in db_fields.values())
+
+    requests = []
+    for document in collection.find({'_unit_key_digest': {'$exists': False}},
+                                    projection=projection):
+        unit_key = dict((name, document.get(db_field)) for name, db_field in db_fields.items())
+        digest = model_class(**unit_key).unit_key_lookup_digest()
+        requests.append(UpdateOne({'_id': document['_id']},
+                                  {'$set': {'_unit_key_digest': digest}}))
+        if len(requests) >= BATCH_SIZE:
+            collection.bulk_write(requests, ordered=False)
+            requests = []
+
+    if requests:
+        collection.bulk_write(requests, ordered=False)
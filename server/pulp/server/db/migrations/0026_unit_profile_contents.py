@@ -0,0 +1,39 @@
+"""
+This migration moves the profile out of each document in the consumer_unit_profiles collection and
+into the consumer_unit_profile_contents collection, which stores each distinct profile once, keyed
+by its profile_hash, along with the number of unit profiles that reference it.
+"""
+from pulp.server.db import connection
+
+
+def migrate(*args, **kwargs):
+    """
+    Perform the migration as described in this module's docblock.
+
+    :param args:   unused
+    :type  args:   list
+    :param kwargs: unused
+    :type  kwargs: dict
+    """
+    db = connection.get_database()
+    unit_profiles = db['consumer_unit_profiles']
+    contents = db['consumer_unit_profile_contents']
+
+    stored_hashes = set()
+    for unit_profile in unit_profiles.find({'profile': {'$exists': True}},
+                                           projection=['profile_hash']):
+        profile_hash = unit_profile['profile_hash']
+        if profile_hash not in stored_hashes:
+            # Only load the profile for the first unit profile with each hash
+            profile = unit_profiles.find_one({'_id': unit_profile['_id']},
+                                             projection=['profile'])['profile']
+            contents.update_one({'_id': profile_hash}, {'$setOnInsert': {'profile': profile}},
+                                upsert=True)
+            stored_hashes.add(profile_hash)
+        unit_profiles.update_one({'_id': unit_profile['_id']}, {'$unset': {'profile': ''}})
+
+    # The references are counted once all profiles are moved, so that the counts are correct even
+    # if a previous run of this migration was interrupted.
+    counts = unit_profiles.aggregate([{'$group': {'_id': '$profile_hash', 'count': {'$sum': 1}}}])
+    for count in counts:
+        contents.update_one({'_id': count['_id']}, {'$set': {'ref_count': count['count']}})
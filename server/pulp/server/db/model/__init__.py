@@ -1,3 +1,4 @@
+from datetime import timedelta
 import copy
 import logging
 import os
@@ -10,7 +11,8 @@ from hashlib import sha256
 from hmac import HMAC
 
 from mongoengine import (BooleanField, DictField, Document, DynamicField, IntField,
-                         ListField, StringField, UUIDField, ValidationError, QuerySetNoCache)
+                         ListField, NotUniqueError, Q, StringField, UUIDField, ValidationError,
+                         QuerySetNoCache)
 from mongoengine import signals
 
 from pulp.common import constants, dateutils, error_codes
@@ -28,7 +30,7 @@ from pulp.server.db.model.reaper_base import ReaperMixin
 from pulp.server.db.model import base
 from pulp.server.db.querysets import CriteriaQuerySet, RepoQuerySet, RepositoryContentUnitQuerySet
 from pulp.server.managers import factory
-from pulp.server.util import Singleton
+from pulp.server.util import calculate_unit_key_digest, Singleton
 from pulp.server.webservices.views import serializers
 
 
@@ -584,6 +586,11 @@ class ContentUnit(AutoRetryDocument):
 
     unit_key_fields must be a tuple of strings, each of which is a valid field name of the subcalss.
 
+    Subclasses that store the checksum of the unit's file may set checksum_field to the name of
+    that field, so that uploads of files Pulp already stores can be skipped. checksum_type_field
+    names the field holding the checksum algorithm; if it is not set, the checksums are assumed to
+    be sha256. The checksum field should be indexed.
+
     :ivar id: content unit id
     :type id: mongoengine.StringField
     :ivar pulp_user_metadata: Bag of User supplied data to go along with this unit
@@ -592,19 +599,28 @@ class ContentUnit(AutoRetryDocument):
     :type _last_updated: mongoengine.IntField
     :ivar _storage_path: The absolute path to associated content files.
     :type _storage_path: mongoengine.StringField
+    :ivar _unit_key_digest: digest of the unit key, as returned by unit_key_lookup_digest()
+    :type _unit_key_digest: mongoengine.StringField
     """
 
     id = StringField(primary_key=True, default=lambda: str(uuid.uuid4()))
     pulp_user_metadata = DictField()
     _last_updated = IntField(required=True)
     _storage_path = StringField()
+    _unit_key_digest = StringField()
 
     meta = {
         'abstract': True,
+        'indexes': [
+            '_unit_key_digest'
+        ]
     }
 
     NAMED_TUPLE = _ContentUnitNamedTupleDescriptor()
 
+    checksum_field = None
+    checksum_type_field = None
+
     @classmethod
     def attach_signals(cls):
         """
@@ -683,7 +699,8 @@ class ContentUnit(AutoRetryDocument):
         """
         The signal that is triggered before a unit is saved, this is used to
         support the legacy behavior of generating the unit id and setting
-        the _last_updated timestamp
+        the _last_updated timestamp. The unit key digest is (re)computed for new
+        units and for units whose unit key fields have changed.
 
         :param sender: sender class
         :type sender: object
@@ -691,6 +708,16 @@ class ContentUnit(AutoRetryDocument):
         :type document: ContentUnit
         """
         document._last_updated = dateutils.now_utc_timestamp()
+        # Units loaded with only() do not carry their unit key, so the digest must not be
+        # recomputed from them unless the unit key itself is being changed.
+        if document._created:
+            document._unit_key_digest = document.unit_key_lookup_digest()
+            return
+        # _get_changed_fields() returns the names the fields are stored under
+        changed_fields = set(document._get_changed_fields())
+        if any(document._fields[name].db_field in changed_fields
+               for name in document.unit_key_fields):
+            document._unit_key_digest = document.unit_key_lookup_digest()
 
     def get_repositories(self):
         """
@@ -775,10 +802,24 @@ class ContentUnit(AutoRetryDocument):
             _hash.update(key)
             if not isinstance(value, basestring):
                 _hash.update(str(value))
+            elif isinstance(value, unicode):
+                _hash.update(value.encode('utf-8'))
             else:
                 _hash.update(value)
         return _hash.hexdigest()
 
+    def unit_key_lookup_digest(self):
+        """
+        The digest of the unit key that is stored in _unit_key_digest and used to look up units.
+
+        Unlike unit_key_as_digest(), each key and value is prefixed with its length, so that
+        different unit keys cannot be hashed from the same input.
+
+        :return: The hex digest of the unit key.
+        :rtype: str
+        """
+        return calculate_unit_key_digest(self.unit_key)
+
     def list_files(self):
         """
         List absolute paths to files associated with this unit.
@@ -1066,13 +1107,27 @@ class LazyCatalogEntry(AutoRetryDocument):
 
 class DeferredDownload(AutoRetryDocument):
     """
-    A collection of units that have been handled by the streamer in the
+    A queue of units that have been handled by the streamer in the
     passive lazy workflow that Pulp should download.
 
-    :ivar unit_id:      The associated content unit ID.
-    :type unit_id:      str
-    :ivar unit_type_id: The associated content unit type.
-    :type unit_type_id: str
+    There is one entry per unit. Workers claim entries with a lease, so that
+    several of them can drain the queue at once, and an entry whose lease
+    expired before its unit was downloaded can be claimed again. Entries are
+    claimed in order of priority, then of the number of times their unit was
+    requested.
+
+    :ivar unit_id:       The associated content unit ID.
+    :type unit_id:       str
+    :ivar unit_type_id:  The associated content unit type.
+    :type unit_type_id:  str
+    :ivar hits:          The number of times the streamer served the unit.
+    :type hits:          int
+    :ivar priority:      Entries with a higher priority are claimed first.
+    :type priority:      int
+    :ivar lease_owner:   The ID of the worker that claimed the entry, if any.
+    :type lease_owner:   str
+    :ivar lease_expires: When the claim on the entry expires, if it is claimed.
+    :type lease_expires: datetime.datetime
     """
     meta = {
         'collection': 'deferred_download',
@@ -1080,16 +1135,72 @@ class DeferredDownload(AutoRetryDocument):
             {
                 'fields': ['unit_id', 'unit_type_id'],
                 'unique': True
-            }
+            },
+            '-priority',
+            '-hits',
         ]
     }
 
     unit_id = StringField(required=True)
     unit_type_id = StringField(required=True)
+    hits = IntField(default=1)
+    priority = IntField(default=0)
+    lease_owner = StringField()
+    lease_expires = UTCDateTimeField()
 
     # For backward compatibility
     _ns = StringField(default='deferred_download')
 
+    @classmethod
+    def record_hit(cls, unit_id, unit_type_id):
+        """
+        Add the unit to the queue, or count another request for it if it is already queued.
+
+        :param unit_id:      The ID of the content unit.
+        :type  unit_id:      str
+        :param unit_type_id: The type of the content unit.
+        :type  unit_type_id: str
+        """
+        query_set = cls.objects(unit_id=unit_id, unit_type_id=unit_type_id)
+        try:
+            query_set.update_one(inc__hits=1, set_on_insert__priority=0,
+                                 set_on_insert___ns='deferred_download', upsert=True)
+        except NotUniqueError:
+            # Another request inserted the entry after the update failed to find it.
+            query_set.update_one(inc__hits=1)
+
+    @classmethod
+    def claim(cls, owner, count, lease_seconds):
+        """
+        Claim up to `count` of the entries that are not currently claimed, each with a lease
+        that expires after `lease_seconds`. Each entry is claimed atomically, so concurrent
+        workers never claim the same entry.
+
+        :param owner:         The ID of the worker claiming the entries.
+        :type  owner:         str
+        :param count:         The maximum number of entries to claim.
+        :type  count:         int
+        :param lease_seconds: How long the worker may take to download the claimed units.
+        :type  lease_seconds: int
+
+        :return: The claimed entries, highest priority first.
+        :rtype:  list of DeferredDownload
+        """
+        entries = []
+        for i in range(count):
+            now = dateutils.now_utc_datetime_with_tzinfo()
+            unclaimed = cls.objects(Q(lease_expires=None) | Q(lease_expires__lte=now),
+                                    id__nin=[entry.id for entry in entries])
+            entry = unclaimed.order_by('-priority', '-hits').modify(
+                set__lease_owner=owner,
+                set__lease_expires=now + timedelta(seconds=lease_seconds),
+                new=True
+            )
+            if entry is None:
+                break
+            entries.append(entry)
+        return entries
+
 
 class User(AutoRetryDocument):
     """
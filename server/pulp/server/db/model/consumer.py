@@ -12,12 +12,11 @@
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
 import datetime
-import hashlib
-import json
 
 from pulp.server.db.model.base import Model
 from pulp.server.db.model.reaper_base import ReaperMixin
 from pulp.common import dateutils
+from pulp.common.util import calculate_profile_hash
 
 
 # -- classes -----------------------------------------------------------------
@@ -257,6 +256,10 @@ class UnitProfile(Model):
     installed RPMs in some repeatable fashion, such that any two consumers that have exactly the
     same RPMs installed will end up with the same ordering of their RPMs in the database.
 
+    The profile itself is not stored in this collection. Many consumers report identical profiles,
+    so the ProfileManager stores each distinct profile once as a UnitProfileContent, keyed by its
+    profile_hash, and adds the profile back to the unit profiles it returns.
+
     :ivar  consumer_id:  A consumer ID.
     :type consumer_id:  str
     :ivar  content_type: The profile (unit) type ID.
@@ -265,6 +268,9 @@ class UnitProfile(Model):
     :type profile:      object
     :ivar  profile_hash: A hash of the profile, used for quick comparisons of profiles
     :type profile_hash: basestring
+    :ivar  reported_hash: A hash of the profile as reported by the consumer, before the
+                          profiler updated it; used to tell whether a consumer's profile changed
+    :type reported_hash: basestring
     """
 
     collection_name = 'consumer_unit_profiles'
@@ -272,7 +278,8 @@ class UnitProfile(Model):
         ('consumer_id', 'content_type'),
     )
 
-    def __init__(self, consumer_id, content_type, profile, profile_hash=None):
+    def __init__(self, consumer_id, content_type, profile, profile_hash=None,
+                 reported_hash=None):
         """
         :param consumer_id:  A consumer ID.
         :type  consumer_id:  str
@@ -284,12 +291,15 @@ class UnitProfile(Model):
                              None, the constructor will automatically calculate it based on the
                              profile.
         :type  profile_hash: basestring
+        :param reported_hash: A hash of the profile as reported by the consumer, if known.
+        :type  reported_hash: basestring
         """
         super(UnitProfile, self).__init__()
         self.consumer_id = consumer_id
         self.content_type = content_type
         self.profile = profile
         self.profile_hash = profile_hash
+        self.reported_hash = reported_hash
 
         if self.profile_hash is None:
             self.profile_hash = self.calculate_hash(self.profile)
@@ -305,10 +315,42 @@ class UnitProfile(Model):
         :return:        Hash of profile
         :rtype:         basestring
         """
-        # Don't use any whitespace in the json separators, and sort dictionary keys to be repeatable
-        serialized_profile = json.dumps(profile, separators=(',', ':'), sort_keys=True)
-        hasher = hashlib.sha256(serialized_profile)
-        return hasher.hexdigest()
+        return calculate_profile_hash(profile)
+
+
+class UnitProfileContent(Model):
+    """
+    Stores the body of a unit profile once for all the UnitProfiles that have its profile_hash.
+
+    :ivar _id:       The hash of the profile, as calculated by UnitProfile.calculate_hash
+    :type _id:       basestring
+    :ivar profile:   The stored profile.
+    :type profile:   object
+    :ivar ref_count: The number of UnitProfiles with this profile_hash. The profile is removed
+                     when no UnitProfile references it.
+    :type ref_count: int
+    """
+
+    collection_name = 'consumer_unit_profile_contents'
+    # The profile_hash is the _id, which is already unique and indexed.
+    unique_indices = ()
+
+    def __init__(self, profile_hash, profile, ref_count=0):
+        """
+        :param profile_hash: The hash of the profile.
+        :type  profile_hash: basestring
+        :param profile:      The stored profile.
+        :type  profile:      object
+        :param ref_count:    The number of UnitProfiles with this profile_hash.
+        :type  ref_count:    int
+        """
+        super(UnitProfileContent, self).__init__()
+        self._id = profile_hash
+        self.profile = profile
+        self.ref_count = ref_count
+
+        # The superclass puts an id attribute on this model, but the profile_hash is the ID.
+        del self.id
 
 
 class ConsumerHistoryEvent(Model, ReaperMixin):
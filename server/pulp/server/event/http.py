@@ -6,56 +6,224 @@ url
   Full URL to contact with the event data. A POST request will be made to this
   URL with the contents of the events in the body.
 
+batch_size
+  Optional. When greater than 1, up to this many queued events are sent in a
+  single POST whose body is a JSON list of events. Only set this when the
+  receiver accepts such lists.
+
 Eventually this should be enhanced to support authentication credentials as well.
+
+Events are not posted by the task that fires them. Each distinct notifier
+configuration gets a bounded queue, drained by a small pool of threads that
+share one requests session, so connections to the receiver are reused and a
+burst of events cannot spawn an unbounded number of threads or connections.
 """
 from gettext import gettext as _
 import logging
+import os
+import Queue
 import threading
+import time
 
 from pulp.server.compat import json, json_util
 
-from requests import post
+from requests import RequestException, Session
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 
 
 TYPE_ID = 'http'
 
+# number of threads posting events for each notifier configuration
+WORKER_COUNT = 4
+# number of events that may wait to be posted for each notifier configuration
+QUEUE_SIZE = 1000
+# seconds to wait for room in a full queue before the event is dropped
+ENQUEUE_TIMEOUT = 30
+# (connect, read) timeouts in seconds for each POST
+REQUEST_TIMEOUT = (10, 30)
+# number of times a POST is retried after a connection error or a 5xx response
+MAX_RETRIES = 3
+# seconds to wait before the first retry; doubled for each following retry
+RETRY_BACKOFF = 1
+
 _logger = logging.getLogger(__name__)
 
-
-def handle_event(notifier_config, event):
-    # fire the actual http push function off in a separate thread to keep
-    # pulp from blocking or deadlocking due to the tasking subsystem
-    json_body = json.dumps(event.data(), default=json_util.default)
-    _logger.info(json_body)
-    thread = threading.Thread(target=_send_post, args=[notifier_config, json_body])
-    thread.setDaemon(True)
-    thread.start()
+# notifiers keyed by (url, username, password, batch_size), see _get_notifier()
+_NOTIFIERS = {}
+_NOTIFIERS_LOCK = threading.Lock()
 
 
-def _send_post(notifier_config, json_body):
+def handle_event(notifier_config, event):
     """
-    Sends a POST request with the given data to the configured notifier url.
+    Queue the event to be posted to the configured URL.
+
+    The POST itself happens in a separate thread to keep pulp from blocking or
+    deadlocking due to the tasking subsystem. If the queue for the URL is full,
+    this blocks for up to ENQUEUE_TIMEOUT seconds before dropping the event.
 
     :param notifier_config: The configuration for the HTTP notifier. This should
-                            contain the 'url' key, and optional 'username' and
-                            'password' keys.
-    :type notifier_config:  dict
-    :param json_body:       The POST data that has been serialized to JSON.
-    :param json_body:       dict
+                            contain the 'url' key, and optional 'username',
+                            'password' and 'batch_size' keys.
+    :type  notifier_config: dict
+    :param event:           event to send
+    :type  event:           pulp.server.event.data.Event
     """
+    json_body = json.dumps(event.data(), default=json_util.default)
+    _logger.info(json_body)
+
     if 'url' not in notifier_config or not notifier_config['url']:
         _logger.error(_('HTTP notifier configured without a URL; cannot fire event'))
         return
-    url = notifier_config['url']
-
-    # Process authentication
-    if 'username' in notifier_config and 'password' in notifier_config:
-        auth = HTTPBasicAuth(notifier_config['username'], notifier_config['password'])
-    else:
-        auth = None
-
-    response = post(url, data=json_body, auth=auth, headers={'Content-Type': 'application/json'})
-    if response.status_code != 200:
-        _logger.error(_('Received HTTP {code} from HTTP notifier to {url}.').format(
-            code=response.status_code, url=url))
+
+    _get_notifier(notifier_config).enqueue(json_body)
+
+
+def _get_notifier(notifier_config):
+    """
+    Return the notifier for the given configuration, creating it if necessary.
+
+    Notifiers are not shared with child processes, since their threads do not
+    survive a fork.
+
+    :param notifier_config: The configuration for the HTTP notifier.
+    :type  notifier_config: dict
+    :return: notifier that posts to the configured URL
+    :rtype:  _Notifier
+    """
+    batch_size = notifier_config.get('batch_size') or 1
+    try:
+        batch_size = max(int(batch_size), 1)
+    except (TypeError, ValueError):
+        _logger.error(_('Invalid batch_size [{size}] for HTTP notifier to {url}; events will '
+                        'not be batched.').format(size=batch_size, url=notifier_config['url']))
+        batch_size = 1
+
+    key = (notifier_config['url'], notifier_config.get('username'),
+           notifier_config.get('password'), batch_size)
+    with _NOTIFIERS_LOCK:
+        notifier = _NOTIFIERS.get(key)
+        if notifier is None or notifier.pid != os.getpid():
+            if 'username' in notifier_config and 'password' in notifier_config:
+                auth = HTTPBasicAuth(notifier_config['username'], notifier_config['password'])
+            else:
+                auth = None
+            notifier = _Notifier(notifier_config['url'], auth, batch_size)
+            _NOTIFIERS[key] = notifier
+        return notifier
+
+
+class _Notifier(object):
+    """
+    Posts queued events to a single URL from a pool of worker threads.
+
+    :ivar url: URL the events are posted to
+    :type url: basestring
+    :ivar batch_size: maximum number of events sent in one POST; when greater
+                      than 1, every POST body is a JSON list of events
+    :type batch_size: int
+    :ivar pid: ID of the process that created this notifier
+    :type pid: int
+    """
+
+    def __init__(self, url, auth, batch_size=1):
+        """
+        :param url: URL the events are posted to
+        :type  url: basestring
+        :param auth: credentials to send with each POST, if any
+        :type  auth: requests.auth.AuthBase or None
+        :param batch_size: maximum number of events sent in one POST
+        :type  batch_size: int
+        """
+        self.url = url
+        self.batch_size = batch_size
+        self.pid = os.getpid()
+        self.queue = Queue.Queue(maxsize=QUEUE_SIZE)
+
+        self.session = Session()
+        self.session.auth = auth
+        self.session.headers['Content-Type'] = 'application/json'
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=WORKER_COUNT)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        for i in range(WORKER_COUNT):
+            thread = threading.Thread(target=self._run)
+            thread.setDaemon(True)
+            thread.start()
+
+    def enqueue(self, json_body):
+        """
+        Queue an event to be posted, waiting for room if the queue is full.
+
+        :param json_body: event serialized to JSON
+        :type  json_body: basestring
+        """
+        try:
+            self.queue.put(json_body, timeout=ENQUEUE_TIMEOUT)
+        except Queue.Full:
+            _logger.error(_('Too many events are waiting to be sent by the HTTP notifier to '
+                            '{url}; dropping event.').format(url=self.url))
+
+    def _run(self):
+        """
+        Worker thread loop, posting queued events until the process exits.
+        """
+        while True:
+            bodies = self._next_batch()
+            try:
+                if self.batch_size > 1:
+                    self._send_post('[%s]' % ', '.join(bodies))
+                else:
+                    self._send_post(bodies[0])
+            except Exception:
+                _logger.exception(_('Error sending event to HTTP notifier at {url}.').format(
+                    url=self.url))
+            finally:
+                for body in bodies:
+                    self.queue.task_done()
+
+    def _next_batch(self):
+        """
+        Wait for the next event, then take up to batch_size - 1 more events that
+        are already queued.
+
+        :return: events serialized to JSON
+        :rtype:  list of basestring
+        """
+        bodies = [self.queue.get()]
+        while len(bodies) < self.batch_size:
+            try:
+                bodies.append(self.queue.get_nowait())
+            except Queue.Empty:
+                break
+        return bodies
+
+    def _send_post(self, data):
+        """
+        Sends a POST request with the given data to the notifier url, retrying
+        connection errors and server errors.
+
+        :param data: The POST data that has been serialized to JSON.
+        :type  data: basestring
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            if attempt:
+                time.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+            try:
+                response = self.session.post(self.url, data=data, timeout=REQUEST_TIMEOUT)
+            except RequestException, e:
+                error = str(e)
+                continue
+            if response.status_code == 200:
+                return
+            msg = _('Received HTTP {code} from HTTP notifier to {url}.').format(
+                code=response.status_code, url=self.url)
+            if response.status_code < 500:
+                _logger.error(msg)
+                return
+            error = msg
+
+        _logger.error(_('Giving up sending event to HTTP notifier at {url} after {count} '
+                        'attempts: {error}').format(url=self.url, count=MAX_RETRIES + 1,
+                                                    error=error))
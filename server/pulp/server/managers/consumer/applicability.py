@@ -14,7 +14,8 @@ from pulp.plugins.loader import api as plugin_api, exceptions as plugin_exceptio
 from pulp.plugins.profiler import Profiler
 from pulp.server.async.tasks import Task
 from pulp.server.db import model
-from pulp.server.db.model.consumer import Bind, RepoProfileApplicability, UnitProfile
+from pulp.server.db.model.consumer import (Bind, RepoProfileApplicability, UnitProfile,
+                                           UnitProfileContent)
 from pulp.server.db.model.criteria import Criteria
 from pulp.server.managers import factory as managers
 from pulp.server.managers.consumer.query import ConsumerQueryManager
@@ -23,6 +24,10 @@ from pulp.plugins.util.misc import paginate
 
 _logger = getLogger(__name__)
 
+# number of consumers whose profiles and bindings are queried at a time when retrieving
+# consumer applicability
+CONSUMER_BATCH_SIZE = 1000
+
 
 class ApplicabilityRegenerationManager(object):
     @staticmethod
@@ -51,29 +56,21 @@ class ApplicabilityRegenerationManager(object):
         # Get all unit profiles associated with given consumers
         unit_profile_criteria = Criteria(
             filters={'consumer_id': {'$in': consumer_ids}},
-            fields=['consumer_id', 'profile_hash', 'content_type', 'id'])
+            fields=['consumer_id', 'profile_hash', 'content_type'])
         all_unit_profiles = consumer_profile_manager.find_by_criteria(unit_profile_criteria)
 
         # Create a consumer-profile map with consumer id as the key and list of tuples
         # with profile details as the value
         consumer_unit_profiles_map = {}
-        # Also create a map of profile_id keyed by profile_hash for profile lookup.
-        profile_hash_profile_id_map = {}
         for unit_profile in all_unit_profiles:
             profile_hash = unit_profile['profile_hash']
             content_type = unit_profile['content_type']
             consumer_id = unit_profile['consumer_id']
-            profile_id = unit_profile['id']
 
             profile_tuple = (profile_hash, content_type)
             # Add this tuple to the list of profile tuples for a consumer
             consumer_unit_profiles_map.setdefault(consumer_id, []).append(profile_tuple)
 
-            # We need just one profile_id per profile_hash to be used in regenerate_applicability
-            # method to get the actual profile corresponding to given profile_hash.
-            if profile_hash not in profile_hash_profile_id_map:
-                profile_hash_profile_id_map[profile_hash] = profile_id
-
         # Get all repos bound to given consumers
         bind_criteria = Criteria(filters={'consumer_id': {'$in': consumer_ids}},
                                  fields=['repo_id', 'consumer_id'])
@@ -95,16 +92,26 @@ class ApplicabilityRegenerationManager(object):
         # Iterate through each tuple in repo_profile_hashes set and regenerate applicability,
         # if it doesn't exist. These are all guaranteed to be unique tuples because of the logic
         # used to create maps and sets above, eliminating multiple unnecessary queries
-        # to check for existing applicability for same profiles.
+        # to check for existing applicability for same profiles. The tuples are sorted by
+        # profile_hash, so each distinct profile is loaded only once, and only one profile is
+        # held in memory at a time.
         manager = managers.applicability_regeneration_manager()
-        for repo_id, (profile_hash, content_type) in repo_profile_hashes:
+        loaded_hash = profile = None
+        for repo_id, (profile_hash, content_type) in sorted(repo_profile_hashes,
+                                                            key=lambda r: r[1]):
             # Check if applicability for given profile_hash and repo_id already exists
             if ApplicabilityRegenerationManager._is_existing_applicability(repo_id, profile_hash):
                 continue
+            if profile_hash != loaded_hash:
+                loaded_hash = profile_hash
+                profile = ApplicabilityRegenerationManager._get_profile(profile_hash)
+            if profile is None:
+                # The consumer's profile changed since the unit profiles were queried
+                continue
             # If applicability does not exist, generate applicability data for given profile
             # and repo id.
-            profile_id = profile_hash_profile_id_map[profile_hash]
-            manager.regenerate_applicability(profile_hash, content_type, profile_id, repo_id)
+            manager.regenerate_applicability(profile_hash, content_type, repo_id,
+                                             profile=profile)
 
     @staticmethod
     def regenerate_applicability_for_repos(repo_criteria):
@@ -130,8 +137,7 @@ class ApplicabilityRegenerationManager(object):
                 existing_applicability = RepoProfileApplicability(**dict(existing_applicability))
                 profile_hash = existing_applicability['profile_hash']
                 unit_profile = UnitProfile.get_collection().find_one({'profile_hash': profile_hash},
-                                                                     projection=['id',
-                                                                                 'content_type'])
+                                                                     projection=['content_type'])
                 if unit_profile is None:
                     # Unit profiles change whenever packages are installed or removed on consumers,
                     # and it is possible that existing_applicability references a UnitProfile
@@ -141,8 +147,7 @@ class ApplicabilityRegenerationManager(object):
 
                 # Regenerate applicability data for given unit_profile and repo id
                 ApplicabilityRegenerationManager.regenerate_applicability(
-                    profile_hash, unit_profile['content_type'], unit_profile['id'], repo_id,
-                    existing_applicability)
+                    profile_hash, unit_profile['content_type'], repo_id, existing_applicability)
 
     @staticmethod
     def queue_regenerate_applicability_for_repos(repo_criteria):
@@ -189,7 +194,7 @@ class ApplicabilityRegenerationManager(object):
             existing_applicability = RepoProfileApplicability(**dict(existing_applicability))
             profile_hash = existing_applicability['profile_hash']
             unit_profile = UnitProfile.get_collection().find_one({'profile_hash': profile_hash},
-                                                                 projection=['id', 'content_type'])
+                                                                 projection=['content_type'])
             if unit_profile is None:
                 # Unit profiles change whenever packages are installed or removed on consumers,
                 # and it is possible that existing_applicability references a UnitProfile
@@ -199,12 +204,11 @@ class ApplicabilityRegenerationManager(object):
 
             # Regenerate applicability data for given unit_profile and repo id
             ApplicabilityRegenerationManager.regenerate_applicability(
-                profile_hash, unit_profile['content_type'], unit_profile['id'], repo_id,
-                existing_applicability)
+                profile_hash, unit_profile['content_type'], repo_id, existing_applicability)
 
     @staticmethod
-    def regenerate_applicability(profile_hash, content_type, profile_id,
-                                 bound_repo_id, existing_applicability=None):
+    def regenerate_applicability(profile_hash, content_type, bound_repo_id,
+                                 existing_applicability=None, profile=None):
         """
         Regenerate and save applicability data for given profile and bound repo id.
         If existing_applicability is not None, replace it with the new applicability data.
@@ -215,15 +219,15 @@ class ApplicabilityRegenerationManager(object):
         :param content_type: profile (unit) type ID
         :type content_type: str
 
-        :param profile_id: unique id of the unit profile
-        :type profile_id: str
-
         :param bound_repo_id: repo id to be used to calculate applicability
                               against the given unit profile
         :type bound_repo_id: str
 
         :param existing_applicability: existing RepoProfileApplicability object to be replaced
         :type existing_applicability: pulp.server.db.model.consumer.RepoProfileApplicability
+
+        :param profile: the profile with the given hash, if the caller has already loaded it
+        :type profile: object
         """
         profiler_conduit = ProfilerConduit()
         # Get the profiler for content_type of given unit_profile
@@ -241,13 +245,13 @@ class ApplicabilityRegenerationManager(object):
         # Get the intersection of existing types in the repo and the types that the profiler
         # handles. If the intersection is not empty, regenerate applicability
         if (set(repo_content_types) & set(profiler.metadata()['types'])):
-            # Get the actual profile for existing_applicability or lookup using profile_id
+            # Get the actual profile for existing_applicability or lookup using profile_hash
             if existing_applicability:
                 profile = existing_applicability.profile
-            else:
-                unit_profile = UnitProfile.get_collection().find_one({'id': profile_id},
-                                                                     projection=['profile'])
-                profile = unit_profile['profile']
+            elif profile is None:
+                profile = ApplicabilityRegenerationManager._get_profile(profile_hash)
+                if profile is None:
+                    return
             call_config = PluginCallConfiguration(plugin_config=profiler_cfg,
                                                   repo_plugin_config=None)
             try:
@@ -268,7 +272,7 @@ class ApplicabilityRegenerationManager(object):
                 # Create a new RepoProfileApplicability object and save it in the db
                 RepoProfileApplicability.objects.create(profile_hash,
                                                         bound_repo_id,
-                                                        unit_profile['profile'],
+                                                        profile,
                                                         applicability)
 
     @staticmethod
@@ -293,6 +297,21 @@ class ApplicabilityRegenerationManager(object):
                 repo_content_types_with_non_zero_unit_count.append(content_type)
         return repo_content_types_with_non_zero_unit_count
 
+    @staticmethod
+    def _get_profile(profile_hash):
+        """
+        Load the stored profile with the given hash.
+
+        :param profile_hash: unit profile hash
+        :type profile_hash:  basestring
+        :return:             the profile, or None if no unit profile has this hash anymore
+        :rtype:              object
+        """
+        content = UnitProfileContent.get_collection().find_one({'_id': profile_hash},
+                                                               projection=['profile'])
+        if content is not None:
+            return content['profile']
+
     @staticmethod
     def _is_existing_applicability(repo_id, profile_hash):
         """
@@ -476,6 +495,11 @@ def retrieve_consumer_applicability(consumer_criteria, content_types=None):
      {'consumers': ['consumer_2', 'consumer_3'],
       'applicability': {'content_type_1': ['unit_1', 'unit_2']}}]
 
+    Consumers with the same profiles that are bound to the same repositories have the same
+    applicability, so consumers are first grouped by their profile hashes and repo ids, their
+    "signature". Applicability data is then fetched and merged once for each group of signatures
+    it applies to, rather than once for each consumer.
+
     :param consumer_ids:  A list of consumer ids that the applicability data should be retrieved
                           against
     :type  consumer_ids:  list
@@ -487,209 +511,121 @@ def retrieve_consumer_applicability(consumer_criteria, content_types=None):
     """
     # We only need the consumer ids
     consumer_criteria['fields'] = ['id']
-    consumer_ids = [c['id'] for c in ConsumerQueryManager.find_by_criteria(consumer_criteria)]
-    consumer_map = dict([(c, {'profiles': [], 'repo_ids': []}) for c in consumer_ids])
-
-    # Fill out the mapping of consumer_ids to profiles, and store the list of profile_hashes
-    profile_hashes = _add_profiles_to_consumer_map_and_get_hashes(consumer_ids, consumer_map)
-
-    # Now add in repo_ids that the consumers are bound to
-    _add_repo_ids_to_consumer_map(consumer_ids, consumer_map)
-    # We don't need the list of consumer_ids anymore, so let's free a little RAM
-    del consumer_ids
-
-    # Now lets get all RepoProfileApplicability objects that have the profile hashes for our
-    # consumers
-    applicability_map = _get_applicability_map(profile_hashes, content_types)
-    # We don't need the profile_hashes anymore, so let's free some RAM
-    del profile_hashes
+    consumer_ids = (c['id'] for c in ConsumerQueryManager.find_by_criteria(consumer_criteria))
 
-    # Now we need to add consumers who match the applicability data to the applicability_map
-    _add_consumers_to_applicability_map(consumer_map, applicability_map)
-    # We don't need the consumer_map anymore, so let's free it up
-    del consumer_map
+    signatures = _get_consumer_signatures(consumer_ids)
+    applicability_map = _get_signature_applicability_map(signatures, content_types)
+    return list(_generate_report(signatures, applicability_map))
 
-    # Collate all the entries for the same sets of consumers together
-    consumer_applicability_map = _get_consumer_applicability_map(applicability_map)
-    # Free the applicability_map, we don't need it anymore
-    del applicability_map
 
-    # Form the data into the expected output format and return
-    return _format_report(consumer_applicability_map)
-
-
-def _add_consumers_to_applicability_map(consumer_map, applicability_map):
-    """
-    For all consumers in the consumer_map, look for their profiles and repos in the
-    applicability_map, and if found, add the consumer_ids to the applicability_map.
-
-    :param consumer_map:      A dictionary mapping consumer_ids to dictionaries with keys
-                              'profiles' and 'repo_ids'. 'profiles' indexes a list of profiles
-                              for each consumer_id, and 'repo_ids' indexes a list of repo_ids
-                              that the consumer is bound to.
-    :type  consumer_map:      dict
-    :param applicability_map: The mapping of (profile_hash, repo_id) to applicability_data and
-                              consumer_ids the data applies to. This method appends
-                              consumer_ids to the appropriate lists of consumer_ids
-    :type  applicability_map: dict
+def _get_consumer_signatures(consumer_ids):
     """
-    for consumer_id, repo_profile_data in consumer_map.items():
-        for profile in repo_profile_data['profiles']:
-            for repo_id in repo_profile_data['repo_ids']:
-                repo_profile = (profile['profile_hash'], repo_id)
-                # Only add the consumer to the applicability map if there is applicability_data
-                # for this combination of repository and profile
-                if repo_profile in applicability_map:
-                    applicability_map[repo_profile]['consumers'].append(consumer_id)
+    Group the given consumers by their signature, which is a tuple of the frozenset of their
+    profile hashes and the frozenset of the repo ids they are bound to. Consumers without
+    profiles or bindings have no applicability, so they are left out.
 
+    The consumers' profiles and bindings are queried in batches of CONSUMER_BATCH_SIZE
+    consumers.
 
-def _add_profiles_to_consumer_map_and_get_hashes(consumer_ids, consumer_map):
+    :param consumer_ids: ids of the consumers to group
+    :type  consumer_ids: iterable
+    :return:             A dictionary mapping signatures to lists of consumer ids
+    :rtype:              dict
     """
-    Query for all the profiles associated with the given list of consumer_ids, add those
-    profiles to the consumer_map, and then return a list of all profile_hashes.
-
-    :param consumer_ids: A list of consumer_ids that we want to map the profiles to
-    :type  consumer_ids: list
-    :param consumer_map: A dictionary mapping consumer_ids to a dictionary with key 'profiles',
-                         which indexes a list that this method will append the found profiles
-                         to.
-    :type  consumer_map: dict
-    :return:             A list of the profile_hashes that were associated with the given
-                         consumers
-    :rtype:              list
-    """
-    profiles = UnitProfile.get_collection().find(
-        {'consumer_id': {'$in': consumer_ids}},
-        projection=['consumer_id', 'profile_hash'])
-    profile_hashes = set()
-    for p in profiles:
-        consumer_map[p['consumer_id']]['profiles'].append(p)
-        profile_hashes.add(p['profile_hash'])
-    # Let's return a list of all the unique profile_hashes for the query we will do a
-    # bit later for applicability data
-    return list(profile_hashes)
-
-
-def _add_repo_ids_to_consumer_map(consumer_ids, consumer_map):
-    """
-    Query for all bindings for the given list of consumer_ids, and for each one add the bound
-    repo_ids to the consumer_map's entry for the consumer.
-
-    :param consumer_ids: The list of consumer_ids. We could pull this from the consumer_map,
-                         but since we already have this list it's probably more performant to
-                         use it as is.
-    :type  consumer_ids: list
-    :param consumer_map: A dictionary mapping consumer_ids to a dictionary with key 'profiles',
-                         which indexes a list that this method will append the found profiles
-                         to.
-    :type  consumer_map: dict
-    """
-    bindings = Bind.get_collection().find(
-        {'consumer_id': {'$in': consumer_ids}},
-        projection=['consumer_id', 'repo_id'])
-    for b in bindings:
-        consumer_map[b['consumer_id']]['repo_ids'].append(b['repo_id'])
-
-
-def _format_report(consumer_applicability_map):
+    signatures = {}
+    for batch in paginate(consumer_ids, CONSUMER_BATCH_SIZE):
+        batch = list(batch)
+        profile_hashes = dict((c, set()) for c in batch)
+        repo_ids = dict((c, set()) for c in batch)
+        profiles = UnitProfile.get_collection().find(
+            {'consumer_id': {'$in': batch}}, projection=['consumer_id', 'profile_hash'])
+        for p in profiles:
+            profile_hashes[p['consumer_id']].add(p['profile_hash'])
+        bindings = Bind.get_collection().find(
+            {'consumer_id': {'$in': batch}}, projection=['consumer_id', 'repo_id'])
+        for b in bindings:
+            repo_ids[b['consumer_id']].add(b['repo_id'])
+
+        for consumer_id in batch:
+            if profile_hashes[consumer_id] and repo_ids[consumer_id]:
+                signature = (frozenset(profile_hashes[consumer_id]),
+                             frozenset(repo_ids[consumer_id]))
+                signatures.setdefault(signature, []).append(consumer_id)
+    return signatures
+
+
+def _get_signature_applicability_map(signatures, content_types):
     """
-    Turn the consumer_applicability_map into the expected response format for this API call.
-
-    :param consumer_applicability_map: A mapping of frozensets of consumers to their
-                                       applicability data
-    :type  consumer_applicability_map: dict
-    :return:                           A list of dictionaries that have two keys, consumers
-                                       and applicability. consumers indexes a list of
-                                       consumer_ids, and applicability indexes the
-                                       applicability data for those consumer_ids.
-    :rtype:                            list
+    Build a mapping of frozensets of signatures to the applicability data that applies to the
+    consumers with those signatures. Each RepoProfileApplicability for a (profile_hash, repo_id)
+    applies to the consumers of all the signatures with that profile hash and repo id, and its
+    data is merged into the entry for exactly that set of signatures. For example:
+
+    {frozenset([signature_1, signature_2]): {'content_type_1': set(['unit_1', 'unit_3'])}}
+
+    :param signatures:    A dictionary mapping signatures to lists of consumer ids, as returned
+                          by _get_consumer_signatures()
+    :type  signatures:    dict
+    :param content_types: If not None, content_types is a list of content_types to
+                          be included in the applicability data
+    :type  content_types: list or None
+    :return:              The mapping of frozensets of signatures to dictionaries mapping
+                          content type ids to sets of applicable units
+    :rtype:               dict
     """
-    report = []
-    for consumers, applicability in consumer_applicability_map.iteritems():
-        # If there are no consumers for this applicability data, there is no need to include
-        # it in the report
-        if consumers:
-            applicability_data = {'consumers': list(consumers),
-                                  'applicability': applicability}
-            report.append(applicability_data)
-
-    return report
+    # Find the signatures that each (profile_hash, repo_id) applies to
+    repo_profile_signatures = {}
+    for signature in signatures:
+        signature_hashes, signature_repo_ids = signature
+        for profile_hash in signature_hashes:
+            for repo_id in signature_repo_ids:
+                repo_profile_signatures.setdefault((profile_hash, repo_id), set()).add(signature)
+    if not repo_profile_signatures:
+        return {}
+    profile_hashes = list(set(profile_hash for profile_hash, _ in repo_profile_signatures))
+    repo_ids = list(set(repo_id for _, repo_id in repo_profile_signatures))
 
-
-def _get_applicability_map(profile_hashes, content_types):
-    """
-    Build an "applicability_map", which is a dictionary that maps tuples of
-    (profile_hash, repo_id) to a dictionary of applicability data and consumer_ids. The
-    consumer_ids are just initialized to an empty list, so that a later method can add
-    consumers to it. For example, it might look like:
-
-    {('profile_hash_1', 'repo_1'): {'applicability': {<applicability_data>}, 'consumers': []}}
-
-    :param profile_hashes: A list of profile hashes that the applicabilities should be queried
-                           with. The applicability map is initialized with all applicability
-                           data for all the given profile_hashes.
-    :type  profile_hashes: list
-    :param content_types:  If not None, content_types is a list of content_types to
-                           be included in the applicability data within the
-                           applicability_map
-    :type  content_types:  list or None
-    :return:               The applicability map
-    :rtype:                dict
-    """
     applicabilities = RepoProfileApplicability.get_collection().find(
-        {'profile_hash': {'$in': profile_hashes}},
+        {'profile_hash': {'$in': profile_hashes}, 'repo_id': {'$in': repo_ids}},
         projection=['profile_hash', 'repo_id', 'applicability'])
-    return_value = {}
+    applicability_map = {}
     for a in applicabilities:
-        if content_types is not None:
-            # The caller has requested us to filter by content_type, so we need to look through
-            # the applicability data and filter out the unwanted content types. Some
-            # applicabilities may end up being empty if they don't have any data for the
-            # requested types, so we'll build a list of those to remove
-            for key in a['applicability'].keys():
-                if key not in content_types:
-                    del a['applicability'][key]
-            # If a doesn't have anything worth reporting, move on to the next applicability
-            if not a['applicability']:
-                continue
-        return_value[(a['profile_hash'], a['repo_id'])] = {'applicability': a['applicability'],
-                                                           'consumers': []}
-    return return_value
-
-
-def _get_consumer_applicability_map(applicability_map):
+        signature_group = repo_profile_signatures.get((a['profile_hash'], a['repo_id']))
+        if signature_group is None:
+            # None of the consumers has this profile and is bound to this repository
+            continue
+        applicability = dict((content_type, units)
+                             for content_type, units in a['applicability'].iteritems()
+                             if content_types is None or content_type in content_types)
+        # If the caller's content types filtered out all of a's data, move on to the next
+        # applicability
+        if content_types is not None and not applicability:
+            continue
+        merged = applicability_map.setdefault(frozenset(signature_group), {})
+        for content_type, units in applicability.iteritems():
+            merged.setdefault(content_type, set()).update(units)
+    return applicability_map
+
+
+def _generate_report(signatures, applicability_map):
     """
-    Massage the applicability_map into a form that will help us to collate applicability
-    groups that contain the same data together.
+    Generate the entries of the report for this API call from the applicability map.
 
-    :param applicability_map: The mapping of (profile_hash, repo_id) to applicability_data and
-                              consumer_ids it applies to. This method appends consumer_ids to
-                              the appropriate lists of consumer_ids
+    :param signatures:        A dictionary mapping signatures to lists of consumer ids
+    :type  signatures:        dict
+    :param applicability_map: The mapping of frozensets of signatures to their merged
+                              applicability data, as returned by
+                              _get_signature_applicability_map()
     :type  applicability_map: dict
-    :return:                  The consumer_applicability_map, which maps frozensets of
-                              consumer_ids to their collective applicability data.
-    :rtype:                   dict
+    :return:                  A generator of dictionaries that have two keys, consumers and
+                              applicability. consumers indexes a list of consumer_ids, and
+                              applicability indexes the applicability data for those
+                              consumer_ids.
+    :rtype:                   generator
     """
-    consumer_applicability_map = {}
-    for repo_profile, data in applicability_map.iteritems():
-        # This will be the key for our map, a set of the consumers that share data
-        consumers = frozenset(data['consumers'])
-        if consumers in consumer_applicability_map:
-            for content_type, applicability in data['applicability'].iteritems():
-                if content_type in consumer_applicability_map[consumers]:
-                    # There is already applicability data for this consumer set and
-                    # content type. We will convert the existing data and the new data to
-                    # sets, generate the union of those sets, and turn it back into a list
-                    # so that we can report unique units.
-                    consumer_applicability_map[consumers][content_type] = list(
-                        set(consumer_applicability_map[consumers][content_type]) |
-                        set(applicability))
-                else:
-                    # This consumer set does not already have applicability data for this type, so
-                    # let's set applicability as the data for it
-                    consumer_applicability_map[consumers][content_type] = applicability
-        else:
-            # This consumer set is not already part of the consumer_applicability_map, so we can
-            # set all the applicability data we have to this consumer set
-            consumer_applicability_map[consumers] = data['applicability']
-    return consumer_applicability_map
+    for signature_group, applicability in applicability_map.iteritems():
+        consumers = [consumer_id for signature in signature_group
+                     for consumer_id in signatures[signature]]
+        yield {'consumers': consumers,
+               'applicability': dict((content_type, list(units))
+                                     for content_type, units in applicability.iteritems())}
@@ -1,16 +1,24 @@
 """
 Contains profile management classes
 """
+import copy
+
 from celery import task
+from pymongo.errors import DuplicateKeyError
 
 from pulp.plugins.loader import api as plugin_api, exceptions as plugin_exceptions
 from pulp.plugins.profiler import Profiler
+from pulp.plugins.util.misc import paginate
 from pulp.server.async.tasks import Task
-from pulp.server.db.model.consumer import UnitProfile
+from pulp.server.db.model.consumer import UnitProfile, UnitProfileContent
 from pulp.server.exceptions import MissingResource, MissingValue
 from pulp.server.managers import factory
 
 
+# number of unit profiles whose profiles are loaded with a single query
+PROFILE_BATCH_SIZE = 100
+
+
 class ProfileManager(object):
     """
     Manage consumer installed content unit profiles.
@@ -52,22 +60,55 @@ class ProfileManager(object):
         # Allow the profiler a chance to update the profile before we save it
         if profile is None:
             raise MissingValue('profile')
+        reported_hash = UnitProfile.calculate_hash(profile)
         profile = profiler.update_profile(consumer, content_type, profile, config)
-        try:
-            p = ProfileManager.get_profile(consumer_id, content_type)
-            p['profile'] = profile
-            # We store the profile's hash anytime the profile gets altered
-            p['profile_hash'] = UnitProfile.calculate_hash(profile)
-        except MissingResource:
-            p = UnitProfile(consumer_id, content_type, profile)
+        # We store the profile's hash anytime the profile gets altered
+        profile_hash = UnitProfile.calculate_hash(profile)
         collection = UnitProfile.get_collection()
+        p = collection.find_one(dict(consumer_id=consumer_id, content_type=content_type))
+        if p is None:
+            old_hash = None
+            p = UnitProfile(consumer_id, content_type, profile, profile_hash, reported_hash)
+        else:
+            old_hash = p['profile_hash']
+            p['profile_hash'] = profile_hash
+            p['reported_hash'] = reported_hash
+        # The profile is stored once for all unit profiles with the same hash. It is referenced
+        # before the unit profile points at it, and released after the unit profile no longer does.
+        if profile_hash != old_hash:
+            ProfileManager._add_profile_reference(profile_hash, profile)
+        p.pop('profile', None)
         collection.save(p)
+        if old_hash is not None and profile_hash != old_hash:
+            ProfileManager._remove_profile_reference(old_hash)
+        p['profile'] = profile
         history_manager = factory.consumer_history_manager()
         history_manager.record_event(
             consumer_id,
             'unit_profile_changed', {'profile_content_type': content_type})
         return p
 
+    @staticmethod
+    def is_unchanged(consumer_id, content_type, reported_hash):
+        """
+        Determine whether the profile a consumer reports is the one already stored, so
+        consumers can send the hash of their profile before sending the profile itself.
+
+        :param consumer_id:   uniquely identifies the consumer.
+        :type  consumer_id:   str
+        :param content_type:  The profile (content) type ID.
+        :type  content_type:  str
+        :param reported_hash: hash of the profile as the consumer would report it, calculated
+                              by pulp.common.util.calculate_profile_hash
+        :type  reported_hash: basestring
+        :return:              True if the stored profile was reported with the same hash
+        :rtype:               bool
+        """
+        collection = UnitProfile.get_collection()
+        query = dict(consumer_id=consumer_id, content_type=content_type,
+                     reported_hash=reported_hash)
+        return collection.find_one(query, projection=['_id']) is not None
+
     @staticmethod
     def delete(consumer_id, content_type):
         """
@@ -78,9 +119,13 @@ class ProfileManager(object):
         :param content_type: The profile (content) type ID.
         :type  content_type: str
         """
-        profile = ProfileManager.get_profile(consumer_id, content_type)
         collection = UnitProfile.get_collection()
-        collection.remove(profile)
+        profile_id = dict(consumer_id=consumer_id, content_type=content_type)
+        profile = collection.find_one(profile_id, projection=['profile_hash'])
+        if profile is None:
+            raise MissingResource(profile_id=profile_id)
+        collection.remove({'_id': profile['_id']})
+        ProfileManager._remove_profile_reference(profile['profile_hash'])
 
     def consumer_deleted(self, id):
         """
@@ -90,8 +135,9 @@ class ProfileManager(object):
         @type id: str
         """
         collection = UnitProfile.get_collection()
-        for p in self.get_profiles(id):
-            collection.remove(p)
+        for p in collection.find(dict(consumer_id=id), projection=['profile_hash']):
+            collection.remove({'_id': p['_id']})
+            self._remove_profile_reference(p['profile_hash'])
 
     @staticmethod
     def get_profile(consumer_id, content_type):
@@ -112,7 +158,7 @@ class ProfileManager(object):
         if profile is None:
             raise MissingResource(profile_id=profile_id)
         else:
-            return profile
+            return next(ProfileManager._add_profiles([profile]))
 
     def get_profiles(self, consumer_id):
         """
@@ -126,22 +172,99 @@ class ProfileManager(object):
         collection = UnitProfile.get_collection()
         query = dict(consumer_id=consumer_id)
         cursor = collection.find(query)
-        return list(cursor)
+        return list(self._add_profiles(cursor))
 
     @staticmethod
     def find_by_criteria(criteria):
         """
-        Return a list of unit profiles that match the provided criteria.
+        Return the unit profiles that match the provided criteria.
+
+        Filters on the profile itself are matched against the stored profiles, and only
+        top-level filter keys are considered for this. The profile is only added to the
+        results when the criteria does not limit the fields, or includes the profile field.
 
         @param criteria:    A Criteria object representing a search you want
                             to perform
         @type  criteria:    pulp.server.db.model.criteria.Criteria
 
-        @return:    list of UnitProfile instances
-        @rtype:     list
+        @return:    generator of UnitProfile instances
+        @rtype:     generator
         """
+        criteria = copy.copy(criteria)
+        filters = criteria.filters or {}
+        profile_filters = dict((key, value) for key, value in filters.items()
+                               if key == 'profile' or key.startswith('profile.'))
+        if profile_filters:
+            contents = UnitProfileContent.get_collection().find(profile_filters,
+                                                                projection=['_id'])
+            filters = dict((key, value) for key, value in filters.items()
+                           if key not in profile_filters)
+            hash_filter = {'profile_hash': {'$in': [c['_id'] for c in contents]}}
+            if 'profile_hash' in filters:
+                filters = {'$and': [filters, hash_filter]}
+            else:
+                filters.update(hash_filter)
+            criteria.filters = filters
+
+        if criteria.fields is None:
+            return ProfileManager._add_profiles(UnitProfile.get_collection().query(criteria))
+        if 'profile' in criteria.fields:
+            criteria.fields = list(criteria.fields) + ['profile_hash']
+            return ProfileManager._add_profiles(UnitProfile.get_collection().query(criteria))
         return UnitProfile.get_collection().query(criteria)
 
+    @staticmethod
+    def _add_profiles(unit_profiles):
+        """
+        Add the stored profile to each of the given unit profiles. The profiles are loaded
+        in batches, and each distinct profile is loaded once per batch.
+
+        :param unit_profiles: unit profiles as stored in the database
+        :type  unit_profiles: iterable of dict
+        :return:              the unit profiles, each with its profile
+        :rtype:               generator
+        """
+        collection = UnitProfileContent.get_collection()
+        for batch in paginate(unit_profiles, PROFILE_BATCH_SIZE):
+            profile_hashes = list(set(p['profile_hash'] for p in batch))
+            contents = collection.find({'_id': {'$in': profile_hashes}}, projection=['profile'])
+            profiles = dict((c['_id'], c['profile']) for c in contents)
+            for unit_profile in batch:
+                unit_profile['profile'] = profiles.get(unit_profile['profile_hash'])
+                yield unit_profile
+
+    @staticmethod
+    def _add_profile_reference(profile_hash, profile):
+        """
+        Count a reference to a stored profile, storing the profile if it is not stored yet.
+
+        :param profile_hash: hash of the profile
+        :type  profile_hash: basestring
+        :param profile:      the profile
+        :type  profile:      object
+        """
+        collection = UnitProfileContent.get_collection()
+        spec = {'_id': profile_hash}
+        document = {'$setOnInsert': {'profile': profile}, '$inc': {'ref_count': 1}}
+        try:
+            collection.update(spec, document, upsert=True)
+        except DuplicateKeyError:
+            # Another consumer stored the same profile at the same time, so it exists now.
+            collection.update(spec, document, upsert=True)
+
+    @staticmethod
+    def _remove_profile_reference(profile_hash):
+        """
+        Release a reference to a stored profile, removing the profile when it is no longer
+        referenced.
+
+        :param profile_hash: hash of the profile
+        :type  profile_hash: basestring
+        """
+        collection = UnitProfileContent.get_collection()
+        collection.update({'_id': profile_hash}, {'$inc': {'ref_count': -1}})
+        collection.remove({'_id': profile_hash, 'ref_count': {'$lte': 0}})
+
 
 create = task(ProfileManager.create, base=Task)
 delete = task(ProfileManager.delete, base=Task, ignore_result=True)
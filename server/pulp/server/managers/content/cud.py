@@ -1,8 +1,18 @@
 import uuid
 
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
 from pulp.common import dateutils
 from pulp.plugins.types import database as content_types_db
+from pulp.plugins.util.misc import paginate
+from pulp.server.controllers import units as units_controller
 from pulp.server.exceptions import InvalidValue
+from pulp.server.util import calculate_unit_key_digest
+
+
+# mongo error code reported when a write violates a unique index
+DUPLICATE_KEY_ERROR = 11000
 
 
 class ContentManager(object):
@@ -24,6 +34,7 @@ class ContentManager(object):
         @rtype: str
         """
         collection = content_types_db.type_units_collection(content_type)
+        unit_key_fields = units_controller.get_unit_key_fields_for_type(content_type)
         if unit_id is None:
             unit_id = str(uuid.uuid4())
         unit_doc = {
@@ -32,6 +43,7 @@ class ContentManager(object):
             '_last_updated': dateutils.now_utc_timestamp()
         }
         unit_doc.update(unit_metadata)
+        unit_doc['_unit_key_digest'] = _unit_key_digest(unit_key_fields, unit_metadata)
         collection.insert(unit_doc)
         return unit_id
 
@@ -47,8 +59,101 @@ class ContentManager(object):
         """
         unit_metadata_delta['_last_updated'] = dateutils.now_utc_timestamp()
         collection = content_types_db.type_units_collection(content_type)
+        unit_key_fields = units_controller.get_unit_key_fields_for_type(content_type)
+        changed_fields = set(unit_key_fields).intersection(unit_metadata_delta)
+        if changed_fields:
+            # the unit key digest must be recomputed from the whole unit key
+            unit_key = dict((k, unit_metadata_delta[k]) for k in changed_fields)
+            missing_fields = set(unit_key_fields).difference(changed_fields)
+            if missing_fields:
+                unit = collection.find_one({'_id': unit_id}, projection=list(missing_fields))
+                unit_key.update((k, (unit or {}).get(k)) for k in missing_fields)
+            unit_metadata_delta['_unit_key_digest'] = _unit_key_digest(unit_key_fields, unit_key)
         collection.update({'_id': unit_id}, {'$set': unit_metadata_delta})
 
+    def upsert_content_units(self, content_type, units_metadata):
+        """
+        Add or update many content units of the same type with one bulk write.
+
+        Each unit is matched to an existing unit by its unit key. Existing
+        units are updated with the given metadata and new units are added,
+        exactly as add_content_unit and update_content_unit would.
+
+        :param content_type: unique id of content collection
+        :type  content_type: str
+        :param units_metadata: full metadata, including the unit key, of each unit
+        :type  units_metadata: list of dict
+
+        :return: the id of each unit, in the same order as units_metadata, and
+                 the number of units that were added rather than updated
+        :rtype:  tuple of (list of str, int)
+        """
+        unit_key_fields = units_controller.get_unit_key_fields_for_type(content_type)
+        collection = content_types_db.type_units_collection(content_type)
+        now = dateutils.now_utc_timestamp()
+
+        unit_keys = []
+        unit_docs = []
+        for unit_metadata in units_metadata:
+            unit_key = dict((k, unit_metadata[k]) for k in unit_key_fields)
+            unit_doc = dict(unit_metadata)
+            unit_doc['_last_updated'] = now
+            unit_doc['_unit_key_digest'] = _unit_key_digest(unit_key_fields, unit_key)
+            unit_keys.append(unit_key)
+            unit_docs.append(unit_doc)
+        if not unit_docs:
+            return [], 0
+
+        unit_ids = [str(uuid.uuid4()) for i in range(len(unit_docs))]
+        requests = []
+        for unit_key, unit_doc, unit_id in zip(unit_keys, unit_docs, unit_ids):
+            on_insert = {'_id': unit_id, '_content_type_id': content_type}
+            requests.append(UpdateOne(unit_key, {'$set': unit_doc, '$setOnInsert': on_insert},
+                                      upsert=True))
+        try:
+            upserted = collection.bulk_write(requests, ordered=False).upserted_ids.keys()
+        except BulkWriteError, e:
+            # A concurrent sync may add the same unit between the match and the
+            # insert of an upsert. The unit exists either way, so only other
+            # errors are fatal, and the unit is updated instead as save_unit does.
+            errors = e.details['writeErrors']
+            if any(error['code'] != DUPLICATE_KEY_ERROR for error in errors):
+                raise
+            retries = [UpdateOne(unit_keys[error['index']], {'$set': unit_docs[error['index']]})
+                       for error in errors]
+            collection.bulk_write(retries, ordered=False)
+            upserted = [u['index'] for u in e.details['upserted']]
+
+        # units that were not inserted by this call already existed, so look up their ids
+        upserted = set(upserted)
+        existing = [i for i in range(len(unit_ids)) if i not in upserted]
+        found = {}
+        projection = dict((k, 1) for k in unit_key_fields)
+        for page in paginate(existing, page_size=50):
+            spec = {'$or': [unit_keys[i] for i in page]}
+            for unit in collection.find(spec, projection=projection):
+                found[tuple(unit.get(k) for k in unit_key_fields)] = unit['_id']
+
+        removed = []
+        for i in existing:
+            unit_id = found.get(tuple(unit_keys[i][k] for k in unit_key_fields))
+            if unit_id is None:
+                removed.append(i)
+            else:
+                unit_ids[i] = unit_id
+
+        added_count = len(upserted)
+        if removed:
+            # These units were removed, for example by orphan purging, after they were
+            # matched, so add them again.
+            removed_ids, removed_added_count = self.upsert_content_units(
+                content_type, [units_metadata[i] for i in removed])
+            for i, unit_id in zip(removed, removed_ids):
+                unit_ids[i] = unit_id
+            added_count += removed_added_count
+
+        return unit_ids, added_count
+
     def remove_content_unit(self, content_type, unit_id):
         """
         Remove a content unit and its metadata from the corresponding pulp db
@@ -107,3 +212,19 @@ class ContentManager(object):
         children = set(parent.get(key, []))
         parent[key] = list(children.difference(to_ids))
         collection.update({'_id': from_id}, parent)
+
+
+def _unit_key_digest(unit_key_fields, unit_metadata):
+    """
+    Calculate the unit key digest that is stored on content units, as the
+    ContentUnit model does when a unit is saved.
+
+    :param unit_key_fields: names of the fields in the unit key
+    :type  unit_key_fields: tuple
+    :param unit_metadata: unit metadata, including the unit key
+    :type  unit_metadata: dict
+
+    :return: the hex digest of the unit key
+    :rtype:  str
+    """
+    return calculate_unit_key_digest(dict((k, unit_metadata.get(k)) for k in unit_key_fields))
@@ -1,8 +1,12 @@
+from collections import OrderedDict
 from errno import ENOENT
 from gettext import gettext as _
+import hashlib
+import json
 import logging
 import os
 import sys
+import threading
 from uuid import uuid4
 
 from celery import task
@@ -11,7 +15,8 @@ from pulp.common import error_codes
 from pulp.plugins.conduits.upload import UploadConduit
 from pulp.plugins.config import PluginCallConfiguration
 from pulp.plugins.loader import api as plugin_api, exceptions as plugin_exceptions
-from pulp.server import config as pulp_config
+from pulp.plugins.util import misc
+from pulp.server import config as pulp_config, util
 from pulp.server.async.tasks import Task
 from pulp.server.db import model
 from pulp.server.exceptions import (PulpDataException, MissingResource, PulpExecutionException,
@@ -21,9 +26,18 @@ from pulp.server.controllers import repository as repo_controller
 
 logger = logging.getLogger(__name__)
 
+# number of bytes of a request body written to the upload file at a time
+WRITE_BLOCK_SIZE = 1048576
+# number of uploads each process computes the checksum of while their segments are saved
+MAX_DIGESTS = 100
+
+# _UploadDigest instances keyed by upload ID, oldest first; None for uploads not being hashed
+_digests = OrderedDict()
+_digests_lock = threading.Lock()
+
 
 class ContentUploadManager(object):
-    def initialize_upload(self):
+    def initialize_upload(self, size=None, checksum=None, checksum_type=None):
         """
         Informs the Pulp server that a new file is about to be uploaded, allowing
         it to do any preparation it needs to do to store or track the upload.
@@ -31,6 +45,20 @@ class ContentUploadManager(object):
         The ID returned from this call is used to track this specific uploaded
         file for the remainder of its life.
 
+        If the size of the file is given, the disk space for it is reserved
+        and the sha256 of the file is computed as its segments are saved. If
+        a checksum is given, the uploaded file is verified against it when it
+        is imported.
+
+        @param size: size of the file to be uploaded
+        @type  size: int
+
+        @param checksum: checksum of the file to be uploaded
+        @type  checksum: str
+
+        @param checksum_type: algorithm of the checksum; defaults to sha256
+        @type  checksum_type: str
+
         @return: unique ID to refer to this upload request in the future
         @rtype:  str
         """
@@ -47,7 +75,15 @@ class ContentUploadManager(object):
         # before attempting to write bits.
         file_path = ContentUploadManager._upload_file_path(upload_id)
         f = open(file_path, 'w')
-        f.close()
+        try:
+            if size:
+                misc.preallocate(f, size)
+        finally:
+            f.close()
+
+        if size is not None or checksum is not None:
+            ContentUploadManager._write_upload_info(
+                upload_id, {'size': size, 'checksum': checksum, 'checksum_type': checksum_type})
 
         return upload_id
 
@@ -58,6 +94,10 @@ class ContentUploadManager(object):
         to retrieve the upload_id value and perform any steps necessary before
         bits can be saved.
 
+        The data may be a file-like object, such as the request carrying the
+        bits, in which case it is copied to the file WRITE_BLOCK_SIZE bytes at
+        a time rather than held in memory.
+
         @param upload_id: upload request ID
         @type  upload_id: str
 
@@ -65,7 +105,7 @@ class ContentUploadManager(object):
         @type  offset: int
 
         @param data: content to write to the file
-        @type  data: str
+        @type  data: str or file-like object
         """
 
         file_path = ContentUploadManager._upload_file_path(upload_id)
@@ -74,10 +114,95 @@ class ContentUploadManager(object):
         if not os.path.exists(file_path):
             raise MissingResource(upload_request=upload_id)
 
+        end = offset
         f = open(file_path, 'r+')
-        f.seek(offset)
-        f.write(data)
-        f.close()
+        try:
+            f.seek(offset)
+            if isinstance(data, basestring):
+                f.write(data)
+                end += len(data)
+            else:
+                while True:
+                    block = data.read(WRITE_BLOCK_SIZE)
+                    if not block:
+                        break
+                    f.write(block)
+                    end += len(block)
+        finally:
+            f.close()
+
+        ContentUploadManager._update_digest(upload_id, file_path, offset, end)
+
+    def reuse_stored_file(self, upload_id, size, checksum, checksum_type=util.TYPE_SHA256):
+        """
+        Fills the given upload request with a copy of a file Pulp already stores, if one of the
+        given size and checksum is found. The caller then does not need to upload the bits before
+        importing the upload.
+
+        @param upload_id: upload request ID
+        @type  upload_id: str
+
+        @param size: size of the file to be uploaded
+        @type  size: int
+
+        @param checksum: checksum of the file to be uploaded
+        @type  checksum: str
+
+        @param checksum_type: algorithm of the checksum
+        @type  checksum_type: str
+
+        @return: True if the upload was filled with a stored file; False otherwise
+        @rtype:  bool
+
+        @raise MissingResource: if the upload request ID does not exist
+        """
+        file_path = ContentUploadManager._upload_file_path(upload_id)
+        if not os.path.exists(file_path):
+            raise MissingResource(upload_request=upload_id)
+
+        stored_path = ContentUploadManager.find_stored_file(size, checksum, checksum_type)
+        if stored_path is None:
+            return False
+
+        misc.copy_file(stored_path, file_path)
+        info = ContentUploadManager._read_upload_info(upload_id)
+        info['reused'] = True
+        ContentUploadManager._write_upload_info(upload_id, info)
+        return True
+
+    @staticmethod
+    def find_stored_file(size, checksum, checksum_type=util.TYPE_SHA256):
+        """
+        Finds a file of a content unit that has the given size and checksum. Only unit models
+        that define a checksum_field are searched.
+
+        @param size: size of the file
+        @type  size: int
+
+        @param checksum: checksum of the file
+        @type  checksum: str
+
+        @param checksum_type: algorithm of the checksum
+        @type  checksum_type: str
+
+        @return: path to a matching file, or None if there is none
+        @rtype:  str
+        """
+        checksum_type = util.sanitize_checksum_type(checksum_type)
+        for type_id in plugin_api.list_unit_models():
+            unit_model = plugin_api.get_unit_model_by_id(type_id)
+            if not unit_model.checksum_field:
+                continue
+            query = {unit_model.checksum_field: checksum.lower()}
+            if unit_model.checksum_type_field:
+                query[unit_model.checksum_type_field] = checksum_type
+            elif checksum_type != util.TYPE_SHA256:
+                continue
+            for unit in unit_model.objects(**query).only('_storage_path'):
+                path = unit._storage_path
+                if path and os.path.isfile(path) and os.path.getsize(path) == size:
+                    return path
+        return None
 
     def delete_upload(self, upload_id):
         """
@@ -91,12 +216,16 @@ class ContentUploadManager(object):
         @raise MissingResource: if the upload request ID does not exist
         """
 
-        file_path = ContentUploadManager._upload_file_path(upload_id)
-        try:
-            os.remove(file_path)
-        except OSError as e:
-            if e.errno != ENOENT:
-                raise
+        with _digests_lock:
+            _digests.pop(upload_id, None)
+
+        for path in (ContentUploadManager._upload_file_path(upload_id),
+                     ContentUploadManager._upload_info_path(upload_id)):
+            try:
+                os.remove(path)
+            except OSError as e:
+                if e.errno != ENOENT:
+                    raise
 
     def read_upload(self, upload_id):
         """
@@ -130,7 +259,7 @@ class ContentUploadManager(object):
         @rtype:  list
         """
         upload_dir = ContentUploadManager._upload_storage_dir()
-        upload_ids = os.listdir(upload_dir)
+        upload_ids = [name for name in os.listdir(upload_dir) if not name.startswith('.')]
         return upload_ids
 
     @staticmethod
@@ -211,6 +340,7 @@ class ContentUploadManager(object):
         transfer_repo = repo_obj.to_transfer_repo()
 
         file_path = ContentUploadManager._upload_file_path(upload_id)
+        ContentUploadManager._verify_upload(upload_id, file_path)
 
         # Invoke the importer
         try:
@@ -253,6 +383,119 @@ class ContentUploadManager(object):
         path = os.path.join(upload_storage_dir, upload_id)
         return path
 
+    @staticmethod
+    def _upload_info_path(upload_id):
+        """
+        Returns the full path to the file describing the given upload. It is
+        hidden so it is not listed as an upload itself.
+
+        :param upload_id: identifies the upload in question
+        :type  upload_id: str
+        :return:          full path on the server's filesystem
+        :rtype:           str
+        """
+        upload_storage_dir = ContentUploadManager._upload_storage_dir()
+        return os.path.join(upload_storage_dir, '.%s.json' % upload_id)
+
+    @staticmethod
+    def _read_upload_info(upload_id):
+        """
+        :param upload_id: identifies the upload in question
+        :type  upload_id: str
+        :return:          the size and checksums known for the upload; empty if none are
+        :rtype:           dict
+        """
+        try:
+            with open(ContentUploadManager._upload_info_path(upload_id)) as f:
+                return json.load(f)
+        except IOError as e:
+            if e.errno != ENOENT:
+                raise
+            return {}
+
+    @staticmethod
+    def _write_upload_info(upload_id, info):
+        """
+        Atomically replaces the file describing the given upload.
+
+        :param upload_id: identifies the upload in question
+        :type  upload_id: str
+        :param info:      the size and checksums known for the upload
+        :type  info:      dict
+        """
+        path = ContentUploadManager._upload_info_path(upload_id)
+        temp_path = '%s.%s' % (path, uuid4())
+        with open(temp_path, 'w') as f:
+            json.dump(info, f)
+        os.rename(temp_path, path)
+
+    @staticmethod
+    def _update_digest(upload_id, file_path, start, end):
+        """
+        Adds a saved segment to the sha256 this process computes for the upload, if any. When
+        the digest covers the whole file, it is recorded in the upload's info file.
+
+        :param upload_id: identifies the upload in question
+        :type  upload_id: str
+        :param file_path: full path to the uploaded file
+        :type  file_path: str
+        :param start:     offset of the first saved byte
+        :type  start:     int
+        :param end:       offset just past the last saved byte
+        :type  end:       int
+        """
+        with _digests_lock:
+            if upload_id in _digests:
+                digest = _digests[upload_id]
+            else:
+                size = ContentUploadManager._read_upload_info(upload_id).get('size')
+                digest = _UploadDigest(size) if size else None
+                if len(_digests) >= MAX_DIGESTS:
+                    _digests.popitem(last=False)
+                _digests[upload_id] = digest
+        if digest is None:
+            return
+
+        checksum = digest.saved(file_path, start, end)
+        if checksum is not None:
+            info = ContentUploadManager._read_upload_info(upload_id)
+            info['sha256'] = checksum
+            ContentUploadManager._write_upload_info(upload_id, info)
+            with _digests_lock:
+                _digests.pop(upload_id, None)
+
+    @staticmethod
+    def _verify_upload(upload_id, file_path):
+        """
+        Verifies the uploaded file against the checksum given when the upload was initialized,
+        if any. The sha256 computed as the segments were saved is used when it is available;
+        otherwise the file is read to compute the checksum.
+
+        :param upload_id: identifies the upload in question
+        :type  upload_id: str
+        :param file_path: full path to the uploaded file
+        :type  file_path: str
+
+        :raises PulpDataException: if the file does not match the checksum
+        """
+        info = ContentUploadManager._read_upload_info(upload_id)
+        expected = info.get('checksum')
+        if not expected or info.get('reused'):
+            return
+
+        checksum_type = util.sanitize_checksum_type(info.get('checksum_type') or
+                                                    util.TYPE_SHA256)
+        checksum = None
+        if checksum_type == util.TYPE_SHA256:
+            checksum = info.get('sha256')
+        if checksum is None:
+            with open(file_path) as f:
+                checksum = util.calculate_checksums(f, [checksum_type])[checksum_type]
+
+        if checksum != expected.lower():
+            raise PulpDataException(_('The uploaded file does not match the %(t)s checksum given '
+                                      'when the upload was created') % {'t': checksum_type})
+
     @staticmethod
     def _upload_storage_dir():
         """
@@ -273,4 +516,69 @@ class ContentUploadManager(object):
         return upload_storage_dir
 
 
+class _UploadDigest(object):
+    """
+    The sha256 of an upload, computed from the segments saved by this process. Segments are
+    hashed in order; those saved ahead of the hashed part are read back from the file once the
+    segments before them have been hashed. Saving data the digest already covers invalidates it.
+
+    :ivar size: size of the uploaded file
+    :type size: int
+    :ivar offset: number of bytes hashed
+    :type offset: int
+    """
+
+    def __init__(self, size):
+        """
+        :param size: size of the uploaded file
+        :type  size: int
+        """
+        self.size = size
+        self.offset = 0
+        self.valid = True
+        self._hash = hashlib.sha256()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def saved(self, file_path, start, end):
+        """
+        Adds a saved segment to the digest.
+
+        :param file_path: full path to the uploaded file
+        :type  file_path: str
+        :param start:     offset of the first saved byte
+        :type  start:     int
+        :param end:       offset just past the last saved byte
+        :type  end:       int
+        :return:          the hex digest once the whole file is hashed; None otherwise
+        :rtype:           str
+        """
+        with self._lock:
+            if not self.valid:
+                return None
+            if start < self.offset:
+                self.valid = False
+                return None
+            self._pending[start] = max(end, self._pending.get(start, end))
+            if self.offset not in self._pending:
+                return None
+
+            with open(file_path) as f:
+                f.seek(self.offset)
+                while self.offset in self._pending:
+                    segment_end = self._pending.pop(self.offset)
+                    while self.offset < segment_end:
+                        data = f.read(min(WRITE_BLOCK_SIZE, segment_end - self.offset))
+                        if not data:
+                            self.valid = False
+                            return None
+                        self._hash.update(data)
+                        self.offset += len(data)
+
+            if self.offset == self.size:
+                self.valid = False
+                return self._hash.hexdigest()
+            return None
+
+
 import_uploaded_unit = task(ContentUploadManager.import_uploaded_unit, base=Task)
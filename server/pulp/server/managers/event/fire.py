@@ -3,17 +3,170 @@ Handles the firing of events to any configured listeners. This module is
 responsible for defining what events look like. The specific fire methods for
 each event type require data relevant to that event type and package it up
 in a consistent event format for that type.
+
+Listeners are looked up in an in-memory table rather than in the database for
+each event, and notifiers are invoked by a small pool of threads so that slow
+notifiers do not hold up the task that fired the event.
 """
 
 import logging
+import os
+import Queue
+import threading
+import time
 
 from pulp.server.db.model.event import EventListener
 from pulp.server.event import data as e, notifiers
 
 
+# Seconds a process uses its listener table before reloading it. Changes made through the
+# EventListenerManager are seen immediately by the process that made them; other processes pick
+# them up once their table expires.
+LISTENER_CACHE_TIMEOUT = 30
+# number of threads invoking notifiers
+NOTIFIER_THREAD_COUNT = 2
+# number of fired events that may wait for a notifier thread
+NOTIFIER_QUEUE_SIZE = 1000
+
 _logger = logging.getLogger(__name__)
 
 
+class ListenerTable(object):
+    """
+    In-memory copy of the configured event listeners, indexed by event type.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_event_type = None
+        self._wildcard = None
+        self._expires = 0
+
+    def invalidate(self):
+        """
+        Discard the table so that it is reloaded from the database on next use.
+        """
+        with self._lock:
+            self._by_event_type = None
+
+    def listeners(self, event_type):
+        """
+        :param event_type: type of the event being fired
+        :type  event_type: str
+        :return: listeners that should be notified of the event, each listed once
+        :rtype:  list of dict
+        """
+        with self._lock:
+            if self._by_event_type is None or time.time() >= self._expires:
+                self._load()
+            return self._by_event_type.get(event_type, []) + self._wildcard
+
+    def _load(self):
+        """
+        Load all event listeners from the database.
+        """
+        by_event_type = {}
+        wildcard = []
+        for listener in EventListener.get_collection().find():
+            event_types = listener['event_types']
+            if isinstance(event_types, basestring):
+                # matched by the former equality query like a list of one type
+                event_types = [event_types]
+            event_types = set(event_types)
+            if '*' in event_types:
+                wildcard.append(listener)
+                continue
+            for event_type in event_types:
+                by_event_type.setdefault(event_type, []).append(listener)
+        self._by_event_type = by_event_type
+        self._wildcard = wildcard
+        self._expires = time.time() + LISTENER_CACHE_TIMEOUT
+
+
+class NotifierDispatcher(object):
+    """
+    Invokes notifiers for fired events from a pool of threads. Threads are
+    started on first use in each process, since they do not survive a fork.
+    """
+
+    def __init__(self):
+        self.queue = Queue.Queue(maxsize=NOTIFIER_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def dispatch(self, listeners, event):
+        """
+        Queue the event to be passed to the notifier of each listener. Blocks
+        while the queue is full.
+
+        :param listeners: listeners to notify
+        :type  listeners: list of dict
+        :param event: event object to fire
+        :type  event: pulp.server.event.data.Event
+        """
+        self._start()
+        self.queue.put((listeners, event))
+
+    def join(self):
+        """
+        Block until all queued events have been passed to their notifiers.
+        """
+        self.queue.join()
+
+    def _start(self):
+        """
+        Start the notifier threads if this process has not done so yet.
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self.queue = Queue.Queue(maxsize=NOTIFIER_QUEUE_SIZE)
+            for i in range(NOTIFIER_THREAD_COUNT):
+                thread = threading.Thread(target=self._run, args=(self.queue,))
+                thread.setDaemon(True)
+                thread.start()
+            self._pid = os.getpid()
+
+    @staticmethod
+    def _run(queue):
+        """
+        Notifier thread loop.
+
+        :param queue: queue of (listeners, event) tuples to process
+        :type  queue: Queue.Queue
+        """
+        while True:
+            listeners, event = queue.get()
+            try:
+                _notify(listeners, event)
+            finally:
+                queue.task_done()
+
+
+def _notify(listeners, event):
+    """
+    Invoke the notifier of each listener for the event. An exception from a
+    notifier is logged but does not interrupt the remainder of the firing, nor
+    bubble up.
+
+    :param listeners: listeners to notify
+    :type  listeners: list of dict
+    :param event: event object to fire
+    :type  event: pulp.server.event.data.Event
+    """
+    for listener in listeners:
+        notifier_type_id = listener['notifier_type_id']
+        try:
+            f = notifiers.get_notifier_function(notifier_type_id)
+            f(listener['notifier_config'], event)
+        except Exception:
+            _logger.exception('Exception from notifier of type [%s]' % notifier_type_id)
+
+
+LISTENERS = ListenerTable()
+DISPATCHER = NotifierDispatcher()
+
+
 class EventFireManager(object):
 
     def fire_repo_sync_started(self, repo_id):
@@ -55,24 +208,12 @@ class EventFireManager(object):
     def _do_fire(self, event):
         """
         Performs the actual act of firing an event to all appropriate
-        listeners. This call will log but otherwise suppress any exception
-        that comes out of a notifier.
+        listeners. The notifiers are invoked asynchronously; any exception
+        that comes out of a notifier is logged but otherwise suppressed.
 
         @param event: event object to fire
         @type  event: pulp.server.event.data.Event
         """
-        # Determine which listeners should be notified
-        listeners = list(EventListener.get_collection().find(
-            {'$or': ({'event_types': event.event_type}, {'event_types': '*'})}))
-
-        # For each listener, retrieve the notifier and invoke it. Be sure that
-        # an exception from a notifier is logged but does not interrupt the
-        # remainder of the firing, nor bubble up.
-        for listener in listeners:
-            notifier_type_id = listener['notifier_type_id']
-            f = notifiers.get_notifier_function(notifier_type_id)
-
-            try:
-                f(listener['notifier_config'], event)
-            except Exception:
-                _logger.exception('Exception from notifier of type [%s]' % notifier_type_id)
+        listeners = LISTENERS.listeners(event.event_type)
+        if listeners:
+            DISPATCHER.dispatch(listeners, event)
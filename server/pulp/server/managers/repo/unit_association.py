@@ -7,6 +7,7 @@ import logging
 import sys
 
 from celery import task
+from pymongo.errors import BulkWriteError
 import mongoengine
 import pymongo
 
@@ -14,12 +15,15 @@ from pulp.common import error_codes
 from pulp.plugins.conduits.unit_import import ImportUnitConduit
 from pulp.plugins.config import PluginCallConfiguration
 from pulp.plugins.loader import api as plugin_api
+from pulp.plugins.types import database as types_db
+from pulp.plugins.util.misc import paginate
 from pulp.server.async.tasks import Task
 from pulp.server.controllers import repository as repo_controller
 from pulp.server.controllers import units as units_controller
 from pulp.server.db import model
 from pulp.server.db.model.criteria import UnitAssociationCriteria
 from pulp.server.db.model.repository import RepoContentUnit
+from pulp.server.managers.content.cud import DUPLICATE_KEY_ERROR
 import pulp.plugins.conduits._common as conduit_common_utils
 import pulp.server.exceptions as exceptions
 import pulp.server.managers.factory as manager_factory
@@ -37,6 +41,14 @@ SORT_DESCENDING = pymongo.DESCENDING
 
 _VALID_DIRECTIONS = (SORT_ASCENDING, SORT_DESCENDING)
 
+# number of associations written by each bulk write in associate_all_by_ids
+ASSOCIATION_BATCH_SIZE = 1000
+
+# Importer metadata key. Importers whose import_units only associates the given
+# units with the destination repository may set it to True, letting
+# associate_from_repo copy associations without calling the importer.
+SERVER_SIDE_COPY = 'server_side_copy'
+
 logger = logging.getLogger(__name__)
 
 
@@ -105,7 +117,8 @@ class RepoUnitAssociationManager(object):
         """
         Creates multiple associations between the given repo and content units.
 
-        See associate_unit_by_id for semantics.
+        See associate_unit_by_id for semantics. The associations are upserted in
+        bulk, ASSOCIATION_BATCH_SIZE at a time.
 
         @param repo_id: identifies the repo
         @type  repo_id: str
@@ -121,16 +134,9 @@ class RepoUnitAssociationManager(object):
 
         @raise InvalidType: if the given owner type is not of the valid enumeration
         """
-
-        # There may be a way to batch this in mongo which would be ideal for a
-        # bulk operation like this. But for deadline purposes, this call will
-        # simply loop and call the single method.
-
         unique_count = 0
-        for unit_id in unit_id_list:
-            if not RepoUnitAssociationManager.association_exists(repo_id, unit_id, unit_type_id):
-                unique_count += 1
-            self.associate_unit_by_id(repo_id, unit_type_id, unit_id, False)
+        for page in paginate(unit_id_list, ASSOCIATION_BATCH_SIZE):
+            unique_count += RepoUnitAssociationManager._bulk_associate(repo_id, unit_type_id, page)
 
         # update the count of associated units on the repo object
         if unique_count:
@@ -138,6 +144,42 @@ class RepoUnitAssociationManager(object):
             repo_controller.update_last_unit_added(repo_id)
         return unique_count
 
+    @staticmethod
+    def _bulk_associate(repo_id, unit_type_id, unit_ids):
+        """
+        Upserts associations between the given repo and content units with a
+        single bulk write, without updating the repo.
+
+        :param repo_id:         identifies the repo
+        :type  repo_id:         str
+        :param unit_type_id:    identifies the type of the units
+        :type  unit_type_id:    str
+        :param unit_ids:        unique identifiers for units within the given type
+        :type  unit_ids:        list of str
+
+        :return:    number of new associations
+        :rtype:     int
+        """
+        requests = []
+        for unit_id in unit_ids:
+            association = RepoContentUnit(repo_id, unit_id, unit_type_id)
+            spec = {'repo_id': repo_id,
+                    'unit_id': unit_id,
+                    'unit_type_id': unit_type_id}
+            new_fields = dict((k, v) for k, v in association.items() if k not in spec)
+            requests.append(pymongo.UpdateOne(spec, {'$setOnInsert': new_fields}, upsert=True))
+        if not requests:
+            return 0
+
+        try:
+            return RepoContentUnit.get_collection().bulk_write(requests,
+                                                               ordered=False).upserted_count
+        except BulkWriteError, e:
+            # a concurrent association of the same unit is not an error
+            if any(error['code'] != DUPLICATE_KEY_ERROR for error in e.details['writeErrors']):
+                raise
+            return e.details['nUpserted']
+
     @staticmethod
     def _units_from_criteria(source_repo, criteria):
         """
@@ -202,6 +244,11 @@ class RepoUnitAssociationManager(object):
         If criteria is None, the effect of this call is to copy the source
         repository's associations into the destination repository.
 
+        If the destination repository's importer declares SERVER_SIDE_COPY in
+        its metadata and the criteria only filters on association fields, the
+        importer is not called. The source repository's associations are copied
+        in bulk by the server instead; see _copy_associations.
+
         :param source_repo_id:         identifies the source repository
         :type  source_repo_id:         str
         :param dest_repo_id:           identifies the destination repository
@@ -236,6 +283,10 @@ class RepoUnitAssociationManager(object):
         # of importing either the selected units or all of the units
         if not source_repo_unit_types.issubset(supported_type_ids):
             raise exceptions.PulpCodedException(error_code=error_codes.PLP0044)
+
+        if cls._server_side_copy_allowed(dest_repo_importer.importer_type_id, criteria):
+            return cls._copy_associations(source_repo_id, dest_repo, criteria)
+
         transfer_units = None
         # if all source types have been converted to mongo - search via new style
         if source_repo_unit_types.issubset(set(plugin_api.list_unit_models())):
@@ -281,6 +332,81 @@ class RepoUnitAssociationManager(object):
             logger.exception(msg % msg_dict)
             raise exceptions.PulpExecutionException(), None, sys.exc_info()[2]
 
+    @staticmethod
+    def _server_side_copy_allowed(importer_type_id, criteria):
+        """
+        Determine whether associate_from_repo may copy associations itself rather
+        than calling the importer. The importer must declare SERVER_SIDE_COPY in
+        its metadata, and the criteria may only select units by type and
+        association fields.
+
+        :param importer_type_id:    type of the destination repository's importer
+        :type  importer_type_id:    str
+        :param criteria:            criteria selecting the units to copy
+        :type  criteria:            pulp.server.db.model.criteria.UnitAssociationCriteria
+
+        :return:    True if the associations may be copied by the server
+        :rtype:     bool
+        """
+        if criteria.unit_filters or criteria.skip or criteria.limit:
+            return False
+        importer_metadata = plugin_api.list_importer_types(importer_type_id)
+        return bool(importer_metadata.get(SERVER_SIDE_COPY, False))
+
+    @staticmethod
+    def _copy_associations(source_repo_id, dest_repo, criteria):
+        """
+        Copy the source repository's associations that match the criteria to the
+        destination repository. Only the type and ID of each associated unit is
+        read, and the associations are written ASSOCIATION_BATCH_SIZE at a time.
+        The destination repository's unit counts are rebuilt once at the end.
+
+        :param source_repo_id:  identifies the source repository
+        :type  source_repo_id:  str
+        :param dest_repo:       destination repository
+        :type  dest_repo:       pulp.server.db.model.Repository
+        :param criteria:        criteria selecting the associations to copy
+        :type  criteria:        pulp.server.db.model.criteria.UnitAssociationCriteria
+
+        :return:    dict with key 'units_successful' whose value is a list of the
+                    type ID and unit key of each copied unit
+        :rtype:     dict
+        """
+        spec = criteria.association_filters.copy()
+        spec['repo_id'] = source_repo_id
+        if criteria.type_ids:
+            spec['unit_type_id'] = {'$in': criteria.type_ids}
+        cursor = RepoContentUnit.get_collection().find(spec,
+                                                       projection=['unit_type_id', 'unit_id'])
+
+        unit_key_fields = {}
+        units_successful = []
+        new_count = 0
+        for page in paginate(cursor, ASSOCIATION_BATCH_SIZE):
+            unit_ids_by_type = {}
+            for association in page:
+                unit_ids_by_type.setdefault(association['unit_type_id'], set()).add(
+                    association['unit_id'])
+
+            for unit_type_id, unit_ids in unit_ids_by_type.items():
+                unit_ids = list(unit_ids)
+                new_count += RepoUnitAssociationManager._bulk_associate(
+                    dest_repo.repo_id, unit_type_id, unit_ids)
+
+                if unit_type_id not in unit_key_fields:
+                    unit_key_fields[unit_type_id] = units_controller.get_unit_key_fields_for_type(
+                        unit_type_id)
+                key_fields = unit_key_fields[unit_type_id]
+                collection = types_db.type_units_collection(unit_type_id)
+                for unit in collection.find({'_id': {'$in': unit_ids}}, projection=key_fields):
+                    unit_key = dict((k, unit[k]) for k in key_fields)
+                    units_successful.append({'type_id': unit_type_id, 'unit_key': unit_key})
+
+        repo_controller.rebuild_content_unit_counts(dest_repo)
+        if new_count:
+            repo_controller.update_last_unit_added(dest_repo.repo_id)
+        return {'units_successful': units_successful}
+
     def unassociate_unit_by_id(self, repo_id, unit_type_id, unit_id, notify_plugins=True):
         """
         Removes the association between a repo and the given unit. Only the
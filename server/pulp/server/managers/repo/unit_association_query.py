@@ -6,6 +6,7 @@ import itertools
 import pymongo
 
 from pulp.plugins.types import database as types_db
+from pulp.plugins.util.misc import paginate
 from pulp.server.controllers import units
 from pulp.server.db.model.criteria import UnitAssociationCriteria
 from pulp.server.db.model.repository import RepoContentUnit
@@ -23,6 +24,9 @@ SORT_DESCENDING = pymongo.DESCENDING
 
 _VALID_DIRECTIONS = (SORT_ASCENDING, SORT_DESCENDING)
 
+# number of associations joined with their units at a time by get_units
+ASSOCIATION_PAGE_SIZE = 1000
+
 
 class RepoUnitAssociationQueryManager(object):
 
@@ -64,93 +68,14 @@ class RepoUnitAssociationQueryManager(object):
 
         criteria = criteria or UnitAssociationCriteria()
 
-        unit_associations_generator = self._unit_associations_cursor(repo_id, criteria)
-
-        if criteria.remove_duplicates:
-            unit_associations_generator = self._unit_associations_no_duplicates(
-                criteria, unit_associations_generator)
-
-        if criteria.association_sort and not criteria.unit_filters:
-            # If we're ordering by association fields, but not filtering the
-            # content units, then perform the skip and limit on this generator
-            # to limit the number of units we load into memory.
-            # Manually perform skip and limit so we don't have to differentiate
-            # based on whether we're removing duplicates or not.
-            unit_associations_generator = self._with_skip_and_limit(unit_associations_generator,
-                                                                    criteria.skip, criteria.limit)
-
-        # The unit ids are used for ordering the units when association field
-        # ordering is specified (i.e. created timestamps, etc.)
-        # The ids are (unit_type_id, unit_id) tuples.
-        association_ordered_unit_ids = []
-
-        # The unit association information is part of the return values, so we
-        # construct a lookup in order to retrieve that information when we are
-        # iterating over the content units.
-        #
-        # unit_type_id -> unit_id -> (ordered)[association_1, association_2, ...]
-        #
-        # We also use the unit_id keys to lookup the units from unit_type_id
-        # collections.
-        associations_lookup = {}
-
-        for association in unit_associations_generator:
-
-            unit_type_id = association['unit_type_id']
-            unit_id = association['unit_id']
-
-            # Build the ordering.
-            association_ordered_unit_ids.append((unit_type_id, unit_id))
-
-            # Build the lookup.
-            association_type_dict = associations_lookup.setdefault(unit_type_id, {})
-            association_list = association_type_dict.setdefault(unit_id, [])
-            association_list.append(association)
-
-        association_unit_types = criteria.type_ids or self.unit_type_ids_for_repo(repo_id)
-        # The unit types should always be sorted in the same order, this allows
-        # multiple calls with skip and limit to work across types.
-        association_unit_types = sorted(association_unit_types)
-
-        # Use a generator expression here to keep from going back to the types
-        # collections once we've returned our limit of results.
-        # Be sure to skip cursors that would otherwise return an empty result set.
-        units_cursors = (self._associated_units_by_type_cursor(t, criteria,
-                                                               associations_lookup[t].keys())
-                         for t in association_unit_types if t in associations_lookup)
-
-        if not criteria.association_sort:
-            # If we're not sorting based on association fields, then set the
-            # skip and limit individually across the cursors to get consistent
-            # behavior across multiple calls across multiple unit types.
-            # The order that the generators are applied here is extremely
-            # important. DO NOT CHANGE!
-            units_cursors = self._associated_units_cursors_with_skip(units_cursors, criteria.skip)
-            units_cursors = self._associated_units_cursors_with_limit(units_cursors, criteria.limit)
-
-        units_generator = itertools.chain(*units_cursors)
-
         if criteria.association_sort:
-            # Use the ordered associations we created to properly order the results.
-            units_generator = self._association_ordered_units(association_ordered_unit_ids,
-                                                              units_generator)
-
-            if criteria.unit_filters:
-                # If we're ordering by association fields and filtering the
-                # content units, then skip and limit must be performed manually
-                # and last (skip and limit must always come after sorting).
-                units_generator = self._with_skip_and_limit(units_generator, criteria.skip,
-                                                            criteria.limit)
-
-            # The association ordering will generate the same unit for every
-            # association it has with the repository, hence "duplicate units".
-            units_generator = self._merged_units_duplicate_units(associations_lookup,
-                                                                 units_generator)
-
+            units_generator = self._units_in_association_order(repo_id, criteria)
+        elif criteria.unit_sort is None:
+            units_generator = self._units_in_unit_id_order(repo_id, criteria)
         else:
-            # Unit ordering or no ordering only produce unique units, hence
-            # "unique units".
-            units_generator = self._merged_units_unique_units(associations_lookup, units_generator)
+            # Sorting by unit fields can only be done once every unit of a type
+            # that is associated with the repository is known.
+            units_generator = self._units_in_unit_sort_order(repo_id, criteria)
 
         if as_generator:
             return units_generator
@@ -244,6 +169,228 @@ class RepoUnitAssociationQueryManager(object):
 
         return [t for t in cursor.distinct('unit_type_id')]
 
+    # -- paged execution methods -----------------------------------------------
+
+    def _units_in_association_order(self, repo_id, criteria):
+        """
+        Generate the units associated with the repository, ordered by the
+        criteria's association sort. The associations are walked in pages, and
+        the units of each page are loaded with a single query per unit type, so
+        only a page of associations and units is held in memory at a time.
+
+        One result is generated for each association, so a unit associated more
+        than once is generated more than once.
+
+        :type repo_id: str
+        :type criteria: UnitAssociationCriteria
+        :rtype: generator
+        """
+        unit_associations_generator = self._unit_associations_cursor(repo_id, criteria)
+
+        if criteria.remove_duplicates:
+            unit_associations_generator = self._unit_associations_no_duplicates(
+                criteria, unit_associations_generator)
+
+        if not criteria.unit_filters:
+            # Every association has a unit, so skip and limit can be performed
+            # on the associations before any unit is loaded.
+            unit_associations_generator = self._with_skip_and_limit(unit_associations_generator,
+                                                                    criteria.skip, criteria.limit)
+
+        units_generator = self._associations_with_units(criteria, unit_associations_generator)
+
+        if criteria.unit_filters:
+            # Associations whose units do not match the filters are dropped, so
+            # skip and limit must be performed on the results.
+            units_generator = self._with_skip_and_limit(units_generator, criteria.skip,
+                                                        criteria.limit)
+
+        return units_generator
+
+    def _associations_with_units(self, criteria, unit_associations):
+        """
+        Add each association's unit to it as its metadata, preserving the order
+        of the associations. Associations whose units do not match the criteria
+        are dropped.
+
+        :type criteria: UnitAssociationCriteria
+        :type unit_associations: iterator
+        :rtype: generator
+        """
+        for page in paginate(unit_associations, ASSOCIATION_PAGE_SIZE):
+
+            unit_ids_by_type = {}
+            for association in page:
+                unit_ids_by_type.setdefault(association['unit_type_id'], set()).add(
+                    association['unit_id'])
+
+            units_by_id = {}
+            for unit_type_id, unit_ids in unit_ids_by_type.items():
+                cursor = self._associated_units_by_type_cursor(unit_type_id, criteria,
+                                                               list(unit_ids))
+                for unit in cursor:
+                    units_by_id[(unit['_content_type_id'], unit['_id'])] = unit
+
+            for association in page:
+                unit = units_by_id.get((association['unit_type_id'], association['unit_id']))
+                if unit is None:
+                    continue
+                association['metadata'] = unit
+                yield association
+
+    def _units_in_unit_id_order(self, repo_id, criteria):
+        """
+        Generate the units associated with the repository, ordered by unit type
+        and then by unit ID, which is the order used when no sort is given.
+
+        The associations of each unit type are walked in unit ID order, which is
+        also the order of the units they reference, so units can be loaded one
+        page at a time.
+
+        Skip and limit count units rather than associations, and every
+        association of each unit is generated.
+
+        :type repo_id: str
+        :type criteria: UnitAssociationCriteria
+        :rtype: generator
+        """
+        # The unit types should always be sorted in the same order, this allows
+        # multiple calls with skip and limit to work across types.
+        unit_type_ids = sorted(criteria.type_ids or self.unit_type_ids_for_repo(repo_id))
+
+        association_cursors = (self._unit_associations_by_unit_id_cursor(repo_id, t, criteria)
+                               for t in unit_type_ids)
+
+        if not criteria.unit_filters:
+            # Each unit is associated with a repository only once, so when units
+            # are not filtered, skip and limit can be performed on the
+            # association cursors themselves. The order that the generators are
+            # applied here is extremely important. DO NOT CHANGE!
+            association_cursors = self._associated_units_cursors_with_skip(association_cursors,
+                                                                           criteria.skip)
+            association_cursors = self._associated_units_cursors_with_limit(association_cursors,
+                                                                            criteria.limit)
+
+        grouped_units = itertools.chain.from_iterable(
+            self._units_with_associations(c, criteria) for c in association_cursors)
+
+        if criteria.unit_filters:
+            grouped_units = self._with_skip_and_limit(grouped_units, criteria.skip,
+                                                      criteria.limit)
+
+        for unit, associations in grouped_units:
+            for association in associations:
+                association['metadata'] = unit
+                yield association
+
+    @staticmethod
+    def _unit_associations_by_unit_id_cursor(repo_id, unit_type_id, criteria):
+        """
+        Retrieve a pymongo cursor for associations of the given unit type with
+        the given repository, sorted by unit ID and then creation date.
+
+        :type repo_id: str
+        :type unit_type_id: str
+        :type criteria: UnitAssociationCriteria
+        :rtype: pymongo.cursor.Cursor
+        """
+        spec = criteria.association_filters.copy()
+        spec['repo_id'] = repo_id
+        spec['unit_type_id'] = unit_type_id
+
+        collection = RepoContentUnit.get_collection()
+
+        cursor = collection.find(spec, projection=criteria.association_fields)
+        cursor.sort([('unit_id', SORT_ASCENDING), ('created', SORT_ASCENDING)])
+
+        return cursor
+
+    def _units_with_associations(self, association_cursor, criteria):
+        """
+        Generate each unit referenced by the associations in unit ID order, along
+        with a list of its associations. Units that do not match the criteria are
+        dropped.
+
+        :param association_cursor: associations of a single unit type, sorted by unit ID
+        :type  association_cursor: pymongo.cursor.Cursor
+        :type  criteria: UnitAssociationCriteria
+        :rtype: generator of (dict, list) tuples
+        """
+        # Associations are sorted by unit ID, so all of the associations of a unit
+        # are adjacent, the oldest first.
+        association_groups = ((unit_id, list(associations)) for unit_id, associations in
+                              itertools.groupby(association_cursor, lambda a: a['unit_id']))
+
+        for page in paginate(association_groups, ASSOCIATION_PAGE_SIZE):
+            associations_by_unit_id = dict(page)
+            if criteria.remove_duplicates:
+                for unit_id, associations in associations_by_unit_id.items():
+                    associations_by_unit_id[unit_id] = associations[:1]
+
+            unit_type_id = page[0][1][0]['unit_type_id']
+            cursor = self._associated_units_by_type_cursor(unit_type_id, criteria,
+                                                           associations_by_unit_id.keys())
+            for unit in cursor:
+                yield unit, associations_by_unit_id[unit['_id']]
+
+    def _units_in_unit_sort_order(self, repo_id, criteria):
+        """
+        Generate the units associated with the repository, ordered by unit type
+        and then by the criteria's unit sort.
+
+        Every association of the requested types is loaded before any unit is
+        queried, since each unit type is sorted by a single query.
+
+        :type repo_id: str
+        :type criteria: UnitAssociationCriteria
+        :rtype: generator
+        """
+        unit_associations_generator = self._unit_associations_cursor(repo_id, criteria)
+
+        if criteria.remove_duplicates:
+            unit_associations_generator = self._unit_associations_no_duplicates(
+                criteria, unit_associations_generator)
+
+        # The unit association information is part of the return values, so we
+        # construct a lookup in order to retrieve that information when we are
+        # iterating over the content units.
+        #
+        # unit_type_id -> unit_id -> (ordered)[association_1, association_2, ...]
+        #
+        # We also use the unit_id keys to lookup the units from unit_type_id
+        # collections.
+        associations_lookup = {}
+
+        for association in unit_associations_generator:
+            association_type_dict = associations_lookup.setdefault(association['unit_type_id'],
+                                                                   {})
+            association_list = association_type_dict.setdefault(association['unit_id'], [])
+            association_list.append(association)
+
+        association_unit_types = criteria.type_ids or self.unit_type_ids_for_repo(repo_id)
+        # The unit types should always be sorted in the same order, this allows
+        # multiple calls with skip and limit to work across types.
+        association_unit_types = sorted(association_unit_types)
+
+        # Use a generator expression here to keep from going back to the types
+        # collections once we've returned our limit of results.
+        # Be sure to skip cursors that would otherwise return an empty result set.
+        units_cursors = (self._associated_units_by_type_cursor(t, criteria,
+                                                               associations_lookup[t].keys())
+                         for t in association_unit_types if t in associations_lookup)
+
+        # Set the skip and limit individually across the cursors to get
+        # consistent behavior across multiple calls across multiple unit types.
+        # The order that the generators are applied here is extremely
+        # important. DO NOT CHANGE!
+        units_cursors = self._associated_units_cursors_with_skip(units_cursors, criteria.skip)
+        units_cursors = self._associated_units_cursors_with_limit(units_cursors, criteria.limit)
+
+        units_generator = itertools.chain(*units_cursors)
+
+        # Unit ordering only produces unique units, hence "unique units".
+        return self._merged_units_unique_units(associations_lookup, units_generator)
+
     # -- unit association methods ----------------------------------------------
 
     @staticmethod
@@ -451,58 +598,6 @@ class RepoUnitAssociationQueryManager(object):
                 generated_elements += cursor.count()
                 yield cursor
 
-    @staticmethod
-    def _association_ordered_units(associated_unit_ids, associated_units):
-        """
-        Return associated units in the order specified by the associated unit id
-        list.
-
-        :type associated_unit_ids: list
-        :type associated_units: iterator
-        :rtype: generator
-        """
-
-        # This algorithm assumes that associated_unit_ids has already been sorted.
-
-        # XXX This is unfortunate as it's the one place that loads all of the
-        # associated_units into memory.
-        # It is worth noting that the units have already been filtered by type,
-        # association filters, and unit filters. In addition, skip and limit
-        # may have also been performed, so it's potentially not as bad as it seems.
-        associated_units_by_id = dict(
-            ((u['_content_type_id'], u['_id']), u) for u in associated_units)
-
-        for id_tuple in associated_unit_ids:
-            # the associated_unit_ids are sorted, but not all of the units may
-            # be in the associated_units_by_id
-            if id_tuple not in associated_units_by_id:
-                continue
-
-            yield associated_units_by_id[id_tuple]
-
-    @staticmethod
-    def _merged_units_duplicate_units(associations_lookup, associated_units):
-        """
-        Return associated units as the unit association information and the unit
-        information as metadata on the unit association information.
-
-        Used when there are duplicate units returned by the associated_units iterator.
-
-        :type associations_lookup: dict
-        :type associated_units: iterator
-        :rtype: generator
-        """
-
-        # This algorithm assumes that the units will come in the same order that
-        # the associations are listed in the associations_lookup.
-
-        for unit in associated_units:
-            # Remove the associations from the list in the order they were
-            # placed in it.
-            association = associations_lookup[unit['_content_type_id']][unit['_id']].pop(0)
-            association['metadata'] = unit
-            yield association
-
     @staticmethod
     def _merged_units_unique_units(associations_lookup, associated_units):
         """
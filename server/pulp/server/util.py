@@ -351,3 +351,30 @@ def calculate_checksums(file_object, checksum_types):
         bits = file_object.read(CHECKSUM_CHUNK_SIZE)
 
     return dict((checksum_type, hasher.hexdigest()) for checksum_type, hasher in hashers.items())
+
+
+def calculate_unit_key_digest(unit_key):
+    """
+    Calculate the digest of a unit key that is stored on content units to look them up.
+
+    Each key and value is prefixed with its length, so that different unit keys cannot be hashed
+    from the same input.
+
+    :param unit_key: unit key field names and their values
+    :type  unit_key: dict
+
+    :return: The hex digest of the unit key.
+    :rtype:  str
+    """
+    _hash = hashlib.sha256()
+    for key, value in sorted(unit_key.items()):
+        for part in (key, value):
+            if part is None:
+                _hash.update('-')
+                continue
+            if isinstance(part, unicode):
+                part = part.encode('utf-8')
+            elif not isinstance(part, str):
+                part = str(part)
+            _hash.update('%d:%s' % (len(part), part))
+    return _hash.hexdigest()
@@ -249,6 +249,7 @@ urlpatterns = patterns(
     url(r'^v2/status/$', StatusView.as_view(), name='status'),
     url(r'^v2/tasks/$', tasks.TaskCollectionView.as_view(), name='task_collection'),
     url(r'^v2/tasks/search/$', tasks.TaskSearchView.as_view(), name='task_search'),
+    url(r'^v2/tasks/status/$', tasks.TaskStatusView.as_view(), name='task_status'),
     url(r'^v2/tasks/(?P<task_id>[^/]+)/$', tasks.TaskResourceView.as_view(), name='task_resource'),
     url(r'^v2/task_groups/(?P<group_id>[^/]+)/$',
         task_groups.TaskGroupView.as_view(), name='task_group'),
@@ -701,17 +701,28 @@ class ConsumerProfilesView(View):
         :param consumer_id: A consumer ID.
         :type consumer_id: str
 
+        If the body carries a profile_hash instead of a profile, nothing is stored. The response
+        indicates whether the stored profile was reported with the same hash; if it was not, the
+        consumer should send the full profile.
+
         :raises MissingValue: if some parameter were not provided
 
-        :return: Response representing the created profile
+        :return: Response representing the created profile, or whether the profile is unchanged
         :rtype: django.http.HttpResponse
         """
 
         body = request.body_as_json
         content_type = body.get('content_type')
         profile = body.get('profile')
+        profile_hash = body.get('profile_hash')
 
         manager = factory.consumer_profile_manager()
+        if profile is None and profile_hash is not None:
+            if content_type is None:
+                raise MissingValue('content_type')
+            unchanged = manager.is_unchanged(consumer_id, content_type, profile_hash)
+            return generate_json_response({'unchanged': unchanged})
+
         new_profile = manager.create(consumer_id, content_type, profile)
         if content_type is None:
             raise MissingValue('content_type')
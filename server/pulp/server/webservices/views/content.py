@@ -8,7 +8,7 @@ from pulp.common import tags
 from pulp.common.tags import (ACTION_REFRESH_ALL_CONTENT_SOURCES,
                               ACTION_REFRESH_CONTENT_SOURCE,
                               RESOURCE_CONTENT_SOURCE)
-from pulp.server import constants
+from pulp.server import constants, util
 from pulp.server.auth import authorization
 from pulp.server.content.sources.container import ContentContainer
 from pulp.server.controllers import content
@@ -429,20 +429,45 @@ class UploadsCollectionView(View):
         return generate_json_response({'upload_ids': upload_ids})
 
     @auth_required(authorization.CREATE)
-    @parse_json_body(allow_empty=True)
+    @parse_json_body(allow_empty=True, json_type=dict)
     def post(self, request, *args, **kwargs):
         """
         Initialize an upload and return a serialized dict containing the upload data.
 
+        If the body gives the size and checksum of the file to be uploaded, and Pulp already
+        stores a file matching them, the upload is filled with that file and the response says
+        so; the caller can then import the upload without sending the bits.
+
         :param request: WSGI request object
         :type request: django.core.handlers.wsgi.WSGIRequest
-        :return : Serialized response containing a url to delete an upload and a unique id.
+        :return : Serialized response containing a url to delete an upload, a unique id and
+                  whether the upload was filled with a stored file.
         :rtype : django.http.HttpResponse
-        """
+
+        :raises InvalidValue: if the size or checksum are given but invalid
+        """
+        size = request.body_as_json.get('size')
+        checksum = request.body_as_json.get('checksum')
+        checksum_type = request.body_as_json.get('checksum_type', util.TYPE_SHA256)
+        if checksum is not None or size is not None:
+            invalid = []
+            if not isinstance(size, (int, long)) or isinstance(size, bool) or size < 0:
+                invalid.append('size')
+            if not isinstance(checksum, basestring) or not checksum:
+                invalid.append('checksum')
+            if not isinstance(checksum_type, basestring):
+                invalid.append('checksum_type')
+            if invalid:
+                raise InvalidValue(invalid)
+
         upload_manager = factory.content_upload_manager()
-        upload_id = upload_manager.initialize_upload()
+        upload_id = upload_manager.initialize_upload(size, checksum, checksum_type)
+        reused = False
+        if checksum is not None:
+            reused = upload_manager.reuse_stored_file(upload_id, size, checksum, checksum_type)
         href = reverse('content_upload_resource', kwargs={'upload_id': upload_id})
-        response = generate_json_response({'_href': href, 'upload_id': upload_id})
+        response = generate_json_response({'_href': href, 'upload_id': upload_id,
+                                           'reused': reused})
         response_redirect = generate_redirect_response(response, href)
         return response_redirect
 
@@ -457,7 +482,8 @@ class UploadSegmentResourceView(View):
         """
         Upload to a specific file upload.
 
-        :param request:   WSGI request object, body contains bits to upload
+        :param request:   WSGI request object, body contains bits to upload; it is streamed
+                          to the file rather than read into memory
         :type  request:   django.core.handlers.wsgi.WSGIRequest
         :param upload_id: id of the initialized upload
         :type  upload_id: str
@@ -479,7 +505,7 @@ class UploadSegmentResourceView(View):
 
         # If the upload ID doesn't exists, either because it was not initialized
         # or was deleted, the call to the manager will raise missing resource
-        upload_manager.save_data(upload_id, offset, request.body)
+        upload_manager.save_data(upload_id, offset, request)
         return generate_json_response(None)
 
 
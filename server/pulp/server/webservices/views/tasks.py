@@ -2,9 +2,11 @@
 This module contains views related to Pulp's task system models.
 """
 from datetime import datetime
+import hashlib
+import json
 
 from django.views.generic import View
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseNotModified
 from mongoengine.queryset import DoesNotExist
 
 from pulp.common import error_codes
@@ -13,17 +15,23 @@ from pulp.server import exceptions as pulp_exceptions
 from pulp.server.async import tasks
 from pulp.server.auth import authorization
 from pulp.server.db.model import Worker, TaskStatus
-from pulp.server.exceptions import MissingResource
+from pulp.server.exceptions import InvalidValue, MissingResource
 from pulp.server.webservices.views import search
 from pulp.server.webservices.views.decorators import auth_required
 from pulp.server.webservices.views.serializers import dispatch as serial_dispatch
 from pulp.server.webservices.views.util import (generate_json_response,
-                                                generate_json_response_with_pulp_encoder)
+                                                generate_json_response_with_pulp_encoder,
+                                                parse_json_body, pulp_json_encoder)
 
 
 # This constant set is used for deleting the completed tasks from the collection.
 VALID_STATES = set(filter(lambda state: state != CALL_CANCELED_STATE, CALL_COMPLETE_STATES))
 
+# Hex digits kept of each digest in a task version
+TASK_VERSION_DIGEST_LENGTH = 12
+# Fields of each task returned by TaskStatusView
+TASK_STATUS_FIELDS = ('task_id', 'state', 'start_time', 'finish_time')
+
 
 def task_serializer(task):
     """
@@ -41,6 +49,59 @@ def task_serializer(task):
     return task
 
 
+def _digest(value):
+    """
+    :param value: JSON serializable value
+    :type  value: object
+
+    :return: the first TASK_VERSION_DIGEST_LENGTH hex digits of the digest of the value
+    :rtype:  str
+    """
+    serialized = json.dumps(value, sort_keys=True, default=pulp_json_encoder)
+    return hashlib.sha1(serialized).hexdigest()[:TASK_VERSION_DIGEST_LENGTH]
+
+
+def task_version(task):
+    """
+    Return a value that changes whenever the serialized task changes.
+
+    The version is a digest of the names of the task's fields followed by a digest of each field,
+    so that changed_task_fields can tell which fields changed since an earlier version without
+    keeping the earlier task.
+
+    :param task: The serialized task
+    :type  task: dict
+
+    :return: hex digests of the serialized task, separated by '-'
+    :rtype:  str
+    """
+    field_digests = sorted(_digest([name, value]) for name, value in task.items())
+    return '-'.join([_digest(sorted(task))] + field_digests)
+
+
+def changed_task_fields(task, version):
+    """
+    Return the fields of the serialized task that changed since the given version of it.
+
+    :param task: The serialized task
+    :type  task: dict
+    :param version: version of the task from an earlier call to task_version, or None
+    :type  version: basestring
+
+    :return: the fields that changed, or None if the task no longer has the same fields as the
+             version or no version is given
+    :rtype:  dict or None
+    """
+    if not version:
+        return None
+    digests = version.split('-')
+    if digests[0] != _digest(sorted(task)):
+        return None
+    known = set(digests[1:])
+    return dict((name, value) for name, value in task.items()
+                if _digest([name, value]) not in known)
+
+
 class TaskSearchView(search.SearchView):
     """
     This view provides GET and POST searching on TaskStatus objects.
@@ -100,6 +161,45 @@ class TaskCollectionView(View):
         return HttpResponse(status=204)
 
 
+class TaskStatusView(View):
+    """
+    View for the status of many tasks at once.
+    """
+
+    @auth_required(authorization.READ)
+    @parse_json_body(json_type=dict)
+    def post(self, request):
+        """
+        Return a response containing the state, start time and finish time of each of the given
+        tasks, and their progress reports if requested. Unknown task IDs are left out.
+
+        :param request: WSGI request object, body contains a list of task IDs as 'task_ids' and
+                        optionally the boolean 'progress'
+        :type  request: django.core.handlers.wsgi.WSGIRequest
+
+        :return: Response containing a list of dicts, one for each task found
+        :rtype:  django.http.HttpResponse
+        :raises InvalidValue: if task_ids is not a list of strings or progress is not a boolean
+        """
+        task_ids = request.body_as_json.get('task_ids')
+        progress = request.body_as_json.get('progress', False)
+        invalid = []
+        if not isinstance(task_ids, list) or \
+                not all(isinstance(task_id, basestring) for task_id in task_ids):
+            invalid.append('task_ids')
+        if not isinstance(progress, bool):
+            invalid.append('progress')
+        if invalid:
+            raise InvalidValue(invalid)
+
+        fields = TASK_STATUS_FIELDS
+        if progress:
+            fields += ('progress_report',)
+        raw_tasks = TaskStatus.objects(task_id__in=task_ids).only(*fields).as_pymongo()
+        statuses = [dict((field, task.get(field)) for field in fields) for task in raw_tasks]
+        return generate_json_response(statuses)
+
+
 class TaskResourceView(View):
     """
     View for a single task.
@@ -110,6 +210,13 @@ class TaskResourceView(View):
         """
         Return a response containing a single task.
 
+        The response includes the task's version. If the optional GET parameter 'version' is
+        given, only the fields of the task that changed since that version are returned, along
+        with 'task_id', the new 'version' and 'partial' set to True, so clients that poll a task
+        do not download the unchanged parts of the task report again. An empty 304 response is
+        returned if nothing changed. The whole task is returned if its fields were added or
+        removed since that version.
+
         :param request: WSGI request object
         :type  request: django.core.handlers.wsgi.WSGIRequest
         :param task_id: The ID of the task you wish to cancel
@@ -119,6 +226,26 @@ class TaskResourceView(View):
         :rtype : django.http.HttpResponse
         :raises MissingResource: if task is not found
         """
+        task_dict = self._get_task(task_id)
+        version = task_version(task_dict)
+        changed = changed_task_fields(task_dict, request.GET.get('version'))
+        if changed is not None:
+            if not changed:
+                return HttpResponseNotModified()
+            task_dict = dict(changed, task_id=task_id, partial=True)
+        task_dict['version'] = version
+        return generate_json_response_with_pulp_encoder(task_dict)
+
+    @staticmethod
+    def _get_task(task_id):
+        """
+        :param task_id: The ID of the task
+        :type  task_id: basestring
+
+        :return: the serialized task, including its queue
+        :rtype:  dict
+        :raises MissingResource: if task is not found
+        """
         try:
             task = TaskStatus.objects.get(task_id=task_id)
         except DoesNotExist:
@@ -129,7 +256,7 @@ class TaskResourceView(View):
             queue_name = Worker(name=task_dict['worker_name'],
                                 last_heartbeat=datetime.now()).queue_name
             task_dict.update({'queue': queue_name})
-        return generate_json_response_with_pulp_encoder(task_dict)
+        return task_dict
 
     @auth_required(authorization.DELETE)
     def delete(self, request, task_id):
@@ -672,6 +672,79 @@ class AddUnitMixinTests(unittest.TestCase):
         self.assertRaises(mixins.ImporterConduitException, self.mixin.link_unit, None, None)
 
 
+@mock.patch('pulp.server.managers.repo.unit_association.RepoUnitAssociationManager.'
+            'associate_all_by_ids')
+@mock.patch('pulp.server.managers.content.cud.ContentManager.upsert_content_units')
+class UnitSaveSessionTests(unittest.TestCase):
+
+    def setUp(self):
+        manager_factory.initialize()
+        self.conduit = mixins.AddUnitMixin('add-repo', 'add-importer')
+
+    def test_buffers_units(self, mock_upsert, mock_associate):
+        session = self.conduit.save_unit_session(batch_size=3)
+        unit = Unit('t', {'k': 'v'}, {'m': 'm1'}, None)
+
+        saved = session.save_unit(unit)
+
+        self.assertTrue(saved is unit)
+        self.assertEqual(unit.id, None)
+        self.assertEqual(0, mock_upsert.call_count)
+        self.assertEqual(0, mock_associate.call_count)
+
+    def test_flush_when_full(self, mock_upsert, mock_associate):
+        mock_upsert.return_value = (['id-1', 'id-2'], 1)
+        session = self.conduit.save_unit_session(batch_size=2)
+        units = [Unit('t', {'k': 'v%d' % i}, {'m': 'm1'}, None) for i in range(2)]
+
+        for unit in units:
+            session.save_unit(unit)
+
+        mock_upsert.assert_called_once_with('t', [mixins.common_utils.to_pulp_unit(u)
+                                                  for u in units])
+        mock_associate.assert_called_once_with('add-repo', 't', ['id-1', 'id-2'])
+        self.assertEqual(['id-1', 'id-2'], [u.id for u in units])
+        self.assertEqual(1, self.conduit._added_count)
+        self.assertEqual(1, self.conduit._updated_count)
+
+    def test_flush_by_type(self, mock_upsert, mock_associate):
+        mock_upsert.side_effect = [(['id-1', 'id-3'], 2), (['id-2'], 0)]
+        units = [Unit('a', {'k': '1'}, {}, None), Unit('b', {'k': '2'}, {}, None),
+                 Unit('a', {'k': '3'}, {}, None)]
+
+        with self.conduit.save_unit_session() as session:
+            for unit in units:
+                session.save_unit(unit)
+
+        self.assertEqual(['a', 'b'], [c[0][0] for c in mock_upsert.call_args_list])
+        self.assertEqual([mock.call('add-repo', 'a', ['id-1', 'id-3']),
+                          mock.call('add-repo', 'b', ['id-2'])], mock_associate.call_args_list)
+        self.assertEqual(['id-1', 'id-2', 'id-3'], [u.id for u in units])
+        self.assertEqual(2, self.conduit._added_count)
+        self.assertEqual(1, self.conduit._updated_count)
+
+    def test_no_flush_on_error(self, mock_upsert, mock_associate):
+        def _save():
+            with self.conduit.save_unit_session() as session:
+                session.save_unit(Unit('t', {'k': 'v'}, {}, None))
+                raise ValueError()
+
+        self.assertRaises(ValueError, _save)
+        self.assertEqual(0, mock_upsert.call_count)
+
+    def test_flush_empty(self, mock_upsert, mock_associate):
+        self.conduit.save_unit_session().flush()
+
+        self.assertEqual(0, mock_upsert.call_count)
+
+    def test_flush_error(self, mock_upsert, mock_associate):
+        mock_upsert.side_effect = Exception()
+        session = self.conduit.save_unit_session()
+        session.save_unit(Unit('t', {'k': 'v'}, {}, None))
+
+        self.assertRaises(mixins.ImporterConduitException, session.flush)
+
+
 class StatusMixinTests(unittest.TestCase):
 
     def setUp(self):
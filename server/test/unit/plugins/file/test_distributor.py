@@ -161,6 +161,96 @@ class FileDistributorTest(unittest.TestCase):
         # Ensure the old rpm is no longer included
         self.assertFalse(os.path.islink(target_file))
 
+    def _incremental_publish(self, distributor, units, scratchpad):
+        """
+        Publish the units incrementally, keeping the distributor scratchpad in
+        the given dict.
+        """
+        conduit = get_publish_conduit(existing_units=units)
+        conduit.get_scratchpad.side_effect = lambda: scratchpad.get('value')
+        conduit.set_scratchpad.side_effect = lambda value: scratchpad.update(value=value)
+        return distributor.publish_repo(self.repo, conduit, {'incremental_publish': True})
+
+    @patch('pulp.server.managers.repo._common.get_working_directory', spec_set=True)
+    def test_incremental_publish_first(self, mock_get_working):
+        mock_get_working.return_value = self.temp_dir
+        distributor = self.create_distributor_with_mocked_api_calls()
+        distributor.unpublish_repo = Mock()
+        scratchpad = {}
+
+        report = self._incremental_publish(distributor, [self.unit], scratchpad)
+
+        self.assertTrue(report.success_flag)
+        # there was nothing published before, so everything is published
+        self.assertEqual(distributor.unpublish_repo.call_count, 1)
+        self.assertTrue(os.path.islink(os.path.join(self.target_dir, SAMPLE_RPM)))
+        published = scratchpad['value']['published_manifest']
+        self.assertEqual(published['locations'], [self.target_dir])
+        self.assertEqual(published['checksum'], distributor._manifest_checksum(
+            os.path.join(self.target_dir, MANIFEST_FILENAME)))
+
+    @patch('pulp.server.managers.repo._common.get_working_directory', spec_set=True)
+    def test_incremental_publish_changes(self, mock_get_working):
+        mock_get_working.return_value = self.temp_dir
+        distributor = self.create_distributor_with_mocked_api_calls()
+        scratchpad = {'value': {'checksum_type': 'sha256'}}
+        self._incremental_publish(distributor, [self.unit], scratchpad)
+        # a file that is not a unit, which a full publish would remove
+        open(os.path.join(self.target_dir, 'extra'), 'w').close()
+
+        new_unit = Unit('RPM', {'name': 'foo.rpm', 'size': 2, 'checksum': 'sum2'}, {},
+                        os.path.join(DATA_DIR, SAMPLE_FILE))
+        distributor.unpublish_repo = Mock()
+        report = self._incremental_publish(distributor, [new_unit], scratchpad)
+
+        self.assertTrue(report.success_flag)
+        self.assertEqual(distributor.unpublish_repo.call_count, 0)
+        self.assertTrue(os.path.exists(os.path.join(self.target_dir, 'extra')))
+        self.assertFalse(os.path.lexists(os.path.join(self.target_dir, SAMPLE_RPM)))
+        self.assertEqual(os.readlink(os.path.join(self.target_dir, 'foo.rpm')),
+                         os.path.join(DATA_DIR, SAMPLE_FILE))
+        with open(os.path.join(self.target_dir, MANIFEST_FILENAME), 'rb') as f:
+            self.assertEqual(list(csv.reader(f)), [['foo.rpm', 'sum2', '2']])
+        self.assertFalse(os.path.exists(
+            os.path.join(self.target_dir, '.%s.new' % MANIFEST_FILENAME)))
+        self.assertEqual(scratchpad['value']['checksum_type'], 'sha256')
+        self.assertEqual(scratchpad['value']['published_manifest']['checksum'],
+                         distributor._manifest_checksum(
+                             os.path.join(self.target_dir, MANIFEST_FILENAME)))
+
+    @patch('pulp.server.managers.repo._common.get_working_directory', spec_set=True)
+    def test_incremental_publish_manifest_changed(self, mock_get_working):
+        """
+        Assert a full publish is done if the published manifest was not written by the last
+        publish.
+        """
+        mock_get_working.return_value = self.temp_dir
+        distributor = self.create_distributor_with_mocked_api_calls()
+        scratchpad = {}
+        self._incremental_publish(distributor, [self.unit], scratchpad)
+        with open(os.path.join(self.target_dir, MANIFEST_FILENAME), 'a') as f:
+            f.write('other.rpm,sum3,3\r\n')
+
+        distributor.unpublish_repo = Mock()
+        self._incremental_publish(distributor, [self.unit], scratchpad)
+
+        self.assertEqual(distributor.unpublish_repo.call_count, 1)
+
+    @patch('pulp.server.managers.repo._common.get_working_directory', spec_set=True)
+    def test_incremental_publish_locations_changed(self, mock_get_working):
+        mock_get_working.return_value = self.temp_dir
+        distributor = self.create_distributor_with_mocked_api_calls()
+        scratchpad = {}
+        self._incremental_publish(distributor, [self.unit], scratchpad)
+
+        other_dir = os.path.join(self.temp_dir, 'other')
+        distributor.get_hosting_locations.return_value = [self.target_dir, other_dir]
+        self._incremental_publish(distributor, [self.unit], scratchpad)
+
+        self.assertTrue(os.path.islink(os.path.join(other_dir, SAMPLE_RPM)))
+        self.assertEqual(scratchpad['value']['published_manifest']['locations'],
+                         [self.target_dir, other_dir])
+
     def test_distributor_removed_calls_unpublish(self):
         distributor = self.create_distributor_with_mocked_api_calls()
         distributor.unpublish_repo = Mock()
@@ -1,3 +1,5 @@
+import mock
+
 from ... import base
 from pulp.plugins.types.model import TypeDefinition
 from pulp.server.db.model.content import ContentType
@@ -433,3 +435,58 @@ class TypesDatabaseTests(base.PulpServerTests):
         index_dict = collection.index_information()
 
         self.assertEqual(2, len(index_dict))  # default (_id) + new one
+
+    def test_registry_serves_lookups_from_memory(self):
+        """
+        Tests that once the registry is loaded, lookups do not query the types collection.
+        """
+
+        # Setup
+        types_db.update_database([DEF_1, DEF_3])
+
+        # Test
+        with mock.patch.object(ContentType, 'get_collection') as mock_get_collection:
+            type_ids = types_db.all_type_ids()
+            unit_key = types_db.type_units_unit_key(DEF_3.id)
+            type_def = types_db.type_definition(DEF_1.id)
+
+        # Verify
+        self.assertEqual(0, mock_get_collection.call_count)
+        self.assertEqual(set([DEF_1.id, DEF_3.id]), set(type_ids))
+        self.assertEqual(DEF_3.unit_key, unit_key)
+        self.assertEqual(DEF_1.display_name, type_def['display_name'])
+
+    def test_registry_returns_copies(self):
+        """
+        Tests that callers modifying a returned definition do not alter the registry.
+        """
+
+        # Setup
+        types_db.update_database([DEF_3])
+
+        # Test
+        types_db.type_definition(DEF_3.id)['unit_key'].append('bogus')
+        types_db.type_units_unit_key(DEF_3.id).append('bogus')
+
+        # Verify
+        self.assertEqual(DEF_3.unit_key, types_db.type_units_unit_key(DEF_3.id))
+
+    def test_registry_version_changes_on_update(self):
+        """
+        Tests that updating or cleaning the types collection is reflected in the registry.
+        """
+
+        # Setup
+        types_db.update_database([DEF_1])
+        version = types_db.type_registry_version()
+
+        # Test
+        types_db.update_database([DEF_1, DEF_2])
+
+        # Verify
+        self.assertTrue(types_db.type_registry_version() > version)
+        self.assertEqual(set([DEF_1.id, DEF_2.id]), set(types_db.all_type_ids()))
+
+        types_db.clean()
+        self.assertEqual([], types_db.all_type_ids())
+        self.assertTrue(types_db.type_definition(DEF_1.id) is None)
@@ -1,5 +1,9 @@
 from cStringIO import StringIO
 import contextlib
+import json
+import os
+import shutil
+import tempfile
 import unittest
 
 import mock
@@ -92,3 +96,99 @@ class TestMakeManifestForDir(unittest.TestCase):
         expected = 'b,greatchecksum,17'
 
         self.assertEqual(fake_file.getvalue().strip(), expected)
+
+
+class TestBuildManifestForDir(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.manifest_path = os.path.join(self.path, manifest_writer.MANIFEST_FILENAME)
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.cache_dir, 'manifest.cache')
+        for filename, contents in (('a', 'hi there\n'), ('b', '')):
+            with open(os.path.join(self.path, filename), 'w') as open_file:
+                open_file.write(contents)
+        os.mkdir(os.path.join(self.path, 'subdir'))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        shutil.rmtree(self.cache_dir)
+
+    def _manifest_rows(self):
+        with open(self.manifest_path) as open_file:
+            return sorted(open_file.read().splitlines())
+
+    def test_calculates_checksums(self):
+        manifest_writer.build_manifest_for_dir(self.path, cache_path=self.cache_path)
+
+        self.assertEqual(self._manifest_rows(), [
+            'a,c641344867e9806fadfd219f25b62b97c94db0eed04a1d79e93676533cfb782b,9',
+            'b,e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855,0',
+        ])
+        with open(self.cache_path) as open_file:
+            cache = json.load(open_file)
+        self.assertEqual(sorted(cache.keys()), ['a', 'b'])
+        self.assertEqual(cache['a'][0], 9)
+        self.assertEqual(cache['a'][1], os.stat(os.path.join(self.path, 'a')).st_mtime)
+
+    def test_no_cache(self):
+        manifest_writer.build_manifest_for_dir(self.path)
+
+        self.assertEqual(len(self._manifest_rows()), 2)
+        self.assertEqual(sorted(os.listdir(self.path)),
+                         sorted(['a', 'b', manifest_writer.MANIFEST_FILENAME, 'subdir']))
+        self.assertFalse(os.path.exists(self.cache_path))
+
+    def test_cache_in_directory(self):
+        cache_path = os.path.join(self.path, 'manifest.cache')
+
+        manifest_writer.build_manifest_for_dir(self.path, cache_path=cache_path)
+        manifest_writer.build_manifest_for_dir(self.path, cache_path=cache_path)
+
+        self.assertEqual(len(self._manifest_rows()), 2)
+
+    @mock.patch.object(manifest_writer, 'get_sha256_checksum', spec_set=True)
+    def test_known_checksums(self, mock_checksum):
+        mock_checksum.return_value = 'calculated'
+        mtime = os.stat(os.path.join(self.path, 'a')).st_mtime
+        known_checksums = {'a': ('known', 9, mtime), 'b': ('wrongsize', 5, mtime)}
+
+        manifest_writer.build_manifest_for_dir(self.path, known_checksums)
+
+        mock_checksum.assert_called_once_with(os.path.join(self.path, 'b'),
+                                              manifest_writer.BUILD_CHUNK_SIZE)
+        self.assertEqual(self._manifest_rows(), ['a,known,9', 'b,calculated,0'])
+
+    @mock.patch.object(manifest_writer, 'get_sha256_checksum', spec_set=True)
+    def test_known_checksums_modified(self, mock_checksum):
+        mock_checksum.return_value = 'calculated'
+        mtime = os.stat(os.path.join(self.path, 'a')).st_mtime
+        known_checksums = {'a': ('known', 9, mtime - 10)}
+
+        manifest_writer.build_manifest_for_dir(self.path, known_checksums)
+
+        self.assertEqual(self._manifest_rows(), ['a,calculated,9', 'b,calculated,0'])
+
+    def test_reuses_cache(self):
+        manifest_writer.build_manifest_for_dir(self.path, cache_path=self.cache_path)
+        with open(self.cache_path) as open_file:
+            cache = json.load(open_file)
+        cache['a'][2] = 'cached'
+        cache['b'][2] = 'stale'
+        cache['b'][1] -= 10
+        with open(self.cache_path, 'w') as open_file:
+            json.dump(cache, open_file)
+
+        with mock.patch.object(manifest_writer, 'get_sha256_checksum') as mock_checksum:
+            mock_checksum.return_value = 'calculated'
+            manifest_writer.build_manifest_for_dir(self.path, cache_path=self.cache_path)
+
+        self.assertEqual(mock_checksum.call_count, 1)
+        self.assertEqual(self._manifest_rows(), ['a,cached,9', 'b,calculated,0'])
+
+    def test_invalid_cache(self):
+        with open(self.cache_path, 'w') as open_file:
+            open_file.write('not json')
+
+        manifest_writer.build_manifest_for_dir(self.path, cache_path=self.cache_path)
+
+        self.assertEqual(len(self._manifest_rows()), 2)
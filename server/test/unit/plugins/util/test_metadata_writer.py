@@ -13,7 +13,7 @@ from pulp.common.error_codes import PLP1005
 from pulp.devel.unit.server.util import assert_validation_exception
 from pulp.plugins.util.metadata_writer import MetadataFileContext, JSONArrayFileContext
 from pulp.plugins.util.metadata_writer import XmlFileContext
-from pulp.plugins.util.metadata_writer import FastForwardXmlFileContext
+from pulp.plugins.util.metadata_writer import FastForwardXmlFileContext, HashingFileWriter
 from pulp.server.util import TYPE_SHA1
 
 
@@ -247,6 +247,36 @@ class MetadataWriterTests(unittest.TestCase):
                                                    expected_metadata_file_name)
         self.assertEquals(expected_metadata_file_path, context.metadata_file_path)
 
+    def test_finalize_gzip_checksums(self):
+
+        path = os.path.join(self.metadata_file_dir, 'test.xml.gz')
+        context = MetadataFileContext(path, TYPE_SHA1)
+
+        context.initialize()
+        context.metadata_file_handle.write('<metadata/>')
+        context.finalize()
+
+        with open(context.metadata_file_path, 'rb') as file_handle:
+            compressed = file_handle.read()
+        self.assertEqual(context.checksum, hashlib.sha1(compressed).hexdigest())
+        self.assertEqual(context.size, len(compressed))
+        self.assertEqual(context.open_checksum, hashlib.sha1('<metadata/>').hexdigest())
+        self.assertEqual(context.open_size, len('<metadata/>'))
+
+    def test_finalize_checksum_handle_opened_elsewhere(self):
+        # subclasses that open their own file handle still get a checksum
+
+        path = os.path.join(self.metadata_file_dir, 'test.xml')
+        context = MetadataFileContext(path, TYPE_SHA1)
+        context.metadata_file_handle = open(path, 'w')
+        context.metadata_file_handle.write('content')
+
+        context.finalize()
+
+        self.assertEqual(context.checksum, hashlib.sha1('content').hexdigest())
+        self.assertEqual(context.size, len('content'))
+        self.assertTrue(context.metadata_file_path.endswith(context.checksum + '-test.xml'))
+
     @patch('pulp.plugins.util.metadata_writer._LOG.exception')
     def test_finalize_error_on_footer(self, mock_logger):
 
@@ -294,6 +324,69 @@ class MetadataWriterTests(unittest.TestCase):
         context.initialize.assert_called_once_with()
 
 
+class HashingFileWriterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def test_plain_file(self):
+        path = os.path.join(self.working_dir, 'test.xml')
+        writer = HashingFileWriter(path, hashlib.sha256)
+
+        writer.write('foo')
+        writer.write('bar')
+        writer.close()
+
+        self.assertTrue(writer.closed)
+        with open(path) as file_handle:
+            self.assertEqual(file_handle.read(), 'foobar')
+        self.assertEqual(writer.checksum, hashlib.sha256('foobar').hexdigest())
+        self.assertEqual(writer.open_checksum, writer.checksum)
+        self.assertEqual(writer.size, 6)
+        self.assertEqual(writer.open_size, 6)
+
+    def test_gzip_file(self):
+        path = os.path.join(self.working_dir, 'test.xml.gz')
+        writer = HashingFileWriter(path, hashlib.sha256)
+
+        writer.write('foobar' * 100)
+        writer.flush()
+        writer.close()
+
+        with open(path, 'rb') as file_handle:
+            compressed = file_handle.read()
+        gzip_handle = gzip.open(path)
+        try:
+            self.assertEqual(gzip_handle.read(), 'foobar' * 100)
+        finally:
+            gzip_handle.close()
+        self.assertEqual(writer.checksum, hashlib.sha256(compressed).hexdigest())
+        self.assertEqual(writer.size, len(compressed))
+        self.assertEqual(writer.open_checksum, hashlib.sha256('foobar' * 100).hexdigest())
+        self.assertEqual(writer.open_size, 600)
+
+    def test_no_checksum(self):
+        path = os.path.join(self.working_dir, 'test.xml')
+        writer = HashingFileWriter(path)
+
+        writer.write('foo')
+        writer.close()
+
+        self.assertEqual(writer.checksum, None)
+        self.assertEqual(writer.open_checksum, None)
+        self.assertEqual(writer.size, 3)
+
+    def test_close_twice(self):
+        writer = HashingFileWriter(os.path.join(self.working_dir, 'test.xml.gz'))
+        writer.close()
+        writer.close()
+
+        self.assertTrue(writer.closed)
+
+
 class TestJSONArrayFileContext(unittest.TestCase):
 
     def setUp(self):
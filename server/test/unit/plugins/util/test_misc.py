@@ -268,3 +268,67 @@ class TestCreateSymlink(unittest.TestCase):
         touch(link_path)
 
         self.assertRaises(RuntimeError, misc.create_symlink, source_path, link_path)
+
+
+class TestCopyFile(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp(prefix='copy-file-')
+        self.source_path = os.path.join(self.working_dir, 'source')
+        self.destination_path = os.path.join(self.working_dir, 'destination')
+        with open(self.source_path, 'w') as source:
+            source.write('contents')
+        os.chmod(self.source_path, 0640)
+        os.utime(self.source_path, (1000, 1000))
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def _assert_copied(self):
+        with open(self.destination_path) as destination:
+            self.assertEqual(destination.read(), 'contents')
+        self.assertEqual(os.stat(self.destination_path).st_mode & 0777, 0640)
+        self.assertEqual(os.stat(self.destination_path).st_mtime, 1000)
+
+    def test_copy_file(self):
+        misc.copy_file(self.source_path, self.destination_path)
+
+        self._assert_copied()
+
+    @patch('pulp.plugins.util.misc.fcntl.ioctl')
+    def test_copy_file_no_reflink(self, mock_ioctl):
+        mock_ioctl.side_effect = IOError(errno.EOPNOTSUPP, 'not supported')
+
+        misc.copy_file(self.source_path, self.destination_path)
+
+        self.assertEqual(mock_ioctl.call_count, 1)
+        self._assert_copied()
+
+
+class TestPreallocate(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp(prefix='preallocate-')
+        self.path = os.path.join(self.working_dir, 'file')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def test_preallocate(self):
+        with open(self.path, 'w') as f:
+            misc.preallocate(f, 4096)
+
+        self.assertEqual(os.path.getsize(self.path), 4096)
+
+    @patch('pulp.plugins.util.misc._fallocate', None)
+    def test_preallocate_no_fallocate(self):
+        with open(self.path, 'w') as f:
+            misc.preallocate(f, 4096)
+
+        self.assertEqual(os.path.getsize(self.path), 4096)
+
+    def test_preallocate_nothing(self):
+        with open(self.path, 'w') as f:
+            misc.preallocate(f, 0)
+
+        self.assertEqual(os.path.getsize(self.path), 0)
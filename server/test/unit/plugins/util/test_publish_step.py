@@ -1,9 +1,11 @@
 import contextlib
 import os
+import pstats
 import shutil
 import sys
 import tarfile
 import tempfile
+import threading
 import time
 import traceback
 import unittest
@@ -14,6 +16,7 @@ from nectar.downloaders.local import LocalFileDownloader
 from nectar.request import DownloadRequest
 
 from pulp.common.plugins import reporting_constants, importer_constants
+from pulp.devel import mock_config
 from pulp.devel.unit.util import touch, compare_dict
 from pulp.plugins.conduits.repo_publish import RepoPublishConduit
 from pulp.plugins.conduits.repo_sync import RepoSyncConduit
@@ -220,6 +223,248 @@ class TestStepProcessBlock(unittest.TestCase):
         self.assertEqual(step.progress_successes, 1)
 
 
+class ItemStep(publish_step.Step):
+    """
+    Step that processes a list of items, failing on the ones that are exceptions
+    """
+    def __init__(self, items, **kwargs):
+        super(ItemStep, self).__init__('item_step', status_conduit=Mock(), **kwargs)
+        self.items = items
+        self.processed = []
+
+    def get_iterator(self):
+        return iter(self.items)
+
+    def get_total(self):
+        return len(self.items)
+
+    def process_main(self, item=None):
+        if isinstance(item, Exception):
+            raise item
+        time.sleep(0.001)
+        self.processed.append(item)
+
+
+class TestStepTiming(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def test_not_started(self):
+        step = publish_step.Step('foo_step')
+
+        self.assertTrue(step.get_timing() is None)
+        self.assertFalse(reporting_constants.PROGRESS_TIMING_KEY in step.get_progress_report()[0])
+
+    @patch('pulp.plugins.util.publish_step.connection.get_command_count', side_effect=[10, 13])
+    def test_timing(self, mock_command_count):
+        step = ItemStep(range(8), disable_reporting=True)
+
+        with patch('pulp.plugins.util.publish_step.time.time', side_effect=[100.0, 104.0]):
+            step.process()
+
+        timing = step.get_timing()
+        self.assertEqual(timing['wall_time'], 4.0)
+        self.assertEqual(timing['items_per_second'], 2.0)
+        self.assertEqual(timing['database_commands'], 3)
+        self.assertTrue(timing['cpu_time'] >= 0)
+        report = step.get_progress_report()[0]
+        self.assertEqual(report[reporting_constants.PROGRESS_TIMING_KEY], timing)
+
+    @patch('pulp.plugins.util.publish_step.connection.get_command_count', return_value=None)
+    def test_timing_commands_unknown(self, mock_command_count):
+        step = ItemStep([])
+
+        step.process()
+
+        self.assertTrue(step.get_timing()['database_commands'] is None)
+
+    @mock_config.patch({'profiling': {'step_types': 'other_step, item_step'}})
+    def test_profile(self):
+        step = ItemStep([1, 2])
+        step._profile_dir = Mock(return_value=self.working_dir)
+
+        step.process()
+
+        profile_path = os.path.join(self.working_dir, 'item_step-%s.prof' % step.uuid)
+        self.assertEqual(os.listdir(self.working_dir), [os.path.basename(profile_path)])
+        pstats.Stats(profile_path)
+
+    @mock_config.patch({'profiling': {'step_types': 'item_step'}})
+    @patch('pulp.plugins.util.publish_step.tempfile.gettempdir')
+    def test_profile_outside_task(self, mock_gettempdir):
+        mock_gettempdir.return_value = self.working_dir
+        step = ItemStep([1, 2])
+        step._profile_dir = Mock(side_effect=RuntimeError('outside of asynchronous task'))
+
+        step.process()
+
+        profile_path = os.path.join(self.working_dir, 'item_step-%s.prof' % step.uuid)
+        pstats.Stats(profile_path)
+        self.assertEqual(step.state, reporting_constants.STATE_COMPLETE)
+
+    @mock_config.patch({'profiling': {'step_types': 'item_step'}})
+    def test_profile_dir_error(self):
+        step = ItemStep([1, 2])
+        step._profile_dir = Mock(side_effect=OSError('permission denied'))
+
+        step.process()
+
+        self.assertEqual(step.state, reporting_constants.STATE_COMPLETE)
+        self.assertTrue(step._profiler is None)
+
+    def test_not_profiled(self):
+        step = ItemStep([1, 2])
+        step._profile_dir = Mock(return_value=self.working_dir)
+
+        step.process()
+
+        self.assertEqual(os.listdir(self.working_dir), [])
+
+    def test_plugin_step_profile_dir(self):
+        step = publish_step.PluginStep('foo_step', working_dir=self.working_dir)
+
+        self.assertEqual(step._profile_dir(), self.working_dir)
+
+
+class TestStepConcurrency(unittest.TestCase):
+
+    def setUp(self):
+        self.task_thread = threading.current_thread()
+
+    def _get_working_directory(self):
+        # like get_working_directory(), only works on the thread running the task
+        if threading.current_thread() is not self.task_thread:
+            raise RuntimeError('Working Directory requested outside of asynchronous task.')
+        return '/working/dir'
+
+    def test_process_items_concurrently(self):
+        step = ItemStep(range(1, 51), max_workers=4)
+
+        step.process()
+
+        self.assertEqual(sorted(step.processed), range(1, 51))
+        self.assertEqual(step.progress_successes, 50)
+        self.assertEqual(step.state, reporting_constants.STATE_COMPLETE)
+
+    def test_non_halting_exceptions(self):
+        step = ItemStep([1, ValueError('bad'), 3], max_workers=2,
+                        non_halting_exceptions=[ValueError])
+
+        self.assertRaises(publish_step.PulpCodedTaskFailedException, step.process)
+
+        self.assertEqual(sorted(step.processed), [1, 3])
+        self.assertEqual(step.progress_successes, 2)
+        self.assertEqual(step.progress_failures, 1)
+        self.assertEqual(step.error_details, [{'error': 'bad', 'traceback': None}])
+
+    def test_halting_exception(self):
+        step = ItemStep([RuntimeError('bad')] + range(1, 101), max_workers=2)
+
+        self.assertRaises(RuntimeError, step.process)
+
+        self.assertEqual(step.state, reporting_constants.STATE_FAILED)
+        # no new items are started after the failure
+        self.assertTrue(len(step.processed) < 100)
+
+    def test_failure_recorded_by_process_main(self):
+        step = ItemStep([1, 2], max_workers=2)
+        step.process_main = lambda item=None: item == 2 and step._record_failure()
+
+        step.process()
+
+        self.assertEqual(step.progress_successes, 1)
+        self.assertEqual(step.progress_failures, 1)
+
+    def test_canceled(self):
+        step = ItemStep(range(1, 101), max_workers=2)
+        original_process_main = step.process_main
+
+        def process_main(item=None):
+            original_process_main(item)
+            step.cancel()
+        step.process_main = process_main
+
+        step.process()
+
+        self.assertEqual(step.state, reporting_constants.STATE_CANCELLED)
+        self.assertTrue(len(step.processed) <= 2)
+
+    def test_parallel_children(self):
+        parent = publish_step.Step('parent', status_conduit=Mock())
+        children = [publish_step.Step('child', parallel=parallel)
+                    for parallel in (True, True, False, True)]
+        for child in children:
+            parent.add_child(child)
+        events = []
+        started = threading.Event()
+
+        def first_child():
+            # blocks until the second child, which runs in parallel, has started
+            started.wait(5)
+            events.append('first')
+
+        def second_child():
+            started.set()
+            events.append('second')
+
+        children[0].process_main = first_child
+        children[1].process_main = second_child
+        children[2].process_main = lambda: events.append('third')
+        children[3].process_main = lambda: events.append('fourth')
+        parent.process_main = lambda: events.append('parent')
+
+        parent.process_lifecycle()
+
+        self.assertEqual(events, ['second', 'first', 'third', 'fourth', 'parent'])
+        for step in children + [parent]:
+            self.assertEqual(step.state, reporting_constants.STATE_COMPLETE)
+
+    def test_parallel_children_failure(self):
+        parent = publish_step.Step('parent', status_conduit=Mock())
+        for i in range(2):
+            parent.add_child(publish_step.Step('child', parallel=True))
+        parent.children[0].process_main = Mock(side_effect=ValueError('bad'))
+        parent.children[1].process_main = Mock()
+        parent.process_main = Mock()
+
+        self.assertRaises(ValueError, parent.process_lifecycle)
+
+        self.assertTrue(parent.children[1].process_main.called)
+        self.assertFalse(parent.process_main.called)
+        self.assertEqual(parent.state, reporting_constants.STATE_FAILED)
+
+    @patch('pulp.plugins.util.publish_step.common_utils.get_working_directory')
+    def test_process_items_concurrently_working_dir(self, mock_get_working_dir):
+        mock_get_working_dir.side_effect = self._get_working_directory
+        step = publish_step.PluginStep('step', conduit=Mock(), max_workers=2)
+        step.get_iterator = lambda: iter(range(10))
+        step.get_total = lambda: 10
+        working_dirs = []
+        step.process_main = lambda item=None: working_dirs.append(step.get_working_dir())
+
+        step.process()
+
+        self.assertEqual(working_dirs, ['/working/dir'] * 10)
+
+    @patch('pulp.plugins.util.publish_step.common_utils.get_working_directory')
+    def test_parallel_children_working_dir(self, mock_get_working_dir):
+        mock_get_working_dir.side_effect = self._get_working_directory
+        parent = publish_step.PluginStep('parent', conduit=Mock())
+        for i in range(2):
+            parent.add_child(publish_step.PluginStep('child', parallel=True))
+        working_dirs = []
+        for child in parent.children:
+            child.process_main = lambda child=child: working_dirs.append(child.get_working_dir())
+
+        parent.process_lifecycle()
+
+        self.assertEqual(working_dirs, ['/working/dir'] * 2)
+
+
 class PluginStepTests(PluginBase):
     """
     This class has a lot of duplicated tests from PublishStepTests, in order to
@@ -761,6 +1006,132 @@ class TestAtomicDirectoryPublishStep(unittest.TestCase):
         self.assertTrue(os.path.exists(existing_file))
         self.assertEquals(1, len(os.listdir(master_dir)))
 
+    def _publish_incrementally(self, source_dir, master_dir, publish_dir, timestamp):
+        step = publish_step.AtomicDirectoryPublishStep(
+            source_dir, [('/', publish_dir)], master_dir, incremental=True)
+        step.parent = Mock(timestamp=timestamp)
+        step.process_main()
+        return step
+
+    def test_process_main_incremental(self):
+        source_dir = os.path.join(self.working_directory, 'source')
+        master_dir = os.path.join(self.working_directory, 'master')
+        publish_dir = os.path.join(self.working_directory, 'publish', 'bar')
+        with open(os.path.join(self._mkdir(source_dir, 'repodata'), 'repomd.xml'), 'w') as f:
+            f.write('first')
+        touch(os.path.join(source_dir, 'unchanged.txt'))
+        touch(os.path.join(source_dir, 'removed.txt'))
+        os.symlink('/content/a.rpm', os.path.join(source_dir, 'a.rpm'))
+
+        step = self._publish_incrementally(source_dir, master_dir, publish_dir, '1.0')
+        self.assertEqual(step.copy_counts, {'copied': 4, 'linked': 0, 'skipped': 0})
+
+        # the second publish has nothing to update, so the files are hardlinked
+        os.unlink(os.path.join(source_dir, 'removed.txt'))
+        step = self._publish_incrementally(source_dir, master_dir, publish_dir, '2.0')
+        self.assertEqual(step.copy_counts, {'copied': 1, 'linked': 2, 'skipped': 0})
+        self.assertEqual(sorted(os.listdir(master_dir)), ['1.0', '2.0'])
+        self.assertEqual(os.stat(os.path.join(master_dir, '1.0', 'unchanged.txt')).st_ino,
+                         os.stat(os.path.join(master_dir, '2.0', 'unchanged.txt')).st_ino)
+
+        # the third publish updates the first master
+        with open(os.path.join(source_dir, 'repodata', 'repomd.xml'), 'w') as f:
+            f.write('third publish')
+        os.symlink('/content/b.rpm', os.path.join(source_dir, 'b.rpm'))
+        step = self._publish_incrementally(source_dir, master_dir, publish_dir, '3.0')
+        self.assertEqual(step.copy_counts, {'copied': 2, 'linked': 0, 'skipped': 2})
+        self.assertEqual(sorted(os.listdir(master_dir)), ['2.0', '3.0'])
+
+        self.assertEqual(os.readlink(publish_dir), os.path.join(master_dir, '3.0'))
+        self.assertEqual(sorted(os.listdir(publish_dir)),
+                         ['a.rpm', 'b.rpm', 'repodata', 'unchanged.txt'])
+        self.assertEqual(os.readlink(os.path.join(publish_dir, 'b.rpm')), '/content/b.rpm')
+        with open(os.path.join(publish_dir, 'repodata', 'repomd.xml')) as f:
+            self.assertEqual(f.read(), 'third publish')
+        # the previously published master is not modified
+        with open(os.path.join(master_dir, '2.0', 'repodata', 'repomd.xml')) as f:
+            self.assertEqual(f.read(), 'first')
+
+    def test_process_main_incremental_replaces_changed_entries(self):
+        source_dir = os.path.join(self.working_directory, 'source')
+        master_dir = os.path.join(self.working_directory, 'master')
+        publish_dir = os.path.join(self.working_directory, 'publish', 'bar')
+        spare_dir = self._mkdir(master_dir, '1.0')
+        published_dir = self._mkdir(master_dir, '2.0')
+        self._mkdir(os.path.dirname(publish_dir))
+        os.symlink(published_dir, publish_dir)
+        os.symlink('/content/old.rpm', os.path.join(spare_dir, 'a.rpm'))
+        self._mkdir(spare_dir, 'repodata')
+        touch(os.path.join(source_dir, 'repodata'))
+        os.symlink('/content/new.rpm', os.path.join(source_dir, 'a.rpm'))
+
+        step = self._publish_incrementally(source_dir, master_dir, publish_dir, '3.0')
+
+        self.assertEqual(step.copy_counts, {'copied': 2, 'linked': 0, 'skipped': 0})
+        self.assertEqual(os.readlink(os.path.join(publish_dir, 'a.rpm')), '/content/new.rpm')
+        self.assertTrue(os.path.isfile(os.path.join(publish_dir, 'repodata')))
+
+    def test_process_main_incremental_failed_publish(self):
+        """
+        Assert that a master left by a failed publish is recycled, not the published one.
+        """
+        source_dir = os.path.join(self.working_directory, 'source')
+        master_dir = os.path.join(self.working_directory, 'master')
+        publish_dir = os.path.join(self.working_directory, 'publish', 'bar')
+        touch(os.path.join(source_dir, 'a.txt'))
+        self._publish_incrementally(source_dir, master_dir, publish_dir, '1.0')
+        failed_dir = self._mkdir(master_dir, '2.0')
+        touch(os.path.join(failed_dir, 'partial.txt'))
+
+        step = self._publish_incrementally(source_dir, master_dir, publish_dir, '3.0')
+
+        self.assertEqual(step.copy_counts, {'copied': 0, 'linked': 1, 'skipped': 0})
+        self.assertEqual(sorted(os.listdir(master_dir)), ['1.0', '3.0'])
+        self.assertEqual(os.listdir(os.path.join(master_dir, '1.0')), ['a.txt'])
+        self.assertEqual(os.readlink(publish_dir), os.path.join(master_dir, '3.0'))
+        self.assertEqual(os.listdir(publish_dir), ['a.txt'])
+
+    def test_process_main_incremental_only_directory_contents(self):
+        """
+        Assert that the published master is found from links to its files.
+        """
+        source_dir = os.path.join(self.working_directory, 'source')
+        master_dir = os.path.join(self.working_directory, 'master')
+        publish_dir = os.path.join(self.working_directory, 'publish', 'bar')
+        touch(os.path.join(source_dir, 'a.txt'))
+        for timestamp in ('1.0', '2.0'):
+            step = publish_step.AtomicDirectoryPublishStep(
+                source_dir, [('/', publish_dir)], master_dir,
+                only_publish_directory_contents=True, incremental=True)
+            step.parent = Mock(timestamp=timestamp)
+            step.process_main()
+
+        self.assertEqual(step._published_masters(), set(['2.0']))
+        self.assertEqual(sorted(os.listdir(master_dir)), ['1.0', '2.0'])
+        self.assertEqual(os.readlink(os.path.join(publish_dir, 'a.txt')),
+                         os.path.join(master_dir, '2.0', 'a.txt'))
+
+    def test_same_file(self):
+        first = os.path.join(self.working_directory, 'first')
+        second = os.path.join(self.working_directory, 'second')
+        for path in (first, second):
+            with open(path, 'w') as f:
+                f.write(path[-5:])
+            os.utime(path, (1000, 1000))
+
+        self.assertTrue(publish_step.AtomicDirectoryPublishStep._same_file(first, second))
+        os.utime(second, (1000, 1000.5))
+        self.assertTrue(publish_step.AtomicDirectoryPublishStep._same_file(first, second))
+        os.utime(second, (1000, 2000))
+        self.assertFalse(publish_step.AtomicDirectoryPublishStep._same_file(first, second))
+        self.assertFalse(publish_step.AtomicDirectoryPublishStep._same_file(first, None))
+
+    @staticmethod
+    def _mkdir(*path):
+        path = os.path.join(*path)
+        os.makedirs(path)
+        return path
+
 
 class TestSaveTarFilePublishStep(unittest.TestCase):
     def setUp(self):
@@ -1124,7 +1495,7 @@ class TestGetLocalUnitsStep(unittest.TestCase):
 
         self.step.process_main()
 
-        mock_paginate.assert_called_once_with(self.step.parent.available_units, 50)
+        mock_paginate.assert_called_once_with(self.step.parent.available_units, 1000)
 
     def test_saves_unit(self, mock_find_units, mock_associate):
         """
@@ -1230,10 +1601,20 @@ class TestCreateManifestStep(unittest.TestCase):
         # make sure the description has some value
         self.assertTrue(step.description)
 
-    @patch('pulp.plugins.util.manifest_writer.make_manifest_for_dir', spec_set=True)
-    def test_process_main(self, mock_make_manifest):
+    @patch('pulp.plugins.util.manifest_writer.build_manifest_for_dir', spec_set=True)
+    def test_process_main(self, mock_build_manifest):
         step = publish_step.CreatePulpManifestStep('/foo/')
 
         step.process_main()
 
-        mock_make_manifest.assert_called_once_with('/foo/')
+        mock_build_manifest.assert_called_once_with('/foo/', None, cache_path=None)
+
+    @patch('pulp.plugins.util.manifest_writer.build_manifest_for_dir', spec_set=True)
+    def test_process_main_known_checksums(self, mock_build_manifest):
+        known_checksums = {'a.iso': ('abc123', 17, 1400000000.0)}
+        step = publish_step.CreatePulpManifestStep('/foo/', known_checksums, '/cache/foo')
+
+        step.process_main()
+
+        mock_build_manifest.assert_called_once_with('/foo/', known_checksums,
+                                                    cache_path='/cache/foo')
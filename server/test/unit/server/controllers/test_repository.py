@@ -1486,14 +1486,40 @@ class TestQueueDownloadRepo(unittest.TestCase):
 
 class TestDownloadDeferred(unittest.TestCase):
 
+    @patch(MODULE + 'get_current_task_id', Mock(return_value='task-id'))
+    @patch(MODULE + 'model.DeferredDownload')
     @patch(MODULE + 'LazyUnitDownloadStep')
     @patch(MODULE + '_create_download_requests')
     @patch(MODULE + '_get_deferred_content_units')
-    def test_download_deferred(self, mock_get_deferred, mock_create_requests, mock_step):
-        """Assert the download step is initialized and called."""
+    def test_download_deferred(self, mock_get_deferred, mock_create_requests, mock_step,
+                               mock_deferred_download):
+        """Assert claimed batches are downloaded until none are left."""
+        entries = [Mock(unit_type_id='abc', unit_id='1'), Mock(unit_type_id='abc', unit_id='2')]
+        mock_deferred_download.claim.side_effect = [entries, []]
+        request = Mock(data={repo_controller.TYPE_ID: 'abc', repo_controller.UNIT_ID: '1'})
+        mock_create_requests.return_value = [request]
+
         repo_controller.download_deferred()
+
+        self.assertEqual(
+            [call('task-id', repo_controller.DEFERRED_DOWNLOAD_BATCH_SIZE,
+                  repo_controller.DEFERRED_DOWNLOAD_LEASE)] * 2,
+            mock_deferred_download.claim.call_args_list)
+        mock_get_deferred.assert_called_once_with(entries)
         mock_create_requests.assert_called_once_with(mock_get_deferred.return_value)
         mock_step.return_value.start.assert_called_once_with()
+        # the unit without catalog entries is removed from the queue
+        self.assertEqual(0, entries[0].delete.call_count)
+        entries[1].delete.assert_called_once_with()
+
+    @patch(MODULE + 'model.DeferredDownload')
+    @patch(MODULE + 'LazyUnitDownloadStep')
+    def test_download_deferred_empty(self, mock_step, mock_deferred_download):
+        mock_deferred_download.claim.return_value = []
+
+        repo_controller.download_deferred()
+
+        self.assertEqual(0, mock_step.call_count)
 
 
 class TestDownloadRepo(unittest.TestCase):
@@ -1523,14 +1549,12 @@ class TestDownloadRepo(unittest.TestCase):
 class TestGetDeferredContentUnits(unittest.TestCase):
 
     @patch(MODULE + 'plugin_api.get_unit_model_by_id')
-    @patch(MODULE + 'model.DeferredDownload')
-    def test_get_deferred_content_units(self, mock_qs, mock_get_model):
+    def test_get_deferred_content_units(self, mock_get_model):
         # Setup
         mock_unit = Mock(unit_type_id='abc', unit_id='123')
-        mock_qs.objects.filter.return_value = [mock_unit]
 
         # Test
-        result = list(repo_controller._get_deferred_content_units())
+        result = list(repo_controller._get_deferred_content_units([mock_unit]))
         self.assertEqual(1, len(result))
         mock_get_model.assert_called_once_with('abc')
         unit_filter = mock_get_model.return_value.objects.filter
@@ -1539,34 +1563,31 @@ class TestGetDeferredContentUnits(unittest.TestCase):
 
     @patch(MODULE + '_logger.error')
     @patch(MODULE + 'plugin_api.get_unit_model_by_id')
-    @patch(MODULE + 'model.DeferredDownload')
-    def test_get_deferred_content_units_no_model(self, mock_qs, mock_get_model, mock_log):
+    def test_get_deferred_content_units_no_model(self, mock_get_model, mock_log):
         # Setup
         mock_unit = Mock(unit_type_id='abc', unit_id='123')
-        mock_qs.objects.filter.return_value = [mock_unit]
         mock_get_model.return_value = None
 
         # Test
-        result = list(repo_controller._get_deferred_content_units())
+        result = list(repo_controller._get_deferred_content_units([mock_unit]))
         self.assertEqual(0, len(result))
         mock_log.assert_called_once_with('Unable to find the model object for the abc type.')
         mock_get_model.assert_called_once_with('abc')
 
     @patch(MODULE + '_logger.debug')
     @patch(MODULE + 'plugin_api.get_unit_model_by_id')
-    @patch(MODULE + 'model.DeferredDownload')
-    def test_get_deferred_content_units_no_unit(self, mock_qs, mock_get_model, mock_log):
+    def test_get_deferred_content_units_no_unit(self, mock_get_model, mock_log):
         # Setup
         mock_unit = Mock(unit_type_id='abc', unit_id='123')
-        mock_qs.objects.filter.return_value = [mock_unit]
         unit_qs = mock_get_model.return_value.objects.filter.return_value
         unit_qs.get.side_effect = mongoengine.DoesNotExist()
 
         # Test
-        result = list(repo_controller._get_deferred_content_units())
+        result = list(repo_controller._get_deferred_content_units([mock_unit]))
         self.assertEqual(0, len(result))
         mock_log.assert_called_once_with('Unable to find the abc:123 content unit.')
         mock_get_model.assert_called_once_with('abc')
+        mock_unit.delete.assert_called_once_with()
 
 
 class TestCreateDownloadRequests(unittest.TestCase):
@@ -1702,26 +1723,115 @@ class TestLazyUnitDownloadStep(unittest.TestCase):
         self.step.start()
         self.step.downloader.download.assert_called_once_with(self.step.download_requests)
 
-    @patch(MODULE + 'model.DeferredDownload')
-    def test_download_started(self, mock_deferred_download):
+    @patch(MODULE + 'model.DeferredDownload', Mock())
+    @patch(MODULE + 'plugin_api.get_unit_model_by_id')
+    def test_start_verifies_downloads(self, mock_get_model):
+        """Assert downloads are verified before start returns and the units are updated."""
+        reports = [Mock(data=self.data, destination='/no/where') for i in range(10)]
+        self.step.downloader = Mock()
+        self.step.downloader.download.side_effect = lambda requests: [
+            self.step.download_succeeded(report) for report in reports]
+        self.step.verify_download = Mock(
+            side_effect=lambda report: self.step.downloaded_units.setdefault('abc', []).append(
+                report.data[repo_controller.UNIT_ID]))
+
+        self.step.start()
+
+        self.assertEqual(10, self.step.verify_download.call_count)
+        mock_get_model.assert_called_once_with('abc')
+        mock_get_model.return_value.objects.filter.assert_called_once_with(
+            id__in=['1234'] * 10)
+        mock_get_model.return_value.objects.filter.return_value.update.assert_called_once_with(
+            set__downloaded=True)
+
+    def test_download_succeeded_queued(self):
+        """Assert downloads are queued for verification."""
+        self.step.download_succeeded(self.report)
+
+        self.assertTrue(self.step.verification_queue.get_nowait() is self.report)
+        self.assertEqual(repo_controller.VERIFICATION_QUEUE_SIZE,
+                         self.step.verification_queue.maxsize)
+
+    def test_verify_downloads_error(self):
+        """Assert unexpected errors fail the download without stopping the thread."""
+        self.step.verify_download = Mock(side_effect=[ValueError, None])
+        for report in (self.report, self.report, None):
+            self.step.verification_queue.put(report)
+
+        self.step._verify_downloads()
+
+        self.assertEqual(2, self.step.verify_download.call_count)
+        self.assertEqual(1, self.step.progress_failures)
+        path_entry = self.report.data[repo_controller.UNIT_FILES]['/no/where']
+        self.assertFalse(path_entry[repo_controller.PATH_DOWNLOADED])
+
+    @patch(MODULE + 'DOWNLOADED_BATCH_SIZE', 2)
+    @patch(MODULE + 'model.DeferredDownload', Mock())
+    @patch(MODULE + 'plugin_api.get_unit_model_by_id')
+    def test_verify_downloads_flushes_batch(self, mock_get_model):
+        """Assert units are marked as downloaded once a batch is full."""
+        self.step.validate_file = Mock()
+        self.step.downloaded_units = {'xyz': ['5678']}
+        for report in (self.report, None):
+            self.step.verification_queue.put(report)
+
+        self.step._verify_downloads()
+
+        self.assertEqual({}, self.step.downloaded_units)
+        update = mock_get_model.return_value.objects.filter.return_value.update
+        self.assertEqual(2, update.call_count)
+
+    @patch(MODULE + 'DOWNLOADED_BATCH_SIZE', 2)
+    @patch(MODULE + 'plugin_api.get_unit_model_by_id', Mock())
+    def test_verify_downloads_flush_error(self):
+        """Assert a batch that cannot be marked is kept without failing the download."""
+        self.step.validate_file = Mock()
+        self.step._flush_downloaded_units = Mock(side_effect=ValueError)
+        self.step.downloaded_units = {'xyz': ['5678']}
+        for report in (self.report, None):
+            self.step.verification_queue.put(report)
+
+        self.step._verify_downloads()
+
+        self.assertEqual({'xyz': ['5678'], 'abc': ['1234']}, self.step.downloaded_units)
+        self.assertEqual(1, self.step.progress_successes)
+        self.assertEqual(0, self.step.progress_failures)
+        path_entry = self.report.data[repo_controller.UNIT_FILES]['/no/where']
+        self.assertTrue(path_entry[repo_controller.PATH_DOWNLOADED])
+
+    def test_download_started(self):
         """Assert if validate_file raises an exception, the download is not skipped."""
         self.step.validate_file = Mock(side_effect=IOError)
 
         self.step.download_started(self.report)
-        qs = mock_deferred_download.objects.filter
-        qs.assert_called_once_with(unit_id='1234', unit_type_id='abc')
-        qs.return_value.delete.assert_called_once_with()
+        self.assertFalse(self.report.data[repo_controller.REQUEST].canceled)
+        self.assertEqual(0, self.step.progress_successes)
+        self.assertEqual({}, self.step.downloaded_units)
 
-    @patch(MODULE + 'model.DeferredDownload')
-    def test_download_started_already_downloaded(self, mock_deferred_download):
+    def test_download_started_already_downloaded(self):
         """Assert if validate_file doesn't raise an exception, the download is skipped."""
         self.step.validate_file = Mock()
 
         self.step.download_started(self.report)
         self.assertTrue(self.report.data[repo_controller.REQUEST].canceled)
-        qs = mock_deferred_download.objects.filter
-        qs.assert_called_once_with(unit_id='1234', unit_type_id='abc')
-        qs.return_value.delete.assert_called_once_with()
+        self.assertEqual(1, self.step.progress_successes)
+        self.assertEqual({'abc': ['1234']}, self.step.downloaded_units)
+
+    @patch(MODULE + 'model.DeferredDownload')
+    @patch(MODULE + 'plugin_api.get_unit_model_by_id')
+    def test_flush_downloaded_units(self, mock_get_model, mock_deferred_download):
+        """Assert units are marked as downloaded and removed from the deferred queue."""
+        self.step.downloaded_units = {'abc': ['1', '2']}
+
+        self.step._flush_downloaded_units()
+
+        self.assertEqual({}, self.step.downloaded_units)
+        mock_get_model.return_value.objects.filter.assert_called_once_with(id__in=['1', '2'])
+        mock_get_model.return_value.objects.filter.return_value.update.assert_called_once_with(
+            set__downloaded=True)
+        mock_deferred_download.objects.filter.assert_called_once_with(
+            unit_type_id='abc', unit_id__in=['1', '2'])
+        mock_deferred_download.objects.filter.return_value.delete.assert_called_once_with()
 
     @patch(MODULE + 'os.path.relpath', Mock(return_value='filename'))
     @patch(MODULE + 'plugin_api.get_unit_model_by_id')
@@ -1733,14 +1843,11 @@ class TestLazyUnitDownloadStep(unittest.TestCase):
         unit = model_qs.objects.filter.return_value.only.return_value.get.return_value
 
         # Test
-        self.step.download_succeeded(self.report)
+        self.step.verify_download(self.report)
         unit.import_content.assert_called_once_with(self.report.destination)
         self.assertEqual(1, self.step.progress_successes)
         self.assertEqual(0, self.step.progress_failures)
-        self.assertEqual(
-            {'set__downloaded': True},
-            model_qs.objects.filter.return_value.update_one.call_args_list[0][1]
-        )
+        self.assertEqual({'abc': ['1234']}, self.step.downloaded_units)
 
     @patch(MODULE + 'os.path.relpath', Mock(return_value='a/filename'))
     @patch(MODULE + 'plugin_api.get_unit_model_by_id')
@@ -1755,7 +1862,7 @@ class TestLazyUnitDownloadStep(unittest.TestCase):
         }
 
         # Test
-        self.step.download_succeeded(self.report)
+        self.step.verify_download(self.report)
         self.assertEqual(0, unit.set_storage_path.call_count)
         unit.import_content.assert_called_once_with(
             self.report.destination,
@@ -1763,7 +1870,7 @@ class TestLazyUnitDownloadStep(unittest.TestCase):
         )
         self.assertEqual(1, self.step.progress_successes)
         self.assertEqual(0, self.step.progress_failures)
-        self.assertEqual(0, model_qs.objects.filter.return_value.update_one.call_count)
+        self.assertEqual({}, self.step.downloaded_units)
 
     @patch(MODULE + 'os.path.relpath', Mock(return_value='a/filename'))
     @patch(MODULE + 'plugin_api.get_unit_model_by_id')
@@ -1778,7 +1885,7 @@ class TestLazyUnitDownloadStep(unittest.TestCase):
         }
 
         # Test
-        self.step.download_succeeded(self.report)
+        self.step.verify_download(self.report)
         self.assertEqual(0, unit.set_storage_path.call_count)
         unit.import_content.assert_called_once_with(
             self.report.destination,
@@ -1786,8 +1893,7 @@ class TestLazyUnitDownloadStep(unittest.TestCase):
         )
         self.assertEqual(1, self.step.progress_successes)
         self.assertEqual(0, self.step.progress_failures)
-        model_qs.objects.filter.return_value.update_one.assert_called_once_with(
-            set__downloaded=True)
+        self.assertEqual({'abc': ['1234']}, self.step.downloaded_units)
 
     @patch(MODULE + 'os.path.relpath', Mock(return_value='filename'))
     @patch(MODULE + 'plugin_api.get_unit_model_by_id')
@@ -1799,11 +1905,12 @@ class TestLazyUnitDownloadStep(unittest.TestCase):
         unit = model_qs.objects.filter.return_value.only.return_value.get.return_value
 
         # Test
-        self.step.download_succeeded(self.report)
+        self.step.verify_download(self.report)
         self.assertEqual(0, unit.set_storage_path.call_count)
         self.assertEqual(0, unit.import_content.call_count)
         self.assertEqual(0, self.step.progress_successes)
         self.assertEqual(1, self.step.progress_failures)
+        self.assertEqual({}, self.step.downloaded_units)
 
     def test_download_failed(self):
         self.assertEqual(0, self.step.progress_failures)
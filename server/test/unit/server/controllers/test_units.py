@@ -40,7 +40,7 @@ class FindUnitsTests(unittest.TestCase):
         # turn into list so the generator will be evaluated
         list(units_controller.find_units(units_iterable))
 
-        mock_paginate.assert_called_once_with(units_iterable, 50)
+        mock_paginate.assert_called_once_with(units_iterable, 1000)
 
     def test_query(self):
         """
@@ -49,26 +49,56 @@ class FindUnitsTests(unittest.TestCase):
         model_1 = DemoModel(key_field='a')
         model_2 = DemoModel(key_field='B')
         units_iterable = (model_1, model_2)
+        DemoModel.objects.reset_mock()
+        DemoModel.objects.side_effect = None
+        DemoModel.objects.return_value = []
 
         # turn into list so the generator will be evaluated
         list(units_controller.find_units(units_iterable))
-        query_dict = DemoModel.objects.call_args[0][0].to_query(DemoModel)
-        expected_result = {'$or': [{'key_field': u'a'}, {'key_field': u'B'}]}
-        self.assertDictEqual(query_dict, expected_result)
+        digests = DemoModel.objects.call_args_list[0][1]['_unit_key_digest__in']
+        self.assertEqual(sorted(digests), sorted([model_1.unit_key_lookup_digest(),
+                                                  model_2.unit_key_lookup_digest()]))
+        self.assertEqual(DemoModel.objects.call_count, 1)
 
     def test_results(self):
         """
-        Test that the mongo query generated is the one we expect
+        Test that units found by digest are returned without querying their unit keys
+        """
+        model_1 = DemoModel(key_field='a')
+        model_2 = DemoModel(key_field='B')
+        units_iterable = (model_1, model_2)
+        model_1_defined = DemoModel(key_field='a', id='foo')
+        model_1_defined._unit_key_digest = model_1.unit_key_lookup_digest()
+        model_2_defined = DemoModel(key_field='B', id='bar')
+        model_2_defined._unit_key_digest = model_2.unit_key_lookup_digest()
+        DemoModel.objects.reset_mock()
+        DemoModel.objects.side_effect = None
+        DemoModel.objects.return_value = [model_1_defined, model_2_defined]
+
+        # turn into list so the generator will be evaluated
+        result = list(units_controller.find_units(units_iterable))
+        self.assertEqual(result, [model_1_defined, model_2_defined])
+        self.assertEqual(DemoModel.objects.call_count, 1)
+
+    def test_results_mismatched_unit_key(self):
+        """
+        Test that a unit whose digest matches but whose unit key does not is ignored
         """
         model_1 = DemoModel(key_field='a')
         model_2 = DemoModel(key_field='B')
         units_iterable = (model_1, model_2)
-        model_2_defined = DemoModel(key_field='B', id='foo')
-        DemoModel.objects.return_value = [model_2_defined]
+        mismatched = DemoModel(key_field='c', id='foo')
+        mismatched._unit_key_digest = model_1.unit_key_lookup_digest()
+        model_2_defined = DemoModel(key_field='B', id='bar')
+        model_2_defined._unit_key_digest = model_2.unit_key_lookup_digest()
+        DemoModel.objects.reset_mock()
+        DemoModel.objects.side_effect = None
+        DemoModel.objects.return_value = [mismatched, model_2_defined]
 
         # turn into list so the generator will be evaluated
         result = list(units_controller.find_units(units_iterable))
         self.assertEqual(result, [model_2_defined])
+        self.assertEqual(DemoModel.objects.call_count, 1)
 
 
 @patch('pulp.plugins.loader.api.get_unit_model_by_id', spec_set=True)
@@ -0,0 +1,62 @@
+"""
+This module contains tests for pulp.server.db.migrations.0025_unit_key_digest.py
+"""
+import unittest
+
+import mock
+from mongoengine import StringField
+
+from pulp.server.db import model
+from pulp.server.db.migrate.models import _import_all_the_way
+
+migration = _import_all_the_way('pulp.server.db.migrations.0025_unit_key_digest')
+
+
+class DemoUnit(model.ContentUnit):
+    name = StringField()
+    version = StringField(db_field='ver')
+    unit_key_fields = ('name', 'version')
+    _content_type_id = StringField(required=True, default='demo')
+
+
+class TestMigrate(unittest.TestCase):
+    """
+    Test the migrate() function.
+    """
+    @mock.patch.object(migration, '_migrate_unit_model')
+    @mock.patch.object(migration, 'PluginManager')
+    def test_migrates_each_model(self, mock_manager, mock_migrate_model):
+        mock_manager.return_value.unit_models = {'demo': DemoUnit}
+
+        migration.migrate()
+
+        mock_migrate_model.assert_called_once_with(DemoUnit)
+
+    @mock.patch.object(DemoUnit, '_get_collection')
+    def test_migrate_unit_model(self, mock_get_collection):
+        collection = mock_get_collection.return_value
+        collection.find.return_value = [
+            {'_id': 'unit1', 'name': 'foo', 'ver': '1.0'},
+            {'_id': 'unit2', 'name': 'foo', 'ver': '2.0'},
+        ]
+
+        migration._migrate_unit_model(DemoUnit)
+
+        collection.find.assert_called_once_with({'_unit_key_digest': {'$exists': False}},
+                                                projection={'name': 1, 'ver': 1})
+        requests = collection.bulk_write.call_args[0][0]
+        self.assertEqual(len(requests), 2)
+        expected = DemoUnit(name='foo', version='2.0').unit_key_lookup_digest()
+        self.assertEqual(requests[1]._doc, {'$set': {'_unit_key_digest': expected}})
+        self.assertEqual(requests[1]._filter, {'_id': 'unit2'})
+
+    @mock.patch.object(migration, 'BATCH_SIZE', 2)
+    @mock.patch.object(DemoUnit, '_get_collection')
+    def test_migrate_unit_model_batches(self, mock_get_collection):
+        collection = mock_get_collection.return_value
+        collection.find.return_value = [
+            {'_id': 'unit%d' % i, 'name': 'foo', 'ver': str(i)} for i in range(5)]
+
+        migration._migrate_unit_model(DemoUnit)
+
+        self.assertEqual(collection.bulk_write.call_count, 3)
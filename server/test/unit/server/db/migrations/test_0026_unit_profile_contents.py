@@ -0,0 +1,49 @@
+"""
+This module contains tests for pulp.server.db.migrations.0026_unit_profile_contents.py
+"""
+import unittest
+
+import mock
+
+from pulp.server.db.migrate.models import _import_all_the_way
+
+migration = _import_all_the_way('pulp.server.db.migrations.0026_unit_profile_contents')
+
+
+class TestMigrate(unittest.TestCase):
+    """
+    Test the migrate() function.
+    """
+    @mock.patch.object(migration.connection, 'get_database')
+    def test_migrate(self, mock_get_database):
+        collections = {'consumer_unit_profiles': mock.Mock(),
+                       'consumer_unit_profile_contents': mock.Mock()}
+        mock_get_database.return_value.__getitem__ = lambda db, name: collections[name]
+        unit_profiles = collections['consumer_unit_profiles']
+        contents = collections['consumer_unit_profile_contents']
+        unit_profiles.find.return_value = [
+            {'_id': 'up1', 'profile_hash': 'hash1'},
+            {'_id': 'up2', 'profile_hash': 'hash1'},
+            {'_id': 'up3', 'profile_hash': 'hash2'},
+        ]
+        unit_profiles.find_one.side_effect = [{'_id': 'up1', 'profile': ['a']},
+                                              {'_id': 'up3', 'profile': ['b']}]
+        unit_profiles.aggregate.return_value = [{'_id': 'hash1', 'count': 2},
+                                                {'_id': 'hash2', 'count': 1}]
+
+        migration.migrate()
+
+        unit_profiles.find.assert_called_once_with({'profile': {'$exists': True}},
+                                                   projection=['profile_hash'])
+        # each distinct profile is loaded and stored once
+        self.assertEqual(unit_profiles.find_one.call_count, 2)
+        self.assertEqual(contents.update_one.call_args_list, [
+            mock.call({'_id': 'hash1'}, {'$setOnInsert': {'profile': ['a']}}, upsert=True),
+            mock.call({'_id': 'hash2'}, {'$setOnInsert': {'profile': ['b']}}, upsert=True),
+            mock.call({'_id': 'hash1'}, {'$set': {'ref_count': 2}}),
+            mock.call({'_id': 'hash2'}, {'$set': {'ref_count': 1}}),
+        ])
+        # the profile is removed from every unit profile
+        unit_profiles.update_one.assert_has_calls([
+            mock.call({'_id': up_id}, {'$unset': {'profile': ''}})
+            for up_id in ('up1', 'up2', 'up3')])
@@ -908,3 +908,20 @@ class TestUnsafeRetry(unittest.TestCase):
         final_answer = mock_func()
         m_logger.error.assert_called_once_with('mock_func operation failed on mock_coll')
         self.assertTrue(final_answer is 'final')
+
+
+class TestCommandCount(unittest.TestCase):
+
+    def test_counts_started_commands(self):
+        before = connection.get_command_count()
+
+        connection._COMMAND_COUNTER.started(Mock())
+        connection._COMMAND_COUNTER.succeeded(Mock())
+        connection._COMMAND_COUNTER.started(Mock())
+        connection._COMMAND_COUNTER.failed(Mock())
+
+        self.assertEqual(connection.get_command_count(), before + 2)
+
+    @patch('pulp.server.db.connection.register_listener', None)
+    def test_unsupported(self):
+        self.assertTrue(connection.get_command_count() is None)
@@ -3,6 +3,7 @@
 """
 Tests for the pulp.server.db.model module.
 """
+from datetime import datetime, timedelta
 from hashlib import sha256
 from mock import patch, Mock, call
 import os
@@ -11,7 +12,8 @@ import stat
 import tempfile
 
 from mongoengine import (ValidationError, BooleanField, DateTimeField, DictField,
-                         Document, IntField, ListField, StringField, QuerySetNoCache)
+                         Document, IntField, ListField, NotUniqueError, StringField,
+                         QuerySetNoCache)
 
 from pulp.common import dateutils
 from pulp.common.compat import unittest
@@ -21,7 +23,7 @@ from pulp.plugins.util import misc
 from pulp.server import constants, exceptions
 from pulp.server.exceptions import PulpCodedException
 from pulp.server.db import model
-from pulp.server.db.fields import ISO8601StringField
+from pulp.server.db.fields import ISO8601StringField, UTCDateTimeField
 from pulp.server.db.querysets import CriteriaQuerySet
 from pulp.server.webservices.views import serializers
 
@@ -96,6 +98,13 @@ class ContentUnitHelper(model.ContentUnit):
     _content_type_id = StringField(default='mock_type_id')
 
 
+class ContentUnitDBFieldHelper(model.ContentUnit):
+    """Used to test a ContentUnit whose unit key field is stored under another name."""
+    apple = StringField(db_field='a')
+    unit_key_fields = ('apple',)
+    _content_type_id = StringField(default='mock_type_id')
+
+
 class TestContentUnit(unittest.TestCase):
     """
     Test ContentUnit model
@@ -108,6 +117,7 @@ class TestContentUnit(unittest.TestCase):
         self.assertTrue(isinstance(model.ContentUnit._last_updated, IntField))
         self.assertTrue(model.ContentUnit._last_updated.required)
         self.assertTrue(isinstance(model.ContentUnit._storage_path, StringField))
+        self.assertTrue(isinstance(model.ContentUnit._unit_key_digest, StringField))
         self.assertTrue(isinstance(model.ContentUnit.pulp_user_metadata, DictField))
 
     def test_unit_key_as_digest(self):
@@ -130,6 +140,32 @@ class TestContentUnit(unittest.TestCase):
                 _hash.update(value)
         self.assertEqual(digest, _hash.hexdigest())
 
+    def test_unit_key_as_digest_unicode(self):
+        unit = ContentUnitHelper()
+        unit.apple = u'caf\xe9'
+        unit.pear = 'yellow'
+        unit.age = 21
+
+        digest = unit.unit_key_as_digest()
+
+        unit.apple = 'caf\xc3\xa9'
+        self.assertEqual(digest, unit.unit_key_as_digest())
+
+    def test_unit_key_lookup_digest(self):
+        unit = ContentUnitHelper(apple=u'caf\xe9', pear='yellow', age=21)
+        other = ContentUnitHelper(apple='caf\xc3\xa9', pear='yellow', age=21)
+
+        self.assertEqual(unit.unit_key_lookup_digest(), other.unit_key_lookup_digest())
+
+    def test_unit_key_lookup_digest_unambiguous(self):
+        unit = ContentUnitHelper(apple='redpear', pear='', age=21)
+        other = ContentUnitHelper(apple='red', pear='pear', age=21)
+        missing = ContentUnitHelper(apple='red', pear=None, age=21)
+        none = ContentUnitHelper(apple='red', pear='None', age=21)
+
+        self.assertNotEqual(unit.unit_key_lookup_digest(), other.unit_key_lookup_digest())
+        self.assertNotEqual(missing.unit_key_lookup_digest(), none.unit_key_lookup_digest())
+
     def test__hash__(self):
         unit = ContentUnitHelper()
         unit.apple = 'red'
@@ -181,6 +217,57 @@ class TestContentUnit(unittest.TestCase):
         # make sure the last updated time has been updated
         self.assertEquals(helper._last_updated, 'foo')
 
+    def test_pre_save_signal_sets_unit_key_digest(self):
+        """
+        Test that the unit key digest is stored on new units
+        """
+        helper = ContentUnitHelper(apple='red', pear='green', age=2)
+
+        model.ContentUnit.pre_save_signal({}, helper)
+
+        self.assertEqual(helper._unit_key_digest, helper.unit_key_lookup_digest())
+
+    def test_pre_save_signal_unit_key_unchanged(self):
+        """
+        Test that the unit key digest is left alone on existing units whose unit key has not
+        changed, since they may have been loaded without their unit key fields
+        """
+        helper = ContentUnitHelper(apple='red', pear='green', age=2)
+        helper._created = False
+        helper._clear_changed_fields()
+        helper._last_updated = 50
+
+        model.ContentUnit.pre_save_signal({}, helper)
+
+        self.assertTrue(helper._unit_key_digest is None)
+
+    def test_pre_save_signal_unit_key_changed(self):
+        """
+        Test that the unit key digest is recomputed when a unit key field changes
+        """
+        helper = ContentUnitHelper(apple='red', pear='green', age=2)
+        helper._created = False
+        helper._clear_changed_fields()
+        helper.pear = 'yellow'
+
+        model.ContentUnit.pre_save_signal({}, helper)
+
+        self.assertEqual(helper._unit_key_digest, helper.unit_key_lookup_digest())
+
+    def test_pre_save_signal_unit_key_db_field_changed(self):
+        """
+        Test that the unit key digest is recomputed when a unit key field stored under another
+        name changes
+        """
+        helper = ContentUnitDBFieldHelper(apple='red')
+        helper._created = False
+        helper._clear_changed_fields()
+        helper.apple = 'green'
+
+        model.ContentUnit.pre_save_signal({}, helper)
+
+        self.assertEqual(helper._unit_key_digest, helper.unit_key_lookup_digest())
+
     @patch('pulp.server.db.model.Repository.objects')
     @patch('pulp.server.db.model.RepositoryContentUnit.objects')
     def test_get_repositories(self, mock_rcu_query, mock_repository_query):
@@ -1371,9 +1458,63 @@ class TestDeferredDownload(unittest.TestCase):
         self.assertTrue(isinstance(model.DeferredDownload._ns, StringField))
         self.assertEqual('deferred_download', model.DeferredDownload._ns.default)
 
+        self.assertTrue(isinstance(model.DeferredDownload.hits, IntField))
+        self.assertEqual(1, model.DeferredDownload.hits.default)
+        self.assertTrue(isinstance(model.DeferredDownload.priority, IntField))
+        self.assertEqual(0, model.DeferredDownload.priority.default)
+        self.assertTrue(isinstance(model.DeferredDownload.lease_owner, StringField))
+        self.assertTrue(isinstance(model.DeferredDownload.lease_expires, UTCDateTimeField))
+
     def test_indexes(self):
         result = model.DeferredDownload.list_indexes()
-        self.assertEqual([[('unit_id', 1), ('unit_type_id', 1)], [(u'_id', 1)]], result)
+        self.assertEqual([[('unit_id', 1), ('unit_type_id', 1)], [('priority', -1)],
+                          [('hits', -1)], [(u'_id', 1)]], result)
+
+    @patch('pulp.server.db.model.DeferredDownload.objects')
+    def test_record_hit(self, mock_objects):
+        model.DeferredDownload.record_hit('123', 'abc')
+
+        mock_objects.assert_called_once_with(unit_id='123', unit_type_id='abc')
+        mock_objects.return_value.update_one.assert_called_once_with(
+            inc__hits=1, set_on_insert__priority=0, set_on_insert___ns='deferred_download',
+            upsert=True)
+
+    @patch('pulp.server.db.model.DeferredDownload.objects')
+    def test_record_hit_concurrent_insert(self, mock_objects):
+        """Assert a hit is counted if another request inserts the entry first."""
+        mock_objects.return_value.update_one.side_effect = [NotUniqueError(), 1]
+
+        model.DeferredDownload.record_hit('123', 'abc')
+
+        mock_objects.return_value.update_one.assert_called_with(inc__hits=1)
+
+    @patch('pulp.server.db.model.dateutils.now_utc_datetime_with_tzinfo')
+    @patch('pulp.server.db.model.DeferredDownload.objects')
+    def test_claim(self, mock_objects, mock_now):
+        now = datetime(2016, 1, 1, tzinfo=dateutils.utc_tz())
+        mock_now.return_value = now
+        entries = [Mock(id='1'), Mock(id='2'), None]
+        modify = mock_objects.return_value.order_by.return_value.modify
+        modify.side_effect = entries
+
+        result = model.DeferredDownload.claim('worker', 5, 60)
+
+        self.assertEqual(entries[:2], result)
+        self.assertEqual(3, modify.call_count)
+        modify.assert_called_with(set__lease_owner='worker',
+                                  set__lease_expires=now + timedelta(seconds=60), new=True)
+        mock_objects.return_value.order_by.assert_called_with('-priority', '-hits')
+        # entries claimed by this call are not claimed again
+        self.assertEqual(['1', '2'], mock_objects.call_args[1]['id__nin'])
+
+    @patch('pulp.server.db.model.DeferredDownload.objects')
+    def test_claim_count(self, mock_objects):
+        modify = mock_objects.return_value.order_by.return_value.modify
+
+        result = model.DeferredDownload.claim('worker', 2, 60)
+
+        self.assertEqual(2, len(result))
+        self.assertEqual(2, modify.call_count)
 
     def test_meta_collection(self):
         """
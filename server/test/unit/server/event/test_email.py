@@ -15,6 +15,7 @@ from pulp.server.compat import json
 from pulp.server.config import config
 from pulp.server.event import data, mail
 from pulp.server.managers import factory
+from pulp.server.managers.event import fire
 
 
 class TestSendEmail(unittest.TestCase):
@@ -131,9 +132,12 @@ class TestSystem(unittest.TestCase):
     @mock.patch('ConfigParser.SafeConfigParser.getboolean', return_value=True)
     # inject fake results from the database query
     @mock.patch('pulp.server.db.model.event.EventListener.get_collection')
+    # invoke the notifiers synchronously
+    @mock.patch.object(fire.DISPATCHER, 'dispatch', new=fire._notify)
     def test_fire(self, mock_get_collection, mock_getbool, mock_smtp, mock_publish, mock_task_ser):
         # verify that the event system will trigger listeners of this type
         mock_get_collection.return_value.find.return_value = [self.event_doc]
+        fire.LISTENERS.invalidate()
         mock_task_ser.return_value = 'serialized task'
         event = data.Event(data.TYPE_REPO_SYNC_FINISHED, 'stuff')
         factory.initialize()
@@ -1,6 +1,8 @@
+import Queue
 import unittest
 
 import mock
+from requests import ConnectionError
 
 from pulp.server.event import http
 from pulp.server.event.data import Event
@@ -10,84 +12,182 @@ MODULE_PATH = 'pulp.server.event.http.'
 
 class TestHTTPNotifierTests(unittest.TestCase):
 
+    def tearDown(self):
+        http._NOTIFIERS.clear()
+
+    @mock.patch(MODULE_PATH + '_get_notifier')
     @mock.patch(MODULE_PATH + 'json')
     @mock.patch(MODULE_PATH + 'json_util')
-    @mock.patch(MODULE_PATH + 'threading.Thread')
-    def test_handle_event(self, mock_thread, mock_jutil, mock_json):
+    def test_handle_event(self, mock_jutil, mock_json, mock_get_notifier):
         # Setup
-        notifier_config = {'key': 'value'}
+        notifier_config = {'url': 'https://localhost/api/'}
         mock_event = mock.Mock(spec=Event)
         event_data = mock_event.data.return_value
 
         # Test
         http.handle_event(notifier_config, mock_event)
         mock_json.dumps.assert_called_once_with(event_data, default=mock_jutil.default)
-        mock_thread.assert_called_once_with(
-            target=http._send_post,
-            args=[notifier_config, mock_json.dumps.return_value]
-        )
+        mock_get_notifier.assert_called_once_with(notifier_config)
+        mock_get_notifier.return_value.enqueue.assert_called_once_with(
+            mock_json.dumps.return_value)
 
-    @mock.patch(MODULE_PATH + 'post')
-    def test_send_post_no_auth(self, mock_post):
-        notifier_config = {'url': 'https://localhost/api/'}
-        data = {'head': 'feet'}
+    @mock.patch(MODULE_PATH + '_get_notifier')
+    @mock.patch(MODULE_PATH + '_logger')
+    def test_handle_event_no_url(self, mock_log, mock_get_notifier):
+        """Assert attempting to post to no url fails."""
+        expected_log = 'HTTP notifier configured without a URL; cannot fire event'
+        mock_event = mock.Mock(spec=Event)
+        mock_event.data.return_value = {}
 
-        http._send_post(notifier_config, data)
-        mock_post.assert_called_once_with(
-            'https://localhost/api/',
-            data=data,
-            headers={'Content-Type': 'application/json'},
-            auth=None,
-        )
+        http.handle_event({}, mock_event)
+
+        mock_log.error.assert_called_once_with(expected_log)
+        self.assertEqual(0, mock_get_notifier.call_count)
+
+    @mock.patch(MODULE_PATH + '_Notifier')
+    def test_get_notifier_no_auth(self, mock_notifier):
+        notifier = http._get_notifier({'url': 'https://localhost/api/'})
+
+        mock_notifier.assert_called_once_with('https://localhost/api/', None, 1)
+        self.assertTrue(notifier is mock_notifier.return_value)
 
     @mock.patch(MODULE_PATH + 'HTTPBasicAuth')
-    @mock.patch(MODULE_PATH + 'post')
-    def test_send_post_auth(self, mock_post, mock_basic_auth):
+    @mock.patch(MODULE_PATH + '_Notifier')
+    def test_get_notifier_auth(self, mock_notifier, mock_basic_auth):
         notifier_config = {
             'url': 'https://localhost/api/',
             'username': 'jcline',
-            'password': 'hunter2'
+            'password': 'hunter2',
+            'batch_size': '10',
         }
-        data = {'head': 'feet'}
-
-        http._send_post(notifier_config, data)
-        mock_post.assert_called_once_with(
-            'https://localhost/api/',
-            data=data,
-            headers={'Content-Type': 'application/json'},
-            auth=mock_basic_auth.return_value,
-        )
+
+        http._get_notifier(notifier_config)
+
         mock_basic_auth.assert_called_once_with('jcline', 'hunter2')
+        mock_notifier.assert_called_once_with('https://localhost/api/',
+                                              mock_basic_auth.return_value, 10)
 
     @mock.patch(MODULE_PATH + '_logger')
-    @mock.patch(MODULE_PATH + 'HTTPBasicAuth')
-    @mock.patch(MODULE_PATH + 'post')
-    def test_send_post_no_url(self, mock_post, mock_basic_auth, mock_log):
-        """Assert attempting to post to no url fails."""
-        expected_log = 'HTTP notifier configured without a URL; cannot fire event'
-        http._send_post({}, {})
-        mock_log.error.assert_called_once_with(expected_log)
-        self.assertEqual(0, mock_post.call_count)
+    @mock.patch(MODULE_PATH + '_Notifier')
+    def test_get_notifier_bad_batch_size(self, mock_notifier, mock_log):
+        http._get_notifier({'url': 'https://localhost/api/', 'batch_size': 'lots'})
+
+        mock_notifier.assert_called_once_with('https://localhost/api/', None, 1)
+        self.assertEqual(1, mock_log.error.call_count)
+
+    @mock.patch(MODULE_PATH + 'os.getpid', return_value=1)
+    @mock.patch(MODULE_PATH + '_Notifier')
+    def test_get_notifier_reused(self, mock_notifier, mock_getpid):
+        """Assert one notifier is shared by all events with the same configuration."""
+        mock_notifier.return_value.pid = 1
+        notifier_config = {'url': 'https://localhost/api/'}
+
+        first = http._get_notifier(notifier_config)
+        second = http._get_notifier(dict(notifier_config))
+        http._get_notifier({'url': 'https://localhost/other/'})
+
+        self.assertTrue(first is second)
+        self.assertEqual(2, mock_notifier.call_count)
+
+    @mock.patch(MODULE_PATH + 'os.getpid', return_value=2)
+    @mock.patch(MODULE_PATH + '_Notifier')
+    def test_get_notifier_after_fork(self, mock_notifier, mock_getpid):
+        """Assert notifiers created by a parent process are not used by its children."""
+        inherited = mock.Mock(pid=1)
+        http._NOTIFIERS[('https://localhost/api/', None, None, 1)] = inherited
+
+        notifier = http._get_notifier({'url': 'https://localhost/api/'})
+
+        self.assertTrue(notifier is mock_notifier.return_value)
+
+
+@mock.patch(MODULE_PATH + 'time.sleep')
+@mock.patch(MODULE_PATH + 'threading.Thread')
+class TestNotifier(unittest.TestCase):
+
+    def test_init(self, mock_thread, mock_sleep):
+        auth = mock.Mock()
+
+        notifier = http._Notifier('https://localhost/api/', auth, 5)
+
+        self.assertEqual(notifier.session.auth, auth)
+        self.assertEqual(notifier.session.headers['Content-Type'], 'application/json')
+        self.assertEqual(notifier.queue.maxsize, http.QUEUE_SIZE)
+        self.assertEqual(mock_thread.call_count, http.WORKER_COUNT)
+        mock_thread.assert_called_with(target=notifier._run)
+        self.assertEqual(mock_thread.return_value.start.call_count, http.WORKER_COUNT)
 
     @mock.patch(MODULE_PATH + '_logger')
-    @mock.patch(MODULE_PATH + 'HTTPBasicAuth')
-    @mock.patch(MODULE_PATH + 'post')
-    def test_send_post_bad_response(self, mock_post, mock_basic_auth, mock_log):
-        """Assert non-200 posts get logged."""
+    def test_enqueue_full(self, mock_log, mock_thread, mock_sleep):
+        notifier = http._Notifier('https://localhost/api/', None)
+        notifier.queue = mock.Mock()
+        notifier.queue.put.side_effect = Queue.Full
+
+        notifier.enqueue('{}')
+
+        notifier.queue.put.assert_called_once_with('{}', timeout=http.ENQUEUE_TIMEOUT)
+        self.assertEqual(1, mock_log.error.call_count)
+
+    def test_next_batch(self, mock_thread, mock_sleep):
+        notifier = http._Notifier('https://localhost/api/', None, 2)
+        for body in ('1', '2', '3'):
+            notifier.enqueue(body)
+
+        self.assertEqual(notifier._next_batch(), ['1', '2'])
+        self.assertEqual(notifier._next_batch(), ['3'])
+
+    def test_next_batch_not_batched(self, mock_thread, mock_sleep):
+        notifier = http._Notifier('https://localhost/api/', None)
+        notifier.enqueue('1')
+        notifier.enqueue('2')
+
+        self.assertEqual(notifier._next_batch(), ['1'])
+
+    def test_send_post(self, mock_thread, mock_sleep):
+        notifier = http._Notifier('https://localhost/api/', None)
+        notifier.session = mock.Mock()
+        notifier.session.post.return_value.status_code = 200
+        data = '{"head": "feet"}'
+
+        notifier._send_post(data)
+
+        notifier.session.post.assert_called_once_with(
+            'https://localhost/api/', data=data, timeout=http.REQUEST_TIMEOUT)
+
+    @mock.patch(MODULE_PATH + '_logger')
+    def test_send_post_bad_response(self, mock_log, mock_thread, mock_sleep):
+        """Assert non-200 posts get logged and are not retried."""
         expected_log = 'Received HTTP 404 from HTTP notifier to https://localhost/api/.'
-        notifier_config = {
-            'url': 'https://localhost/api/',
-            'username': 'jcline',
-            'password': 'hunter2'
-        }
-        data = {'head': 'feet'}
-        mock_post.return_value.status_code = 404
-
-        http._send_post(notifier_config, data)
-        mock_post.assert_called_once_with(
-            'https://localhost/api/',
-            data=data,
-            headers={'Content-Type': 'application/json'},
-            auth=mock_basic_auth.return_value,
-        )
+        notifier = http._Notifier('https://localhost/api/', None)
+        notifier.session = mock.Mock()
+        notifier.session.post.return_value.status_code = 404
+
+        notifier._send_post('{}')
+
+        self.assertEqual(1, notifier.session.post.call_count)
         mock_log.error.assert_called_once_with(expected_log)
+
+    @mock.patch(MODULE_PATH + '_logger')
+    def test_send_post_retries(self, mock_log, mock_thread, mock_sleep):
+        """Assert connection errors and server errors are retried with backoff."""
+        notifier = http._Notifier('https://localhost/api/', None)
+        notifier.session = mock.Mock()
+        notifier.session.post.side_effect = [
+            ConnectionError('refused'), mock.Mock(status_code=503), mock.Mock(status_code=200)]
+
+        notifier._send_post('{}')
+
+        self.assertEqual(3, notifier.session.post.call_count)
+        self.assertEqual([mock.call(1), mock.call(2)], mock_sleep.call_args_list)
+        self.assertEqual(0, mock_log.error.call_count)
+
+    @mock.patch(MODULE_PATH + '_logger')
+    def test_send_post_gives_up(self, mock_log, mock_thread, mock_sleep):
+        notifier = http._Notifier('https://localhost/api/', None)
+        notifier.session = mock.Mock()
+        notifier.session.post.side_effect = ConnectionError('refused')
+
+        notifier._send_post('{}')
+
+        self.assertEqual(http.MAX_RETRIES + 1, notifier.session.post.call_count)
+        self.assertEqual(1, mock_log.error.call_count)
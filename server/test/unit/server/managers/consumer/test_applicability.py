@@ -11,10 +11,8 @@ from pulp.server.db.model.criteria import Criteria
 from pulp.server.db.model import Repository
 from pulp.server.managers import factory as factory
 from pulp.server.managers.consumer.applicability import (
-    _add_consumers_to_applicability_map, _add_profiles_to_consumer_map_and_get_hashes,
-    _add_repo_ids_to_consumer_map, _format_report, _get_applicability_map,
-    _get_consumer_applicability_map, DoesNotExist, MultipleObjectsReturned,
-    retrieve_consumer_applicability, ApplicabilityRegenerationManager)
+    _generate_report, _get_consumer_signatures, _get_signature_applicability_map, DoesNotExist,
+    MultipleObjectsReturned, retrieve_consumer_applicability, ApplicabilityRegenerationManager)
 from pulp.server.managers.consumer.bind import BindManager
 from pulp.server.managers.consumer.cud import ConsumerManager
 from pulp.server.managers.consumer.profile import ProfileManager
@@ -1187,317 +1185,140 @@ class TestRetrieveConsumerApplicability(base.PulpServerTests,
         self.assert_equal_ignoring_list_order(applicability, expected_applicability)
 
 
-class TestAddConsumersToApplicabilityMap(base.PulpServerTests,
-                                         base.RecursiveUnorderedListComparisonMixin):
+class TestGetConsumerSignatures(base.PulpServerTests):
     """
-    Test the _add_consumer_to_applicability_map() function.
-    """
-    def test__add_consumers_to_applicability_map(self):
-        """
-        Test the _add_consumers_to_applicability_map() function.
-        """
-        consumer_map = {
-            'consumer_1': {'profiles': [{'profile_hash': 'hash_1'},
-                                        {'profile_hash': 'hash_2'}],
-                           'repo_ids': ['repo_1']},
-            'consumer_2': {'profiles': [{'profile_hash': 'hash_2'},
-                                        {'profile_hash': 'hash_3'}],
-                           'repo_ids': ['repo_1', 'repo_2']},
-            'consumer_3': {'profiles': [{'profile_hash': 'hash_1'},
-                                        {'profile_hash': 'hash_4'}],
-                           'repo_ids': ['repo_3']},
-        }
-        # The applicability_map should be altered by _add_consumers_to_applicability_map()
-        # by having the consumers in the consumer_map added to the correct applicability
-        # spots. The applicability_map doesn't have data for every combo of profile and
-        # repo, so that we can make sure the function is able to handle that case
-        # gracefully.
-        applicability_map = {
-            ('hash_1', 'repo_1'): {'consumers': [], 'applicability': ['a_1']},
-            ('hash_2', 'repo_1'): {'consumers': [], 'applicability': ['a_2']},
-            ('hash_2', 'repo_2'): {'consumers': [], 'applicability': ['a_3']},
-            # This one should not match any consumers
-            ('hash_5', 'repo_3'): {'consumers': [], 'applicability': ['a_4']},
-        }
-
-        _add_consumers_to_applicability_map(consumer_map, applicability_map)
-
-        expected_applicability_map = {
-            ('hash_1', 'repo_1'): {'consumers': ['consumer_1'],
-                                   'applicability': ['a_1']},
-            ('hash_2', 'repo_1'): {'consumers': ['consumer_1', 'consumer_2'],
-                                   'applicability': ['a_2']},
-            ('hash_2', 'repo_2'): {'consumers': ['consumer_2'],
-                                   'applicability': ['a_3']},
-            ('hash_5', 'repo_3'): {'consumers': [], 'applicability': ['a_4']},
-        }
-        self.assert_equal_ignoring_list_order(applicability_map,
-                                              expected_applicability_map)
-
-
-class TestAddProfilesToConsumerMapAndGetHashes(
-        base.PulpServerTests, base.RecursiveUnorderedListComparisonMixin):
-    """
-    Test the _add_profiles_to_consumer_map_and_get_hashes() function.
+    Test the _get_consumer_signatures() function.
     """
     def tearDown(self):
         """
         Empty the collections that were written to during this test suite.
         """
-        super(TestAddProfilesToConsumerMapAndGetHashes, self).tearDown()
+        super(TestGetConsumerSignatures, self).tearDown()
         Consumer.get_collection().remove()
         UnitProfile.get_collection().remove()
-
-    def test__add_profiles_to_consumer_map_and_get_hashes(self):
-        """
-        Test the _add_profiles_to_consumer_map_and_get_hashes() function.
-        """
-        # Set up the consumers
-        consumer_ids = ['consumer_1', 'consumer_2']
-        manager = factory.consumer_manager()
-        for consumer_id in consumer_ids:
-            manager.register(consumer_id)
-        # Set up consumer profile data
-        consumer_profiles = {
-            'consumer_1': [{'type': 'content_type_1',
-                            'profile': ['unit_1-0.9.1', 'unit_3-12.9.3']},
-                           {'type': 'content_type_2',
-                            'profile': 'a_profile'}],
-            'consumer_2': [{'type': 'content_type_2', 'profile': 'a_profile'}]}
-        manager = ProfileManager()
-        profile_map = {}
-        expected_hashes = set()
-        for consumer_id, profiles in consumer_profiles.items():
-            profile_map[consumer_id] = []
-            for profile in profiles:
-                consumer_profile = manager.create(consumer_id, profile['type'],
-                                                  profile['profile'])
-                profile_map[consumer_id].append(
-                    {'hash': consumer_profile.profile_hash,
-                     'profile': consumer_profile.profile})
-                expected_hashes.add(consumer_profile.profile_hash)
-        expected_hashes = list(expected_hashes)
-        consumer_map = {
-            'consumer_1': {'profiles': []},
-            'consumer_2': {'profiles': []}
-        }
-
-        hashes = _add_profiles_to_consumer_map_and_get_hashes(
-            consumer_ids, consumer_map)
-
-        self.assertEqual(set(consumer_map.keys()), set(['consumer_1', 'consumer_2']))
-        self.assertEqual(len(consumer_map['consumer_1']['profiles']), 2)
-        self.assertEqual(len(consumer_map['consumer_2']['profiles']), 1)
-        self.assertEqual(set([p['profile_hash']
-                              for p in consumer_map['consumer_1']['profiles']]),
-                         set([profile_map['consumer_1'][0]['hash'],
-                              profile_map['consumer_1'][1]['hash']]))
-        self.assertEqual(consumer_map['consumer_2']['profiles'][0]['profile_hash'],
-                         profile_map['consumer_2'][0]['hash'])
-        # _add_profiles_to_consumer_map_and_get_hashes should return a list of unique
-        # hashes, and this test only creates two unique hashes
-        self.assertEqual(len(hashes), 2)
-        self.assert_equal_ignoring_list_order(hashes, expected_hashes)
-
-
-class TestAddRepoIDsToConsumerMap(base.PulpServerTests,
-                                  base.RecursiveUnorderedListComparisonMixin):
-    """
-    Test the _add_repo_ids_to_consumer_map() function.
-    """
-    def tearDown(self):
-        """
-        Empty the collections that were written to during this test suite.
-        """
-        super(TestAddRepoIDsToConsumerMap, self).tearDown()
-        Consumer.get_collection().remove()
         Bind.get_collection().remove()
 
+    @mock.patch('pulp.server.managers.consumer.applicability.CONSUMER_BATCH_SIZE', 2)
     @mock.patch('pulp.server.managers.consumer.bind.factory.consumer_history_manager')
     @mock.patch('pulp.server.managers.consumer.bind.BindManager._validate_consumer_repo')
-    def test__add_repo_ids_to_consumer_map(self, m_validate_consumer_repo, *unused_mocks):
+    def test__get_consumer_signatures(self, m_validate_consumer_repo, *unused_mocks):
         """
-        Test the _add_repo_ids_to_consumer_map() function.
+        Test the _get_consumer_signatures() function.
         """
-        # Set up the consumers
         m_validate_consumer_repo.return_value = None
-        consumer_ids = ['consumer_1', 'consumer_2', 'consumer_3']
+        consumer_ids = ['consumer_1', 'consumer_2', 'consumer_3', 'consumer_4']
         manager = factory.consumer_manager()
         for consumer_id in consumer_ids:
             manager.register(consumer_id)
-        # Create repository bindings. Let's leave consumer_3 unbound.
+        # consumer_1 and consumer_3 have the same profiles and bindings. consumer_4 has a
+        # profile but no bindings, so it has no applicability.
+        manager = ProfileManager()
+        hash_1 = manager.create('consumer_1', 'content_type_1', ['unit_1']).profile_hash
+        hash_2 = manager.create('consumer_1', 'content_type_2', ['unit_2']).profile_hash
+        manager.create('consumer_2', 'content_type_1', ['unit_1'])
+        manager.create('consumer_3', 'content_type_1', ['unit_1'])
+        manager.create('consumer_3', 'content_type_2', ['unit_2'])
+        manager.create('consumer_4', 'content_type_1', ['unit_1'])
         bind_manager = BindManager()
         bind_manager.bind('consumer_1', 'repo_1', 'distributor_id', False, {})
         bind_manager.bind('consumer_2', 'repo_1', 'distributor_id', False, {})
         bind_manager.bind('consumer_2', 'repo_2', 'distributor_id', False, {})
-        consumer_map = {
-            'consumer_1': {'repo_ids': []},
-            'consumer_2': {'repo_ids': []},
-            'consumer_3': {'repo_ids': []}}
-
-        _add_repo_ids_to_consumer_map(consumer_ids, consumer_map)
-
-        expected_consumer_map = {
-            'consumer_1': {'repo_ids': ['repo_1']},
-            'consumer_2': {'repo_ids': ['repo_1', 'repo_2']},
-            'consumer_3': {'repo_ids': []}}
-
-        # The order of repo_ids is not important, so we'll use the
-        # assert_equal_ignoring_list_order, which will compare the lists as sets
-        self.assert_equal_ignoring_list_order(consumer_map, expected_consumer_map)
-
-
-class TestFormatReport(base.PulpServerTests, base.RecursiveUnorderedListComparisonMixin):
-    """
-    Test the _add_repo_ids_to_consumer_map() function.
-    """
-    def test__format_report(self):
-        """
-        Test the _format_report() function.
-        """
-        applicability_map = {
-            frozenset(['consumer_1']): {'type_1': ['unit_1']},
-            frozenset(['consumer_1', 'consumer_2']): {'type_2': ['unit_2']}}
-
-        report = _format_report(applicability_map)
-
-        expected_report = [{'consumers': ['consumer_1'],
-                            'applicability': {'type_1': ['unit_1']}},
-                           {'consumers': ['consumer_1', 'consumer_2'],
-                            'applicability': {'type_2': ['unit_2']}}]
-        # The order of lists found in the output isn't important, so we can use
-        # assert_equal_ignoring_list_order to compare the output and expected output as sets
-        self.assert_equal_ignoring_list_order(report, expected_report)
-
-    def test__format_report_removes_empty_consumer_lists(self):
-        """
-        Test the _format_report() function with applicability data that doesn't apply to
-        any consumers.
-        """
-        applicability_map = {
-            frozenset(['consumer_1']): {'type_1': ['unit_1']},
-            frozenset(['consumer_1', 'consumer_2']): {'type_2': ['unit_2']},
-            frozenset([]): {'type_3': ['unit_3']}}
+        bind_manager.bind('consumer_3', 'repo_1', 'distributor_id', False, {})
 
-        report = _format_report(applicability_map)
+        signatures = _get_consumer_signatures(iter(consumer_ids))
 
-        expected_report = [{'consumers': ['consumer_1'],
-                            'applicability': {'type_1': ['unit_1']}},
-                           {'consumers': ['consumer_1', 'consumer_2'],
-                            'applicability': {'type_2': ['unit_2']}}]
-        # The order of lists found in the output isn't important, so we can use
-        # assert_equal_ignoring_list_order to compare the output and expected output as sets
-        self.assert_equal_ignoring_list_order(report, expected_report)
+        expected_signatures = {
+            (frozenset([hash_1, hash_2]), frozenset(['repo_1'])): ['consumer_1', 'consumer_3'],
+            (frozenset([hash_1]), frozenset(['repo_1', 'repo_2'])): ['consumer_2']}
+        self.assertEqual(signatures, expected_signatures)
 
 
-class TestGetApplicabilityMap(base.PulpServerTests):
+class TestGetSignatureApplicabilityMap(base.PulpServerTests):
     """
-    Test the _get_applicability_map() function.
+    Test the _get_signature_applicability_map() function.
     """
-    def tearDown(self):
-        """
-        Empty the collections that were written to during this test suite.
-        """
-        super(TestGetApplicabilityMap, self).tearDown()
-        RepoProfileApplicability.get_collection().remove()
+    SIGNATURE_1 = (frozenset(['hash_1']), frozenset(['repo_1', 'repo_2']))
+    SIGNATURE_2 = (frozenset(['hash_1', 'hash_2']), frozenset(['repo_1', 'repo_3']))
+    SIGNATURES = {SIGNATURE_1: ['c_1'], SIGNATURE_2: ['c_2', 'c_3']}
 
-    def test__get_applicability_map_content_types_none(self):
-        """
-        Test the _get_applicability_map() function with content_types set to None.
-        """
+    def setUp(self):
+        super(TestGetSignatureApplicabilityMap, self).setUp()
         applicabilities = [
             {'profile_hash': 'hash_1',
-             'profile': 'a_profile',
              'repo_id': 'repo_1',
-             'applicability': {'type_1': 'a_1'}},
+             'applicability': {'type_1': ['a_1']}},
             {'profile_hash': 'hash_1',
-             'profile': 'a_profile',
              'repo_id': 'repo_2',
-             'applicability': {'type_1': 'a_2'}},
+             'applicability': {'type_1': ['a_2'], 'type_2': ['a_5']}},
+            # Only SIGNATURE_2 has these, so their units should be merged together
             {'profile_hash': 'hash_2',
-             'profile': 'another_profile',
-             'repo_id': 'repo_2',
-             'applicability': {'type_2': 'a_3'}},
-            {'profile_hash': 'hash_3',
-             'profile': 'we leave this off the query',
              'repo_id': 'repo_1',
-             'applicability': {'type_1': 'a_4'}}]
+             'applicability': {'type_1': ['a_1', 'a_3']}},
+            {'profile_hash': 'hash_2',
+             'repo_id': 'repo_3',
+             'applicability': {'type_1': ['a_3', 'a_6']}},
+            # No signature has both hash_2 and repo_2
+            {'profile_hash': 'hash_2',
+             'repo_id': 'repo_2',
+             'applicability': {'type_1': ['a_4']}}]
         for a in applicabilities:
             RepoProfileApplicability.objects.create(a['profile_hash'], a['repo_id'],
-                                                    a['profile'], a['applicability'])
+                                                    'a_profile', a['applicability'])
+
+    def tearDown(self):
+        """
+        Empty the collections that were written to during this test suite.
+        """
+        super(TestGetSignatureApplicabilityMap, self).tearDown()
+        RepoProfileApplicability.get_collection().remove()
 
-        # Leave hash_3 out of the query, so we can make sure it doesn't get returned
-        a_map = _get_applicability_map(['hash_1', 'hash_2'], None)
+    def test__get_signature_applicability_map_content_types_none(self):
+        """
+        Test the _get_signature_applicability_map() function with content_types set to None.
+        """
+        a_map = _get_signature_applicability_map(self.SIGNATURES, None)
 
         expected_a_map = {
-            ('hash_1', 'repo_1'): {'applicability': {'type_1': 'a_1'}, 'consumers': []},
-            ('hash_1', 'repo_2'): {'applicability': {'type_1': 'a_2'}, 'consumers': []},
-            ('hash_2', 'repo_2'): {'applicability': {'type_2': 'a_3'}, 'consumers': []}}
+            frozenset([self.SIGNATURE_1, self.SIGNATURE_2]): {'type_1': set(['a_1'])},
+            frozenset([self.SIGNATURE_1]): {'type_1': set(['a_2']), 'type_2': set(['a_5'])},
+            frozenset([self.SIGNATURE_2]): {'type_1': set(['a_1', 'a_3', 'a_6'])}}
         self.assertEqual(a_map, expected_a_map)
 
-    def test__get_applicability_map_content_types_not_none(self):
+    def test__get_signature_applicability_map_content_types_not_none(self):
         """
-        Assert that _get_applicability_map() correctly filters out unwanted types when
-        content_types is passed.
+        Assert that _get_signature_applicability_map() correctly filters out unwanted types
+        when content_types is passed.
         """
-        applicabilities = [
-            {'profile_hash': 'hash_1',
-             'profile': 'a_profile',
-             'repo_id': 'repo_1',
-             'applicability': {'type_1': 'a_1'}},
-            {'profile_hash': 'hash_1',
-             'profile': 'a_profile',
-             'repo_id': 'repo_2',
-             'applicability': {'type_1': 'a_2', 'type_2': 'a_5'}},
-            {'profile_hash': 'hash_2',
-             'profile': 'another_profile',
-             'repo_id': 'repo_2',
-             'applicability': {'type_2': 'a_3'}},
-            {'profile_hash': 'hash_3',
-             'profile': 'we leave this off the query',
-             'repo_id': 'repo_1',
-             'applicability': {'type_1': 'a_4'}}]
-        for a in applicabilities:
-            RepoProfileApplicability.objects.create(a['profile_hash'], a['repo_id'],
-                                                    a['profile'], a['applicability'])
-
-        # Leave hash_3 out of the query, so we can make sure it doesn't get returned
-        a_map = _get_applicability_map(['hash_1', 'hash_2'], ['type_1'])
+        a_map = _get_signature_applicability_map(self.SIGNATURES, ['type_2'])
 
         expected_a_map = {
-            ('hash_1', 'repo_1'): {'applicability': {'type_1': 'a_1'}, 'consumers': []},
-            ('hash_1', 'repo_2'): {'applicability': {'type_1': 'a_2'}, 'consumers': []}}
+            frozenset([self.SIGNATURE_1]): {'type_2': set(['a_5'])}}
         self.assertEqual(a_map, expected_a_map)
 
+    def test__get_signature_applicability_map_no_signatures(self):
+        self.assertEqual(_get_signature_applicability_map({}, None), {})
 
-class TestGetConsumerApplicabilityMap(base.PulpServerTests,
-                                      base.RecursiveUnorderedListComparisonMixin):
+
+class TestGenerateReport(base.PulpServerTests, base.RecursiveUnorderedListComparisonMixin):
     """
-    Test the _get_consumer_applicability_map() function.
+    Test the _generate_report() function.
     """
-    def test__get_consumer_applicability_map(self):
+    def test__generate_report(self):
         """
-        Test the _get_consumer_applicability_map() function.
+        Test the _generate_report() function.
         """
-        a_map = {
-            ('hash_1', 'repo_1'): {'applicability': {'type_1': ['a_1']},
-                                   'consumers': ['c_1', 'c_2']},
-            ('hash_1', 'repo_2'): {'applicability': {'type_1': ['a_2']},
-                                   'consumers': ['c_2', 'c_3']},
-            # This is the same set of consumers as the first group. The function should
-            # combine these two into the same entry in the output. This one has the same
-            # content_type as the first one too, so it should combine the units together.
-            ('hash_1', 'repo_3'): {'applicability': {'type_1': ['a_3']},
-                                   'consumers': ['c_1', 'c_2']},
-            # Another one with the same consumers, but this one's applicability is for
-            # a different content type, which will still combine them together, but as
-            # separate types in the same applicability entry
-            ('hash_1', 'repo_4'): {'applicability': {'type_2': ['a_4']},
-                                   'consumers': ['c_1', 'c_2']}}
-
-        c_a_map = _get_consumer_applicability_map(a_map)
-
-        expected_c_a_map = {
-            frozenset(['c_1', 'c_2']): {'type_1': ['a_1', 'a_3'], 'type_2': ['a_4']},
-            frozenset(['c_2', 'c_3']): {'type_1': ['a_2']}}
-        self.assert_equal_ignoring_list_order(c_a_map, expected_c_a_map)
+        signatures = {'signature_1': ['consumer_1'],
+                      'signature_2': ['consumer_2', 'consumer_3']}
+        applicability_map = {
+            frozenset(['signature_1']): {'type_1': set(['unit_1'])},
+            frozenset(['signature_1', 'signature_2']): {'type_2': set(['unit_2', 'unit_3'])}}
+
+        report = list(_generate_report(signatures, applicability_map))
+
+        expected_report = [{'consumers': ['consumer_1'],
+                            'applicability': {'type_1': ['unit_1']}},
+                           {'consumers': ['consumer_1', 'consumer_2', 'consumer_3'],
+                            'applicability': {'type_2': ['unit_2', 'unit_3']}}]
+        # The order of lists found in the output isn't important, so we can use
+        # assert_equal_ignoring_list_order to compare the output and expected output as sets
+        self.assert_equal_ignoring_list_order(report, expected_report)
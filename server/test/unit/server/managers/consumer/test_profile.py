@@ -1,10 +1,11 @@
 import mock
-import pymongo
 
 from .... import base
 from pulp.devel import mock_plugins
 from pulp.plugins.profiler import Profiler
-from pulp.server.db.model.consumer import Consumer, ConsumerHistoryEvent, UnitProfile
+from pulp.server.db.model.consumer import (Consumer, ConsumerHistoryEvent, UnitProfile,
+                                           UnitProfileContent)
+from pulp.server.db.model.criteria import Criteria
 from pulp.server.exceptions import MissingResource
 from pulp.server.managers import factory
 from pulp.server.managers.consumer.cud import ConsumerManager
@@ -24,12 +25,14 @@ class ProfileManagerTests(base.PulpServerTests):
         super(ProfileManagerTests, self).setUp()
         Consumer.get_collection().remove()
         UnitProfile.get_collection().remove()
+        UnitProfileContent.get_collection().remove()
         mock_plugins.install()
 
     def tearDown(self):
         super(ProfileManagerTests, self).tearDown()
         Consumer.get_collection().remove()
         UnitProfile.get_collection().remove()
+        UnitProfileContent.get_collection().remove()
         mock_plugins.reset()
 
     def populate(self):
@@ -49,9 +52,12 @@ class ProfileManagerTests(base.PulpServerTests):
         self.assertEquals(len(profiles), 1)
         self.assertEquals(profiles[0]['consumer_id'], self.CONSUMER_ID)
         self.assertEquals(profiles[0]['content_type'], self.TYPE_1)
-        self.assertEquals(profiles[0]['profile'], self.PROFILE_1)
+        self.assertFalse('profile' in profiles[0])
         expected_hash = UnitProfile.calculate_hash(self.PROFILE_1)
         self.assertEqual(profiles[0]['profile_hash'], expected_hash)
+        content = UnitProfileContent.get_collection().find_one({'_id': expected_hash})
+        self.assertEqual(content['profile'], self.PROFILE_1)
+        self.assertEqual(content['ref_count'], 1)
 
     def test_get_profiles(self):
         # Setup
@@ -124,9 +130,79 @@ class ProfileManagerTests(base.PulpServerTests):
         self.assertEquals(len(profiles), 1)
         self.assertEquals(profiles[0]['consumer_id'], self.CONSUMER_ID)
         self.assertEquals(profiles[0]['content_type'], self.TYPE_1)
-        self.assertEquals(profiles[0]['profile'], self.PROFILE_2)
         expected_hash = UnitProfile.calculate_hash(self.PROFILE_2)
         self.assertEqual(profiles[0]['profile_hash'], expected_hash)
+        # the old profile is no longer referenced
+        contents = list(UnitProfileContent.get_collection().find())
+        self.assertEqual(len(contents), 1)
+        self.assertEqual(contents[0]['_id'], expected_hash)
+        self.assertEqual(contents[0]['profile'], self.PROFILE_2)
+
+    def test_update_shares_profile(self):
+        """
+        Assert that consumers with the same profile share one stored copy of it.
+        """
+        self.populate()
+        factory.consumer_manager().register('other-consumer')
+        manager = factory.consumer_profile_manager()
+        manager.update(self.CONSUMER_ID, self.TYPE_1, self.PROFILE_1)
+        manager.update('other-consumer', self.TYPE_1, self.PROFILE_1)
+
+        contents = list(UnitProfileContent.get_collection().find())
+        self.assertEqual(len(contents), 1)
+        self.assertEqual(contents[0]['ref_count'], 2)
+        self.assertEqual(manager.get_profile('other-consumer', self.TYPE_1)['profile'],
+                         self.PROFILE_1)
+
+        manager.update(self.CONSUMER_ID, self.TYPE_1, self.PROFILE_2)
+        content = UnitProfileContent.get_collection().find_one(
+            {'_id': UnitProfile.calculate_hash(self.PROFILE_1)})
+        self.assertEqual(content['ref_count'], 1)
+
+        manager.consumer_deleted('other-consumer')
+        contents = list(UnitProfileContent.get_collection().find())
+        self.assertEqual(len(contents), 1)
+        self.assertEqual(contents[0]['profile'], self.PROFILE_2)
+
+    def test_find_by_criteria_profile_filter(self):
+        self.populate()
+        manager = factory.consumer_profile_manager()
+        manager.update(self.CONSUMER_ID, self.TYPE_1, self.PROFILE_1)
+        manager.update(self.CONSUMER_ID, self.TYPE_2, self.PROFILE_3)
+
+        profiles = list(manager.find_by_criteria(Criteria(filters={'profile.name': 'xxx'})))
+
+        self.assertEqual(len(profiles), 1)
+        self.assertEqual(profiles[0]['content_type'], self.TYPE_2)
+        self.assertEqual(profiles[0]['profile'], self.PROFILE_3)
+
+    def test_update_records_reported_hash(self):
+        """
+        Assert that the hash of the profile as reported is stored, even when the profiler
+        changes the profile.
+        """
+        self.populate()
+        manager = factory.consumer_profile_manager()
+        mock_plugins.MOCK_PROFILER.update_profile.side_effect = None
+        mock_plugins.MOCK_PROFILER.update_profile.return_value = self.PROFILE_3
+
+        manager.update(self.CONSUMER_ID, self.TYPE_1, self.PROFILE_1)
+
+        profile = manager.get_profile(self.CONSUMER_ID, self.TYPE_1)
+        self.assertEqual(profile['profile_hash'], UnitProfile.calculate_hash(self.PROFILE_3))
+        self.assertEqual(profile['reported_hash'], UnitProfile.calculate_hash(self.PROFILE_1))
+
+    def test_is_unchanged(self):
+        self.populate()
+        manager = factory.consumer_profile_manager()
+        manager.update(self.CONSUMER_ID, self.TYPE_1, self.PROFILE_1)
+
+        self.assertTrue(manager.is_unchanged(self.CONSUMER_ID, self.TYPE_1,
+                                             UnitProfile.calculate_hash(self.PROFILE_1)))
+        self.assertFalse(manager.is_unchanged(self.CONSUMER_ID, self.TYPE_1,
+                                              UnitProfile.calculate_hash(self.PROFILE_2)))
+        self.assertFalse(manager.is_unchanged(self.CONSUMER_ID, self.TYPE_2,
+                                              UnitProfile.calculate_hash(self.PROFILE_1)))
 
     def test_update_with_consumer_history(self):
         # Setup
@@ -189,15 +265,12 @@ class ProfileManagerTests(base.PulpServerTests):
     def test_multiple_types(self):
         # Setup
         self.populate()
-        collection = UnitProfile.get_collection()
         # Test
         manager = factory.consumer_profile_manager()
         manager.update(self.CONSUMER_ID, self.TYPE_1, self.PROFILE_1)
         manager.update(self.CONSUMER_ID, self.TYPE_2, self.PROFILE_2)
         # Verify
-        cursor = collection.find({'consumer_id': self.CONSUMER_ID})
-        cursor.sort('content_type', pymongo.ASCENDING)
-        profiles = list(cursor)
+        profiles = sorted(manager.get_profiles(self.CONSUMER_ID), key=lambda p: p['content_type'])
         # Type_1
         self.assertEquals(len(profiles), 2)
         self.assertEquals(profiles[0]['consumer_id'], self.CONSUMER_ID)
@@ -263,9 +336,11 @@ class ProfileManagerTests(base.PulpServerTests):
         self.assertEquals(len(profiles), 1)
         self.assertEquals(profiles[0]['consumer_id'], self.CONSUMER_ID)
         self.assertEquals(profiles[0]['content_type'], self.TYPE_2)
-        self.assertEquals(profiles[0]['profile'], self.PROFILE_2)
         expected_hash = UnitProfile.calculate_hash(self.PROFILE_2)
         self.assertEqual(profiles[0]['profile_hash'], expected_hash)
+        contents = list(UnitProfileContent.get_collection().find())
+        self.assertEqual(len(contents), 1)
+        self.assertEqual(contents[0]['_id'], expected_hash)
 
     def test_consumer_deleted(self):
         # Setup
@@ -283,6 +358,7 @@ class ProfileManagerTests(base.PulpServerTests):
         cursor = collection.find()
         profiles = list(cursor)
         self.assertEquals(len(profiles), 0)
+        self.assertEqual(UnitProfileContent.get_collection().find().count(), 0)
 
     @mock.patch('pulp.server.managers.factory.consumer_agent_manager')
     def test_consumer_unregister_cleanup(self, *unused):
@@ -1,7 +1,14 @@
+import unittest
+
+import mock
+from pymongo.errors import BulkWriteError
+
 from .... import base
 from pulp.plugins.types import database, model
+from pulp.server.managers.content import cud
 from pulp.server.managers.content.cud import ContentManager
 from pulp.server.managers.content.query import ContentQueryManager
+from pulp.server.util import calculate_unit_key_digest
 
 
 TYPE_1_DEF = model.TypeDefinition('type-1', 'Type 1', 'Test Definition One',
@@ -52,6 +59,7 @@ class PulpContentCUDTests(PulpContentTests):
         units = self.query_manager.list_content_units(TYPE_1_DEF.id)
         self.assertEqual(len(units), 1)
         self.assertTrue('_last_updated' in units[0])
+        self.assertEqual(units[0]['_unit_key_digest'], calculate_unit_key_digest({'key-1': 'A'}))
 
     def test_update_content_unit(self):
         unit_id = self.cud_manager.add_content_unit(TYPE_1_DEF.id, None, TYPE_1_UNITS[0])
@@ -62,6 +70,13 @@ class PulpContentCUDTests(PulpContentTests):
         self.assertTrue(unit['search-1'] == 'two')
         self.assertTrue('_last_updated' in unit)
 
+    def test_update_content_unit_key(self):
+        unit_id = self.cud_manager.add_content_unit(TYPE_2_DEF.id, None, TYPE_2_UNITS[0])
+        self.cud_manager.update_content_unit(TYPE_2_DEF.id, unit_id, {'key-2b': 'D'})
+        unit = self.query_manager.get_content_unit_by_id(TYPE_2_DEF.id, unit_id)
+        self.assertEqual(unit['_unit_key_digest'],
+                         calculate_unit_key_digest({'key-2a': 'A', 'key-2b': 'D'}))
+
     def test_delete_content_unit(self):
         unit_id = self.cud_manager.add_content_unit(TYPE_1_DEF.id, None, TYPE_1_UNITS[0])
         units = self.query_manager.list_content_units(TYPE_1_DEF.id)
@@ -89,3 +104,80 @@ class PulpContentCUDTests(PulpContentTests):
                                                          [child_id])
         parent = self.query_manager.get_content_unit_by_id(TYPE_2_DEF.id, parent_id)
         self.assertEqual(len(parent['_%s_references' % TYPE_1_DEF.id]), 0)
+
+    def test_upsert_content_units(self):
+        existing_id = self.cud_manager.add_content_unit(TYPE_1_DEF.id, None, TYPE_1_UNITS[0])
+        units = [{'key-1': 'A', 'search-1': 'two'}, TYPE_1_UNITS[1], TYPE_1_UNITS[2]]
+
+        unit_ids, added_count = self.cud_manager.upsert_content_units(TYPE_1_DEF.id, units)
+
+        self.assertEqual(added_count, 2)
+        self.assertEqual(len(unit_ids), 3)
+        self.assertEqual(unit_ids[0], existing_id)
+        units = self.query_manager.list_content_units(TYPE_1_DEF.id)
+        self.assertEqual(len(units), 3)
+        for unit_id, key in zip(unit_ids, ('A', 'B', 'C')):
+            unit = self.query_manager.get_content_unit_by_id(TYPE_1_DEF.id, unit_id)
+            self.assertEqual(unit['key-1'], key)
+            self.assertEqual(unit['_content_type_id'], TYPE_1_DEF.id)
+            self.assertTrue('_last_updated' in unit)
+            self.assertEqual(unit['_unit_key_digest'], calculate_unit_key_digest({'key-1': key}))
+        unit = self.query_manager.get_content_unit_by_id(TYPE_1_DEF.id, existing_id)
+        self.assertEqual(unit['search-1'], 'two')
+
+    def test_upsert_content_units_duplicates(self):
+        units = [TYPE_1_UNITS[0], TYPE_1_UNITS[0]]
+
+        unit_ids, added_count = self.cud_manager.upsert_content_units(TYPE_1_DEF.id, units)
+
+        self.assertEqual(added_count, 1)
+        self.assertEqual(unit_ids[0], unit_ids[1])
+
+    def test_upsert_content_units_empty(self):
+        self.assertEqual(self.cud_manager.upsert_content_units(TYPE_1_DEF.id, []), ([], 0))
+
+
+@mock.patch.object(cud.units_controller, 'get_unit_key_fields_for_type',
+                   return_value=('key-1',))
+@mock.patch.object(cud.content_types_db, 'type_units_collection')
+class TestUpsertContentUnitsRaces(unittest.TestCase):
+
+    def test_duplicate_key_updates(self, mock_collection, mock_key_fields):
+        """
+        Test that units added by another sync between the match and the insert of an upsert
+        are updated instead.
+        """
+        collection = mock_collection.return_value
+        collection.bulk_write.side_effect = [
+            BulkWriteError({'writeErrors': [{'index': 1, 'code': cud.DUPLICATE_KEY_ERROR}],
+                            'upserted': [{'index': 0, '_id': 'id-0'}]}),
+            None]
+        collection.find.return_value = [{'_id': 'id-1', 'key-1': 'B'}]
+        units = [{'key-1': 'A', 'search-1': 'one'}, {'key-1': 'B', 'search-1': 'two'}]
+
+        unit_ids, added_count = ContentManager().upsert_content_units('type-1', units)
+
+        retries = collection.bulk_write.call_args_list[1][0][0]
+        self.assertEqual(len(retries), 1)
+        self.assertEqual(retries[0]._filter, {'key-1': 'B'})
+        self.assertEqual(retries[0]._doc['$set']['search-1'], 'two')
+        self.assertFalse(retries[0]._upsert)
+        self.assertEqual(unit_ids[1], 'id-1')
+        self.assertEqual(added_count, 1)
+
+    @mock.patch.object(cud.uuid, 'uuid4', side_effect=['id-0', 'id-1'])
+    def test_existing_unit_removed(self, mock_uuid, mock_collection, mock_key_fields):
+        """
+        Test that units removed after they were matched are added again.
+        """
+        collection = mock_collection.return_value
+        collection.bulk_write.side_effect = [mock.Mock(upserted_ids={}),
+                                             mock.Mock(upserted_ids={0: 'id-1'})]
+        collection.find.return_value = []
+        units = [{'key-1': 'A', 'search-1': 'one'}]
+
+        unit_ids, added_count = ContentManager().upsert_content_units('type-1', units)
+
+        self.assertEqual(collection.bulk_write.call_count, 2)
+        self.assertEqual(unit_ids, ['id-1'])
+        self.assertEqual(added_count, 1)
@@ -1,6 +1,9 @@
+from StringIO import StringIO
 import errno
+import hashlib
 import os
 import shutil
+import tempfile
 
 import unittest
 import mock
@@ -12,6 +15,7 @@ from pulp.server.controllers import importer as importer_controller
 from pulp.server.db import model
 from pulp.server.exceptions import (MissingResource, PulpDataException, PulpExecutionException,
                                     InvalidValue, PulpCodedException)
+from pulp.server.managers.content import upload
 from pulp.server.managers.content.upload import ContentUploadManager
 import pulp.server.managers.factory as manager_factory
 
@@ -251,13 +255,18 @@ class ContentUploadManagerTests(base.PulpServerTests):
 
 class TestContentUploadManager(unittest.TestCase):
 
+    @mock.patch.object(ContentUploadManager, '_upload_info_path')
     @mock.patch.object(ContentUploadManager, '_upload_file_path')
     @mock.patch('pulp.server.managers.content.upload.os')
-    def test_delete_upload_removes_file(self, mock_os, mock__upload_file_path):
+    def test_delete_upload_removes_file(self, mock_os, mock__upload_file_path,
+                                        mock__upload_info_path):
         my_upload_id = 'asdf'
         ContentUploadManager().delete_upload(my_upload_id)
         mock__upload_file_path.assert_called_once_with(my_upload_id)
-        mock_os.remove.assert_called_once_with(mock__upload_file_path.return_value)
+        mock__upload_info_path.assert_called_once_with(my_upload_id)
+        self.assertEqual(mock_os.remove.call_args_list,
+                         [mock.call(mock__upload_file_path.return_value),
+                          mock.call(mock__upload_info_path.return_value)])
 
     @mock.patch.object(ContentUploadManager, '_upload_file_path')
     @mock.patch('pulp.server.managers.content.upload.os')
@@ -283,3 +292,175 @@ class TestContentUploadManager(unittest.TestCase):
         my_upload_id = 'asdf'
         mock_os.remove.side_effect = ValueError()
         self.assertRaises(ValueError, ContentUploadManager().delete_upload, my_upload_id)
+
+
+class TestUploadWrites(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        patcher = mock.patch.object(ContentUploadManager, '_upload_storage_dir',
+                                    return_value=self.working_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.upload_manager = ContentUploadManager()
+
+    def tearDown(self):
+        upload._digests.clear()
+        shutil.rmtree(self.working_dir)
+
+    def test_initialize_upload_preallocates(self):
+        upload_id = self.upload_manager.initialize_upload(11, 'ABC', 'sha256')
+
+        self.assertEqual(os.path.getsize(self.upload_manager._upload_file_path(upload_id)), 11)
+        self.assertEqual(self.upload_manager._read_upload_info(upload_id),
+                         {'size': 11, 'checksum': 'ABC', 'checksum_type': 'sha256'})
+        self.assertEqual(self.upload_manager.list_upload_ids(), [upload_id])
+
+    def test_initialize_upload_no_size(self):
+        upload_id = self.upload_manager.initialize_upload()
+
+        self.assertEqual(os.path.getsize(self.upload_manager._upload_file_path(upload_id)), 0)
+        self.assertFalse(os.path.exists(self.upload_manager._upload_info_path(upload_id)))
+
+    @mock.patch('pulp.server.managers.content.upload.WRITE_BLOCK_SIZE', 3)
+    def test_save_data_stream(self):
+        upload_id = self.upload_manager.initialize_upload()
+
+        self.upload_manager.save_data(upload_id, 2, StringIO('fus ro dah'))
+
+        with open(self.upload_manager._upload_file_path(upload_id)) as f:
+            self.assertEqual(f.read(), '\0\0fus ro dah')
+
+    def test_save_data_out_of_order_computes_sha256(self):
+        upload_id = self.upload_manager.initialize_upload(10)
+
+        self.upload_manager.save_data(upload_id, 4, 'ro dah')
+        self.assertFalse('sha256' in self.upload_manager._read_upload_info(upload_id))
+        self.upload_manager.save_data(upload_id, 0, 'fus ')
+
+        info = self.upload_manager._read_upload_info(upload_id)
+        self.assertEqual(info['sha256'], hashlib.sha256('fus ro dah').hexdigest())
+        self.assertFalse(upload_id in upload._digests)
+
+    def test_save_data_rewrite_abandons_sha256(self):
+        upload_id = self.upload_manager.initialize_upload(10)
+
+        self.upload_manager.save_data(upload_id, 0, 'fus ')
+        self.upload_manager.save_data(upload_id, 0, 'fus ')
+        self.upload_manager.save_data(upload_id, 4, 'ro dah')
+
+        self.assertFalse('sha256' in self.upload_manager._read_upload_info(upload_id))
+
+    def test_verify_upload(self):
+        checksum = hashlib.sha256('fus ro dah').hexdigest()
+        upload_id = self.upload_manager.initialize_upload(10, checksum.upper())
+        self.upload_manager.save_data(upload_id, 0, 'fus ro dah')
+        file_path = self.upload_manager._upload_file_path(upload_id)
+
+        with mock.patch('pulp.server.managers.content.upload.util.calculate_checksums') as calc:
+            self.upload_manager._verify_upload(upload_id, file_path)
+        self.assertEqual(calc.call_count, 0)
+
+    def test_verify_upload_mismatch(self):
+        upload_id = self.upload_manager.initialize_upload(checksum='abc', checksum_type='sha1')
+        self.upload_manager.save_data(upload_id, 0, 'fus ro dah')
+        file_path = self.upload_manager._upload_file_path(upload_id)
+
+        self.assertRaises(PulpDataException, self.upload_manager._verify_upload, upload_id,
+                          file_path)
+
+    def test_delete_upload_removes_info(self):
+        upload_id = self.upload_manager.initialize_upload(10)
+        self.upload_manager.save_data(upload_id, 0, 'fus ')
+
+        self.upload_manager.delete_upload(upload_id)
+
+        self.assertEqual(os.listdir(self.working_dir), [])
+        self.assertFalse(upload_id in upload._digests)
+
+
+class TestReuseStoredFile(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        patcher = mock.patch.object(ContentUploadManager, '_upload_storage_dir',
+                                    return_value=self.working_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.stored_path = os.path.join(self.working_dir, 'stored')
+        with open(self.stored_path, 'w') as f:
+            f.write('stored bits')
+        self.upload_path = os.path.join(self.working_dir, 'upload')
+        open(self.upload_path, 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    @mock.patch.object(ContentUploadManager, 'find_stored_file')
+    @mock.patch.object(ContentUploadManager, '_upload_file_path')
+    def test_reuse_stored_file(self, mock_upload_file_path, mock_find):
+        mock_upload_file_path.return_value = self.upload_path
+        mock_find.return_value = self.stored_path
+
+        reused = ContentUploadManager().reuse_stored_file('upload', 11, 'abc', 'sha256')
+
+        self.assertTrue(reused)
+        self.assertTrue(ContentUploadManager._read_upload_info('upload')['reused'])
+        mock_find.assert_called_once_with(11, 'abc', 'sha256')
+        with open(self.upload_path) as f:
+            self.assertEqual(f.read(), 'stored bits')
+
+    @mock.patch.object(ContentUploadManager, 'find_stored_file', return_value=None)
+    @mock.patch.object(ContentUploadManager, '_upload_file_path')
+    def test_reuse_stored_file_not_found(self, mock_upload_file_path, mock_find):
+        mock_upload_file_path.return_value = self.upload_path
+
+        reused = ContentUploadManager().reuse_stored_file('upload', 11, 'abc')
+
+        self.assertFalse(reused)
+        self.assertEqual(os.path.getsize(self.upload_path), 0)
+
+    @mock.patch.object(ContentUploadManager, 'find_stored_file')
+    @mock.patch.object(ContentUploadManager, '_upload_file_path')
+    def test_reuse_stored_file_missing_upload(self, mock_upload_file_path, mock_find):
+        mock_upload_file_path.return_value = os.path.join(self.working_dir, 'missing')
+
+        self.assertRaises(MissingResource, ContentUploadManager().reuse_stored_file,
+                          'missing', 11, 'abc')
+        self.assertEqual(mock_find.call_count, 0)
+
+    @mock.patch('pulp.server.managers.content.upload.plugin_api')
+    def test_find_stored_file(self, mock_plugin_api):
+        no_checksum = mock.Mock(checksum_field=None)
+        typed = mock.Mock(checksum_field='checksum', checksum_type_field='checksumtype')
+        typed.objects.return_value.only.return_value = [
+            mock.Mock(_storage_path=None), mock.Mock(_storage_path=self.stored_path)]
+        models = {'a': no_checksum, 'b': typed}
+        mock_plugin_api.list_unit_models.return_value = ['a', 'b']
+        mock_plugin_api.get_unit_model_by_id.side_effect = models.get
+
+        path = ContentUploadManager.find_stored_file(11, 'ABC', 'sha')
+
+        self.assertEqual(path, self.stored_path)
+        typed.objects.assert_called_once_with(checksum='abc', checksumtype='sha1')
+        typed.objects.return_value.only.assert_called_once_with('_storage_path')
+
+    @mock.patch('pulp.server.managers.content.upload.plugin_api')
+    def test_find_stored_file_size_mismatch(self, mock_plugin_api):
+        model_class = mock.Mock(checksum_field='checksum', checksum_type_field=None)
+        model_class.objects.return_value.only.return_value = [
+            mock.Mock(_storage_path=self.stored_path)]
+        mock_plugin_api.list_unit_models.return_value = ['a']
+        mock_plugin_api.get_unit_model_by_id.return_value = model_class
+
+        self.assertEqual(ContentUploadManager.find_stored_file(12, 'abc'), None)
+        model_class.objects.assert_called_once_with(checksum='abc')
+
+    @mock.patch('pulp.server.managers.content.upload.plugin_api')
+    def test_find_stored_file_untyped_checksums_are_sha256(self, mock_plugin_api):
+        model_class = mock.Mock(checksum_field='checksum', checksum_type_field=None)
+        mock_plugin_api.list_unit_models.return_value = ['a']
+        mock_plugin_api.get_unit_model_by_id.return_value = model_class
+
+        self.assertEqual(ContentUploadManager.find_stored_file(11, 'abc', 'sha1'), None)
+        self.assertEqual(model_class.objects.call_count, 0)
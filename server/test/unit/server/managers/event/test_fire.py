@@ -1,9 +1,11 @@
 import mock
 
 from .... import base
+from pulp.common.compat import unittest
 from pulp.server.db.model.event import EventListener
 from pulp.server.event import data as event_data, notifiers
 from pulp.server.managers import factory as manager_factory
+from pulp.server.managers.event import fire
 
 
 class EventFireManagerTests(base.PulpServerTests):
@@ -13,11 +15,13 @@ class EventFireManagerTests(base.PulpServerTests):
 
         self.manager = manager_factory.event_fire_manager()
         self.event_manager = manager_factory.event_listener_manager()
+        fire.LISTENERS.invalidate()
 
     def tearDown(self):
         super(EventFireManagerTests, self).tearDown()
 
         EventListener.get_collection().remove()
+        fire.LISTENERS.invalidate()
         notifiers.reset()
 
     def test_do_fire(self):
@@ -41,6 +45,7 @@ class EventFireManagerTests(base.PulpServerTests):
         # Test
         event = event_data.Event(event_data.TYPE_REPO_SYNC_STARTED, 'payload')
         self.manager._do_fire(event)
+        fire.DISPATCHER.join()
 
         # Verify
         self.assertEqual(1, notifier_1.fire.call_count)
@@ -66,6 +71,7 @@ class EventFireManagerTests(base.PulpServerTests):
         # Test
         event = event_data.Event(event_data.TYPE_REPO_SYNC_STARTED, 'payload')
         self.manager._do_fire(event)
+        fire.DISPATCHER.join()
 
         # Verify
         self.assertEqual(1, notifier_1.fire.call_count)
@@ -88,6 +94,7 @@ class EventFireManagerTests(base.PulpServerTests):
         # Test
         event = event_data.Event(event_data.TYPE_REPO_SYNC_STARTED, 'payload')
         self.manager._do_fire(event)
+        fire.DISPATCHER.join()
 
         # Verify
 
@@ -113,6 +120,7 @@ class EventFireManagerTests(base.PulpServerTests):
         # Test
         repo_id = 'test-repo'
         self.manager.fire_repo_sync_started(repo_id)
+        fire.DISPATCHER.join()
 
         # Verify
         self.assertEqual(1, notifier.fire.call_count)
@@ -134,6 +142,7 @@ class EventFireManagerTests(base.PulpServerTests):
         # so make up a fake dict here to simulate that.
         result = {'repo_id': 'test-repo', 'result': 'success'}
         self.manager.fire_repo_sync_finished(result)
+        fire.DISPATCHER.join()
 
         # Verify
         self.assertEqual(1, notifier.fire.call_count)
@@ -141,3 +150,73 @@ class EventFireManagerTests(base.PulpServerTests):
 
         self.assertEqual(event.event_type, event_data.TYPE_REPO_SYNC_FINISHED)
         self.assertEqual(event.payload, result)
+
+    def test_listeners_cached(self):
+        """
+        Test that listeners are only read from the database again after a listener changes.
+        """
+        notifier = mock.Mock()
+        notifiers.NOTIFIER_FUNCTIONS['notifier_1'] = notifier.fire
+        self.event_manager.create('notifier_1', {}, [event_data.TYPE_REPO_SYNC_STARTED])
+        self.manager.fire_repo_sync_started('test-repo')
+
+        with mock.patch.object(EventListener, 'get_collection') as mock_get_collection:
+            self.manager.fire_repo_sync_started('test-repo')
+            self.assertEqual(0, mock_get_collection.call_count)
+
+        self.event_manager.create('notifier_1', {}, [event_data.TYPE_REPO_SYNC_STARTED])
+        self.manager.fire_repo_sync_started('test-repo')
+        fire.DISPATCHER.join()
+
+        self.assertEqual(4, notifier.fire.call_count)
+
+
+class ListenerTableTests(unittest.TestCase):
+
+    @mock.patch.object(EventListener, 'get_collection')
+    def test_listeners(self, mock_get_collection):
+        started = {'event_types': [event_data.TYPE_REPO_SYNC_STARTED]}
+        both = {'event_types': [event_data.TYPE_REPO_SYNC_STARTED,
+                                event_data.TYPE_REPO_SYNC_FINISHED]}
+        star = {'event_types': ['*', event_data.TYPE_REPO_SYNC_STARTED]}
+        mock_get_collection.return_value.find.return_value = [started, both, star]
+        table = fire.ListenerTable()
+
+        self.assertEqual(table.listeners(event_data.TYPE_REPO_SYNC_STARTED), [started, both, star])
+        self.assertEqual(table.listeners(event_data.TYPE_REPO_SYNC_FINISHED), [both, star])
+        self.assertEqual(table.listeners(event_data.TYPE_REPO_PUBLISH_STARTED), [star])
+        self.assertEqual(1, mock_get_collection.return_value.find.call_count)
+
+    @mock.patch.object(EventListener, 'get_collection')
+    def test_listeners_single_type(self, mock_get_collection):
+        started = {'event_types': event_data.TYPE_REPO_SYNC_STARTED}
+        star = {'event_types': '*'}
+        mock_get_collection.return_value.find.return_value = [started, star]
+        table = fire.ListenerTable()
+
+        self.assertEqual(table.listeners(event_data.TYPE_REPO_SYNC_STARTED), [started, star])
+        self.assertEqual(table.listeners(event_data.TYPE_REPO_SYNC_FINISHED), [star])
+
+    @mock.patch('pulp.server.managers.event.fire.time.time')
+    @mock.patch.object(EventListener, 'get_collection')
+    def test_listeners_expire(self, mock_get_collection, mock_time):
+        mock_get_collection.return_value.find.return_value = []
+        mock_time.return_value = 1000
+        table = fire.ListenerTable()
+
+        table.listeners(event_data.TYPE_REPO_SYNC_STARTED)
+        mock_time.return_value = 1000 + fire.LISTENER_CACHE_TIMEOUT
+        table.listeners(event_data.TYPE_REPO_SYNC_STARTED)
+
+        self.assertEqual(2, mock_get_collection.return_value.find.call_count)
+
+    @mock.patch.object(EventListener, 'get_collection')
+    def test_invalidate(self, mock_get_collection):
+        mock_get_collection.return_value.find.return_value = []
+        table = fire.ListenerTable()
+
+        table.listeners(event_data.TYPE_REPO_SYNC_STARTED)
+        table.invalidate()
+        table.listeners(event_data.TYPE_REPO_SYNC_STARTED)
+
+        self.assertEqual(2, mock_get_collection.return_value.find.call_count)
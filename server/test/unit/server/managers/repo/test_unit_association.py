@@ -59,6 +59,87 @@ class TestUnitsFromCriteria(unittest.TestCase):
         self.assertTrue(found)
 
 
+@mock.patch('pulp.server.managers.repo.unit_association.plugin_api')
+class TestServerSideCopyAllowed(unittest.TestCase):
+
+    def test_allowed(self, mock_plugin_api):
+        mock_plugin_api.list_importer_types.return_value = {
+            'types': ['foo'], association_manager.SERVER_SIDE_COPY: True}
+        criteria = UnitAssociationCriteria(type_ids=['foo'],
+                                           association_filters={'created': {'$gt': 'x'}})
+
+        allowed = association_manager.RepoUnitAssociationManager._server_side_copy_allowed(
+            'imp', criteria)
+
+        self.assertTrue(allowed)
+        mock_plugin_api.list_importer_types.assert_called_once_with('imp')
+
+    def test_not_declared(self, mock_plugin_api):
+        mock_plugin_api.list_importer_types.return_value = {'types': ['foo']}
+
+        allowed = association_manager.RepoUnitAssociationManager._server_side_copy_allowed(
+            'imp', UnitAssociationCriteria())
+
+        self.assertFalse(allowed)
+
+    def test_unit_filters(self, mock_plugin_api):
+        mock_plugin_api.list_importer_types.return_value = {
+            'types': ['foo'], association_manager.SERVER_SIDE_COPY: True}
+        criteria = UnitAssociationCriteria(unit_filters={'name': 'bar'})
+
+        allowed = association_manager.RepoUnitAssociationManager._server_side_copy_allowed(
+            'imp', criteria)
+
+        self.assertFalse(allowed)
+
+
+@mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
+@mock.patch('pulp.server.managers.repo.unit_association.types_db')
+@mock.patch('pulp.server.managers.repo.unit_association.units_controller')
+@mock.patch('pulp.server.managers.repo.unit_association.RepoUnitAssociationManager.'
+            '_bulk_associate')
+@mock.patch('pulp.server.managers.repo.unit_association.RepoContentUnit')
+class TestCopyAssociations(unittest.TestCase):
+
+    def test_copy(self, mock_rcu, mock_bulk, mock_units_ctrl, mock_types_db, mock_repo_ctrl):
+        mock_rcu.get_collection.return_value.find.return_value = [
+            {'unit_type_id': 'foo', 'unit_id': 'a'}, {'unit_type_id': 'foo', 'unit_id': 'b'}]
+        mock_bulk.return_value = 2
+        mock_units_ctrl.get_unit_key_fields_for_type.return_value = ('name',)
+        mock_types_db.type_units_collection.return_value.find.return_value = [
+            {'_id': 'a', 'name': 'apple'}, {'_id': 'b', 'name': 'banana'}]
+        dest_repo = mock.Mock(repo_id='dest')
+        criteria = UnitAssociationCriteria(type_ids=['foo'], association_filters={'owner': 'x'})
+
+        ret = association_manager.RepoUnitAssociationManager._copy_associations(
+            'source', dest_repo, criteria)
+
+        mock_rcu.get_collection.return_value.find.assert_called_once_with(
+            {'owner': 'x', 'repo_id': 'source', 'unit_type_id': {'$in': ['foo']}},
+            projection=['unit_type_id', 'unit_id'])
+        self.assertEqual(mock_bulk.call_count, 1)
+        self.assertEqual(mock_bulk.call_args[0][:2], ('dest', 'foo'))
+        self.assertEqual(sorted(mock_bulk.call_args[0][2]), ['a', 'b'])
+        self.assertEqual(ret, {'units_successful': [
+            {'type_id': 'foo', 'unit_key': {'name': 'apple'}},
+            {'type_id': 'foo', 'unit_key': {'name': 'banana'}}]})
+        mock_repo_ctrl.rebuild_content_unit_counts.assert_called_once_with(dest_repo)
+        mock_repo_ctrl.update_last_unit_added.assert_called_once_with('dest')
+
+    def test_copy_nothing_new(self, mock_rcu, mock_bulk, mock_units_ctrl, mock_types_db,
+                              mock_repo_ctrl):
+        mock_rcu.get_collection.return_value.find.return_value = []
+        dest_repo = mock.Mock(repo_id='dest')
+
+        ret = association_manager.RepoUnitAssociationManager._copy_associations(
+            'source', dest_repo, UnitAssociationCriteria())
+
+        self.assertEqual(ret, {'units_successful': []})
+        self.assertEqual(mock_bulk.call_count, 0)
+        mock_repo_ctrl.rebuild_content_unit_counts.assert_called_once_with(dest_repo)
+        self.assertEqual(mock_repo_ctrl.update_last_unit_added.call_count, 0)
+
+
 @mock.patch('pulp.server.managers.repo.unit_association.model.Repository')
 class RepoUnitAssociationManagerTests(base.PulpServerTests):
 
@@ -73,6 +73,86 @@ class RepoUnitAssociationQueryManagerTests(unittest.TestCase):
         ]
         self.assertEqual(return_value, expected_return_value)
 
+    @mock.patch.object(association_query_manager, 'ASSOCIATION_PAGE_SIZE', 2)
+    @mock.patch.object(association_query_manager.RepoUnitAssociationQueryManager,
+                       '_associated_units_by_type_cursor')
+    def test__associations_with_units_pages(self, mock_units_cursor):
+        """
+        Assert units are loaded a page of associations at a time, and that the
+        association order is kept.
+        """
+        associations = [{'unit_type_id': 'a', 'unit_id': '2'},
+                        {'unit_type_id': 'b', 'unit_id': '1'},
+                        {'unit_type_id': 'a', 'unit_id': '1'}]
+        mock_units_cursor.side_effect = lambda t, c, ids: [
+            {'_content_type_id': t, '_id': i} for i in sorted(ids) if (t, i) != ('b', '1')]
+        manager = association_query_manager.RepoUnitAssociationQueryManager()
+
+        results = manager._associations_with_units(UnitAssociationCriteria(), iter(associations))
+
+        self.assertEqual(next(results)['metadata'], {'_content_type_id': 'a', '_id': '2'})
+        self.assertEqual(mock_units_cursor.call_count, 2)
+        # the unit of the second association is filtered out
+        self.assertEqual(next(results)['metadata'], {'_content_type_id': 'a', '_id': '1'})
+        self.assertEqual(mock_units_cursor.call_count, 3)
+        self.assertRaises(StopIteration, next, results)
+
+    @mock.patch.object(association_query_manager, 'ASSOCIATION_PAGE_SIZE', 2)
+    @mock.patch.object(association_query_manager.RepoUnitAssociationQueryManager,
+                       '_associated_units_by_type_cursor')
+    def test__units_with_associations(self, mock_units_cursor):
+        """
+        Assert each unit is generated once with all of its associations.
+        """
+        associations = [{'unit_type_id': 'a', 'unit_id': '1', 'created': 1},
+                        {'unit_type_id': 'a', 'unit_id': '1', 'created': 2},
+                        {'unit_type_id': 'a', 'unit_id': '2', 'created': 1},
+                        {'unit_type_id': 'a', 'unit_id': '3', 'created': 1}]
+        mock_units_cursor.side_effect = lambda t, c, ids: [
+            {'_content_type_id': t, '_id': i} for i in sorted(ids)]
+        manager = association_query_manager.RepoUnitAssociationQueryManager()
+
+        results = list(manager._units_with_associations(iter(associations),
+                                                        UnitAssociationCriteria()))
+
+        self.assertEqual([(u['_id'], len(a)) for u, a in results], [('1', 2), ('2', 1), ('3', 1)])
+        self.assertEqual([c[0][2] for c in mock_units_cursor.call_args_list],
+                         [['1', '2'], ['3']])
+
+    @mock.patch.object(association_query_manager.RepoUnitAssociationQueryManager,
+                       '_associated_units_by_type_cursor')
+    def test__units_with_associations_remove_duplicates(self, mock_units_cursor):
+        associations = [{'unit_type_id': 'a', 'unit_id': '1', 'created': 1},
+                        {'unit_type_id': 'a', 'unit_id': '1', 'created': 2}]
+        mock_units_cursor.return_value = [{'_content_type_id': 'a', '_id': '1'}]
+        manager = association_query_manager.RepoUnitAssociationQueryManager()
+        criteria = UnitAssociationCriteria(remove_duplicates=True)
+
+        results = list(manager._units_with_associations(iter(associations), criteria))
+
+        self.assertEqual(results, [({'_content_type_id': 'a', '_id': '1'}, [associations[0]])])
+
+    @mock.patch.object(association_query_manager.RepoUnitAssociationQueryManager,
+                       '_units_in_unit_sort_order')
+    @mock.patch.object(association_query_manager.RepoUnitAssociationQueryManager,
+                       '_units_in_unit_id_order')
+    @mock.patch.object(association_query_manager.RepoUnitAssociationQueryManager,
+                       '_units_in_association_order')
+    def test_get_units_execution(self, mock_association_order, mock_unit_id_order,
+                                 mock_unit_sort_order):
+        """
+        Assert that all of the associations are only loaded up front for unit sorts.
+        """
+        manager = association_query_manager.RepoUnitAssociationQueryManager()
+
+        manager.get_units('r', UnitAssociationCriteria(association_sort=[('created', 1)]))
+        manager.get_units('r', UnitAssociationCriteria())
+        manager.get_units('r', UnitAssociationCriteria(unit_sort=[('name', 1)]))
+
+        self.assertEqual(mock_association_order.call_count, 1)
+        self.assertEqual(mock_unit_id_order.call_count, 1)
+        self.assertEqual(mock_unit_sort_order.call_count, 1)
+
 
 class UnitAssociationQueryTests(base.PulpServerTests):
 
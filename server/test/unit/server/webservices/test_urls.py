@@ -567,6 +567,14 @@ class TestDjangoTasksUrls(unittest.TestCase):
         url_name = 'task_search'
         assert_url_match(url, url_name)
 
+    def test_match_task_status(self):
+        """
+        Test the matching for task_status.
+        """
+        url = '/v2/tasks/status/'
+        url_name = 'task_status'
+        assert_url_match(url, url_name)
+
 
 class TestDjangoRolesUrls(unittest.TestCase):
     """
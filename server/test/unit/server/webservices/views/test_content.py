@@ -6,8 +6,9 @@ import unittest
 from django.http import HttpResponseBadRequest, HttpResponseNotFound
 
 from base import assert_auth_CREATE, assert_auth_DELETE, assert_auth_READ, assert_auth_UPDATE
-from pulp.server import constants
-from pulp.server.exceptions import InvalidValue, MissingResource, OperationPostponed
+from pulp.server import constants, util
+from pulp.server.exceptions import (InvalidValue, MissingResource, OperationPostponed,
+                                    PulpCodedValidationException)
 from pulp.server.webservices.views.content import (
     CatalogResourceView,
     ContentSourceCollectionActionView,
@@ -619,11 +620,84 @@ class TestUploadsCollectionView(unittest.TestCase):
         content_types_view = UploadsCollectionView()
         response = content_types_view.post(request)
 
-        self.assertTrue(mock_upload_manager.initialize_upload.called)
+        mock_upload_manager.initialize_upload.assert_called_once_with(None, None,
+                                                                      util.TYPE_SHA256)
 
-        mock_resp.assert_called_once_with({'upload_id': 'mock_id', '_href': '/mock/path/'})
+        mock_resp.assert_called_once_with({'upload_id': 'mock_id', '_href': '/mock/path/',
+                                           'reused': False})
         mock_redirect.assert_called_once_with(mock_resp.return_value, '/mock/path/')
         self.assertTrue(response is mock_redirect.return_value)
+        self.assertEqual(mock_upload_manager.reuse_stored_file.call_count, 0)
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_CREATE())
+    @mock.patch('pulp.server.webservices.views.content.generate_redirect_response')
+    @mock.patch('pulp.server.webservices.views.content.generate_json_response')
+    @mock.patch('pulp.server.webservices.views.content.reverse')
+    @mock.patch('pulp.server.webservices.views.content.factory')
+    def test_post_uploads_collection_view_checksum(self, mock_factory, mock_reverse, mock_resp,
+                                                   mock_redirect):
+        """
+        View post should fill the upload with a stored file matching the given checksum.
+        """
+        mock_upload_manager = mock.MagicMock()
+        mock_upload_manager.initialize_upload.return_value = 'mock_id'
+        mock_upload_manager.reuse_stored_file.return_value = True
+        mock_factory.content_upload_manager.return_value = mock_upload_manager
+
+        request = mock.MagicMock()
+        request.body = json.dumps({'size': 11, 'checksum': 'abc', 'checksum_type': 'sha1'})
+        mock_reverse.return_value = '/mock/path/'
+
+        content_types_view = UploadsCollectionView()
+        content_types_view.post(request)
+
+        mock_upload_manager.initialize_upload.assert_called_once_with(11, 'abc', 'sha1')
+        mock_upload_manager.reuse_stored_file.assert_called_once_with('mock_id', 11, 'abc', 'sha1')
+        mock_resp.assert_called_once_with({'upload_id': 'mock_id', '_href': '/mock/path/',
+                                           'reused': True})
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_CREATE())
+    @mock.patch('pulp.server.webservices.views.content.factory')
+    def test_post_uploads_collection_view_invalid_checksum(self, mock_factory):
+        """
+        View post should reject a checksum without a valid size.
+        """
+        mock_upload_manager = mock.MagicMock()
+        mock_factory.content_upload_manager.return_value = mock_upload_manager
+
+        request = mock.MagicMock()
+        request.body = json.dumps({'size': '11', 'checksum': 'abc'})
+
+        content_types_view = UploadsCollectionView()
+        try:
+            content_types_view.post(request)
+            self.fail('InvalidValue should have been raised.')
+        except InvalidValue, e:
+            self.assertEqual(e.property_names, ['size'])
+        self.assertEqual(mock_upload_manager.initialize_upload.call_count, 0)
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_CREATE())
+    @mock.patch('pulp.server.webservices.views.content.factory')
+    def test_post_uploads_collection_view_not_object(self, mock_factory):
+        """
+        View post should reject a body that is not a JSON object.
+        """
+        mock_upload_manager = mock.MagicMock()
+        mock_factory.content_upload_manager.return_value = mock_upload_manager
+
+        request = mock.MagicMock()
+        request.body = json.dumps(['size', 11])
+
+        content_types_view = UploadsCollectionView()
+        try:
+            content_types_view.post(request)
+            self.fail('PulpCodedValidationException should have been raised.')
+        except PulpCodedValidationException, e:
+            self.assertEqual(e.error_code.code, 'PLP1015')
+        self.assertEqual(mock_upload_manager.initialize_upload.call_count, 0)
 
 
 class TestUploadSegmentResourceView(unittest.TestCase):
@@ -642,12 +716,11 @@ class TestUploadSegmentResourceView(unittest.TestCase):
         mock_upload_manager = mock.MagicMock()
         mock_factory.content_upload_manager.return_value = mock_upload_manager
         request = mock.MagicMock()
-        request.body = 'upload these bits'
 
         upload_segment_resource = UploadSegmentResourceView()
         response = upload_segment_resource.put(request, 'mock_id', 4)
 
-        mock_upload_manager.save_data.assert_called_once_with('mock_id', 4, 'upload these bits')
+        mock_upload_manager.save_data.assert_called_once_with('mock_id', 4, request)
         mock_resp.assert_called_once_with(None)
         self.assertTrue(response is mock_resp.return_value)
 
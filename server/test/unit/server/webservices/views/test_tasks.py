@@ -1,6 +1,8 @@
 """
 This module contains tests for the pulp.server.webservices.views.tasks module.
 """
+import json
+
 import mock
 
 from mongoengine.queryset import DoesNotExist
@@ -9,10 +11,11 @@ from .base import assert_auth_DELETE, assert_auth_READ
 from pulp.common.compat import unittest
 from pulp.server import exceptions as pulp_exceptions
 from pulp.server.db import model
-from pulp.server.exceptions import MissingResource
+from pulp.server.exceptions import InvalidValue, MissingResource
 from pulp.server.webservices.views import util
 from pulp.server.webservices.views.tasks import (TaskCollectionView, TaskResourceView,
-                                                 TaskSearchView, task_serializer)
+                                                 TaskSearchView, TaskStatusView, task_serializer,
+                                                 task_version)
 
 
 @mock.patch('pulp.server.webservices.views.tasks.serial_dispatch')
@@ -134,6 +137,72 @@ class TestTaskCollection(unittest.TestCase):
             task_collection.delete(mock_request)
 
 
+class TestTaskStatus(unittest.TestCase):
+    """
+    Tests for the status of many tasks.
+    """
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.webservices.views.tasks.TaskStatus')
+    @mock.patch('pulp.server.webservices.views.tasks.generate_json_response')
+    def test_post_task_status(self, mock_resp, mock_task_status):
+        """
+        View should return only the status fields of the requested tasks.
+        """
+        mock_request = mock.MagicMock()
+        mock_request.body = json.dumps({'task_ids': ['1', '2', 'missing']})
+        queryset = mock_task_status.objects.return_value.only.return_value
+        queryset.as_pymongo.return_value = [
+            {'_id': 'a', 'task_id': '1', 'state': 'running', 'start_time': 'then'},
+            {'_id': 'b', 'task_id': '2', 'state': 'waiting'}]
+
+        response = TaskStatusView().post(mock_request)
+
+        mock_task_status.objects.assert_called_once_with(task_id__in=['1', '2', 'missing'])
+        mock_task_status.objects.return_value.only.assert_called_once_with(
+            'task_id', 'state', 'start_time', 'finish_time')
+        mock_resp.assert_called_once_with([
+            {'task_id': '1', 'state': 'running', 'start_time': 'then', 'finish_time': None},
+            {'task_id': '2', 'state': 'waiting', 'start_time': None, 'finish_time': None}])
+        self.assertTrue(response is mock_resp.return_value)
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.webservices.views.tasks.TaskStatus')
+    @mock.patch('pulp.server.webservices.views.tasks.generate_json_response')
+    def test_post_task_status_progress(self, mock_resp, mock_task_status):
+        """
+        View should include progress reports when they are requested.
+        """
+        mock_request = mock.MagicMock()
+        mock_request.body = json.dumps({'task_ids': ['1'], 'progress': True})
+        queryset = mock_task_status.objects.return_value.only.return_value
+        queryset.as_pymongo.return_value = [
+            {'task_id': '1', 'state': 'running', 'progress_report': {'step': 2}}]
+
+        TaskStatusView().post(mock_request)
+
+        mock_task_status.objects.return_value.only.assert_called_once_with(
+            'task_id', 'state', 'start_time', 'finish_time', 'progress_report')
+        self.assertEqual(mock_resp.call_args[0][0][0]['progress_report'], {'step': 2})
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    def test_post_task_status_invalid(self):
+        """
+        View should reject task IDs that are not a list of strings.
+        """
+        mock_request = mock.MagicMock()
+        mock_request.body = json.dumps({'task_ids': 'abc', 'progress': 'yes'})
+
+        try:
+            TaskStatusView().post(mock_request)
+            self.fail('InvalidValue should have been raised.')
+        except InvalidValue, e:
+            self.assertEqual(e.property_names, ['task_ids', 'progress'])
+
+
 class TestTaskResource(unittest.TestCase):
     """
     View for a single task.
@@ -153,6 +222,7 @@ class TestTaskResource(unittest.TestCase):
             return arg
 
         mock_request = mock.MagicMock()
+        mock_request.GET = {}
         mock_task_status.objects.get.return_value = {'id': 'mock_task', 'worker_name': 'mock'}
         mock_task_serial.side_effect = mock_serializer
         mock_worker_inst = mock.MagicMock()
@@ -163,9 +233,72 @@ class TestTaskResource(unittest.TestCase):
         response = task_resource.get(mock_request, 'mock_task')
 
         expected_content = {'id': 'mock_task', 'worker_name': 'mock', 'queue': 'mock_q_name'}
+        expected_content['version'] = task_version(expected_content)
         mock_resp.assert_called_once_with(expected_content)
         self.assertTrue(response is mock_resp.return_value)
 
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.webservices.views.tasks.task_serializer')
+    @mock.patch('pulp.server.webservices.views.tasks.TaskStatus')
+    @mock.patch('pulp.server.webservices.views.tasks.generate_json_response_with_pulp_encoder')
+    def test_get_task_resource_not_modified(self, mock_resp, mock_task_status, mock_task_serial):
+        """
+        Test get task_resource returns an empty 304 response if the task matches the version.
+        """
+        waiting = {'id': 'mock_task', 'state': 'waiting'}
+        mock_task_status.objects.get.return_value = waiting
+        mock_task_serial.side_effect = dict
+        mock_request = mock.MagicMock()
+        mock_request.GET = {'version': task_version(waiting)}
+
+        response = TaskResourceView().get(mock_request, 'mock_task')
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, '')
+        self.assertFalse(mock_resp.called)
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.webservices.views.tasks.task_serializer')
+    @mock.patch('pulp.server.webservices.views.tasks.TaskStatus')
+    @mock.patch('pulp.server.webservices.views.tasks.generate_json_response_with_pulp_encoder')
+    def test_get_task_resource_modified(self, mock_resp, mock_task_status, mock_task_serial):
+        """
+        Test get task_resource returns only the fields that changed since the version.
+        """
+        running = {'task_id': 'mock_task', 'state': 'running', 'tags': ['a']}
+        mock_task_status.objects.get.return_value = running
+        mock_task_serial.side_effect = dict
+        mock_request = mock.MagicMock()
+        mock_request.GET = {'version': task_version(dict(running, state='waiting'))}
+
+        response = TaskResourceView().get(mock_request, 'mock_task')
+
+        mock_resp.assert_called_once_with({'task_id': 'mock_task', 'state': 'running',
+                                           'partial': True, 'version': task_version(running)})
+        self.assertTrue(response is mock_resp.return_value)
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.webservices.views.tasks.task_serializer')
+    @mock.patch('pulp.server.webservices.views.tasks.TaskStatus')
+    @mock.patch('pulp.server.webservices.views.tasks.generate_json_response_with_pulp_encoder')
+    def test_get_task_resource_fields_added(self, mock_resp, mock_task_status, mock_task_serial):
+        """
+        Test get task_resource returns the whole task if its fields changed since the version.
+        """
+        finished = {'task_id': 'mock_task', 'state': 'finished', 'result': 1}
+        mock_task_status.objects.get.return_value = finished
+        mock_task_serial.side_effect = dict
+        mock_request = mock.MagicMock()
+        mock_request.GET = {'version': task_version({'task_id': 'mock_task', 'state': 'running'})}
+
+        response = TaskResourceView().get(mock_request, 'mock_task')
+
+        mock_resp.assert_called_once_with(dict(finished, version=task_version(finished)))
+        self.assertTrue(response is mock_resp.return_value)
+
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
                 new=assert_auth_READ())
     @mock.patch('pulp.server.webservices.views.tasks.TaskStatus')
@@ -175,6 +308,7 @@ class TestTaskResource(unittest.TestCase):
         """
 
         mock_request = mock.MagicMock()
+        mock_request.GET = {}
         mock_task_status.objects.get.side_effect = DoesNotExist()
 
         task_resource = TaskResourceView()
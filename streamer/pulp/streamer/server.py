@@ -3,7 +3,7 @@ from httplib import NOT_FOUND, INTERNAL_SERVER_ERROR, SERVICE_UNAVAILABLE
 from urlparse import urlparse
 import logging
 
-from mongoengine import DoesNotExist, NotUniqueError
+from mongoengine import DoesNotExist
 from nectar import listener as nectar_listener
 import requests
 from twisted.internet import reactor
@@ -107,21 +107,17 @@ class StreamerListener(nectar_listener.DownloadEventListener):
 
     def download_succeeded(self, report):
         """
-        If the download was successful, add a deferred download entry.
+        If the download was successful, add a deferred download entry, or count
+        another hit on the existing one.
 
         :param report: The download report for this request.
         :type  report: nectar.report.DownloadReport
         """
         if not self.pulp_request:
-            try:
-                download = model.DeferredDownload(
-                    unit_id=self.catalog_entry.unit_id,
-                    unit_type_id=self.catalog_entry.unit_type_id
-                )
-                download.save()
-            except NotUniqueError:
-                # There's already an entry for this unit.
-                pass
+            model.DeferredDownload.record_hit(
+                self.catalog_entry.unit_id,
+                self.catalog_entry.unit_type_id
+            )
 
 
 class Streamer(resource.Resource):
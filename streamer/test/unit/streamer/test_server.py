@@ -1,7 +1,6 @@
 from httplib import INTERNAL_SERVER_ERROR, NOT_FOUND, SERVICE_UNAVAILABLE
 
 from mock import Mock, patch
-from mongoengine import NotUniqueError
 from twisted.web.server import Request
 
 from pulp.common.compat import unittest
@@ -88,20 +87,9 @@ class TestStreamerListener(unittest.TestCase):
 
     @patch(MODULE_PREFIX + 'model.DeferredDownload')
     def test_download_succeeded(self, mock_deferred_download):
-        """Assert a deferred download entry is made."""
+        """Assert a hit on the deferred download entry is recorded."""
         self.listener.download_succeeded(None)
-        mock_deferred_download.assert_called_once_with(unit_id='abc', unit_type_id='123')
-        mock_deferred_download.return_value.save.assert_called_once_with()
-
-    @patch(MODULE_PREFIX + 'model.DeferredDownload')
-    def test_download_succeeded_entry_not_unique(self, mock_deferred_download):
-        """Assert NotUniqueError exceptions are ignored."""
-        # Setup
-        mock_deferred_download.return_value.save.side_effect = NotUniqueError()
-
-        # Test
-        self.listener.download_succeeded(None)
-        mock_deferred_download.return_value.save.assert_called_once_with()
+        mock_deferred_download.record_hit.assert_called_once_with('abc', '123')
 
     @patch(MODULE_PREFIX + 'model.DeferredDownload')
     def test_download_succeeded_pulp_request(self, mock_deferred_download):